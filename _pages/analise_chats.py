@@ -10,9 +10,10 @@ from collections import Counter
 import json
 from datetime import datetime
 from utils.sql_loader import carregar_dados
-from utils.analise_helpers import _safe_pct, _cor_nota, _top_items, _gerar_html_relatorio
+from utils.analise_helpers import _safe_pct, _cor_nota, _top_items, _gerar_html_relatorio, _sem_nulos
 from utils.cats_vendedor import _CATS_VENDEDOR, _CATS_LEGACY
 from utils.qualificacao_dashboard import render_tab_bot_vs_ia
+from utils.transcricoes_loader import carregar_detalhes_chats
 
 TIMEZONE = 'America/Sao_Paulo'
 
@@ -25,9 +26,22 @@ _CORES_CLASS = {
 # ──────────────────────────────────────────────
 # CACHE / CARREGAMENTO
 # ──────────────────────────────────────────────
+def _parse_json(v):
+    if not v or (isinstance(v, float) and pd.isna(v)):
+        return {}
+    txt = str(v).strip()
+    if not txt:
+        return {}
+    try:
+        return json.loads(txt)
+    except (TypeError, ValueError):
+        return {}
+
+
 @st.cache_data(ttl=21600, show_spinner=False)
 def _carregar_dados() -> pd.DataFrame:
-    df = carregar_dados("consultas/analise_chats/analise_chats.sql")
+    # Camada leve: notas, rótulos e resumo da avaliação (sem transcrição/JSON completo)
+    df = carregar_dados("consultas/analise_chats/analise_chats_resumo.sql")
     if df is None or df.empty:
         return pd.DataFrame()
 
@@ -52,19 +66,9 @@ def _carregar_dados() -> pd.DataFrame:
     # ── Motivo de não avaliação ──────────────────────────────────────────────
     df['motivo_nao_avaliacao'] = df.get('motivo_triagem', pd.Series(dtype=str)).fillna('')
 
-    # ── Parse do JSON de avaliação ───────────────────────────────────────────
-    def _parse_json(v):
-        if not v or (isinstance(v, float) and pd.isna(v)):
-            return {}
-        txt = str(v).strip()
-        if not txt:
-            return {}
-        try:
-            return json.loads(txt)
-        except (TypeError, ValueError):
-            return {}
-
-    df['parsed_json'] = df['ai_evaluation'].apply(_parse_json)
+    # ── Resumo do JSON de avaliação (só os campos agregados; o JSON completo
+    #    e a transcrição vêm sob demanda via carregar_detalhes_chats) ─────────
+    df['parsed_json'] = df['avaliacao_resumo'].apply(lambda v: _sem_nulos(_parse_json(v)))
 
     # ── Lead classification ──────────────────────────────────────────────────
     def _extract_lead_class(j):
@@ -196,7 +200,7 @@ def _carregar_dados() -> pd.DataFrame:
 
     df['notas_pct'] = df['parsed_json'].apply(_extract_notas_pct)
 
-    return df
+    return df.drop(columns=['avaliacao_resumo', 'parsed_json'])
 
 
 
@@ -862,6 +866,12 @@ def run_page():
                     st.info("Sem dados de produto.")
 
             st.markdown("#### 📋 Chats Avaliados")
+            # Colunas pesadas só dos chats deste relatório (lotes + LRU)
+            _det_ag = carregar_detalhes_chats(df_ag['chat_id'])
+            df_ag['transcript'] = df_ag['chat_id'].astype(str).map(
+                lambda c: _det_ag.get(c, {}).get('transcript', ''))
+            df_ag['ai_evaluation'] = df_ag['chat_id'].astype(str).map(
+                lambda c: _det_ag.get(c, {}).get('ai_evaluation'))
             _cols_tab = [
                 'chat_id', 'data_chat', 'lead_classification', 'lead_score',
                 'tipo_ligacao', 'produto_recomendado', 'evaluation_ia',
@@ -975,8 +985,9 @@ def run_page():
 
             if sel_id:
                 row_data   = df_base[df_base['chat_id'] == sel_id].iloc[0]
-                j          = row_data.get('parsed_json', {})
-                transcript = row_data.get('transcript', '')
+                detalhe    = carregar_detalhes_chats([sel_id]).get(str(sel_id), {})
+                j          = _parse_json(detalhe.get('ai_evaluation'))
+                transcript = detalhe.get('transcript', '')
 
                 st.write(f"### 📝 Chat ID: `{sel_id}`")
                 
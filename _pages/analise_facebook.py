@@ -2,12 +2,12 @@ import streamlit as st
 import pandas as pd
 from facebook_business.api import FacebookAdsApi
 from facebook_business.adobjects.adaccount import AdAccount
-from facebook_business.adobjects.adsinsights import AdsInsights
 from dotenv import load_dotenv
 import os
 import io
 from datetime import datetime
 import plotly.express as px
+from collectors import meta_ads_collector
 from utils.sql_loader import carregar_dados
 from fbclid_db import (
     load_fbclid_cache,
@@ -24,15 +24,6 @@ load_dotenv()
 # Carrega credenciais específicas do Facebook, se existirem
 load_dotenv('.facebook_credentials.env', override=True)
 
-# action_types que contam como conversão
-CONVERSION_ACTIONS = {
-    'purchase', 'lead', 'omni_purchase',
-    'offsite_conversion.fb_pixel_purchase',
-    'offsite_conversion.fb_pixel_lead',
-    'submit_application_total',
-    'onsite_conversion.lead_grouped',
-}
-
 def get_facebook_api_account(empresa="Degrau"):
     """
     Inicializa a API do Facebook para a empresa selecionada.
@@ -68,65 +59,25 @@ def get_facebook_campaign_insights(account, start_date, end_date):
     incluindo conversões, CPA, alcance e frequência.
     """
     try:
-        fields = [
-            AdsInsights.Field.campaign_name,
-            AdsInsights.Field.objective,
-            AdsInsights.Field.spend,
-            AdsInsights.Field.impressions,
-            AdsInsights.Field.clicks,
-            AdsInsights.Field.ctr,
-            AdsInsights.Field.cpc,
-            AdsInsights.Field.cpm,
-            AdsInsights.Field.reach,
-            AdsInsights.Field.frequency,
-            AdsInsights.Field.actions,
-            AdsInsights.Field.cost_per_action_type,
-            AdsInsights.Field.conversions,
-        ]
-        params = {
-            'level': 'campaign',
-            'time_range': {
-                'since': start_date.strftime('%Y-%m-%d'),
-                'until': end_date.strftime('%Y-%m-%d'),
-            },
-        }
-
-        insights = account.get_insights(fields=fields, params=params)
-        rows = []
-        for insight in insights:
-            conversoes = 0
-
-            # 1) Tenta campo 'conversions' (submit_application_total)
-            if 'conversions' in insight:
-                for conv in insight['conversions']:
-                    if conv['action_type'] == 'submit_application_total':
-                        conversoes += int(conv.get('value', 0))
-
-            # 2) Fallback: busca em 'actions'
-            if conversoes == 0 and AdsInsights.Field.actions in insight:
-                for action in insight[AdsInsights.Field.actions]:
-                    if action['action_type'] in CONVERSION_ACTIONS:
-                        conversoes += int(action.get('value', 0))
-
-            custo = float(insight[AdsInsights.Field.spend])
-            cpa = custo / conversoes if conversoes > 0 else 0
-
-            rows.append({
-                'Campanha': insight[AdsInsights.Field.campaign_name],
-                'Objetivo': insight.get(AdsInsights.Field.objective, 'N/A'),
-                'Custo': custo,
-                'Impressões': int(insight.get(AdsInsights.Field.impressions, 0)),
-                'Cliques': int(insight.get(AdsInsights.Field.clicks, 0)),
-                'CTR (%)': float(insight.get(AdsInsights.Field.ctr, 0)),
-                'CPC': float(insight.get(AdsInsights.Field.cpc, 0)),
-                'CPM': float(insight.get(AdsInsights.Field.cpm, 0)),
-                'Alcance': int(insight.get(AdsInsights.Field.reach, 0)),
-                'Frequência': float(insight.get(AdsInsights.Field.frequency, 0)),
-                'Conversões': conversoes,
-                'CPA': cpa,
-            })
-
-        df = pd.DataFrame(rows)
+        # Fatos diários do armazém local: só dias novos ou recentes vão à API
+        df = meta_ads_collector.carregar_campanhas(account, start_date, end_date, com_alcance=True)
+        if df.empty:
+            return pd.DataFrame()
+
+        df = pd.DataFrame({
+            'Campanha': df['campanha'],
+            'Objetivo': df['objetivo'].replace('', 'N/A'),
+            'Custo': df['custo'],
+            'Impressões': df['impressoes'],
+            'Cliques': df['cliques'],
+            'CTR (%)': df['ctr_pct'],
+            'CPC': df['cpc'],
+            'CPM': df['cpm'],
+            'Alcance': df['alcance'].astype(int),
+            'Frequência': df['frequencia'],
+            'Conversões': df['conversoes'],
+            'CPA': df['cpa'],
+        })
         if not df.empty:
             df['Curso Venda'] = df['Campanha'].str.extract(r'\{(.*?)\}')
             df['Curso Venda'] = df['Curso Venda'].str.strip()
@@ -139,42 +90,19 @@ def get_facebook_campaign_insights(account, start_date, end_date):
         return pd.DataFrame()
     
 
-def get_facebook_breakdown_insights(account, start_date, end_date, breakdown):
+def get_facebook_breakdown_insights(account, start_date, end_date, breakdowns):
     """
-    Busca insights de Custo segmentados por um 'breakdown' específico (ex: age, gender).
+    Busca insights de Custo segmentados por cada 'breakdown' (ex: age, gender), em paralelo.
+    Retorna {breakdown: DataFrame}; breakdowns com erro voltam vazios.
     """
-    try:
-        fields = [
-            AdsInsights.Field.spend,
-        ]
-        params = {
-            'level': 'campaign',
-            'time_range': {
-                'since': start_date.strftime('%Y-%m-%d'),
-                'until': end_date.strftime('%Y-%m-%d'),
-            },
-            # O parâmetro chave que segmenta os dados
-            'breakdowns': [breakdown],
-        }
-
-        insights = account.get_insights(fields=fields, params=params)
-        
-        rows = []
-        for insight in insights:
-            rows.append({
-                'Segmento': insight[breakdown],
-                'Custo': float(insight[AdsInsights.Field.spend]),
-            })
-        
-        df = pd.DataFrame(rows)
-        # Agrupa os resultados, pois a API retorna uma linha por dia por segmento
-        if not df.empty:
-            df = df.groupby('Segmento')['Custo'].sum().sort_values(ascending=False).reset_index()
-        return df
-
-    except Exception as e:
-        st.error(f"Erro ao buscar dados com breakdown '{breakdown}': {e}")
-        return pd.DataFrame()
+    resultados = meta_ads_collector.carregar_breakdowns(account, start_date, end_date, breakdowns)
+    dfs = {}
+    for breakdown in breakdowns:
+        resultado = resultados.get(breakdown, {})
+        if resultado.get('erro'):
+            st.error(f"Erro ao buscar dados com breakdown '{breakdown}': {resultado['erro']}")
+        dfs[breakdown] = resultado.get('dados') if resultado.get('dados') is not None else pd.DataFrame()
+    return dfs
     
 def formatar_reais(valor):
     """Formata um número para o padrão monetário brasileiro."""
@@ -267,18 +195,25 @@ def run_page():
 
     st.header("👤 Perfil do Público e Plataformas")
 
+    # Custo por segmento: os cinco breakdowns numa única rodada paralela
+    with st.spinner("Buscando segmentações do público..."):
+        breakdowns = get_facebook_breakdown_insights(
+            account, start_date, end_date,
+            ['gender', 'age', 'region', 'publisher_platform', 'impression_device'],
+        )
+
     # --- Análise Demográfica ---
     col1, col2, col3 = st.columns(3)
     with col1:
         st.markdown("##### Gênero")
-        df_gender = get_facebook_breakdown_insights(account, start_date, end_date, 'gender')
+        df_gender = breakdowns['gender']
         if not df_gender.empty:
             fig_gender = px.pie(df_gender, names='Segmento', values='Custo', hole=0.4)
             st.plotly_chart(fig_gender, use_container_width=True)
 
     with col2:
         st.markdown("##### Faixa Etária")
-        df_age = get_facebook_breakdown_insights(account, start_date, end_date, 'age')
+        df_age = breakdowns['age']
         if not df_age.empty:
             fig_age = px.bar(df_age, x='Custo', y='Segmento', orientation='h', text_auto='.2s')
             fig_age.update_layout(yaxis_title=None, xaxis_title="Custo (R$)")
@@ -286,7 +221,7 @@ def run_page():
 
     with col3:
         st.markdown("##### Top 5 Regiões (Estados)")
-        df_region = get_facebook_breakdown_insights(account, start_date, end_date, 'region')
+        df_region = breakdowns['region']
         if not df_region.empty:
             fig_region = px.bar(df_region.head(5).sort_values("Custo", ascending=True), x='Custo', y='Segmento', orientation='h', text_auto='.2s')
             fig_region.update_layout(yaxis_title=None, xaxis_title="Custo (R$)")
@@ -298,14 +233,14 @@ def run_page():
     colA, colB = st.columns(2)
     with colA:
         st.markdown("##### Plataforma (Facebook, Instagram, etc.)")
-        df_platform = get_facebook_breakdown_insights(account, start_date, end_date, 'publisher_platform')
+        df_platform = breakdowns['publisher_platform']
         if not df_platform.empty:
             fig_platform = px.pie(df_platform, names='Segmento', values='Custo', hole=0.4)
             st.plotly_chart(fig_platform, use_container_width=True)
 
     with colB:
         st.markdown("##### Tipo de Dispositivo")
-        df_device = get_facebook_breakdown_insights(account, start_date, end_date, 'impression_device')
+        df_device = breakdowns['impression_device']
         if not df_device.empty:
             fig_device = px.pie(df_device, names='Segmento', values='Custo', hole=0.4)
             st.plotly_chart(fig_device, use_container_width=True)
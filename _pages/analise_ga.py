@@ -11,6 +11,7 @@ import yaml
 import os
 from datetime import datetime
 from st_aggrid import GridOptionsBuilder, AgGrid
+from collectors import ga4_reports, google_ads_collector
 from utils.sql_loader import carregar_dados
 import time
 from gclid_db import (
@@ -118,59 +119,20 @@ def get_google_ads_campaign_performance(client, customer_id, start_date, end_dat
     Retorna informações de campanhas, incluindo custo e conversões.
     """
     try:
-        # Inicializa o serviço
-        ga_service = client.get_service("GoogleAdsService")
-        
-        # Formata as datas para o formato esperado pelo Google Ads (YYYY-MM-DD)
-        start_date_str = start_date.strftime('%Y-%m-%d')
-        end_date_str = end_date.strftime('%Y-%m-%d')
-        
-        # Query GAQL (Google Ads Query Language)
-        query = f"""
-            SELECT 
-                campaign.name, 
-                campaign.id, 
-                metrics.cost_micros, 
-                metrics.conversions,
-                metrics.conversions_value
-            FROM campaign
-            WHERE 
-                segments.date >= '{start_date_str}' 
-                AND segments.date <= '{end_date_str}'
-                AND campaign.status != 'REMOVED'
-            ORDER BY metrics.cost_micros DESC
-        """
-        
-        # Executa a consulta
-        response = ga_service.search_stream(customer_id=customer_id, query=query)
-        
-        # Processa os resultados
-        campaigns_data = []
-        
-        for batch in response:
-            for row in batch.results:
-                # Converte micros (millionths) para valores reais e arredonda para 2 casas decimais
-                cost = round(float(row.metrics.cost_micros) / 1000000, 2)
-                conversions = float(row.metrics.conversions)
-                conversion_value = float(row.metrics.conversions_value)
-                
-                # Calcula CPA (Custo por Conversão) e arredonda para 2 casas decimais
-                cpa = round(cost / conversions, 2) if conversions > 0 else 0
-                
-                # Extrai nome do curso venda do nome da campanha (se existir no formato {Curso})
-                campaign_name = row.campaign.name
-                
-                campaigns_data.append({
-                    'Campanha': campaign_name,
-                    'ID da Campanha': row.campaign.id,
-                    'Custo': cost,
-                    'Conversões': conversions,
-                    'Valor de Conversões': conversion_value,
-                    'CPA (Custo por Conversão)': cpa
-                })
-        
-        # Retorna como DataFrame
-        return pd.DataFrame(campaigns_data)
+        # Fatos diários do armazém local: só dias novos ou recentes vão à API
+        df = google_ads_collector.carregar_campanhas(client, customer_id, start_date, end_date)
+        if df.empty:
+            return pd.DataFrame()
+        df = df[df['status'] != 'REMOVED']
+
+        return pd.DataFrame({
+            'Campanha': df['campanha'],
+            'ID da Campanha': df['campanha_id'],
+            'Custo': df['custo'].round(2),
+            'Conversões': df['conversoes'],
+            'Valor de Conversões': df['valor_conversoes'],
+            'CPA (Custo por Conversão)': df['cpa'].round(2),
+        }).reset_index(drop=True)
     
     except GoogleAdsException as ex:
         error_messages = []
@@ -431,21 +393,27 @@ def get_individual_conversion_report(client, property_id, start_date, end_date):
         
     return pd.DataFrame()
 # Função para executar relatórios no GA4
-def run_ga_report(client, property_id, dimensions, metrics, start_date, end_date, limit=15, order_bys=None):
-    """Função ÚNICA para executar qualquer relatório no GA4."""
+# Todos os relatórios GA4 da página, buscados juntos (batch_run_reports + cache local)
+RELATORIOS_GA = {
+    'custo': ga4_reports.relatorio(['campaignName'], ['advertiserAdCost', 'conversions'], ordenar_por='advertiserAdCost'),
+    'eventos': ga4_reports.relatorio(['eventName'], ['eventCount'], limit=200, ordenar_por='eventCount'),
+    'kpis': ga4_reports.relatorio([], ['activeUsers', 'newUsers', 'screenPageViews', 'eventCount', 'userEngagementDuration'], limit=1),
+    'aquisicao': ga4_reports.relatorio(['sessionDefaultChannelGroup'], ['sessions', 'activeUsers', 'conversions', 'purchaseRevenue']),
+    'genero': ga4_reports.relatorio(['userGender'], ['activeUsers']),
+    'idade': ga4_reports.relatorio(['userAgeBracket'], ['activeUsers']),
+    'cidade': ga4_reports.relatorio(['city'], ['activeUsers'], limit=10, ordenar_por='activeUsers'),
+    'paginas': ga4_reports.relatorio(['pageTitle'], ['screenPageViews', 'userEngagementDuration', 'activeUsers'], limit=20, ordenar_por='screenPageViews'),
+    'dispositivo': ga4_reports.relatorio(['deviceCategory'], ['activeUsers']),
+    'sistema': ga4_reports.relatorio(['operatingSystem'], ['activeUsers'], limit=10, ordenar_por='activeUsers'),
+}
+
+def carregar_relatorios_ga(client, property_id, start_date, end_date):
+    """Executa RELATORIOS_GA em lote; em caso de falha devolve DataFrames vazios."""
     try:
-        request = RunReportRequest(
-            property=f"properties/{property_id}",
-            dimensions=dimensions,
-            metrics=metrics,
-            date_ranges=[DateRange(start_date=start_date.strftime('%Y-%m-%d'), end_date=end_date.strftime('%Y-%m-%d'))],
-            limit=limit,
-            order_bys=order_bys if order_bys else []
-        )
-        return client.run_report(request)
+        return ga4_reports.buscar_relatorios(client, property_id, RELATORIOS_GA, start_date, end_date)
     except Exception as e:
         st.warning(f"Atenção: A consulta ao Google Analytics falhou. Erro: {e}")
-        return None
+        return {nome: pd.DataFrame() for nome in RELATORIOS_GA}
 
 def formatar_reais(valor):
     """Formata um número para o padrão monetário brasileiro."""
@@ -485,24 +453,22 @@ def run_page():
     start_date, end_date = periodo_selecionado
     st.info(f"Exibindo dados de **{start_date.strftime('%d/%m/%Y')}** a **{end_date.strftime('%d/%m/%Y')}**")
  
-    # --- ANÁLISE 1: PERFORMANCE DE CAMPANHAS ---
-    cost_response = run_ga_report(
-        client, PROPERTY_ID,
-        dimensions=[Dimension(name="campaignName")],
-        metrics=[Metric(name="advertiserAdCost"), Metric(name="conversions")],
-        start_date=start_date, end_date=end_date,
-        order_bys=[{'metric': {'metric_name': 'advertiserAdCost'}, 'desc': True}]
-    )
+    with st.spinner("Buscando relatórios do GA4..."):
+        relatorios_ga = carregar_relatorios_ga(client, PROPERTY_ID, start_date, end_date)
 
-    if cost_response and cost_response.rows:
-        rows = []
-        for r in cost_response.rows:
-            cost = float(r.metric_values[0].value)
-            conversions = float(r.metric_values[1].value)
-            cpa = (cost / conversions) if conversions > 0 else 0
-            rows.append({'Campanha': r.dimension_values[0].value, 'Custo': cost, 'Conversões': int(conversions), 'CPA (Custo por Conversão)': cpa})
-        
-        df_performance = pd.DataFrame(rows)
+    # --- ANÁLISE 1: PERFORMANCE DE CAMPANHAS ---
+    df_custo = relatorios_ga['custo']
+    df_performance = pd.DataFrame()
+
+    if not df_custo.empty:
+        custo = df_custo['advertiserAdCost'].astype(float)
+        conversoes = df_custo['conversions'].astype(float)
+        df_performance = pd.DataFrame({
+            'Campanha': df_custo['campaignName'],
+            'Custo': custo,
+            'Conversões': conversoes.astype(int),
+            'CPA (Custo por Conversão)': (custo / conversoes).where(conversoes > 0, 0),
+        })
         df_performance = df_performance[df_performance['Custo'] > 0].reset_index(drop=True)
 
         # Métrica de Custo Total ---
@@ -637,24 +603,13 @@ def run_page():
             st.header("🏷️ Eventos Registrados no GA4")
             st.info("Selecione os eventos que deseja analisar para identificar disparos de tags específicas (ex: purchase, add_to_cart, etc.).")
 
-            with st.spinner("Buscando eventos do GA4..."):
-                events_response = run_ga_report(
-                    client, PROPERTY_ID,
-                    dimensions=[Dimension(name="eventName")],
-                    metrics=[Metric(name="eventCount")],
-                    start_date=start_date, end_date=end_date,
-                    limit=200,
-                    order_bys=[{'metric': {'metric_name': 'eventCount'}, 'desc': True}]
-                )
+            df_eventos_ga = relatorios_ga['eventos']
 
-            if events_response and events_response.rows:
-                df_events = pd.DataFrame([
-                    {
-                        'Evento': r.dimension_values[0].value,
-                        'Disparos': int(r.metric_values[0].value)
-                    }
-                    for r in events_response.rows
-                ])
+            if not df_eventos_ga.empty:
+                df_events = pd.DataFrame({
+                    'Evento': df_eventos_ga['eventName'],
+                    'Disparos': df_eventos_ga['eventCount'].astype(int),
+                })
 
                 todos_eventos = sorted(df_events['Evento'].tolist())
 
@@ -748,17 +703,15 @@ def run_page():
         # SEÇÃO: KPIs GERAIS DE ENGAJAMENTO ---
     st.header("Visão Geral do Período")
     
-    kpi_response = run_ga_report(client, PROPERTY_ID, [], 
-        [Metric(name="activeUsers"), Metric(name="newUsers"), Metric(name="screenPageViews"), Metric(name="eventCount"), Metric(name="userEngagementDuration")],
-        start_date, end_date, limit=1)
-
-    if kpi_response and kpi_response.rows:
-        row = kpi_response.rows[0]
-        usuarios_ativos = int(row.metric_values[0].value)
-        novos_usuarios = int(row.metric_values[1].value)
-        visualizacoes = int(row.metric_values[2].value)
-        eventos = int(row.metric_values[3].value)
-        duracao_total_engajamento = float(row.metric_values[4].value)
+    df_kpis = relatorios_ga['kpis']
+
+    if not df_kpis.empty:
+        row = df_kpis.iloc[0]
+        usuarios_ativos = int(row['activeUsers'])
+        novos_usuarios = int(row['newUsers'])
+        visualizacoes = int(row['screenPageViews'])
+        eventos = int(row['eventCount'])
+        duracao_total_engajamento = float(row['userEngagementDuration'])
 
         # Calcula o tempo médio de engajamento por usuário
         tempo_medio_engajamento = (duracao_total_engajamento / usuarios_ativos) if usuarios_ativos > 0 else 0
@@ -779,23 +732,16 @@ def run_page():
     # SEÇÃO: TABELA DE AQUISIÇÃO DE TRÁFEGO ---
     st.header("📈 Aquisição de Tráfego por Canal")
 
-    acq_response = run_ga_report(client, PROPERTY_ID, 
-        [Dimension(name="sessionDefaultChannelGroup")], 
-        [Metric(name="sessions"), Metric(name="activeUsers"), Metric(name="conversions"), Metric(name="purchaseRevenue")], 
-        start_date, end_date)
+    df_aquisicao = relatorios_ga['aquisicao']
  
-    if acq_response and acq_response.rows:
-        rows = []
-        for r in acq_response.rows:
-            rows.append({
-                'Canal': r.dimension_values[0].value,
-                'Sessões': int(r.metric_values[0].value),
-                'Usuários': int(r.metric_values[1].value),
-                'Conversões': int(r.metric_values[2].value),
-                'Receita (R$)': float(r.metric_values[3].value)
-            })
-        
-        df_acquisition = pd.DataFrame(rows).sort_values("Sessões", ascending=False)
+    if not df_aquisicao.empty:
+        df_acquisition = pd.DataFrame({
+            'Canal': df_aquisicao['sessionDefaultChannelGroup'],
+            'Sessões': df_aquisicao['sessions'].astype(int),
+            'Usuários': df_aquisicao['activeUsers'].astype(int),
+            'Conversões': df_aquisicao['conversions'].astype(int),
+            'Receita (R$)': df_aquisicao['purchaseRevenue'].astype(float),
+        }).sort_values("Sessões", ascending=False)
         
         st.dataframe(df_acquisition, use_container_width=True, hide_index=True,
             column_config={
@@ -810,12 +756,10 @@ def run_page():
 
     # --- Gráfico 1: Gênero (Rosca) ---
     with col1:
-        gender_response = run_ga_report(client, PROPERTY_ID,
-            [Dimension(name="userGender")], [Metric(name="activeUsers")],
-            start_date, end_date)
-        
-        if gender_response and gender_response.rows:
-            df_gender = pd.DataFrame([{'Gênero': r.dimension_values[0].value, 'Usuários': int(r.metric_values[0].value)} for r in gender_response.rows])
+        df_genero = relatorios_ga['genero']
+
+        if not df_genero.empty:
+            df_gender = pd.DataFrame({'Gênero': df_genero['userGender'], 'Usuários': df_genero['activeUsers'].astype(int)})
 
             df_gender = df_gender[df_gender['Gênero'] != 'unknown']    
 
@@ -824,12 +768,10 @@ def run_page():
 
     # --- Gráfico 2: Idade (Barras) ---
     with col2:
-        age_response = run_ga_report(client, PROPERTY_ID,
-            [Dimension(name="userAgeBracket")], [Metric(name="activeUsers")],
-            start_date, end_date)
-            
-        if age_response and age_response.rows:
-            df_age = pd.DataFrame([{'Faixa Etária': r.dimension_values[0].value, 'Usuários': int(r.metric_values[0].value)} for r in age_response.rows])
+        df_idade = relatorios_ga['idade']
+
+        if not df_idade.empty:
+            df_age = pd.DataFrame({'Faixa Etária': df_idade['userAgeBracket'], 'Usuários': df_idade['activeUsers'].astype(int)})
 
             # Remove a faixa etária desconhecida, se existir
             df_age = df_age[df_age['Faixa Etária'] != 'unknown']
@@ -849,12 +791,10 @@ def run_page():
 
     # --- Gráfico 3: Cidade (Barras) ---
     with col3:
-        city_response = run_ga_report(client, PROPERTY_ID,
-            [Dimension(name="city")], [Metric(name="activeUsers")],
-            start_date, end_date, limit=10, order_bys=[{'metric': {'metric_name': 'activeUsers'}, 'desc': True}])
-            
-        if city_response and city_response.rows:
-            df_city = pd.DataFrame([{'Cidade': r.dimension_values[0].value, 'Usuários': int(r.metric_values[0].value)} for r in city_response.rows])
+        df_cidade = relatorios_ga['cidade']
+
+        if not df_cidade.empty:
+            df_city = pd.DataFrame({'Cidade': df_cidade['city'], 'Usuários': df_cidade['activeUsers'].astype(int)})
             fig_city = px.bar(
                 df_city.sort_values("Usuários", ascending=True), 
                 y='Cidade', 
@@ -871,30 +811,18 @@ def run_page():
     st.divider()
     st.header("📄 Engajamento por Página")
 
-    # Pede as métricas necessárias para o cálculo
-    page_response = run_ga_report(client, PROPERTY_ID,
-        [Dimension(name="pageTitle")],
-        [Metric(name="screenPageViews"), Metric(name="userEngagementDuration"), Metric(name="activeUsers")],
-        start_date, end_date, limit=20, # Top 20 páginas
-        order_bys=[{'metric': {'metric_name': 'screenPageViews'}, 'desc': True}])
-
-    if page_response and page_response.rows:
-        page_rows = []
-        for r in page_response.rows:
-            views = int(r.metric_values[0].value)
-            total_engagement = float(r.metric_values[1].value)
-            users = int(r.metric_values[2].value)
-            # Calcula o tempo médio e formata
-            avg_time = (total_engagement / users) if users > 0 else 0
-            minutos, segundos = divmod(int(avg_time), 60)
-            
-            page_rows.append({
-                'Título da Página': r.dimension_values[0].value,
-                'Visualizações': views,
-                'Tempo Médio de Engajamento': f"{minutos:02d}:{segundos:02d}"
-            })
-            
-        df_pages = pd.DataFrame(page_rows)
+    # Top 20 páginas por visualizações
+    df_paginas = relatorios_ga['paginas']
+
+    if not df_paginas.empty:
+        usuarios = df_paginas['activeUsers'].astype(float)
+        # Calcula o tempo médio (segundos) e formata mm:ss
+        tempo_medio = (df_paginas['userEngagementDuration'].astype(float) / usuarios).where(usuarios > 0, 0).astype(int)
+        df_pages = pd.DataFrame({
+            'Título da Página': df_paginas['pageTitle'],
+            'Visualizações': df_paginas['screenPageViews'].astype(int),
+            'Tempo Médio de Engajamento': (tempo_medio // 60).map('{:02d}'.format) + ':' + (tempo_medio % 60).map('{:02d}'.format),
+        })
         st.dataframe(df_pages, use_container_width=True, hide_index=True)
 
     st.divider()
@@ -904,23 +832,19 @@ def run_page():
         
     # --- Gráfico 1: Categoria de Dispositivo (Rosca) ---
     with col1:
-        device_response = run_ga_report(client, PROPERTY_ID,
-            [Dimension(name="deviceCategory")], [Metric(name="activeUsers")],
-            start_date, end_date)
-        
-        if device_response and device_response.rows:
-            df_device = pd.DataFrame([{'Dispositivo': r.dimension_values[0].value, 'Usuários': int(r.metric_values[0].value)} for r in device_response.rows])
+        df_dispositivo = relatorios_ga['dispositivo']
+
+        if not df_dispositivo.empty:
+            df_device = pd.DataFrame({'Dispositivo': df_dispositivo['deviceCategory'], 'Usuários': df_dispositivo['activeUsers'].astype(int)})
             fig_device = px.pie(df_device, names='Dispositivo', values='Usuários', title='Acessos por Dispositivo', hole=0.4)
             st.plotly_chart(fig_device, use_container_width=True)
 
     # --- Gráfico 2: Sistema Operacional (Barras) ---
     with col2:
-        os_response = run_ga_report(client, PROPERTY_ID,
-            [Dimension(name="operatingSystem")], [Metric(name="activeUsers")],
-            start_date, end_date, limit=10, order_bys=[{'metric': {'metric_name': 'activeUsers'}, 'desc': True}])
-            
-        if os_response and os_response.rows:
-            df_os = pd.DataFrame([{'Sistema': r.dimension_values[0].value, 'Usuários': int(r.metric_values[0].value)} for r in os_response.rows])
+        df_sistema = relatorios_ga['sistema']
+
+        if not df_sistema.empty:
+            df_os = pd.DataFrame({'Sistema': df_sistema['operatingSystem'], 'Usuários': df_sistema['activeUsers'].astype(int)})
             fig_os = px.bar(
                 df_os.sort_values("Usuários", ascending=True), 
                 y='Sistema', 
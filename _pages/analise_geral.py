@@ -35,6 +35,7 @@ from _pages.relatorios_ia import (
     init_google_ads_client_central,
     salvar_relatorio,
 )
+from utils import llm_router, prompt_tabelas
 from utils.analise_helpers import _safe_pct, _top_items
 from utils.cats_vendedor import _CATS_VENDEDOR, _CATS_LEGACY
 
@@ -198,29 +199,9 @@ def _infer_sale_modality(row: pd.Series) -> str:
     return 'Outros'
 
 
-def _markdown_value(value):
-    if value is None or (isinstance(value, float) and pd.isna(value)):
-        return '—'
-    text = str(value)
-    return text.replace('|', '/').replace('\n', ' ').strip() or '—'
-
-
 def format_table_for_prompt(df: pd.DataFrame, title: str, max_rows=50) -> str:
-    if df is None or df.empty:
-        return f"### {title}\nSem dados disponíveis no período.\n"
-
-    work_df = df.head(max_rows).copy()
-    headers = list(work_df.columns)
-    lines = [f"### {title}"]
-    lines.append('| ' + ' | '.join(headers) + ' |')
-    lines.append('| ' + ' | '.join(['---'] * len(headers)) + ' |')
-
-    for _, row in work_df.iterrows():
-        lines.append('| ' + ' | '.join(_markdown_value(row[col]) for col in headers) + ' |')
-
-    if len(df) > max_rows:
-        lines.append(f"*top {max_rows} de {len(df)} linhas*")
-    return '\n'.join(lines) + '\n'
+    # Top max_rows na ordem recebida, cortado de novo pelo orçamento de tokens da tabela
+    return prompt_tabelas.tabela(df, title, max_linhas=max_rows, modelo=MODELOS_ANTHROPIC[0])
 
 
 def _text_block(title: str, lines: list[str]) -> str:
@@ -1441,45 +1422,62 @@ def _build_context(empresa: str, df_op: pd.DataFrame, df_v: pd.DataFrame, df_c:
     }
 
 
-def _call_claude(system_prompt: str, user_prompt: str, max_tokens=8000, temperature=0.3):
+def _clientes_llm():
     client, error = _get_anthropic_client()
-    if error:
-        return None, {'error': error}
-    if client is None:
-        return None, {'error': 'Cliente Anthropic indisponível.'}
+    return ({'anthropic': client} if client is not None and not error else {}), error
 
-    import anthropic as _anthropic
 
-    last_error = None
-    for model_name in MODELOS_ANTHROPIC:
-        for _ in range(2):
-            try:
-                response = client.messages.create(
-                    model=model_name,
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                    system=system_prompt,
-                    messages=[{'role': 'user', 'content': user_prompt}],
-                )
-                text_chunks = []
-                for block in getattr(response, 'content', []):
-                    block_text = getattr(block, 'text', None)
-                    if block_text:
-                        text_chunks.append(block_text)
-                usage = getattr(response, 'usage', None)
-                return ''.join(text_chunks), {
-                    'model': model_name,
-                    'input_tokens': getattr(usage, 'input_tokens', None),
-                    'output_tokens': getattr(usage, 'output_tokens', None),
-                    'custo_estimado_usd': None,
-                }
-            except _anthropic.APIStatusError as exc:
-                last_error = f'Erro na API Claude ({model_name}): {exc.status_code} - {exc.message}'
-                continue
-            except Exception as exc:
-                last_error = f'Erro ao chamar Claude ({model_name}): {exc}'
-                continue
-    return None, {'error': last_error or 'Falha desconhecida ao chamar Claude.'}
+def _meta_llm(resposta: dict) -> dict:
+    return {
+        'model': resposta['modelo'],
+        'provedor': resposta['provedor'],
+        'input_tokens': resposta['input_tokens'],
+        'output_tokens': resposta['output_tokens'],
+        'custo_estimado_usd': None,
+    }
+
+
+def _transmitir_claude(system_prompt: str, user_prompt: str, estado: dict, max_tokens=8000, temperature=0.3,
+                       tarefa='analise_geral'):
+    """Chama o LLM pela rota da tarefa (utils.llm_router) em streaming: gera os trechos
+    do texto (para st.write_stream). Claude nos MODELOS_ANTHROPIC por padrão;
+    LLM_ROTA_ANALISE_GERAL pode acrescentar OpenAI/Groq como fallback, que só vale antes
+    do primeiro trecho.
+
+    `estado` acumula o texto parcial em 'texto'; no fim recebe 'meta' (model, provedor,
+    input_tokens, output_tokens) ou 'error'.
+    """
+    clientes, error = _clientes_llm()
+    estado.update(texto='', meta=None, error=None)
+    resultado = {}
+    try:
+        for trecho in llm_router.transmitir(
+            tarefa,
+            [{'role': 'user', 'content': user_prompt}],
+            system=system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            rota_padrao=[f'anthropic:{m}' for m in MODELOS_ANTHROPIC],
+            clientes=clientes,
+            resultado=resultado,
+        ):
+            estado['texto'] += trecho
+            yield trecho
+    except llm_router.LLMIndisponivel as exc:
+        estado['error'] = f'{error}\n\n{exc}' if error else f'Erro ao chamar o LLM: {exc}'
+        return
+    except Exception as exc:
+        estado['error'] = f'Resposta do LLM interrompida no meio do streaming: {exc}'
+        return
+    estado['meta'] = _meta_llm(resultado)
+
+
+def _exibir_streaming(gerador) -> None:
+    """Mostra o texto enquanto chega; o espaço é limpo no fim para a renderização definitiva."""
+    area = st.empty()
+    with area.container():
+        st.write_stream(gerador)
+    area.empty()
 
 
 def _render_company_summary(context: dict):
@@ -1654,11 +1652,15 @@ def run_page():
         resultados = st.session_state.setdefault('analise_geral_resultados', {})
         resultado_key = f"{empresa_ia}_{data_ref}"
 
+        # texto parcial de cada geração em streaming (sobrevive a um rerun no meio da resposta)
+        parciais = st.session_state.setdefault('analise_geral_streaming', {})
+
         if st.button('Gerar relatório com IA', type='primary', use_container_width=True, key='analise_geral_btn_gerar'):
-            with st.spinner('Gerando análise estratégica com Claude...'):
-                report, meta = _call_claude(SYSTEM_PROMPT, payload)
-            if meta.get('error'):
-                st.error(meta['error'])
+            estado = parciais[resultado_key] = {}
+            _exibir_streaming(_transmitir_claude(SYSTEM_PROMPT, payload, estado))
+            report, meta = estado['texto'], estado['meta']
+            if estado['error']:
+                st.error(estado['error'])
             else:
                 dados_brutos = json.dumps({
                     'empresa': empresa_ia,
@@ -1675,6 +1677,13 @@ def run_page():
                 resultados[resultado_key] = {'report': report, 'meta': meta, 'payload': payload}
                 st.session_state['analise_geral_resultados'] = resultados
 
+        parcial = parciais.get(resultado_key)
+        if parcial and parcial.get('texto') and not parcial.get('meta') and not parcial.get('error'):
+            st.warning('A geração anterior foi interrompida antes do fim e não foi salva. '
+                       'Clique em "Gerar relatório com IA" para gerar de novo.')
+            with st.expander('Texto parcial da geração interrompida'):
+                st.markdown(parcial['texto'])
+
         resultado = resultados.get(resultado_key)
         if resultado:
             meta = resultado.get('meta', {})
@@ -1699,18 +1708,20 @@ def run_page():
                     payload=resultado['payload'],
                     report=resultado['report'],
                 )
-                with st.spinner('Validando cobertura do payload...'):
-                    validation_report, validation_meta = _call_claude(
-                        'Você é um auditor técnico de qualidade analítica. Seja direto e específico.',
-                        validation_prompt,
-                        max_tokens=3000,
-                        temperature=0.1,
-                    )
-                if validation_meta.get('error'):
-                    st.error(validation_meta['error'])
+                st.markdown('### Auditoria de uso dos dados')
+                validacao = {}
+                _exibir_streaming(_transmitir_claude(
+                    'Você é um auditor técnico de qualidade analítica. Seja direto e específico.',
+                    validation_prompt,
+                    validacao,
+                    max_tokens=3000,
+                    temperature=0.1,
+                    tarefa='analise_geral_validacao',
+                ))
+                if validacao['error']:
+                    st.error(validacao['error'])
                 else:
-                    st.markdown('### Auditoria de uso dos dados')
-                    st.markdown(validation_report)
+                    st.markdown(validacao['texto'])
         else:
             st.info('Gere o relatório da empresa selecionada para visualizar o resultado e rodar a auditoria de uso do payload.')
 
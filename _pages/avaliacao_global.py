@@ -13,12 +13,14 @@ import plotly.express as px
 import streamlit as st
 from dotenv import load_dotenv
 
+from utils import prompt_tabelas
+from utils.analise_helpers import _sem_nulos
 from utils.sql_loader import carregar_dados
 
 load_dotenv()
 
 # ══════════════════════════════════════════════════════════════════════════════
-# CARREGAMENTO — reutiliza os mesmos SQLs dos dashboards individuais
+# CARREGAMENTO — só notas, rótulos e resumos (sem transcrição nem JSON completo)
 # ══════════════════════════════════════════════════════════════════════════════
 
 def _parse_json(v):
@@ -47,8 +49,8 @@ def _join_list(lst, field='ponto'):
 
 @st.cache_data(ttl=3600, show_spinner=False)
 def _carregar_whatsapp() -> pd.DataFrame:
-    # Mesmo SQL do analise_chats.py — sem filtros restritivos no banco
-    df = carregar_dados("consultas/analise_chats/analise_chats.sql")
+    # Mesmo SQL enxuto do analise_chats.py — sem filtros restritivos no banco
+    df = carregar_dados("consultas/analise_chats/analise_chats_resumo.sql")
     if df is None or df.empty:
         return pd.DataFrame()
 
@@ -66,8 +68,8 @@ def _carregar_whatsapp() -> pd.DataFrame:
     df['data_avaliacao'] = col.dt.tz_convert(None)
     df['canal'] = 'WhatsApp'
 
-    # Parse JSON de avaliação (mesmo padrão do analise_chats.py)
-    parsed = df['ai_evaluation'].apply(_parse_json)
+    # Parse do resumo da avaliação (mesmo padrão do analise_chats.py)
+    parsed = df['avaliacao_resumo'].apply(lambda v: _sem_nulos(_parse_json(v)))
 
     df['strengths'] = parsed.apply(
         lambda j: _join_list(j.get('avaliacao_vendedor', {}).get('pontos_fortes', []), 'ponto')
@@ -117,8 +119,8 @@ def _carregar_whatsapp() -> pd.DataFrame:
 
 @st.cache_data(ttl=3600, show_spinner=False)
 def _carregar_telefone() -> pd.DataFrame:
-    # Mesmo SQL do analise_transcricoes.py — sem filtros restritivos no banco
-    df = carregar_dados("consultas/transcricoes/transcricoes.sql")
+    # Só as colunas do painel, já filtradas por nota > 0 (sem ai_insight/transcrição)
+    df = carregar_dados("consultas/avaliacao_global/avaliacao_global_telefone.sql")
     if df is None or df.empty:
         return pd.DataFrame()
 
@@ -131,18 +133,14 @@ def _carregar_telefone() -> pd.DataFrame:
         return pd.DataFrame()
 
     # Data unificada tz-naive
-    col = pd.to_datetime(df['data_ligacao'], errors='coerce', utc=True)
+    col = pd.to_datetime(df['data_avaliacao'], errors='coerce', utc=True)
     df['data_avaliacao'] = col.dt.tz_convert(None)
     df['canal'] = 'Telefone'
 
     df['lead_classification'] = df.get('lead_classification', pd.Series(dtype=str)).fillna('—')
     df.loc[~df['lead_classification'].isin(['A', 'B', 'C', 'D']), 'lead_classification'] = '—'
 
-    # transcricoes.sql usa 'concurso_area', unificamos para 'contest_area'
-    if 'concurso_area' in df.columns:
-        df['contest_area'] = df['concurso_area'].fillna('')
-    else:
-        df['contest_area'] = ''
+    df['contest_area'] = df.get('contest_area', pd.Series('', index=df.index)).fillna('')
 
     for col_name in ('vendedor_disclaimer', 'lead_disclaimer', 'strengths', 'improvements', 'most_expensive_mistake'):
         if col_name not in df.columns:
@@ -209,6 +207,8 @@ def _agregar_time(df: pd.DataFrame) -> dict:
 # DIAGNÓSTICO EXECUTIVO VIA CLAUDE
 # ══════════════════════════════════════════════════════════════════════════════
 
+_MODELO_DIAGNOSTICO = "claude-opus-4-6"
+
 _PROMPT_DIAGNOSTICO = """Você é um diretor comercial analisando a performance do time de vendas de um curso preparatório para concursos (+30 anos, +100 mil aprovações).
 
 METODOLOGIA DE AVALIAÇÃO:
@@ -321,6 +321,24 @@ REGRAS:
 - Retorne APENAS JSON válido."""
 
 
+def _ranking_para_prompt(ranking: pd.DataFrame) -> str:
+    """Ranking numerado por nota. Acima de PROMPT_TOKENS_TABELA ficam os vendedores
+    com mais avaliações (na posição do ranking) e uma nota com os omitidos."""
+    linhas = (
+        "  " + pd.Series(range(1, len(ranking) + 1), index=ranking.index).astype(str)
+        + ". " + ranking['agente'].astype(str)
+        + ": " + ranking['nota_media'].map('{:.1f}'.format)
+        + " (" + ranking['volume'].astype(int).astype(str) + " avaliações)"
+    )
+    manter = prompt_tabelas.linhas_no_orcamento(linhas, prompt_tabelas.TOKENS_TABELA,
+                                                prioridade=ranking['volume'], modelo=_MODELO_DIAGNOSTICO)
+    texto = '\n'.join(linhas[manter])
+    if not manter.all():
+        texto += (f"\n  ... {int((~manter).sum())} vendedor(es) com menos avaliações omitido(s) "
+                  f"({int(ranking.loc[~manter, 'volume'].sum())} avaliações)")
+    return texto
+
+
 def _gerar_diagnostico(df_filtrado: pd.DataFrame, empresa: str, periodo_str: str, canais_str: str) -> dict:
     api_key = os.getenv("ANTHROPIC_API_KEY")
     if not api_key:
@@ -341,10 +359,7 @@ def _gerar_diagnostico(df_filtrado: pd.DataFrame, empresa: str, periodo_str: str
         nota_media=('evaluation_ia', 'mean'),
         volume=('evaluation_ia', 'count')
     ).sort_values('nota_media', ascending=False).reset_index()
-    ranking_str = '\n'.join(
-        f"  {i+1}. {r['agente']}: {r['nota_media']:.1f} ({int(r['volume'])} avaliações)"
-        for i, r in ranking.iterrows()
-    )
+    ranking_str = prompt_tabelas.memorizar(("ranking_vendedores",), ranking, lambda: _ranking_para_prompt(ranking))
 
     dados_geral = _agregar_time(df_filtrado)
 
@@ -370,7 +385,7 @@ def _gerar_diagnostico(df_filtrado: pd.DataFrame, empresa: str, periodo_str: str
         disclaimers='\n'.join(f"  - {d}" for d in disclaimers) or 'Nenhum disponível',
     )
 
-    model = "claude-opus-4-6"
+    model = _MODELO_DIAGNOSTICO
     max_tokens = int(os.getenv("CLAUDE_MAX_TOKENS", "8000"))
 
     client = anthropic.Anthropic(api_key=api_key)
@@ -8,10 +8,11 @@ from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
 from facebook_business.api import FacebookAdsApi
 from facebook_business.adobjects.adaccount import AdAccount
-from facebook_business.adobjects.adsinsights import AdsInsights
 from dotenv import load_dotenv
 import yaml
 
+from collectors import google_ads_collector, meta_ads_collector
+
 load_dotenv()
 load_dotenv('.facebook_credentials.env', override=True)
 
@@ -55,52 +56,24 @@ def get_google_ads_campaign_data(client, customer_id, start_date, end_date):
     Busca métricas de campanhas do Google Ads incluindo CTR, CPC, CPA e conversões.
     """
     try:
-        ga_service = client.get_service("GoogleAdsService")
-        
-        query = f"""
-            SELECT
-                campaign.name,
-                campaign.id,
-                metrics.cost_micros,
-                metrics.impressions,
-                metrics.clicks,
-                metrics.ctr,
-                metrics.average_cpc,
-                metrics.conversions,
-                metrics.cost_per_conversion
-            FROM campaign
-            WHERE segments.date BETWEEN '{start_date.strftime('%Y-%m-%d')}' 
-                AND '{end_date.strftime('%Y-%m-%d')}'
-                AND campaign.status = 'ENABLED'
-            ORDER BY metrics.cost_micros DESC
-        """
-        
-        response = ga_service.search(customer_id=customer_id, query=query)
-        
-        rows = []
-        for row in response:
-            campaign = row.campaign
-            metrics = row.metrics
-            
-            # Converte micros para valor real (Google Ads usa micros = valor * 1.000.000)
-            custo = metrics.cost_micros / 1_000_000
-            cpc = metrics.average_cpc / 1_000_000 if metrics.average_cpc else 0
-            cpa = metrics.cost_per_conversion / 1_000_000 if metrics.cost_per_conversion else 0
-            
-            rows.append({
-                'Campanha': campaign.name,
-                'ID': campaign.id,
-                'Custo': custo,
-                'Impressões': metrics.impressions,
-                'Cliques': metrics.clicks,
-                'CTR (%)': metrics.ctr * 100,  # Converte para percentual
-                'CPC': cpc,
-                'Conversões': metrics.conversions,
-                'CPA': cpa
-            })
-        
-        df = pd.DataFrame(rows)
-        
+        # Fatos diários do armazém local: só dias novos ou recentes vão à API
+        df = google_ads_collector.carregar_campanhas(client, customer_id, start_date, end_date)
+        if df.empty:
+            return pd.DataFrame()
+        df = df[df['status'] == 'ENABLED']
+
+        df = pd.DataFrame({
+            'Campanha': df['campanha'],
+            'ID': df['campanha_id'],
+            'Custo': df['custo'],
+            'Impressões': df['impressoes'],
+            'Cliques': df['cliques'],
+            'CTR (%)': df['ctr_pct'],
+            'CPC': df['cpc'],
+            'Conversões': df['conversoes'],
+            'CPA': df['cpa'],
+        }).reset_index(drop=True)
+
         if not df.empty:
             # Extrai o curso/produto do nome da campanha (conteúdo entre {})
             df['Curso Venda'] = df['Campanha'].str.extract(r'\{(.*?)\}')[0]
@@ -117,15 +90,6 @@ def get_google_ads_campaign_data(client, customer_id, start_date, end_date):
         st.error(f"Erro inesperado ao buscar dados do Google Ads: {e}")
         return pd.DataFrame()
 
-# action_types que contam como conversão
-CONVERSION_ACTIONS = {
-    'purchase', 'lead', 'omni_purchase',
-    'offsite_conversion.fb_pixel_purchase',
-    'offsite_conversion.fb_pixel_lead',
-    'submit_application_total',
-    'onsite_conversion.lead_grouped',
-}
-
 # Função para inicializar a API do Facebook
 def init_facebook_api(empresa="Degrau"):
     """
@@ -162,60 +126,21 @@ def get_facebook_campaign_insights(account, start_date, end_date):
     incluindo CTR, CPC, CPA e conversões (com submit_application_total).
     """
     try:
-        fields = [
-            AdsInsights.Field.campaign_name,
-            AdsInsights.Field.spend,
-            AdsInsights.Field.impressions,
-            AdsInsights.Field.clicks,
-            AdsInsights.Field.ctr,
-            AdsInsights.Field.cpc,
-            AdsInsights.Field.actions,
-            AdsInsights.Field.cost_per_action_type,
-            AdsInsights.Field.conversions,
-        ]
-        params = {
-            'level': 'campaign',
-            'time_range': {
-                'since': start_date.strftime('%Y-%m-%d'),
-                'until': end_date.strftime('%Y-%m-%d'),
-            },
-        }
-
-        insights = account.get_insights(fields=fields, params=params)
-        rows = []
-        for insight in insights:
-            conversoes = 0
-
-            # 1) Tenta campo 'conversions' (submit_application_total)
-            if 'conversions' in insight:
-                for conv in insight['conversions']:
-                    if conv['action_type'] == 'submit_application_total':
-                        conversoes += int(conv.get('value', 0))
-
-            # 2) Fallback: busca em 'actions'
-            if conversoes == 0 and AdsInsights.Field.actions in insight:
-                for action in insight[AdsInsights.Field.actions]:
-                    if action['action_type'] in CONVERSION_ACTIONS:
-                        conversoes += int(action.get('value', 0))
-
-            custo = float(insight[AdsInsights.Field.spend])
-            cpa = custo / conversoes if conversoes > 0 else 0
-
-            ctr_value = float(insight.get(AdsInsights.Field.ctr, 0))
-            cpc_value = float(insight.get(AdsInsights.Field.cpc, 0))
-
-            rows.append({
-                'Campanha': insight[AdsInsights.Field.campaign_name],
-                'Custo': custo,
-                'Impressões': int(insight.get(AdsInsights.Field.impressions, 0)),
-                'Cliques': int(insight.get(AdsInsights.Field.clicks, 0)),
-                'CTR (%)': ctr_value,
-                'CPC': cpc_value,
-                'Conversões': conversoes,
-                'CPA': cpa,
-            })
-
-        df = pd.DataFrame(rows)
+        # Fatos diários do armazém local: só dias novos ou recentes vão à API
+        df = meta_ads_collector.carregar_campanhas(account, start_date, end_date)
+        if df.empty:
+            return pd.DataFrame()
+
+        df = pd.DataFrame({
+            'Campanha': df['campanha'],
+            'Custo': df['custo'],
+            'Impressões': df['impressoes'],
+            'Cliques': df['cliques'],
+            'CTR (%)': df['ctr_pct'],
+            'CPC': df['cpc'],
+            'Conversões': df['conversoes'],
+            'CPA': df['cpa'],
+        })
         if not df.empty:
             df['Curso Venda'] = df['Campanha'].str.extract(r'\{(.*?)\}')[0]
             df['Curso Venda'] = df['Curso Venda'].fillna('Não Especificado')
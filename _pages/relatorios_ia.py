@@ -4,7 +4,9 @@ import json
 import os
 import re
 from datetime import datetime, timedelta
+from functools import partial
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
@@ -12,12 +14,15 @@ import streamlit as st
 import yaml
 from dotenv import load_dotenv
 from facebook_business.adobjects.adaccount import AdAccount
-from facebook_business.adobjects.adsinsights import AdsInsights
 from facebook_business.api import FacebookAdsApi
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
 from sqlalchemy import text as sql_text
 
+from collectors import google_ads_collector, meta_ads_collector
+from collectors.coleta_paralela import coletar_em_paralelo
+from utils import llm_limiter, prompt_tabelas
+
 _PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 load_dotenv(os.path.join(_PROJECT_ROOT, '.env'))
 load_dotenv(os.path.join(_PROJECT_ROOT, '.facebook_credentials.env'), override=True)
@@ -756,38 +761,6 @@ OBJETIVO_MAP_GOOGLE = {
     "VIDEO": "VIDEO",
 }
 
-# ---- Lookup dicts para resolver enums numéricos da API ----
-_CHANNEL_TYPE_MAP = {
-    2: "SEARCH", 3: "DISPLAY", 4: "SHOPPING", 5: "HOTEL",
-    6: "VIDEO", 7: "MULTI_CHANNEL", 9: "DISCOVERY",
-}
-_STATUS_MAP = {
-    2: "ENABLED", 3: "PAUSED", 4: "REMOVED",
-}
-_BIDDING_MAP = {
-    2: "ENHANCED_CPC", 5: "MANUAL_CPC", 6: "MANUAL_CPM", 7: "MANUAL_CPV",
-    8: "MAXIMIZE_CONVERSIONS", 9: "MAXIMIZE_CONVERSION_VALUE",
-    12: "TARGET_CPA", 13: "TARGET_CPM", 14: "TARGET_IMPRESSION_SHARE",
-    16: "TARGET_ROAS", 17: "TARGET_SPEND",
-}
-_SUB_TYPE_MAP = {
-    10: "VIDEO_OUTSTREAM", 11: "VIDEO_ACTION", 12: "VIDEO_NON_SKIPPABLE",
-    18: "VIDEO_SEQUENCE", 20: "VIDEO_REACH_TARGET_FREQUENCY",
-}
-
-def _resolve_enum(val, lookup=None):
-    """Resolve enum da Google Ads API para string. 
-    Funciona com proto-plus (que retorna int ou enum com .name) e com enums numéricos."""
-    if hasattr(val, 'name'):
-        return val.name
-    name = str(val).split(".")[-1]
-    if lookup:
-        try:
-            return lookup.get(int(name), name)
-        except (ValueError, TypeError):
-            pass
-    return name
-
 def classificar_por_nome(nome_campanha):
     """Fallback: classifica objetivo pela convenção de nomenclatura."""
     nome = nome_campanha.upper()
@@ -850,166 +823,72 @@ def init_google_ads_client_central():
 def get_google_ads_data(client, customer_id, start_date, end_date):
     """Busca dados do Google Ads incluindo métricas completas para análise."""
     try:
-        ga_service = client.get_service("GoogleAdsService")
-        query = f"""
-            SELECT
-                campaign.name,
-                campaign.id,
-                campaign.status,
-                campaign.advertising_channel_type,
-                campaign.advertising_channel_sub_type,
-                campaign.bidding_strategy_type,
-                campaign.target_cpa.target_cpa_micros,
-                campaign.maximize_conversions.target_cpa_micros,
-                metrics.cost_micros,
-                metrics.impressions,
-                metrics.clicks,
-                metrics.ctr,
-                metrics.average_cpc,
-                metrics.average_cpm,
-                metrics.conversions,
-                metrics.cost_per_conversion,
-                metrics.conversions_from_interactions_rate,
-                metrics.search_budget_lost_impression_share,
-                metrics.search_rank_lost_impression_share,
-                metrics.search_impression_share,
-                metrics.engagements,
-                metrics.engagement_rate,
-                metrics.interaction_rate,
-                metrics.unique_users,
-                metrics.average_impression_frequency_per_user,
-                metrics.video_quartile_p25_rate,
-                metrics.video_quartile_p50_rate,
-                metrics.video_quartile_p75_rate,
-                metrics.video_quartile_p100_rate
-            FROM campaign
-            WHERE segments.date BETWEEN '{start_date}' AND '{end_date}'
-                AND metrics.cost_micros > 0
-            ORDER BY metrics.cost_micros DESC
-        """
-        response = ga_service.search(customer_id=customer_id, query=query)
-        rows = []
-        for row in response:
-            custo = row.metrics.cost_micros / 1_000_000
-            cpc = row.metrics.average_cpc / 1_000_000 if row.metrics.average_cpc else 0
-            cpm = row.metrics.average_cpm / 1_000_000 if row.metrics.average_cpm else 0
-            cpa = row.metrics.cost_per_conversion / 1_000_000 if row.metrics.cost_per_conversion else 0
-
-            # tCPA: verifica TARGET_CPA e MAXIMIZE_CONVERSIONS (com CPA-alvo)
-            tcpa_target = row.campaign.target_cpa.target_cpa_micros / 1_000_000 if row.campaign.target_cpa.target_cpa_micros else 0
-            tcpa_maxconv = row.campaign.maximize_conversions.target_cpa_micros / 1_000_000 if row.campaign.maximize_conversions.target_cpa_micros else 0
-            tcpa = tcpa_target or tcpa_maxconv
-
-            # Parcelas de impressão (None quando não aplicável, ex: PMax/YouTube)
-            imp_lost_budget = row.metrics.search_budget_lost_impression_share
-            imp_lost_rank = row.metrics.search_rank_lost_impression_share
-
-            # Resolve enums para nomes legíveis (API pode retornar inteiros ou proto-plus enums)
-            channel_type = _resolve_enum(row.campaign.advertising_channel_type, _CHANNEL_TYPE_MAP)
-            status = _resolve_enum(row.campaign.status, _STATUS_MAP)
-            sub_type_raw = _resolve_enum(row.campaign.advertising_channel_sub_type, _SUB_TYPE_MAP)
-            bidding_type = _resolve_enum(row.campaign.bidding_strategy_type, _BIDDING_MAP)
-
-            objetivo_api = OBJETIVO_MAP_GOOGLE.get(channel_type)
-            objetivo = objetivo_api if objetivo_api else classificar_por_nome(row.campaign.name)
-
-            # Rec/Cons para YouTube — baseado em sub_type e estratégia de lance
-            _REC = {"VIDEO_NON_SKIPPABLE", "VIDEO_OUTSTREAM", "VIDEO_REACH_TARGET_FREQUENCY"}
-            _ACT = {"VIDEO_ACTION"}
-            if sub_type_raw in _REC or bidding_type in {"TARGET_CPM", "MANUAL_CPM"}:
-                rec_cons = "Reconhecimento"
-            elif sub_type_raw in _ACT or bidding_type == "MAXIMIZE_CONVERSIONS":
-                rec_cons = "Ação/Conversão"
-            elif channel_type == "VIDEO":
-                rec_cons = "Consideração"  # TrueView / VVC (sub_type UNSPECIFIED + MANUAL_CPV)
-            else:
-                rec_cons = "-"
-
-            # Métricas exclusivas de YouTube
-            unique_users = row.metrics.unique_users if row.metrics.unique_users else 0
-            avg_freq = row.metrics.average_impression_frequency_per_user if row.metrics.average_impression_frequency_per_user else 0
-            interaction_rate = round(row.metrics.interaction_rate * 100, 2) if row.metrics.interaction_rate else 0
-
-            q25 = round(row.metrics.video_quartile_p25_rate * 100, 1) if row.metrics.video_quartile_p25_rate else 0
-            q50 = round(row.metrics.video_quartile_p50_rate * 100, 1) if row.metrics.video_quartile_p50_rate else 0
-            q75 = round(row.metrics.video_quartile_p75_rate * 100, 1) if row.metrics.video_quartile_p75_rate else 0
-            q100 = round(row.metrics.video_quartile_p100_rate * 100, 1) if row.metrics.video_quartile_p100_rate else 0
-
-            rows.append({
-                'Campanha': row.campaign.name,
-                'Status': status,
-                'Objetivo': objetivo,
-                'Canal': channel_type,
-                'Subtipo': sub_type_raw,
-                'Rec/Cons': rec_cons,
-                'Tipo Lance': bidding_type,
-                'Custo': round(custo, 2),
-                'Impressões': row.metrics.impressions,
-                'Usuários Exclusivos': int(unique_users),
-                'Freq Méd Imp/Usuário': round(avg_freq, 2),
-                'Cliques': row.metrics.clicks,
-                'CTR (%)': round(row.metrics.ctr * 100, 2),
-                'CPC': round(cpc, 2),
-                'CPM': round(cpm, 2),
-                'Conversões': round(row.metrics.conversions, 1),
-                'CPA': round(cpa, 2),
-                'tCPA': round(tcpa, 2),
-                'Taxa Conv (%)': round(row.metrics.conversions_from_interactions_rate * 100, 2) if row.metrics.conversions_from_interactions_rate else 0,
-                'Imp Lost Budget (%)': round(imp_lost_budget * 100, 1) if imp_lost_budget else None,
-                'Imp Lost Rank (%)': round(imp_lost_rank * 100, 1) if imp_lost_rank else None,
-                '_campaign_id': row.campaign.id,
-                'Video Views': 0,
-                'Video View Rate (%)': 0,
-                'Taxa de Interação (%)': interaction_rate,
-                'CPV': 0,
-                'Engajamentos': row.metrics.engagements,
-                'Engagement Rate (%)': round(row.metrics.engagement_rate * 100, 2) if row.metrics.engagement_rate else 0,
-                '% Assistido 25': q25,
-                '% Assistido 50': q50,
-                '% Assistido 75': q75,
-                '% Assistido 100': q100,
-            })
-        df = pd.DataFrame(rows)
-
-        # Query separada para métricas de vídeo (incompatíveis com search impression share)
-        if not df.empty:
-            try:
-                video_query = f"""
-                    SELECT
-                        campaign.id,
-                        metrics.video_views,
-                        metrics.video_view_rate,
-                        metrics.average_cpv
-                    FROM campaign
-                    WHERE segments.date BETWEEN '{start_date}' AND '{end_date}'
-                        AND campaign.advertising_channel_type = 'VIDEO'
-                        AND metrics.cost_micros > 0
-                """
-                video_resp = ga_service.search(customer_id=customer_id, query=video_query)
-                video_map = {}
-                for vrow in video_resp:
-                    video_map[vrow.campaign.id] = {
-                        'Video Views': vrow.metrics.video_views,
-                        'Video View Rate (%)': round(vrow.metrics.video_view_rate * 100, 2) if vrow.metrics.video_view_rate else 0,
-                        'CPV': round(vrow.metrics.average_cpv / 1_000_000, 4) if vrow.metrics.average_cpv else 0,
-                    }
-                if video_map:
-                    for idx, r in df.iterrows():
-                        cid = r['_campaign_id']
-                        if cid in video_map:
-                            df.at[idx, 'Video Views'] = video_map[cid]['Video Views']
-                            df.at[idx, 'Video View Rate (%)'] = video_map[cid]['Video View Rate (%)']
-                            df.at[idx, 'CPV'] = video_map[cid]['CPV']
-            except Exception:
-                pass
-
-        if not df.empty:
-            df = df.drop(columns=['_campaign_id'])
-        return df
+        return _buscar_google_ads(client, customer_id, start_date, end_date)
     except Exception as e:
         st.error(f"Erro Google Ads: {e}")
         return pd.DataFrame()
 
+def _buscar_google_ads(client, customer_id, start_date, end_date):
+    """Versão sem tratamento de erro de get_google_ads_data (propaga exceções).
+    Usada na coleta paralela, onde o erro é reportado por fonte.
+    Os dados vêm do armazém diário (collectors.ads_warehouse): só dias novos
+    ou ainda mutáveis são consultados na API."""
+    df = google_ads_collector.carregar_campanhas(client, customer_id, start_date, end_date, com_alcance=True)
+    if df.empty:
+        return pd.DataFrame()
+    df = df[df['custo'] > 0].reset_index(drop=True)
+    if df.empty:
+        return pd.DataFrame()
+
+    objetivo = df['canal'].map(OBJETIVO_MAP_GOOGLE)
+    objetivo = objetivo.fillna(df['campanha'].map(classificar_por_nome))
+
+    # Rec/Cons para YouTube — baseado em sub_type e estratégia de lance
+    rec_cons = np.select(
+        [
+            df['subtipo'].isin(["VIDEO_NON_SKIPPABLE", "VIDEO_OUTSTREAM", "VIDEO_REACH_TARGET_FREQUENCY"])
+            | df['tipo_lance'].isin(["TARGET_CPM", "MANUAL_CPM"]),
+            (df['subtipo'] == "VIDEO_ACTION") | (df['tipo_lance'] == "MAXIMIZE_CONVERSIONS"),
+            df['canal'] == "VIDEO",  # TrueView / VVC (sub_type UNSPECIFIED + MANUAL_CPV)
+        ],
+        ["Reconhecimento", "Ação/Conversão", "Consideração"],
+        default="-",
+    )
+
+    return pd.DataFrame({
+        'Campanha': df['campanha'],
+        'Status': df['status'],
+        'Objetivo': objetivo,
+        'Canal': df['canal'],
+        'Subtipo': df['subtipo'],
+        'Rec/Cons': rec_cons,
+        'Tipo Lance': df['tipo_lance'],
+        'Custo': df['custo'].round(2),
+        'Impressões': df['impressoes'],
+        'Usuários Exclusivos': df['usuarios_unicos'].astype(int),
+        'Freq Méd Imp/Usuário': df['freq_media'].round(2),
+        'Cliques': df['cliques'],
+        'CTR (%)': df['ctr_pct'].round(2),
+        'CPC': df['cpc'].round(2),
+        'CPM': df['cpm'].round(2),
+        'Conversões': df['conversoes'].round(1),
+        'CPA': df['cpa'].round(2),
+        'tCPA': df['tcpa'].round(2),
+        'Taxa Conv (%)': df['taxa_conv_pct'].round(2),
+        'Imp Lost Budget (%)': df['is_perdida_orcamento_pct'].round(1),
+        'Imp Lost Rank (%)': df['is_perdida_rank_pct'].round(1),
+        'Video Views': df['video_views'],
+        'Video View Rate (%)': df['taxa_view_pct'].round(2),
+        'Taxa de Interação (%)': df['taxa_interacao_pct'].round(2),
+        'CPV': df['cpv'].round(4),
+        'Engajamentos': df['engajamentos'],
+        'Engagement Rate (%)': df['taxa_engajamento_pct'].round(2),
+        '% Assistido 25': df['q25_pct'].round(1),
+        '% Assistido 50': df['q50_pct'].round(1),
+        '% Assistido 75': df['q75_pct'].round(1),
+        '% Assistido 100': df['q100_pct'].round(1),
+    })
+
 def init_facebook_api(secrets_key="facebook_api", env_suffix=""):
     """Inicializa a API do Facebook. Use env_suffix='_CENTRAL' para Central."""
     app_id, app_secret, access_token, ad_account_id = None, None, None, None
@@ -1044,115 +923,182 @@ def get_facebook_data(account, start_date, end_date):
     - Leads primários = lead_presencial + lead_live (Custom Conversions)
     """
     try:
-        fields = [
-            AdsInsights.Field.campaign_name,
-            AdsInsights.Field.objective,
-            AdsInsights.Field.spend,
-            AdsInsights.Field.impressions,
-            AdsInsights.Field.reach,
-            AdsInsights.Field.frequency,
-            AdsInsights.Field.cpm,
-            # Cliques no link (não cliques totais)
-            'inline_link_clicks',
-            'inline_link_click_ctr',
-            'cost_per_inline_link_click',
-            AdsInsights.Field.actions,
-            AdsInsights.Field.cost_per_action_type,
-            # Conversions traz eventos pixel por nome (lead_presencial, lead_live, lead_online)
-            'conversions',
-        ]
-        params = {
-            'level': 'campaign',
-            'time_range': {'since': start_date, 'until': end_date},
-            # Usa a configuração de atribuição da conta (igual ao Gerenciador de Anúncios)
-            'use_account_attribution_setting': True,
-        }
-        insights = account.get_insights(fields=fields, params=params)
-
-        rows = []
-
-        # Eventos de venda para campanhas ONLINE (Compras no site = pixel purchase offsite)
-        # Usa apenas offsite_conversion.fb_pixel_purchase para refletir exatamente
-        # o campo "Compras no site" do Gerenciador de Anúncios da Meta.
-        VENDA_ACTIONS = {
-            'offsite_conversion.fb_pixel_purchase',
-        }
-        # Nomes dos eventos pixel de lead (do campo conversions)
-        LEAD_EVENTS = {
-            'offsite_conversion.fb_pixel_custom.lead_presencial': 'lead_presencial',
-            'offsite_conversion.fb_pixel_custom.lead_live': 'lead_live',
-            'offsite_conversion.fb_pixel_custom.lead_online': 'lead_online',
-        }
-
-        for insight in insights:
-            custo = float(insight.get(AdsInsights.Field.spend, 0))
-
-            # Cliques no link
-            cliques_link = int(insight.get('inline_link_clicks', 0))
-            ctr_link = float(insight.get('inline_link_click_ctr', 0))
-            cpc_link = float(insight.get('cost_per_inline_link_click', 0))
-
-            # Leads primários via campo 'conversions' (eventos pixel por nome)
-            lead_presencial = 0
-            lead_live = 0
-            lead_online = 0
-            conversions = insight.get('conversions', [])
-            for conv in conversions:
-                atype = conv.get('action_type', '')
-                val = int(conv.get('value', 0))
-                target = LEAD_EVENTS.get(atype)
-                if target == 'lead_presencial':
-                    lead_presencial = val
-                elif target == 'lead_live':
-                    lead_live = val
-                elif target == 'lead_online':
-                    lead_online = val
-
-            # Vendas via campo 'actions'
-            vendas = 0
-            actions = insight.get(AdsInsights.Field.actions, [])
-            for action in actions:
-                atype = action.get('action_type', '')
-                val = int(action.get('value', 0))
-                if atype in VENDA_ACTIONS:
-                    vendas += val
-
-            leads_primarios = lead_presencial + lead_live
-            cpl_primario = custo / leads_primarios if leads_primarios > 0 else 0
-
-            # Classificação de objetivo
-            obj_api = insight.get(AdsInsights.Field.objective, "")
-            objetivo = OBJETIVO_MAP_META.get(obj_api)
-            if not objetivo:
-                objetivo = classificar_por_nome(insight[AdsInsights.Field.campaign_name])
-
-            rows.append({
-                'Campanha': insight[AdsInsights.Field.campaign_name],
-                'Objetivo': objetivo,
-                'Custo': custo,
-                'Impressões': int(insight.get(AdsInsights.Field.impressions, 0)),
-                'Alcance': int(insight.get(AdsInsights.Field.reach, 0)),
-                'Frequência': float(insight.get(AdsInsights.Field.frequency, 0)),
-                'CPM': float(insight.get(AdsInsights.Field.cpm, 0)),
-                'Cliques Link': cliques_link,
-                'CTR Link (%)': round(ctr_link, 2),
-                'CPC Link': round(cpc_link, 2),
-                'lead_presencial': lead_presencial,
-                'lead_live': lead_live,
-                'lead_online': lead_online,
-                'Resultado Presencial + Live': leads_primarios,
-                'CPL Primário': round(cpl_primario, 2),
-                'Compras no site': vendas,
-            })
-        return pd.DataFrame(rows)
+        return _buscar_facebook(account, start_date, end_date)
     except Exception as e:
         st.error(f"Erro Meta Ads: {e}")
         return pd.DataFrame()
 
+
+def _buscar_facebook(account, start_date, end_date):
+    """Versão sem tratamento de erro de get_facebook_data (propaga exceções).
+    Usada na coleta paralela, onde o erro é reportado por fonte.
+    Usa a configuração de atribuição da conta (igual ao Gerenciador de Anúncios)
+    e lê do armazém diário (collectors.ads_warehouse)."""
+    df = meta_ads_collector.carregar_campanhas(
+        account, start_date, end_date, atribuicao_conta=True, com_alcance=True
+    )
+    if df.empty:
+        return pd.DataFrame()
+
+    objetivo = df['objetivo'].map(OBJETIVO_MAP_META)
+    objetivo = objetivo.fillna(df['campanha'].map(classificar_por_nome))
+    leads_primarios = df['lead_presencial'] + df['lead_live']
+    cpl_primario = (df['custo'] / leads_primarios.where(leads_primarios > 0)).fillna(0)
+
+    return pd.DataFrame({
+        'Campanha': df['campanha'],
+        'Objetivo': objetivo,
+        'Custo': df['custo'],
+        'Impressões': df['impressoes'],
+        'Alcance': df['alcance'].astype(int),
+        'Frequência': df['frequencia'],
+        'CPM': df['cpm'],
+        'Cliques Link': df['cliques_link'],
+        'CTR Link (%)': df['ctr_link_pct'].round(2),
+        'CPC Link': df['cpc_link'].round(2),
+        'lead_presencial': df['lead_presencial'],
+        'lead_live': df['lead_live'],
+        'lead_online': df['lead_online'],
+        'Resultado Presencial + Live': leads_primarios,
+        'CPL Primário': cpl_primario.round(2),
+        'Compras no site': df['compras'],
+    })
+
 # =====================================================
 # FORMATAÇÃO DOS DADOS POR OBJETIVO (v2.0)
 # =====================================================
 
+def _col(df, nome, padrao):
+    """Coluna como Series (ou `padrao` em todas as linhas), igual a r.get(nome, padrao)."""
+    return df[nome] if nome in df.columns else pd.Series(padrao, index=df.index, dtype=object)
+
+
+def _fmt(serie, spec):
+    return serie.map(spec.format)
+
+
+def _linha_se(condicao, texto):
+    """'\n' + texto nas linhas em que a condição vale, '' nas demais."""
+    return (pd.Series("\n", index=condicao.index) + texto).where(condicao.astype(bool), "")
+
+
+def _textos_meta(df):
+    cpl_linha = (
+        "  lead_presencial: " + _col(df, 'lead_presencial', 0).astype(str)
+        + " | lead_live: " + _col(df, 'lead_live', 0).astype(str)
+        + " | lead_online: " + _col(df, 'lead_online', 0).astype(str)
+        + " | Resultado Presencial + Live: " + _col(df, 'Resultado Presencial + Live', 0).astype(str)
+        + " | CPL Primário: R$" + _fmt(_col(df, 'CPL Primário', 0), "{:.2f}")
+        + pd.Series(" ⚠️ <30, dados insuficientes", index=df.index).where(
+            _col(df, 'Resultado Presencial + Live', 0) < 30, "")
+    )
+    tem_leads = ((_col(df, 'Resultado Presencial + Live', 0) > 0) | (_col(df, 'lead_presencial', 0) > 0)
+                 | (_col(df, 'lead_live', 0) > 0) | (_col(df, 'lead_online', 0) > 0))
+    compras = _col(df, 'Compras no site', 0)
+    return (
+        "\n  Cliques no link: " + _fmt(_col(df, 'Cliques Link', 0), "{:,}")
+        + " | CTR link: " + _fmt(_col(df, 'CTR Link (%)', 0), "{:.2f}") + "%"
+        + " | CPC link: R$" + _fmt(_col(df, 'CPC Link', 0), "{:.2f}")
+        + " | CPM: R$" + _fmt(_col(df, 'CPM', 0), "{:.2f}")
+        + "\n  Alcance: " + _fmt(_col(df, 'Alcance', 0), "{:,}")
+        + " | Frequência: " + _fmt(_col(df, 'Frequência', 0), "{:.1f}")
+        + _linha_se(tem_leads, cpl_linha)
+        + _linha_se(compras > 0, "  Compras no site: " + compras.astype(str))
+    )
+
+
+def _textos_youtube(df):
+    return (
+        "\n  Tipo: " + _col(df, 'Rec/Cons', '-').astype(str)
+        + " | Estratégia de Lance: " + _col(df, 'Tipo Lance', '-').astype(str)
+        + "\n  Custo: R$" + _fmt(df['Custo'], "{:.2f}")
+        + " | Impressões: " + _fmt(df['Impressões'], "{:,}")
+        + " | CPM: R$" + _fmt(_col(df, 'CPM', 0), "{:.2f}")
+        + " | CPC: R$" + _fmt(_col(df, 'CPC', 0), "{:.2f}")
+        + " | CPV: R$" + _fmt(_col(df, 'CPV', 0), "{:.4f}")
+        + "\n  Usuários Exclusivos: " + _fmt(_col(df, 'Usuários Exclusivos', 0), "{:,}")
+        + " | Freq. Méd. Imp./Usuário: " + _fmt(_col(df, 'Freq Méd Imp/Usuário', 0), "{:.2f}")
+        + "\n  Video Views: " + _fmt(_col(df, 'Video Views', 0), "{:,}")
+        + " | View Rate: " + _fmt(_col(df, 'Video View Rate (%)', 0), "{:.2f}") + "%"
+        + "\n  % Assistido: 25%=" + _fmt(_col(df, '% Assistido 25', 0), "{:.1f}")
+        + "% | 50%=" + _fmt(_col(df, '% Assistido 50', 0), "{:.1f}")
+        + "% | 75%=" + _fmt(_col(df, '% Assistido 75', 0), "{:.1f}")
+        + "% | 100%=" + _fmt(_col(df, '% Assistido 100', 0), "{:.1f}") + "%"
+        + "\n  Taxa de Interação: " + _fmt(_col(df, 'Taxa de Interação (%)', 0), "{:.2f}")
+        + "% | Engajamentos: " + _fmt(_col(df, 'Engajamentos', 0), "{:,}")
+    )
+
+
+def _textos_google(df):
+    tcpa = _col(df, 'tCPA', 0)
+    conv = _col(df, 'Conversões', 0)
+    imp_budget = _col(df, 'Imp Lost Budget (%)', None)
+    imp_rank = _col(df, 'Imp Lost Rank (%)', None)
+    return (
+        "\n  Canal: " + _col(df, 'Canal', '').astype(str)
+        + " | Cliques: " + _fmt(_col(df, 'Cliques', 0), "{:,}")
+        + " | CTR: " + _fmt(_col(df, 'CTR (%)', 0), "{:.2f}") + "%"
+        + " | CPC: R$" + _fmt(_col(df, 'CPC', 0), "{:.2f}")
+        + " | CPM: R$" + _fmt(_col(df, 'CPM', 0), "{:.2f}")
+        + "\n  Conversões: " + conv.astype(str)
+        + " | CPA: R$" + _fmt(_col(df, 'CPA', 0), "{:.2f}")
+        + " | CPA Desejado: " + ("R$" + _fmt(tcpa, "{:.2f}")).where(tcpa > 0, "não configurado")
+        + " | Taxa conv: " + _fmt(_col(df, 'Taxa Conv (%)', 0), "{:.2f}") + "%"
+        + _linha_se(imp_budget.notna() | imp_rank.notna(),
+                    "  Parc impr perd (orç): " + (_fmt(imp_budget.fillna(0), "{:.1f}") + "%").where(imp_budget.notna(), "N/A")
+                    + " | Parc impr perd (class): " + (_fmt(imp_rank.fillna(0), "{:.1f}") + "%").where(imp_rank.notna(), "N/A"))
+        + _linha_se((conv > 0) & (conv < 30), "  ⚠️ <30 conversões — CPA não é estatisticamente confiável")
+    )
+
+
+def _bloco_campanhas(df, origem_label):
+    """Linhas do bloco de campanhas de uma plataforma/marca para o payload do Claude.
+
+    Formatado por coluna (sem iterrows) e memorizado pelos dados. Acima de
+    PROMPT_TOKENS_CAMPANHAS ficam as campanhas de maior custo, na ordem
+    original, com uma nota do que foi omitido.
+    """
+    if df is None or df.empty:
+        return [f"  [{origem_label}]: sem dados no período"]
+    return [prompt_tabelas.memorizar(("campanhas", origem_label, prompt_tabelas.TOKENS_CAMPANHAS), df,
+                                     lambda: _montar_bloco_campanhas(df, origem_label))]
+
+
+def _montar_bloco_campanhas(df, origem_label):
+    df = df.reset_index(drop=True)
+    status = _col(df, 'Status', '')
+    textos = (
+        "  Campanha: " + df['Campanha'].astype(str)
+        + (" [" + status.astype(str) + "]").where(status.astype(bool), "")
+        + "\n  Objetivo: " + _col(df, 'Objetivo', 'LEADS').astype(str)
+        + " | Custo: R$" + _fmt(df['Custo'], "{:.2f}")
+        + " | Impressões: " + _fmt(df['Impressões'], "{:,}")
+    )
+    if "Meta" in origem_label:
+        textos = textos + _textos_meta(df)
+    else:
+        video = (_col(df, 'Canal', '') == "VIDEO").to_numpy()
+        detalhes = pd.Series("", index=df.index, dtype=object)
+        if video.any():
+            detalhes[video] = _textos_youtube(df[video])
+        if not video.all():
+            detalhes[~video] = _textos_google(df[~video])
+        textos = textos + detalhes
+    textos = textos + "\n"
+
+    custo_total = df['Custo'].sum()
+    bloco = [f"  [{origem_label}]", f"  Total campanhas: {len(df)} | Custo total: R${custo_total:.2f}", ""]
+    manter = prompt_tabelas.linhas_no_orcamento(textos, prompt_tabelas.TOKENS_CAMPANHAS,
+                                                prioridade=df['Custo'], modelo="claude-opus-4-6")
+    bloco.extend(textos[manter])
+    if not manter.all():
+        omitidas = int((~manter).sum())
+        bloco.append(f"  ({omitidas} campanha(s) de menor custo omitida(s) para caber no prompt — "
+                     f"R${df.loc[~manter, 'Custo'].sum():.2f} somados)")
+        bloco.append("")
+    return "\n".join(bloco)
+
+
 def formatar_dados_para_claude(df_google_degrau, df_google_central, df_facebook, janela_dias, df_facebook_central=None, start_date=None, end_date=None,
                                prev_google_degrau=None, prev_google_central=None, prev_facebook=None, prev_facebook_central=None,
                                prev_start_date=None, prev_end_date=None, empresa=None):
@@ -1180,99 +1126,6 @@ def formatar_dados_para_claude(df_google_degrau, df_google_central, df_facebook,
         linhas.append(f"Empresa: {empresa}")
     linhas.append("")
 
-    def _bloco_campanhas(df, origem_label):
-        """Retorna linhas formatadas para um conjunto de campanhas de uma plataforma/marca."""
-        if df is None or df.empty:
-            return [f"  [{origem_label}]: sem dados no período"]
-
-        eh_meta = "Meta" in origem_label
-        custo_total = df['Custo'].sum()
-        bloco = []
-        bloco.append(f"  [{origem_label}]")
-        bloco.append(f"  Total campanhas: {len(df)} | Custo total: R${custo_total:.2f}")
-        bloco.append("")
-
-        for _, r in df.iterrows():
-            obj = r.get('Objetivo', 'LEADS')
-            status = r.get('Status', '')
-            bloco.append(f"  Campanha: {r['Campanha']}" + (f" [{status}]" if status else ""))
-            bloco.append(f"  Objetivo: {obj} | Custo: R${r['Custo']:.2f} | Impressões: {r['Impressões']:,}")
-
-            if eh_meta:
-                # Métricas Meta com cliques no link
-                cliques = r.get('Cliques Link', 0)
-                ctr = r.get('CTR Link (%)', 0)
-                cpc = r.get('CPC Link', 0)
-                cpm = r.get('CPM', 0)
-                alcance = r.get('Alcance', 0)
-                freq = r.get('Frequência', 0)
-                lead_p = r.get('lead_presencial', 0)
-                lead_l = r.get('lead_live', 0)
-                lead_o = r.get('lead_online', 0)
-                leads = r.get('Resultado Presencial + Live', 0)
-                cpl = r.get('CPL Primário', 0)
-                compras_site = r.get('Compras no site', 0)
-
-                bloco.append(f"  Cliques no link: {cliques:,} | CTR link: {ctr:.2f}% | CPC link: R${cpc:.2f} | CPM: R${cpm:.2f}")
-                bloco.append(f"  Alcance: {alcance:,} | Frequência: {freq:.1f}")
-                if leads > 0 or lead_p > 0 or lead_l > 0 or lead_o > 0:
-                    aviso = " ⚠️ <30, dados insuficientes" if leads < 30 else ""
-                    bloco.append(f"  lead_presencial: {lead_p} | lead_live: {lead_l} | lead_online: {lead_o} | Resultado Presencial + Live: {leads} | CPL Primário: R${cpl:.2f}{aviso}")
-                if compras_site > 0:
-                    bloco.append(f"  Compras no site: {compras_site}")
-            else:
-                # Métricas Google Ads
-                canal = r.get('Canal', '')
-                cliques = r.get('Cliques', 0)
-                ctr = r.get('CTR (%)', 0)
-                cpc = r.get('CPC', 0)
-                cpm = r.get('CPM', 0)
-                conv = r.get('Conversões', 0)
-                cpa = r.get('CPA', 0)
-                tcpa = r.get('tCPA', 0)
-                taxa_conv = r.get('Taxa Conv (%)', 0)
-                imp_budget = r.get('Imp Lost Budget (%)', None)
-                imp_rank = r.get('Imp Lost Rank (%)', None)
-                cpv = r.get('CPV', 0)
-                video_views = r.get('Video Views', 0)
-                view_rate = r.get('Video View Rate (%)', 0)
-                engajamentos = r.get('Engajamentos', 0)
-                eng_rate = r.get('Engagement Rate (%)', 0)
-
-                if canal == "VIDEO":
-                    # ── YouTube: apenas métricas de vídeo, sem Conversões/CPA/Parcelas ──
-                    rec_cons = r.get('Rec/Cons', '-')
-                    tipo_lance = r.get('Tipo Lance', '-')
-                    unique_users = r.get('Usuários Exclusivos', 0)
-                    avg_freq = r.get('Freq Méd Imp/Usuário', 0)
-                    q25 = r.get('% Assistido 25', 0)
-                    q50 = r.get('% Assistido 50', 0)
-                    q75 = r.get('% Assistido 75', 0)
-                    q100 = r.get('% Assistido 100', 0)
-                    taxa_interacao = r.get('Taxa de Interação (%)', 0)
-                    bloco.append(f"  Tipo: {rec_cons} | Estratégia de Lance: {tipo_lance}")
-                    bloco.append(f"  Custo: R${r['Custo']:.2f} | Impressões: {r['Impressões']:,} | CPM: R${cpm:.2f} | CPC: R${cpc:.2f} | CPV: R${cpv:.4f}")
-                    bloco.append(f"  Usuários Exclusivos: {unique_users:,} | Freq. Méd. Imp./Usuário: {avg_freq:.2f}")
-                    bloco.append(f"  Video Views: {video_views:,} | View Rate: {view_rate:.2f}%")
-                    bloco.append(f"  % Assistido: 25%={q25:.1f}% | 50%={q50:.1f}% | 75%={q75:.1f}% | 100%={q100:.1f}%")
-                    bloco.append(f"  Taxa de Interação: {taxa_interacao:.2f}% | Engajamentos: {engajamentos:,}")
-                else:
-                    # ── Search, PMax, Display: métricas de conversão e parcelas ──
-                    tcpa_str = f"R${tcpa:.2f}" if tcpa > 0 else "não configurado"
-                    bloco.append(f"  Canal: {canal} | Cliques: {cliques:,} | CTR: {ctr:.2f}% | CPC: R${cpc:.2f} | CPM: R${cpm:.2f}")
-                    bloco.append(f"  Conversões: {conv} | CPA: R${cpa:.2f} | CPA Desejado: {tcpa_str} | Taxa conv: {taxa_conv:.2f}%")
-
-                    if imp_budget is not None or imp_rank is not None:
-                        ib = f"{imp_budget:.1f}%" if imp_budget is not None else "N/A"
-                        ir = f"{imp_rank:.1f}%" if imp_rank is not None else "N/A"
-                        bloco.append(f"  Parc impr perd (orç): {ib} | Parc impr perd (class): {ir}")
-
-                    if conv > 0 and conv < 30:
-                        bloco.append(f"  ⚠️ <30 conversões — CPA não é estatisticamente confiável")
-
-            bloco.append("")
-        return bloco
-
     def _soma(df, col):
         return df[col].sum() if df is not None and not df.empty and col in df.columns else 0
 
@@ -2463,15 +2316,26 @@ def _get_anthropic_client():
         timeout=600.0,
     ), None
 
-def analisar_com_claude(dados_consolidados, system_prompt=None, tipo_relatorio="completo_ads"):
-    """Envia dados para o Claude e retorna a análise usando o prompt correto."""
+def transmitir_com_claude(dados_consolidados, system_prompt=None, tipo_relatorio="completo_ads", estado=None):
+    """Gera a análise em streaming: devolve os trechos de texto conforme o Claude os escreve
+    (para st.write_stream).
+
+    `estado` (dict, normalmente guardado no session_state) acumula o texto parcial em
+    'texto'; ao terminar, 'concluido' = True ou 'erro' com a mensagem ❌. Sobrecarga (529)
+    e queda de conexão só são retentadas antes do primeiro trecho — depois disso a
+    resposta já está na tela e recomeçar duplicaria o texto.
+    """
     import time
 
     import anthropic as _anthropic
 
+    estado = {} if estado is None else estado
+    estado.update(texto="", concluido=False, erro=None)
+
     client, erro = _get_anthropic_client()
     if erro:
-        return erro
+        estado["erro"] = erro
+        return
 
     if system_prompt is None:
         system_prompt = SYSTEM_PROMPT_ADS_V2
@@ -2483,45 +2347,111 @@ def analisar_com_claude(dados_consolidados, system_prompt=None, tipo_relatorio="
 
     max_tentativas = 4
     for tentativa in range(1, max_tentativas + 1):
+        inicio = time.monotonic()
+        primeiro_trecho = None
         try:
-            with client.messages.stream(
+            with llm_limiter.stream_mensagem(
+                client,
                 model="claude-opus-4-6",
                 max_tokens=64000,
                 thinking={"type": "adaptive"},
                 system=system_prompt,
                 messages=[{"role": "user", "content": user_msg}]
             ) as stream:
-                texto = stream.get_final_text()
+                for trecho in stream.text_stream:
+                    if primeiro_trecho is None:
+                        primeiro_trecho = time.monotonic() - inicio
+                    estado["texto"] += trecho
+                    yield trecho
                 final = stream.get_final_message()
+            if final.stop_reason is None:
+                raise ConnectionError("streaming encerrado antes do fim da resposta")
 
             usage = final.usage
             print(
                 f"[Claude API] model={final.model} | tentativa={tentativa} | input_tokens={usage.input_tokens} | "
-                f"output_tokens={usage.output_tokens} | stop_reason={final.stop_reason}"
+                f"output_tokens={usage.output_tokens} | stop_reason={final.stop_reason} | "
+                f"primeiro_trecho={primeiro_trecho or 0:.1f}s | total={time.monotonic() - inicio:.1f}s"
             )
-            return texto
+            estado["concluido"] = True
+            return
 
         except _anthropic.APIStatusError as e:
-            if e.status_code == 529:  # overloaded_error
+            if e.status_code == 529 and not estado["texto"]:  # overloaded_error
                 espera = 2 ** tentativa  # 2s, 4s, 8s, 16s
                 print(f"[Claude API] Sobrecarga na tentativa {tentativa}. Aguardando {espera}s...")
                 if tentativa < max_tentativas:
                     time.sleep(espera)
                 else:
-                    return f"❌ API do Claude sobrecarregada após {max_tentativas} tentativas. Tente novamente em alguns minutos."
+                    estado["erro"] = f"❌ API do Claude sobrecarregada após {max_tentativas} tentativas. Tente novamente em alguns minutos."
+                    return
             else:
-                return f"❌ Erro na API do Claude ({e.status_code}): {e.message}"
+                estado["erro"] = f"❌ Erro na API do Claude ({e.status_code}): {e.message}"
+                return
 
         except (_anthropic.APIConnectionError, ConnectionError) as e:
+            if estado["texto"]:
+                estado["erro"] = f"❌ Conexão com o Claude interrompida no meio da resposta: {e}"
+                return
             espera = 2 ** tentativa
             print(f"[Claude API] Conexão interrompida na tentativa {tentativa}: {e}. Aguardando {espera}s...")
             if tentativa < max_tentativas:
                 time.sleep(espera)
             else:
-                return f"❌ Conexão com o Claude falhou após {max_tentativas} tentativas. Verifique sua rede e tente novamente."
+                estado["erro"] = f"❌ Conexão com o Claude falhou após {max_tentativas} tentativas. Verifique sua rede e tente novamente."
+                return
 
         except Exception as e:
-            return f"❌ Erro inesperado ao chamar o Claude: {e}"
+            estado["erro"] = f"❌ Erro inesperado ao chamar o Claude: {e}"
+            return
+
+
+def analisar_com_claude(dados_consolidados, system_prompt=None, tipo_relatorio="completo_ads"):
+    """Envia dados para o Claude e retorna a análise usando o prompt correto (sem streaming)."""
+    estado = {}
+    for _ in transmitir_com_claude(dados_consolidados, system_prompt, tipo_relatorio, estado):
+        pass
+    return estado["erro"] or estado["texto"]
+
+
+# Texto parcial/final das análises em streaming, por session_key da aba
+_CHAVE_STREAMING = "ria_streaming"
+
+
+def _analisar_em_streaming(dados_consolidados, system_prompt, tipo, session_key, data_ref):
+    """Mostra a análise enquanto é gerada e, no fim, troca pela renderização formatada.
+
+    O texto parcial fica em st.session_state[_CHAVE_STREAMING][session_key]: se um rerun
+    interromper a geração, o que já chegou continua disponível (_mostrar_analise_interrompida).
+    Retorna o dict de estado (texto, concluido, erro).
+    """
+    estado = {"data_ref": data_ref}
+    st.session_state.setdefault(_CHAVE_STREAMING, {})[session_key] = estado
+
+    icone = "🚨" if tipo == "alerta" else "🤖"
+    st.subheader(f"{icone} Análise do Claude")
+    area = st.empty()
+    with area.container():
+        st.write_stream(transmitir_com_claude(dados_consolidados, system_prompt, tipo, estado))
+    area.empty()
+    if estado["erro"] and not estado["texto"]:
+        st.error(estado["erro"])
+    else:
+        _renderizar_analise(estado["texto"], tipo)
+        if estado["erro"]:
+            st.error(estado["erro"])
+    return estado
+
+
+def _mostrar_analise_interrompida(session_key):
+    """Exibe o texto parcial de uma análise em streaming que não chegou ao fim (ex.: rerun)."""
+    estado = st.session_state.get(_CHAVE_STREAMING, {}).get(session_key)
+    if not estado or estado.get("concluido") or estado.get("erro") or not estado.get("texto"):
+        return
+    st.warning("⚠️ A geração anterior foi interrompida antes do fim e não foi salva. "
+               "Texto parcial abaixo — clique em 'Analisar com IA' para gerar de novo.")
+    with st.expander(f"📝 Análise parcial ({estado.get('data_ref') or 'sem data'})"):
+        st.markdown(estado["texto"])
 
 # =====================================================
 # HISTÓRICO DE RELATÓRIOS (MySQL)
@@ -2580,6 +2510,57 @@ def salvar_relatorio(analise, dados_consolidados, data_ref, tipo="completo_ads")
     return filepath
 
 
+def _relatorio_da_linha(row):
+    gerado_em = row.generated_at.isoformat() if row.generated_at else ""
+    return {
+        "id": row.id,
+        "uuid": row.uuid,
+        "data": row.reference_date,
+        "tipo": row.type,
+        "gerado_em": gerado_em,
+        "analise": row.ai_analysis or "",
+        "dados_brutos": row.raw_data or "",
+    }
+
+
+def buscar_relatorio(tipo, data_ref):
+    """Relatório mais recente salvo para (tipo, data_ref) — ex.: pré-gerado pelo
+    relatorios_ia_cron.py — ou None. Mesmo formato de carregar_relatorios_historico."""
+    engine = _get_writer_engine()
+    if engine:
+        try:
+            with engine.connect() as conn:
+                row = conn.execute(
+                    sql_text("""
+                        SELECT id, uuid, reference_date, type, generated_at, raw_data, ai_analysis
+                        FROM ai_reports
+                        WHERE type = :tipo AND reference_date = :data_ref
+                        ORDER BY generated_at DESC LIMIT 1
+                    """),
+                    {"tipo": tipo, "data_ref": data_ref},
+                ).fetchone()
+            if row is not None:
+                return _relatorio_da_linha(row)
+        except Exception as e:
+            st.warning(f"Erro ao buscar relatório no banco: {e}. Tentando arquivos locais.")
+
+    filepath = os.path.join(HISTORICO_DIR, f"relatorio_{tipo}_{data_ref}.json")
+    try:
+        with open(filepath, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return {
+        "id": None,
+        "uuid": None,
+        "data": data.get("data", data_ref),
+        "tipo": data.get("tipo", tipo),
+        "gerado_em": data.get("gerado_em", ""),
+        "analise": data.get("analise_claude", ""),
+        "dados_brutos": data.get("dados_brutos", ""),
+    }
+
+
 def carregar_relatorios_historico(filtro_tipo=None):
     """Carrega relatórios do banco MySQL (com fallback para arquivos locais)."""
     relatorios = []
@@ -2598,16 +2579,7 @@ def carregar_relatorios_historico(filtro_tipo=None):
             with engine.connect() as conn:
                 result = conn.execute(sql_text(query), params)
                 for row in result:
-                    gerado_em = row.generated_at.isoformat() if row.generated_at else ""
-                    relatorios.append({
-                        "id": row.id,
-                        "uuid": row.uuid,
-                        "data": row.reference_date,
-                        "tipo": row.type,
-                        "gerado_em": gerado_em,
-                        "analise": row.ai_analysis or "",
-                        "dados_brutos": row.raw_data or "",
-                    })
+                    relatorios.append(_relatorio_da_linha(row))
             if relatorios:
                 return relatorios
         except Exception as e:
@@ -2656,13 +2628,10 @@ def run_page():
     hoje = datetime.now().date()
     ontem = hoje - timedelta(days=1)
 
-    empresas = ["Degrau Cultural", "Central de Concursos"]
+    empresas = list(EMPRESAS_ADS)
     empresa_selecionada = st.sidebar.radio("Selecione a empresa:", empresas, key="ria_empresa")
 
-    if empresa_selecionada == "Degrau Cultural":
-        contas_options = ["Google Ads (Degrau)", "Meta Ads (Degrau)"]
-    else:
-        contas_options = ["Google Ads (Central)", "Meta Ads (Central)"]
+    contas_options = EMPRESAS_ADS[empresa_selecionada]["contas"]
 
     contas = st.sidebar.multiselect(
         "Contas para incluir:",
@@ -2726,7 +2695,8 @@ def run_page():
             info_periodo += f"  |  **Comparação:** {prev_start_custom.strftime('%d/%m/%Y')} a {prev_end_custom.strftime('%d/%m/%Y')} ({dias_comp} dias)"
         st.info(info_periodo)
 
-        if st.button("🔍 Buscar Dados", type="primary", use_container_width=True, key="btn_ads_buscar"):
+        buscar_ads = st.button("🔍 Buscar Dados", type="primary", use_container_width=True, key="btn_ads_buscar")
+        if buscar_ads:
             _coletar_dados(contas, start_date, end_date, janela_dias, "ads_dados", prev_start_custom, prev_end_custom, empresa=empresa_selecionada)
         dados_ads_prontos = "ads_dados" in st.session_state
         if st.button(
@@ -2736,6 +2706,10 @@ def run_page():
             disabled=not dados_ads_prontos,
         ):
             _enviar_para_ia("ads_dados", SYSTEM_PROMPT_ADS_V2, "completo_ads")
+        elif not buscar_ads and modo == "Últimos 7 dias" and sorted(contas) == sorted(contas_options):
+            _mostrar_relatorio_pre_gerado("completo_ads", data_ref_relatorio(start_date, end_date, empresa_selecionada))
+
+        _mostrar_analise_interrompida("ads_dados")
 
         if "ads_dados" in st.session_state:
             info = st.session_state["ads_dados"]
@@ -2755,7 +2729,8 @@ def run_page():
 
         st.info(f"📅 Verificando dados de ontem: **{start_alerta.strftime('%d/%m/%Y')}**")
 
-        if st.button("🔍 Buscar Dados", type="primary", use_container_width=True, key="btn_alerta_buscar"):
+        buscar_alerta = st.button("🔍 Buscar Dados", type="primary", use_container_width=True, key="btn_alerta_buscar")
+        if buscar_alerta:
             _coletar_dados(contas, start_alerta, end_alerta, 1, "alerta_dados", empresa=empresa_selecionada)
         dados_alerta_prontos = "alerta_dados" in st.session_state
         if st.button(
@@ -2765,6 +2740,10 @@ def run_page():
             disabled=not dados_alerta_prontos,
         ):
             _enviar_para_ia("alerta_dados", SYSTEM_PROMPT_ALERTA_DIARIO, "alerta")
+        elif not buscar_alerta and sorted(contas) == sorted(contas_options):
+            _mostrar_relatorio_pre_gerado("alerta", data_ref_relatorio(start_alerta, end_alerta, empresa_selecionada))
+
+        _mostrar_analise_interrompida("alerta_dados")
 
         if "alerta_dados" in st.session_state:
             info = st.session_state["alerta_dados"]
@@ -2788,13 +2767,7 @@ def run_page():
         else:
             st.write(f"**{len(relatorios)} relatório(s)**")
             for idx, rel in enumerate(relatorios):
-                gerado_em = ""
-                if rel["gerado_em"]:
-                    try:
-                        dt_val = datetime.fromisoformat(rel["gerado_em"])
-                        gerado_em = dt_val.strftime("%d/%m/%Y às %H:%M")
-                    except ValueError:
-                        gerado_em = rel["gerado_em"]
+                gerado_em = _formatar_gerado_em(rel["gerado_em"])
 
                 icone = "🚨" if rel["tipo"] == "alerta" else "📊"
                 with st.expander(f"{icone} {rel['data']} [{rel['tipo']}] — {gerado_em}"):
@@ -2814,6 +2787,38 @@ def run_page():
                         st.code(rel["dados_brutos"], language="text")
 
 
+def _formatar_gerado_em(gerado_em):
+    if not gerado_em:
+        return ""
+    try:
+        return datetime.fromisoformat(gerado_em).strftime("%d/%m/%Y às %H:%M")
+    except ValueError:
+        return gerado_em
+
+
+def _mostrar_relatorio_pre_gerado(tipo, data_ref):
+    """Exibe o relatório já salvo para o preset (tipicamente gerado de madrugada pelo
+    relatorios_ia_cron.py), sem coletar nem chamar o Claude."""
+    rel = buscar_relatorio(tipo, data_ref)
+    if not rel or not rel["analise"]:
+        return
+    st.success(f"📦 Relatório pronto ({rel['data']}), gerado em {_formatar_gerado_em(rel['gerado_em'])}. "
+               "Use 'Buscar Dados' para gerar de novo.")
+    icone = "🚨" if tipo == "alerta" else "🤖"
+    st.subheader(f"{icone} Análise do Claude")
+    _renderizar_analise(rel["analise"], tipo)
+    st.download_button(
+        label="📥 Exportar Relatório HTML",
+        data=gerar_html_relatorio(rel["analise"], rel["dados_brutos"], rel["data"], tipo),
+        file_name=f"relatorio_{tipo}_{rel['data']}.html",
+        mime="text/html",
+        use_container_width=True,
+        key=f"btn_html_pronto_{tipo}_{rel['data']}",
+    )
+    with st.expander("📋 Ver dados brutos enviados ao Claude"):
+        st.code(rel["dados_brutos"], language="text")
+
+
 def _executar_analise(contas, start_date, end_date, janela_dias, system_prompt, tipo):
     """Executa a coleta + análise e exibe resultados."""
     start_str = start_date.strftime('%Y-%m-%d')
@@ -2904,13 +2909,11 @@ def _executar_analise(contas, start_date, end_date, janela_dias, system_prompt,
         start_date=start_date, end_date=end_date
     )
 
-    with st.spinner("🤖 Analisando com Claude..."):
-        analise = analisar_com_claude(dados_consolidados, system_prompt, tipo)
-
-    # Exibe
-    icone = "🚨" if tipo == "alerta" else "🤖"
-    st.subheader(f"{icone} Análise do Claude")
-    _renderizar_analise(analise, tipo)
+    # Exibe enquanto gera
+    estado = _analisar_em_streaming(dados_consolidados, system_prompt, tipo, f"analise_{tipo}", data_ref)
+    if not estado["concluido"]:
+        return
+    analise = estado["texto"]
 
     filepath = salvar_relatorio(analise, dados_consolidados, data_ref, tipo)
     if filepath == "db":
@@ -2997,20 +3000,13 @@ def _mostrar_tabelas_google_ads(df_google, label):
 
         for col in ['Custo', 'CPC', 'CPM', 'CPA', 'CPA Desejado (Lead)']:
             if col in df_std_display.columns:
-                df_std_display[col] = df_std_display[col].apply(
-                    lambda v: f"R$ {v:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-                    if pd.notna(v) and v > 0 else "-"
-                )
+                df_std_display[col] = _fmt_brl_serie(df_std_display[col])
         for col in ['CTR (%)', 'Taxa Conv (%)']:
             if col in df_std_display.columns:
-                df_std_display[col] = df_std_display[col].apply(
-                    lambda v: f"{v:.2f}%" if pd.notna(v) else "-"
-                )
+                df_std_display[col] = _fmt_pct_serie(df_std_display[col])
         for col in ['Imp Lost Budget (%)', 'Imp Lost Rank (%)']:
             if col in df_std_display.columns:
-                df_std_display[col] = df_std_display[col].apply(
-                    lambda v: f"{v:.1f}%" if pd.notna(v) else "-"
-                )
+                df_std_display[col] = _fmt_pct_serie(df_std_display[col], 1)
         st.dataframe(df_std_display, use_container_width=True, hide_index=True)
 
 
@@ -3038,6 +3034,38 @@ def _fmt_num(v):
     return f"{v:,.0f}".replace(",", ".")
 
 
+def _fmt_brl_serie(s, decimais=2):
+    """Versão vetorizada de _fmt_brl para uma coluna inteira."""
+    s = pd.to_numeric(s, errors='coerce')
+    # astype(object): série vazia ou toda NaN sai do map como float e não tem .str
+    txt = s.map(f"R$ {{:,.{decimais}f}}".format, na_action='ignore').astype(object)
+    txt = txt.str.replace(",", "X", regex=False).str.replace(".", ",", regex=False).str.replace("X", ".", regex=False)
+    return txt.where(s.notna() & (s != 0), "-")
+
+
+def _fmt_pct_serie(s, decimais=2):
+    """Versão vetorizada de _fmt_pct."""
+    s = pd.to_numeric(s, errors='coerce')
+    return s.map(f"{{:.{decimais}f}}%".format, na_action='ignore').fillna("-")
+
+
+def _fmt_int_serie(s):
+    """Inteiro com separador de milhar brasileiro (1.234)."""
+    s = pd.to_numeric(s, errors='coerce').fillna(0)
+    return s.map("{:,.0f}".format).astype(object).str.replace(",", ".", regex=False)
+
+
+def _fmt_num_serie(s):
+    """Versão vetorizada de _fmt_num (sufixos k/M)."""
+    s = pd.to_numeric(s, errors='coerce')
+    txt = np.select(
+        [s >= 1_000_000, s >= 1_000],
+        [(s / 1_000_000).map("{:.1f}M".format), (s / 1_000).map("{:.1f}k".format)],
+        default=_fmt_int_serie(s),
+    )
+    return pd.Series(txt, index=s.index).where(s.notna() & (s != 0), "-")
+
+
 def _mostrar_youtube_visual(df_video, label):
     """Exibe campanhas YouTube com layout visual por pilares: Alcance, Retenção, Engajamento."""
     st.markdown(f"##### 📺 Campanhas YouTube — {label}")
@@ -3060,11 +3088,11 @@ def _mostrar_youtube_visual(df_video, label):
     st.markdown("###### ALCANCE")
     df_alcance = pd.DataFrame({
         'CAMPANHA': df_video['Campanha'],
-        'ORÇAM./DIA': df_video['Custo'].apply(lambda v: _fmt_brl(v / 7 if v > 0 else 0, 0)),
-        'IMPR.': df_video['Impressões'].apply(lambda v: f"{v:,.0f}".replace(",", ".")),
-        'USUÁRIOS EXCL.': df_video['Usuários Exclusivos'].apply(lambda v: f"{v:,.0f}".replace(",", ".")),
-        'FREQ. 7D': df_video['Freq Méd Imp/Usuário'].apply(lambda v: f"{v:.1f}" if v > 0 else "-"),
-        'CPM MÉD.': df_video['CPM'].apply(lambda v: _fmt_brl(v)),
+        'ORÇAM./DIA': _fmt_brl_serie((df_video['Custo'] / 7).where(df_video['Custo'] > 0, 0), 0),
+        'IMPR.': _fmt_int_serie(df_video['Impressões']),
+        'USUÁRIOS EXCL.': _fmt_int_serie(df_video['Usuários Exclusivos']),
+        'FREQ. 7D': df_video['Freq Méd Imp/Usuário'].map("{:.1f}".format).where(df_video['Freq Méd Imp/Usuário'] > 0, "-"),
+        'CPM MÉD.': _fmt_brl_serie(df_video['CPM']),
     })
     st.dataframe(df_alcance, use_container_width=True, hide_index=True)
 
@@ -3072,11 +3100,11 @@ def _mostrar_youtube_visual(df_video, label):
     st.markdown("###### RETENÇÃO DE VÍDEO")
     df_retencao = pd.DataFrame({
         'CAMPANHA': df_video['Campanha'],
-        'VIEW RATE': df_video['Video View Rate (%)'].apply(lambda v: _fmt_pct(v)),
-        '25%': df_video['% Assistido 25'].apply(lambda v: _fmt_pct(v, 1)),
-        '50%': df_video['% Assistido 50'].apply(lambda v: _fmt_pct(v, 1)),
-        '75%': df_video['% Assistido 75'].apply(lambda v: _fmt_pct(v, 1)),
-        '100%': df_video['% Assistido 100'].apply(lambda v: _fmt_pct(v, 1)),
+        'VIEW RATE': _fmt_pct_serie(df_video['Video View Rate (%)']),
+        '25%': _fmt_pct_serie(df_video['% Assistido 25'], 1),
+        '50%': _fmt_pct_serie(df_video['% Assistido 50'], 1),
+        '75%': _fmt_pct_serie(df_video['% Assistido 75'], 1),
+        '100%': _fmt_pct_serie(df_video['% Assistido 100'], 1),
     })
     st.dataframe(df_retencao, use_container_width=True, hide_index=True)
 
@@ -3086,11 +3114,9 @@ def _mostrar_youtube_visual(df_video, label):
         quartis = ['25%', '50%', '75%', '100%']
         x_labels = ['25%', '50%', '75%', '100%']
         cores = px.colors.qualitative.Set1
-        for i, (_, row) in enumerate(df_video.iterrows()):
-            nome = row['Campanha']
-            if len(nome) > 30:
-                nome = nome[:30] + "..."
-            vals = [row['% Assistido 25'], row['% Assistido 50'], row['% Assistido 75'], row['% Assistido 100']]
+        nomes = df_video['Campanha'].where(df_video['Campanha'].str.len() <= 30, df_video['Campanha'].str[:30] + "...")
+        curvas = df_video[['% Assistido 25', '% Assistido 50', '% Assistido 75', '% Assistido 100']].to_numpy()
+        for i, (nome, vals) in enumerate(zip(nomes, curvas)):
             fig.add_trace(go.Scatter(
                 x=x_labels, y=vals, mode='lines+markers',
                 name=nome, line=dict(width=2, color=cores[i % len(cores)]),
@@ -3110,22 +3136,43 @@ def _mostrar_youtube_visual(df_video, label):
     st.markdown("###### ENGAJAMENTO")
     df_eng = pd.DataFrame({
         'CAMPANHA': df_video['Campanha'],
-        'CPV MÉD.': df_video['CPV'].apply(lambda v: _fmt_brl(v, 2)),
-        'CPC MÉD.': df_video['CPC'].apply(lambda v: _fmt_brl(v)),
-        'INTERAÇÕES': df_video['Engajamentos'].apply(lambda v: f"{v:,.0f}".replace(",", ".")),
-        'TAXA DE INTER.': df_video['Taxa de Interação (%)'].apply(lambda v: _fmt_pct(v)),
-        'VISUALIZAÇÕES': df_video['Video Views'].apply(lambda v: _fmt_num(v)),
+        'CPV MÉD.': _fmt_brl_serie(df_video['CPV'], 2),
+        'CPC MÉD.': _fmt_brl_serie(df_video['CPC']),
+        'INTERAÇÕES': _fmt_int_serie(df_video['Engajamentos']),
+        'TAXA DE INTER.': _fmt_pct_serie(df_video['Taxa de Interação (%)']),
+        'VISUALIZAÇÕES': _fmt_num_serie(df_video['Video Views']),
     })
     st.dataframe(df_eng, use_container_width=True, hide_index=True)
 
 
-def _coletar_dados(contas, start_date, end_date, janela_dias, session_key, prev_start_override=None, prev_end_override=None, empresa=None):
-    """Coleta dados das APIs para o período selecionado E para o período anterior (WoW),
-    exibe métricas e salva no session_state para análise posterior.
-    Se prev_start_override e prev_end_override forem fornecidos, usa como período de comparação."""
+# Contas de cada empresa e prefixo do data_ref dos relatórios salvos
+EMPRESAS_ADS = {
+    "Degrau Cultural": {"slug": "degrau", "contas": ["Google Ads (Degrau)", "Meta Ads (Degrau)"]},
+    "Central de Concursos": {"slug": "central", "contas": ["Google Ads (Central)", "Meta Ads (Central)"]},
+}
+
+
+def data_ref_relatorio(start_date, end_date, empresa=None):
+    """Referência do relatório salvo: '<empresa>_AAAA-MM-DD' ou '<empresa>_AAAA-MM-DD_a_AAAA-MM-DD'."""
     start_str = start_date.strftime('%Y-%m-%d')
     end_str = end_date.strftime('%Y-%m-%d')
     data_ref = start_str if start_str == end_str else f"{start_str}_a_{end_str}"
+    slug = EMPRESAS_ADS.get(empresa, {}).get("slug")
+    return f"{slug}_{data_ref}" if slug else data_ref
+
+
+def coletar_dados_ads(contas, start_date, end_date, janela_dias, empresa=None,
+                      prev_start_override=None, prev_end_override=None, callback=None):
+    """Coleta das contas (período atual e anterior) e payload de formatar_dados_para_claude, sem UI.
+
+    Usada pela página (_coletar_dados) e pelo pipeline agendado (relatorios_ia_cron.py).
+    Retorna dict: data_ref, dados_consolidados (None se nada foi coletado), dfs
+    {fonte: DataFrame do período atual}, avisos (contas sem conexão) e erros (consultas
+    que falharam). callback é repassado a coletar_em_paralelo.
+    """
+    start_str = start_date.strftime('%Y-%m-%d')
+    end_str = end_date.strftime('%Y-%m-%d')
+    data_ref = data_ref_relatorio(start_date, end_date, empresa)
 
     # Período anterior: customizado ou calculado automaticamente
     if prev_start_override and prev_end_override:
@@ -3138,62 +3185,126 @@ def _coletar_dados(contas, start_date, end_date, janela_dias, session_key, prev_
     prev_start_str = prev_start_date.strftime('%Y-%m-%d')
     prev_end_str = prev_end_date.strftime('%Y-%m-%d')
 
-    df_google_degrau = pd.DataFrame()
-    df_google_central = pd.DataFrame()
-    df_facebook = pd.DataFrame()
-    df_facebook_central = pd.DataFrame()
-
-    # DataFrames do período anterior
-    prev_google_degrau = pd.DataFrame()
-    prev_google_central = pd.DataFrame()
-    prev_facebook = pd.DataFrame()
-    prev_facebook_central = pd.DataFrame()
-
+    # Clientes e credenciais são resolvidos aqui (st.secrets só na thread do
+    # script); as consultas conta × período rodam em paralelo.
+    fontes = {}
+    avisos = []
     if "Google Ads (Degrau)" in contas:
-        with st.spinner("🔄 Buscando Google Ads (Degrau)..."):
-            client_degrau = init_google_ads_client("google-ads.yaml")
-            if client_degrau:
-                try:
-                    customer_id = str(st.secrets["google_ads"]["customer_id"])
-                except Exception:
-                    customer_id = "4934481887"
-                df_google_degrau = get_google_ads_data(client_degrau, customer_id, start_str, end_str)
-                prev_google_degrau = get_google_ads_data(client_degrau, customer_id, prev_start_str, prev_end_str)
-            else:
-                st.warning("⚠️ Não foi possível conectar ao Google Ads (Degrau)")
+        client_degrau = init_google_ads_client("google-ads.yaml")
+        if client_degrau:
+            try:
+                customer_id = str(st.secrets["google_ads"]["customer_id"])
+            except Exception:
+                customer_id = "4934481887"
+            fontes["google_degrau"] = ("Google Ads (Degrau)", partial(_buscar_google_ads, client_degrau, customer_id))
+        else:
+            avisos.append("⚠️ Não foi possível conectar ao Google Ads (Degrau)")
 
     if "Google Ads (Central)" in contas:
-        with st.spinner("🔄 Buscando Google Ads (Central)..."):
-            client_central = init_google_ads_client_central()
-            if client_central:
-                try:
-                    customer_id_c = str(st.secrets["google_ads_central"]["customer_id"])
-                except Exception:
-                    customer_id_c = "1646681121"
-                df_google_central = get_google_ads_data(client_central, customer_id_c, start_str, end_str)
-                prev_google_central = get_google_ads_data(client_central, customer_id_c, prev_start_str, prev_end_str)
-            else:
-                st.warning("⚠️ Não foi possível conectar ao Google Ads (Central)")
+        client_central = init_google_ads_client_central()
+        if client_central:
+            try:
+                customer_id_c = str(st.secrets["google_ads_central"]["customer_id"])
+            except Exception:
+                customer_id_c = "1646681121"
+            fontes["google_central"] = ("Google Ads (Central)", partial(_buscar_google_ads, client_central, customer_id_c))
+        else:
+            avisos.append("⚠️ Não foi possível conectar ao Google Ads (Central)")
 
     if "Meta Ads (Degrau)" in contas:
-        with st.spinner("🔄 Buscando Meta Ads (Degrau)..."):
-            fb_account = init_facebook_api()
-            if fb_account:
-                df_facebook = get_facebook_data(fb_account, start_str, end_str)
-                prev_facebook = get_facebook_data(fb_account, prev_start_str, prev_end_str)
-            else:
-                st.warning("⚠️ Não foi possível conectar ao Meta Ads (Degrau)")
+        fb_account = init_facebook_api()
+        if fb_account:
+            fontes["facebook"] = ("Meta Ads (Degrau)", partial(_buscar_facebook, fb_account))
+        else:
+            avisos.append("⚠️ Não foi possível conectar ao Meta Ads (Degrau)")
 
     if "Meta Ads (Central)" in contas:
-        with st.spinner("🔄 Buscando Meta Ads (Central)..."):
-            fb_account_central = init_facebook_api_central()
-            if fb_account_central:
-                df_facebook_central = get_facebook_data(fb_account_central, start_str, end_str)
-                prev_facebook_central = get_facebook_data(fb_account_central, prev_start_str, prev_end_str)
+        fb_account_central = init_facebook_api_central()
+        if fb_account_central:
+            fontes["facebook_central"] = ("Meta Ads (Central)", partial(_buscar_facebook, fb_account_central))
+        else:
+            avisos.append("⚠️ Não foi possível conectar ao Meta Ads (Central)")
+
+    tarefas = {}
+    for fonte, (_, buscar) in fontes.items():
+        tarefas[(fonte, "atual")] = partial(buscar, start_str, end_str)
+        tarefas[(fonte, "anterior")] = partial(buscar, prev_start_str, prev_end_str)
+
+    resultados = coletar_em_paralelo(tarefas, callback=callback) if tarefas else {}
+    erros = [
+        f"{fontes[fonte][0]} — período {periodo}: {r['erro']}"
+        for (fonte, periodo), r in resultados.items() if r['erro']
+    ]
+
+    def _df(fonte, periodo):
+        dados = resultados.get((fonte, periodo), {}).get('dados')
+        return dados if dados is not None else pd.DataFrame()
+
+    dfs = {fonte: _df(fonte, "atual") for fonte in ("google_degrau", "google_central", "facebook", "facebook_central")}
+    coleta = {
+        "data_ref": data_ref,
+        "dados_consolidados": None,
+        "dfs": dfs,
+        "avisos": avisos,
+        "erros": erros,
+    }
+    if all(df.empty for df in dfs.values()):
+        return coleta
+
+    coleta["dados_consolidados"] = formatar_dados_para_claude(
+        dfs["google_degrau"], dfs["google_central"], dfs["facebook"], janela_dias,
+        df_facebook_central=dfs["facebook_central"],
+        start_date=start_date, end_date=end_date,
+        prev_google_degrau=_df("google_degrau", "anterior"),
+        prev_google_central=_df("google_central", "anterior"),
+        prev_facebook=_df("facebook", "anterior"),
+        prev_facebook_central=_df("facebook_central", "anterior"),
+        prev_start_date=prev_start_date,
+        prev_end_date=prev_end_date,
+        empresa=empresa,
+    )
+    return coleta
+
+
+def _coletar_dados(contas, start_date, end_date, janela_dias, session_key, prev_start_override=None, prev_end_override=None, empresa=None):
+    """Coleta dados das APIs para o período selecionado E para o período anterior (WoW),
+    exibe métricas e salva no session_state para análise posterior.
+    Se prev_start_override e prev_end_override forem fornecidos, usa como período de comparação."""
+    with st.status("🔄 Buscando consultas em paralelo...", expanded=True) as status:
+        rotulos = {
+            "google_degrau": "Google Ads (Degrau)", "google_central": "Google Ads (Central)",
+            "facebook": "Meta Ads (Degrau)", "facebook_central": "Meta Ads (Central)",
+        }
+
+        def _progresso(chave, resultado, concluidas, total):
+            fonte, periodo = chave
+            rotulo = f"{rotulos[fonte]} — período {periodo}"
+            if resultado['erro']:
+                status.write(f"⚠️ {rotulo}: {resultado['erro']}")
             else:
-                st.warning("⚠️ Não foi possível conectar ao Meta Ads (Central)")
+                qtd = len(resultado['dados']) if resultado['dados'] is not None else 0
+                status.write(f"✅ {rotulo}: {qtd} campanha(s) em {resultado['duracao']:.1f}s")
+            status.update(label=f"🔄 Coleta {concluidas}/{total}...")
+
+        coleta = coletar_dados_ads(
+            contas, start_date, end_date, janela_dias, empresa=empresa,
+            prev_start_override=prev_start_override, prev_end_override=prev_end_override,
+            callback=_progresso,
+        )
+        if coleta["erros"]:
+            status.update(label=f"⚠️ Coleta concluída com {len(coleta['erros'])} falha(s)", state="error", expanded=True)
+        else:
+            status.update(label="✅ Coleta concluída", state="complete", expanded=False)
+    for aviso in coleta["avisos"]:
+        st.warning(aviso)
 
-    if df_google_degrau.empty and df_google_central.empty and df_facebook.empty and df_facebook_central.empty:
+    dfs = coleta["dfs"]
+    df_google_degrau = dfs["google_degrau"]
+    df_google_central = dfs["google_central"]
+    df_facebook = dfs["facebook"]
+    df_facebook_central = dfs["facebook_central"]
+
+    if coleta["dados_consolidados"] is None:
         st.error("❌ Nenhum dado coletado. Verifique as credenciais e o período.")
         return
 
@@ -3218,22 +3329,10 @@ def _coletar_dados(contas, start_date, end_date, janela_dias, session_key, prev_
         if not df_google_central.empty:
             _mostrar_tabelas_google_ads(df_google_central, "Google Ads — Central")
 
-    dados_consolidados = formatar_dados_para_claude(
-        df_google_degrau, df_google_central, df_facebook, janela_dias,
-        df_facebook_central=df_facebook_central,
-        start_date=start_date, end_date=end_date,
-        prev_google_degrau=prev_google_degrau,
-        prev_google_central=prev_google_central,
-        prev_facebook=prev_facebook,
-        prev_facebook_central=prev_facebook_central,
-        prev_start_date=prev_start_date,
-        prev_end_date=prev_end_date,
-        empresa=empresa,
-    )
-
+    dados_consolidados = coleta["dados_consolidados"]
     st.session_state[session_key] = {
         "dados_consolidados": dados_consolidados,
-        "data_ref": data_ref,
+        "data_ref": coleta["data_ref"],
     }
     st.success("✅ Dados coletados! Revise abaixo e clique em 'Analisar com IA' quando estiver pronto.")
     with st.expander("📋 Ver dados que serão enviados à IA", expanded=True):
@@ -3250,12 +3349,10 @@ def _enviar_para_ia(session_key, system_prompt, tipo):
     dados_consolidados = dados["dados_consolidados"]
     data_ref = dados["data_ref"]
 
-    with st.spinner("🤖 Analisando com Claude..."):
-        analise = analisar_com_claude(dados_consolidados, system_prompt, tipo)
-
-    icone = "🚨" if tipo == "alerta" else "🤖"
-    st.subheader(f"{icone} Análise do Claude")
-    _renderizar_analise(analise, tipo)
+    estado = _analisar_em_streaming(dados_consolidados, system_prompt, tipo, session_key, data_ref)
+    if not estado["concluido"]:
+        return
+    analise = estado["texto"]
 
     filepath = salvar_relatorio(analise, dados_consolidados, data_ref, tipo)
     if filepath == "db":
@@ -11,17 +11,11 @@ import json
 from utils.sql_loader import carregar_dados
 from utils.transcricao_analyzer import TranscricaoAnalyzer
 from utils.transcricao_mysql_writer import atualizar_avaliacao_transcricao
+from utils import avaliacao_cache, batch_avaliacoes, fila_avaliacoes
 from utils.analise_helpers import _cor_nota
-from utils.transcricoes_loader import carregar_detalhe_transcricao
+from utils.transcricoes_loader import carregar_detalhe_transcricao, carregar_detalhes_transcricoes
 from utils.venda_consultiva_core import montar_contexto_qualificacao
 
-try:
-    from utils.crm_sync_writer import (crm_sync_habilitado, montar_payload_crm,
-                                       sincronizar_interacao_crm)
-except Exception:  # módulo opcional até o deploy completo do CRM sync
-    def crm_sync_habilitado():
-        return False
-
 TIMEZONE = 'America/Sao_Paulo'
 
 # ──────────────────────────────────────────────
@@ -133,41 +127,6 @@ def _contexto_da_row(row_data) -> dict:
     )
 
 
-def _crm_sync_ligacao(tid, row_data, analise, transcricao):
-    """Envia transcrição + inteligência do LEAD ao CRM (nunca a avaliação do
-    vendedor — ver política em utils/crm_sync_writer.py). Ativo apenas com
-    CRM_SYNC_ENABLED=1 e oportunidade vinculada."""
-    if not crm_sync_habilitado():
-        return
-    try:
-        op_id = row_data.get('oportunidade_id')
-    except Exception:
-        op_id = None
-    try:
-        op_id = int(op_id) if op_id is not None and str(op_id).strip() not in ('', 'nan', 'None') else None
-    except (TypeError, ValueError):
-        op_id = None
-    if not op_id or not analise.get('deve_avaliar'):
-        return
-    try:
-        ai_eval = json.loads(analise.get('avaliacao_completa') or '{}')
-    except (TypeError, ValueError):
-        ai_eval = {}
-    try:
-        _payload = montar_payload_crm(
-            opportunity_id=op_id,
-            canal='ligacao',
-            origem_id=str(tid),
-            transcript=transcricao,
-            ai_evaluation=ai_eval,
-            data_evento=str(row_data.get('data_ligacao')) if row_data.get('data_ligacao') is not None else None,
-            agente=str(row_data.get('agente')) if row_data.get('agente') is not None else None,
-        )
-        sincronizar_interacao_crm(_payload)
-    except Exception:
-        pass
-
-
 def _limpar_selecao():
     st.session_state.transcricoes_selecionadas = []
     for key in list(st.session_state.keys()):
@@ -176,249 +135,145 @@ def _limpar_selecao():
 
 
 # ──────────────────────────────────────────────
-# EXECUÇÃO EM LOTE
+# AVALIAÇÃO EM LOTE (fila + avaliacao_worker.py)
 # ──────────────────────────────────────────────
-def _executar_avaliacoes(df_base: pd.DataFrame, ids_selecionados: list):
-    if not ids_selecionados:
-        return
+# Campos da linha que o worker/poller precisam para gravar o resultado
+_CAMPOS_META = ('data_trancricao', 'agente', 'duracao', 'telefone_lead',
+                'tipo_ligacao', 'oportunidade_id', 'data_ligacao')
 
-    import threading
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-
-    # Instância compartilhada — OpenAI client é thread-safe
-    ia = TranscricaoAnalyzer()
-    total = len(ids_selecionados)
-    bar = st.progress(0)
-    status_txt = st.empty()
-
-    # Estado compartilhado entre threads (protegido por lock)
-    lock = threading.Lock()
-    concluidos = [0]
-    sucesso_count = [0]
-    erros_count = [0]
-    mensagens = []  # coletadas nas threads, exibidas no final (thread-safe)
-
-    # Monta lista de tarefas com dados já extraídos do DataFrame
-    tasks = []
-    for tid in ids_selecionados:
-        row_list = df_base[df_base['transcricao_id'] == tid]
-        row_data = row_list.iloc[0] if not row_list.empty else {}
-        nome = row_data.get('nome_lead', f'ID {tid}') if not row_list.empty else f'ID {tid}'
-        detalhe = carregar_detalhe_transcricao(tid)
-        tx = detalhe.get('transcricao', '') or ''
-        tasks.append((tid, nome, tx, row_data if not row_list.empty else {}))
-
-    def _avaliar_uma(task):
-        tid, nome, tx, row_data = task
-
-        if not tx or len(tx.strip()) < 500:
-            return (tid, nome, 'insuficiente', None)
 
-        try:
-            analise = ia.analisar_transcricao(tx, contexto_adicional=_contexto_da_row(row_data))
-            if analise.get('erro'):
-                return (tid, nome, 'erro_ia', analise['erro'])
-
-            # Se a IA classificou como não-venda, montar insight mínimo
-            insight_para_salvar = analise.get('avaliacao_completa')
-            if not insight_para_salvar and not analise.get('deve_avaliar'):
-                insight_para_salvar = json.dumps({
-                    'classificacao_ligacao': analise.get('classificacao_ligacao', 'outros'),
-                    'motivo': analise.get('motivo', ''),
-                }, ensure_ascii=False)
-
-            ok, err = atualizar_avaliacao_transcricao(
-                transcricao_id=tid,
-                insight_ia=insight_para_salvar,
-                evaluation_ia=analise.get('nota_vendedor'),
-                created_at=row_data.get('data_trancricao'),
-                agent=row_data.get('agente'),
-                duration=row_data.get('duracao'),
-                phone=row_data.get('telefone_lead'),
-                type_=row_data.get('tipo_ligacao'),
-                vendedor_disclaimer=analise.get('vendedor_disclaimer'),
-                lead_disclaimer=analise.get('lead_disclaimer'),
-            )
-            if ok:
-                _crm_sync_ligacao(tid, row_data, analise, tx)
-                return (tid, nome, 'ok', None)
-            return (tid, nome, 'erro_db', err or 'Erro desconhecido')
-
-        except Exception as e:
-            return (tid, nome, 'excecao', str(e))
-
-    # 4 workers: bom equilíbrio entre paralelismo e limites de rate da API
-    MAX_WORKERS = min(4, total)
-
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(_avaliar_uma, t): t for t in tasks}
-        for future in as_completed(futures):
-            tid, nome, status_r, detalhe = future.result()
-            with lock:
-                concluidos[0] += 1
-                bar.progress(concluidos[0] / total)
-                status_txt.text(f"Concluídas {concluidos[0]}/{total} ({MAX_WORKERS} em paralelo)...")
-                if status_r == 'ok':
-                    sucesso_count[0] += 1
-                else:
-                    erros_count[0] += 1
-                    if status_r == 'insuficiente':
-                        mensagens.append(('warning', f"Transcrição insuficiente: {nome}"))
-                    elif status_r == 'erro_db':
-                        mensagens.append(('error', f"Erro ao salvar {nome}: {detalhe}"))
-                        st.session_state.ultimo_erro = detalhe
-                    else:
-                        mensagens.append(('error', f"Erro em {nome}: {detalhe}"))
+def _enfileirar(df_linhas: pd.DataFrame, minimo_chars: int, rotulo: str):
+    """Enfileira as ligações para o avaliacao_worker.py. A página só guarda o
+    lote em session_state e acompanha o progresso (ver _painel_fila): rerun,
+    troca de página ou aba fechada não interrompem a avaliação."""
+    if df_linhas.empty:
+        return
 
-    bar.empty()
-    status_txt.empty()
+    itens = [{
+        'item_id': row.get('transcricao_id'),
+        'payload': {
+            'meta': {c: row.get(c) for c in _CAMPOS_META},
+            'contexto_adicional': _contexto_da_row(row),
+            'minimo_chars': minimo_chars,
+        },
+    } for _, row in df_linhas.iterrows() if pd.notna(row.get('transcricao_id'))]
+
+    resumo = fila_avaliacoes.enfileirar('ligacao', itens)
+    st.session_state.setdefault('transcricoes_lotes_fila', []).append(
+        {'lote': resumo['lote'], 'rotulo': rotulo, 'total': resumo['enfileirados'],
+         'cache_antes': avaliacao_cache.estatisticas("ligacao")}
+    )
     st.session_state.transcricoes_selecionadas = []
+    st.success(f"✅ {resumo['enfileirados']} ligação(ões) na fila de avaliação.")
+    if resumo['duplicados']:
+        st.info(f"{resumo['duplicados']} já estava(m) na fila e foi(ram) ignorada(s).")
 
-    # Exibe mensagens coletadas (chamadas Streamlit apenas no thread principal)
-    for tipo, msg in mensagens:
-        if tipo == 'warning':
-            st.warning(msg)
-        else:
-            st.error(msg)
 
-    if sucesso_count[0]:
-        carregar_transcricoes_base.clear()
-        st.success(f"✅ {sucesso_count[0]} avaliação(ões) concluída(s).")
-        if erros_count[0]:
-            st.warning(f"⚠️ {erros_count[0]} erro(s).")
-        st.rerun()
-    elif erros_count[0]:
-        st.warning(f"⚠️ {erros_count[0]} erro(s). Nenhuma avaliação salva.")
+def _resumo_cache(item: dict):
+    """Acertos do cache de avaliações durante o lote (as estatísticas ficam no
+    SQLite do cache, gravadas pelo worker; lotes simultâneos se somam)."""
+    antes, depois = item.get('cache_antes'), item.get('cache_depois')
+    if not antes or not depois:
+        return
+    cache_hits = depois['hits'] - antes['hits']
+    cache_consultas = cache_hits + depois['misses'] - antes['misses']
+    cache_tokens = depois['tokens_poupados'] - antes['tokens_poupados']
+    if cache_consultas:
+        st.caption(
+            f"⚡ Sem mudança (cache): **{cache_hits}/{cache_consultas}** "
+            f"({cache_hits / cache_consultas:.0%}) — ~{cache_tokens:,} tokens poupados"
+        )
 
 
-# ──────────────────────────────────────────────
-# REAVALIAÇÃO EM LOTE (economia de tokens)
-# ──────────────────────────────────────────────
-def _executar_reavaliacao(df_avaliadas: pd.DataFrame):
-    """
-    Reavalia transcrições já avaliadas usando prompt otimizado.
-    Economia de tokens:
-    - Heurísticas expandidas eliminam chamadas NA sem usar API
-    - Classificação usa modelo leve (~300 tokens)
-    - Prompt de reavaliação ~50% menor que avaliação completa
-    """
-    if df_avaliadas.empty:
+@st.fragment(run_every=5)
+def _painel_fila():
+    """Progresso dos lotes enfileirados nesta sessão (atualiza a cada 5 s)."""
+    lotes = st.session_state.get('transcricoes_lotes_fila') or []
+    if not lotes:
         return
 
-    import threading
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-
-    ia = TranscricaoAnalyzer()
-    total = len(df_avaliadas)
-    bar = st.progress(0)
-    status_txt = st.empty()
-
-    lock = threading.Lock()
-    concluidos = [0]
-    sucesso_count = [0]
-    na_count = [0]
-    erros_count = [0]
-    tokens_total = [0]
-    mensagens = []
-
-    tasks = []
-    for _, row in df_avaliadas.iterrows():
-        tid = row.get('transcricao_id')
-        nome = row.get('nome_lead', f'ID {tid}')
-        detalhe = carregar_detalhe_transcricao(tid)
-        tx = detalhe.get('transcricao', '') or ''
-        insight_existente = str(row.get('insight_ia', '') or '')
-        tasks.append((tid, nome, tx, insight_existente, row))
-
-    def _reavaliar_uma(task):
-        tid, nome, tx, insight_existente, row_data = task
-
-        if not tx or len(tx.strip()) < 50:
-            return (tid, nome, 'insuficiente', None, 0)
+    if not fila_avaliacoes.workers_ativos():
+        st.warning(
+            "⚠️ Nenhum worker de avaliação ativo — os itens ficam na fila até alguém rodar "
+            "`python3 avaliacao_worker.py` no servidor."
+        )
 
-        try:
-            # Nova versão: analisar_transcricao faz tudo (triagem + avaliação)
-            analise = ia.analisar_transcricao(tx, contexto_adicional=_contexto_da_row(row_data))
-
-            if analise.get('erro'):
-                return (tid, nome, 'erro_ia', analise['erro'], 0)
-
-            status_r = 'na' if analise.get('lead_classificacao') == 'NA' or not analise.get('deve_avaliar') else 'reavaliada'
-
-            # Se a IA classificou como não-venda, montar insight mínimo
-            insight_para_salvar = analise.get('avaliacao_completa')
-            if not insight_para_salvar and not analise.get('deve_avaliar'):
-                insight_para_salvar = json.dumps({
-                    'classificacao_ligacao': analise.get('classificacao_ligacao', 'outros'),
-                    'motivo': analise.get('motivo', ''),
-                }, ensure_ascii=False)
-
-            ok, err = atualizar_avaliacao_transcricao(
-                transcricao_id=tid,
-                insight_ia=insight_para_salvar,
-                evaluation_ia=analise.get('nota_vendedor'),
-                created_at=row_data.get('data_trancricao'),
-                agent=row_data.get('agente'),
-                duration=row_data.get('duracao'),
-                phone=row_data.get('telefone_lead'),
-                type_=row_data.get('tipo_ligacao'),
-                vendedor_disclaimer=analise.get('vendedor_disclaimer'),
-                lead_disclaimer=analise.get('lead_disclaimer'),
-            )
-            if ok:
-                _crm_sync_ligacao(tid, row_data, analise, tx)
-                return (tid, nome, status_r, analise.get('motivo', 'Reavaliação completa'), 0)
-            return (tid, nome, 'erro_db', err or 'Erro desconhecido', 0)
-
-        except Exception as e:
-            return (tid, nome, 'excecao', str(e), 0)
-
-    MAX_WORKERS = min(4, total)
-
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(_reavaliar_uma, t): t for t in tasks}
-        for future in as_completed(futures):
-            tid, nome, status_r, detalhe, tokens = future.result()
-            with lock:
-                concluidos[0] += 1
-                tokens_total[0] += tokens
-                bar.progress(concluidos[0] / total)
-                status_txt.text(
-                    f"Reavaliadas {concluidos[0]}/{total} "
-                    f"(NA: {na_count[0]} | tokens: ~{tokens_total[0]:,})"
-                )
-                if status_r in ('reavaliada', 'na'):
-                    sucesso_count[0] += 1
-                    if status_r == 'na':
-                        na_count[0] += 1
-                elif status_r == 'insuficiente':
-                    erros_count[0] += 1
-                    mensagens.append(('warning', f"Transcrição insuficiente: {nome}"))
-                else:
-                    erros_count[0] += 1
-                    mensagens.append(('error', f"Erro em {nome}: {detalhe}"))
+    for item in list(lotes):
+        prog = fila_avaliacoes.progresso(item['lote'])
+        if not prog['total']:
+            lotes.remove(item)
+            continue
+        feitos = prog['concluido'] + prog['falhou']
+        st.progress(
+            feitos / prog['total'],
+            text=f"{item['rotulo']}: {feitos}/{prog['total']} "
+                 f"(executando: {prog['executando']} | falhas: {prog['falhou']})",
+        )
+        if prog['finalizado']:
+            if not item.get('finalizado'):
+                item['finalizado'] = True
+                item['cache_depois'] = avaliacao_cache.estatisticas("ligacao")
+                carregar_transcricoes_base.clear()
+            _resumo_cache(item)
+            for erro in prog['erros']:
+                st.error(erro)
+            col_r, col_o = st.columns(2)
+            if prog['falhou'] and col_r.button("🔁 Tentar falhas de novo", key=f"reabrir_{item['lote']}"):
+                fila_avaliacoes.reabrir_falhas(item['lote'])
+                item['finalizado'] = False
+                st.rerun(scope="fragment")
+            if col_o.button("OK", key=f"ok_{item['lote']}"):
+                lotes.remove(item)
+                st.rerun()
 
-    bar.empty()
-    status_txt.empty()
 
-    for tipo, msg in mensagens:
-        if tipo == 'warning':
-            st.warning(msg)
-        else:
-            st.error(msg)
+# ──────────────────────────────────────────────
+# ENVIO VIA BATCH API (50% do custo, resultado em até 24h)
+# ──────────────────────────────────────────────
+def _enviar_batch(df_linhas: pd.DataFrame, minimo_chars: int):
+    """Envia as ligações para a Batch API. A coleta e a gravação no banco ficam
+    com o batch_poller_cron.py (ou com o botão de coleta abaixo)."""
+    if df_linhas.empty:
+        return
 
-    if sucesso_count[0]:
-        carregar_transcricoes_base.clear()
+    itens, insuficientes = [], 0
+    with st.spinner(f"Preparando {len(df_linhas)} transcrição(ões) para o batch..."):
+        detalhes = carregar_detalhes_transcricoes(df_linhas['transcricao_id'].dropna().astype(int))
+        for _, row in df_linhas.iterrows():
+            tid = row.get('transcricao_id')
+            tx = detalhes.get(str(int(tid)), {}).get('transcricao', '') if pd.notna(tid) else ''
+            if len(tx.strip()) < minimo_chars:
+                insuficientes += 1
+                continue
+            itens.append({
+                'transcricao_id': tid,
+                'transcricao': tx,
+                'contexto_adicional': _contexto_da_row(row),
+                'meta': {c: row.get(c) for c in _CAMPOS_META},
+            })
+
+    if not itens:
+        st.warning("Nenhuma transcrição com conteúdo suficiente para o batch.")
+        return
+
+    with st.spinner(f"Enviando {len(itens)} transcrição(ões) para a Batch API..."):
+        resumo = batch_avaliacoes.enviar_ligacoes(itens)
+
+    if resumo['batch_id']:
         st.success(
-            f"✅ Reavaliação concluída: **{sucesso_count[0]}** processada(s)\n\n"
-            f"- 🔄 Reavaliadas via IA: **{sucesso_count[0] - na_count[0]}**\n"
-            f"- 🚫 Reclassificadas como NA: **{na_count[0]}** (0 tokens)\n"
-            f"- 🪙 Tokens estimados: **~{tokens_total[0]:,}**\n"
-            f"- ❌ Erros: **{erros_count[0]}**"
+            f"✅ Batch criado: `{resumo['batch_id']}` — {resumo['enviados']} ligação(ões). "
+            "Os resultados são coletados e salvos automaticamente pelo poller "
+            "(batch_poller_cron.py) assim que o batch terminar."
         )
-        st.rerun()
-    elif erros_count[0]:
-        st.warning(f"⚠️ {erros_count[0]} erro(s). Nenhuma reavaliação salva.")
+    if resumo['resolvidos']:
+        st.info(f"⚡ {resumo['resolvidos']} resolvida(s) sem API (triagem/cache): {resumo['salvos']} salva(s) agora.")
+    if insuficientes:
+        st.caption(f"{insuficientes} transcrição(ões) insuficiente(s) ignorada(s).")
+    for erro in resumo['erros']:
+        st.error(erro)
+    st.session_state.transcricoes_selecionadas = []
+    if resumo['salvos']:
+        carregar_transcricoes_base.clear()
 
 
 # ──────────────────────────────────────────────
@@ -487,6 +342,8 @@ def run_page():
     c3.metric("Avaliadas", avaliadas)
     c4.metric("Pendentes", max(0, pendentes))
 
+    _painel_fila()
+
     # ── Reavaliação do período ────────────────────
     if avaliadas > 0:
         with st.expander(f"🔄 Reavaliar período ({avaliadas} avaliada(s))", expanded=False):
@@ -510,8 +367,14 @@ def run_page():
                     type="primary",
                     key="btn_reavaliar_periodo"
                 ):
-                    df_avaliadas_periodo = df_f[df_f['avaliada']].copy()
-                    _executar_reavaliacao(df_avaliadas_periodo)
+                    _enfileirar(df_f[df_f['avaliada']].copy(), minimo_chars=50,
+                                rotulo=f"Reavaliação do período ({avaliadas})")
+                if st.button(
+                    f"📦 Reavaliar {avaliadas} via Batch API (50% do custo, até 24h)",
+                    key="btn_reavaliar_periodo_batch",
+                    help="Não prende a tela: os resultados são gravados pelo poller de batches",
+                ):
+                    _enviar_batch(df_f[df_f['avaliada']].copy(), minimo_chars=50)
 
     # ── Gráfico rápido: ligações por data ────────────────
     _df_por_data = df_f.copy()
@@ -600,7 +463,18 @@ def run_page():
                 n_sel = len(st.session_state.transcricoes_selecionadas)
                 if n_sel > 0:
                     if st.button(f"🤖 Avaliar {n_sel} selecionada(s)", type="primary", key="btn_avaliar_top"):
-                        _executar_avaliacoes(df_t1, st.session_state.transcricoes_selecionadas)
+                        _enfileirar(
+                            df_t1[df_t1['transcricao_id'].isin(st.session_state.transcricoes_selecionadas)],
+                            minimo_chars=500, rotulo=f"Avaliação de {n_sel} ligação(ões)",
+                        )
+            with col_av:
+                if n_sel > 0:
+                    if st.button(f"📦 Batch API ({n_sel}, 50% do custo)", key="btn_batch_top",
+                                 help="Envia para processamento em até 24h; o poller grava os resultados"):
+                        _enviar_batch(
+                            df_t1[df_t1['transcricao_id'].isin(st.session_state.transcricoes_selecionadas)],
+                            minimo_chars=500,
+                        )
 
             # ── tabela compacta ──
             df_tabela = fatia[[
@@ -705,7 +579,10 @@ def run_page():
                         st.rerun()
                 with col_b3:
                     if st.button(f"🤖 Avaliar {n_sel}", type="primary"):
-                        _executar_avaliacoes(df_t1, st.session_state.transcricoes_selecionadas)
+                        _enfileirar(
+                            df_t1[df_t1['transcricao_id'].isin(st.session_state.transcricoes_selecionadas)],
+                            minimo_chars=500, rotulo=f"Avaliação de {n_sel} ligação(ões)",
+                        )
 
     # ════════════════════════════════════════════
     # TAB 2 — AVALIAÇÕES
@@ -948,24 +825,29 @@ def run_page():
     # ══════════════════════════════════════════════════════════════
     st.divider()
     with st.expander("📦 Consultar / Coletar Resultados de Batch", expanded=False):
-        st.markdown("Verifique o andamento de um batch enviado à Anthropic e colete os resultados quando estiver pronto.")
+        st.markdown(
+            "Batches enviados por esta página são coletados e salvos automaticamente pelo "
+            "`batch_poller_cron.py`. Use os botões abaixo para acompanhar ou forçar a coleta."
+        )
 
-        _session_ids = st.session_state.get('transcricao_batch_ids', [])
+        _lotes = batch_avaliacoes.listar(canal='ligacao', limite=20)
+        if _lotes:
+            st.dataframe(pd.DataFrame([{
+                'Batch': _l['batch_id'],
+                'Status': _l['status'],
+                'Anthropic': _l['processing_status'] or '—',
+                'Itens': _l['total'],
+                'Salvos': _l['salvos'] if _l['salvos'] is not None else '—',
+                'Criado em': datetime.fromtimestamp(_l['criado_em']).strftime('%d/%m/%Y %H:%M'),
+            } for _l in _lotes]), use_container_width=True, hide_index=True)
+
+        _abertos = [_l['batch_id'] for _l in _lotes if _l['status'] == 'aberto']
         _batch_input = st.text_input(
             "ID do Batch (ex: msgbatch_xxxxx):",
-            value=_session_ids[-1] if _session_ids else "",
+            value=_abertos[0] if _abertos else "",
             key="transcricao_batch_id_input",
         )
 
-        if _session_ids:
-            _sel_batch = st.selectbox(
-                "Ou escolha um dos batches desta sessão:",
-                options=["— digitar manualmente —"] + _session_ids[::-1],
-                key="transcricao_batch_sel_session",
-            )
-            if _sel_batch != "— digitar manualmente —":
-                _batch_input = _sel_batch
-
         _col_b1, _col_b2 = st.columns(2)
 
         with _col_b1:
@@ -1024,38 +906,21 @@ def run_page():
                 disabled=not _coleta_ok,
                 help="Disponível após consultar e confirmar que o batch está finalizado (ended)",
             ):
-                _ia2 = TranscricaoAnalyzer()
+                _bid = _batch_input.strip()
+                if batch_avaliacoes.obter(_bid) is None:
+                    # Batch criado fora desta página: grava sem os metadados da linha
+                    batch_avaliacoes.registrar(_bid, 'ligacao', {})
                 with st.spinner("Coletando resultados do batch..."):
-                    _resultados = _ia2.coletar_resultados_batch(_batch_input.strip())
+                    _resumo = batch_avaliacoes.coletar(_bid)
 
-                if not _resultados:
+                if _resumo['status'] != 'coletado':
                     st.warning("Nenhum resultado retornado ou batch ainda não finalizado.")
+                    for _e in _resumo.get('erros', []):
+                        st.caption(_e)
                 else:
-                    _sucesso, _erros = 0, []
-                    for _res in _resultados:
-                        _tid_raw = _res.get('transcricao_id', '')
-                        try:
-                            _tid = int(_tid_raw)
-                        except (ValueError, TypeError):
-                            _erros.append(f"ID inválido: {_tid_raw}")
-                            continue
-                        if _res.get('erro'):
-                            _erros.append(f"{_tid}: {_res['erro']}")
-                            continue
-                        _ok_save, _msg_save = atualizar_avaliacao_transcricao(
-                            transcricao_id=_tid,
-                            insight_ia=_res.get('avaliacao_completa'),
-                            evaluation_ia=_res.get('nota_vendedor'),
-                            vendedor_disclaimer=_res.get('vendedor_disclaimer'),
-                            lead_disclaimer=_res.get('lead_disclaimer'),
-                        )
-                        if _ok_save:
-                            _sucesso += 1
-                        else:
-                            _erros.append(f"{_tid}: {_msg_save}")
-
-                    st.success(f"🎉 {_sucesso}/{len(_resultados)} avaliações salvas.")
-                    if _sucesso:
+                    _erros = _resumo.get('erros', [])
+                    st.success(f"🎉 {_resumo['salvos']} avaliação(ões) salvas.")
+                    if _resumo['salvos']:
                         st.cache_data.clear()
                     if _erros:
                         with st.expander(f"⚠️ {len(_erros)} erros"):
@@ -16,36 +16,28 @@ import streamlit as st
 from dotenv import load_dotenv
 
 import octadesk_db
+from utils import batch_avaliacoes, fila_avaliacoes
 from utils.chat_ia_analyzer import (ChatIAAnalyzer, filtrar_mensagens_bot,
                                     verificar_avaliabilidade)
 from utils.chat_mysql_writer import salvar_avaliacao_chat
 from utils.sql_loader import carregar_dados
 from utils.venda_consultiva_core import montar_contexto_qualificacao
 
-try:
-    from utils.crm_sync_writer import (crm_sync_habilitado, montar_payload_crm,
-                                       sincronizar_interacao_crm)
-except Exception:  # módulo opcional até o deploy completo do CRM sync
-    def crm_sync_habilitado():
-        return False
-
 load_dotenv()
 TIMEZONE = 'America/Sao_Paulo'
 
 # ── Manifestos de batch: preservam oportunidade/metadados entre a criação
-#    do batch (Anthropic) e a coleta dos resultados (horas/dias depois). ──
+#    do batch (Anthropic) e a coleta dos resultados (horas/dias depois).
+#    Ficam no registro utils.batch_avaliacoes, de onde o batch_poller_cron.py
+#    coleta e grava sozinho; BATCH_MANIFEST_DIR só é lido para batches antigos. ──
 BATCH_MANIFEST_DIR = os.path.join(os.path.dirname(__file__), '..', 'batch_manifests')
 
 
 def _salvar_manifest_batch(batch_id: str, meta_por_chat: dict):
     try:
-        os.makedirs(BATCH_MANIFEST_DIR, exist_ok=True)
-        import json as _json
-        path = os.path.join(BATCH_MANIFEST_DIR, f"{batch_id}.json")
-        with open(path, 'w', encoding='utf-8') as f:
-            _json.dump(meta_por_chat, f, ensure_ascii=False)
+        batch_avaliacoes.registrar(batch_id, 'whatsapp', meta_por_chat)
     except Exception as e:
-        st.warning(f"⚠️ Não foi possível salvar o manifest do batch: {e}")
+        st.warning(f"⚠️ Não foi possível registrar o manifest do batch: {e}")
 
 
 def _carregar_manifest_batch(batch_id: str) -> dict:
@@ -59,6 +51,85 @@ def _carregar_manifest_batch(batch_id: str) -> dict:
         pass
     return {}
 
+def _meta_gravacao_chat(row, transcript: str) -> dict:
+    """Campos da linha que o poller de batches e o avaliacao_worker.py usam
+    para gravar a avaliação (utils.batch_avaliacoes._linha_chat)."""
+    _op_id = row.get('oportunidade_id')
+    try:
+        _op_id = int(_op_id) if pd.notna(_op_id) else None
+    except (ValueError, TypeError):
+        _op_id = None
+
+    _tags_raw = row.get('tags')
+    if isinstance(_tags_raw, list):
+        _tags_str = ', '.join(
+            t.get('name', str(t)) if isinstance(t, dict) else str(t)
+            for t in _tags_raw if t
+        ) or None
+    else:
+        _tags_str = str(_tags_raw) if _tags_raw is not None and str(_tags_raw).strip() else None
+
+    return {
+        'opportunity_id': _op_id,
+        'transcript': transcript,
+        'octa_agent': str(row.get('agent.name', '') or '') or None,
+        'octa_channel': str(row.get('channel', '') or '') or None,
+        'octa_status': str(row.get('status', '') or '') or None,
+        'octa_tags': _tags_str,
+        'octa_group': str(row.get('group.name', '') or '') or None,
+        'octa_origin': str(row.get('conversationOriginLabel', '') or '') or None,
+        'octa_contact_name': str(row.get('contact.name', '') or '') or None,
+        'octa_contact_phone': str(row.get('Telefone Cliente', '') or '') or None,
+        'octa_bot_name': str(row.get('botName', '') or '') or None,
+        'octa_created_at': str(row.get('createdAt', '') or '') or None,
+        'octa_survey_response': str(row.get('conversationOriginLabel', '') or '') or None,
+    }
+
+
+@st.fragment(run_every=5)
+def _painel_fila_chats():
+    """Progresso das avaliações enfileiradas nesta sessão (atualiza a cada 5 s).
+    Quem avalia é o avaliacao_worker.py — a página pode recarregar à vontade."""
+    lotes = st.session_state.get('octa_lotes_fila') or []
+    if not lotes:
+        return
+
+    if not fila_avaliacoes.workers_ativos():
+        st.warning(
+            "⚠️ Nenhum worker de avaliação ativo — os chats ficam na fila até alguém rodar "
+            "`python3 avaliacao_worker.py` no servidor."
+        )
+
+    for item in list(lotes):
+        prog = fila_avaliacoes.progresso(item['lote'])
+        if not prog['total']:
+            lotes.remove(item)
+            continue
+        feitos = prog['concluido'] + prog['falhou']
+        st.progress(
+            feitos / prog['total'],
+            text=f"Avaliando {prog['total']} chats: {feitos}/{prog['total']} "
+                 f"(executando: {prog['executando']} | falhas: {prog['falhou']})",
+        )
+        if prog['finalizado']:
+            if not item.get('finalizado'):
+                item['finalizado'] = True
+                # Recarregar avaliados do banco na próxima renderização completa
+                st.session_state.pop('octa_evaluated_ids', None)
+                st.session_state.pop('octa_df_detalhes', None)
+                st.session_state.pop('octa_df_key', None)
+            for erro in prog['erros']:
+                st.error(f"❌ {erro}")
+            col_r, col_o = st.columns(2)
+            if prog['falhou'] and col_r.button("🔁 Tentar falhas de novo", key=f"octa_reabrir_{item['lote']}"):
+                fila_avaliacoes.reabrir_falhas(item['lote'])
+                item['finalizado'] = False
+                st.rerun(scope="fragment")
+            if col_o.button("OK", key=f"octa_ok_{item['lote']}"):
+                lotes.remove(item)
+                st.rerun()
+
+
 SQL_MATCH_OPORTUNIDADES = os.path.join(
     os.path.dirname(__file__), '..', 'consultas', 'chat_oportunidades',
     'buscar_oportunidades_match.sql'
@@ -221,9 +292,9 @@ def get_octadesk_chats(api_token, base_url, start_date, end_date, max_pages=5, l
         days_ago_end = (today - end_date).days
         is_recent = days_ago_end <= 2
 
-        cached_chats = []
+        cached_chats = pd.DataFrame()
         if not force_api:
-            cached_chats = octadesk_db.get_cached_chats(start_date=start_date, end_date=end_date)
+            cached_chats = octadesk_db.get_cached_chats_df(start_date=start_date, end_date=end_date)
 
         need_api = force_api or is_recent or len(cached_chats) == 0
         api_chats = []
@@ -238,24 +309,17 @@ def get_octadesk_chats(api_token, base_url, start_date, end_date, max_pages=5, l
                 octadesk_db.save_chats(api_chats)
 
             if not is_recent and not force_api:
-                cached_chats = octadesk_db.get_cached_chats(start_date=start_date, end_date=end_date)
-        elif not is_recent and cached_chats:
+                cached_chats = octadesk_db.get_cached_chats_df(start_date=start_date, end_date=end_date)
+        elif not is_recent and not cached_chats.empty:
             st.info(f"📦 Exibindo **{len(cached_chats)}** chats do cache local para este período.")
 
-        seen_ids = set()
-        combined = []
-        for chat in api_chats:
-            chat_id = chat.get('id')
-            if chat_id and chat_id not in seen_ids:
-                seen_ids.add(chat_id)
-                combined.append(chat)
-        for chat in cached_chats:
-            chat_id = chat.get('id')
-            if chat_id and chat_id not in seen_ids:
-                seen_ids.add(chat_id)
-                combined.append(chat)
-
-        if not combined:
+        # API primeiro: em ids repetidos prevalece a versão mais recente
+        frames = [f for f in (octadesk_db.chats_to_df(api_chats), cached_chats) if not f.empty]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if not df.empty:
+            df = df[df['id'].notna()].drop_duplicates(subset='id', keep='first')
+
+        if df.empty:
             cache_stats = octadesk_db.get_cache_stats()
             cache_range = ""
             if cache_stats.get('oldest_chat') and cache_stats.get('newest_chat'):
@@ -272,7 +336,6 @@ def get_octadesk_chats(api_token, base_url, start_date, end_date, max_pages=5, l
             )
             return pd.DataFrame()
 
-        df = pd.json_normalize(combined)
         if 'createdAt' in df.columns:
             df['createdAt'] = pd.to_datetime(df['createdAt'], utc=True, errors='coerce')
             df['createdAt'] = df['createdAt'].dt.tz_convert(TIMEZONE)
@@ -461,26 +524,13 @@ def get_octadesk_messages(api_token, base_url, chats_df, max_chats=20):
     chats_to_fetch = chats_df.head(max_chats)
     chat_ids = [row for row in chats_to_fetch['id'].tolist() if row]
 
-    # ── Fase 1: busca em batch todos os chats que já estão no cache ──────────
-    cached_batch = octadesk_db.get_cached_messages_batch(chat_ids)
-    messages = []
-    missing_ids = []
-
-    for chat_id in chat_ids:
-        if chat_id in cached_batch:
-            for msg in cached_batch[chat_id]:
-                msg["chatId"] = chat_id
-                messages.append(msg)
-        else:
-            missing_ids.append(chat_id)
-
+    # Busca em batch as mensagens já cacheadas (colunas estruturadas, sem JSON).
     # Fora da sincronização manual/cron, a UI trabalha apenas com mensagens já cacheadas.
     # Chats sem cache permanecem pendentes até uma sincronização explícita.
-
-    if not messages:
+    df_messages = octadesk_db.get_cached_messages_df(chat_ids)
+    if df_messages.empty:
         return pd.DataFrame()
 
-    df_messages = pd.json_normalize(messages)
     if 'createdAt' in df_messages.columns:
         df_messages['createdAt'] = pd.to_datetime(df_messages['createdAt'], utc=True, errors='coerce')
         df_messages['createdAt'] = df_messages['createdAt'].dt.tz_convert(TIMEZONE)
@@ -1062,6 +1112,9 @@ def run_page():
                     'Telefone Cliente',
                     df_detalhes['contact.phoneContacts'].apply(_extract_phone)
                 )
+            elif 'phone' in df_detalhes.columns:
+                # Chats vindos do cache já trazem o telefone extraído
+                df_detalhes = df_detalhes.rename(columns={'phone': 'Telefone Cliente'})
 
             cols_remover = [
                 'assignedToGroupDate',
@@ -1345,8 +1398,6 @@ def run_page():
                         for _, row in source_rows.iterrows()
                     }
 
-                    analyzer = ChatIAAnalyzer()
-
                     def _get_clean_value(row, column_name):
                         val = row.get(column_name)
                         if val is None:
@@ -1360,7 +1411,7 @@ def run_page():
                             pass
                         return str(val)
                     
-                    # Montar lista de chats para processamento paralelo
+                    # Aptos vão para a fila de avaliação; inaptos são gravados já
                     chats_para_avaliar = []
                     chats_inaptos = []
                     
@@ -1410,7 +1461,6 @@ def run_page():
                                 'meta': meta
                             })
                     
-                    total = len(chats_para_avaliar) + len(chats_inaptos)
                     sucesso = 0
                     
                     # Salvar inaptos primeiro (sem API)
@@ -1456,93 +1506,25 @@ def run_page():
                         if saved:
                             sucesso += 1
                     
-                    # Processar aptos em paralelo
+                    # Aptos vão para a fila do avaliacao_worker.py
                     if chats_para_avaliar:
-                        progress_bar = st.progress(0, text=f"Avaliando {len(chats_para_avaliar)} chats em paralelo...")
-                        
-                        def _progress_callback(completed, total_chats, chat_id, result):
-                            progress_bar.progress(
-                                completed / total_chats,
-                                text=f"Avaliado {completed}/{total_chats} — último: {chat_id}"
-                            )
-                        
-                        resultados = analyzer.avaliar_lote_paralelo(
-                            chats_para_avaliar,
-                            callback=_progress_callback
+                        resumo = fila_avaliacoes.enfileirar('whatsapp', [{
+                            'item_id': item['chat_id'],
+                            'payload': {
+                                'agent_name': item['agent_name'],
+                                'contexto_adicional': item['contexto_adicional'],
+                                'meta': _meta_gravacao_chat(item['meta']['row'], item['transcript']),
+                            },
+                        } for item in chats_para_avaliar])
+                        st.session_state.setdefault('octa_lotes_fila', []).append({'lote': resumo['lote']})
+                        st.success(
+                            f"✅ {resumo['enfileirados']} chat(s) na fila de avaliação — acompanhe o progresso abaixo."
                         )
-                        
-                        # Salvar resultados no banco
-                        for i, eval_result in enumerate(resultados):
-                            meta = chats_para_avaliar[i]['meta']
-                            row = meta['row']
-                            chat_id = meta['chat_id']
-                            
-                            if eval_result.get('erro'):
-                                st.warning(f"⚠️ Erro ao avaliar {chat_id}: {eval_result['erro']}")
-                            
-                            tags_raw = row.get('tags')
-                            if isinstance(tags_raw, list):
-                                tags_str = ', '.join(
-                                    t.get('name', str(t)) if isinstance(t, dict) else str(t)
-                                    for t in tags_raw if t
-                                ) or None
-                            else:
-                                tags_str = _get_clean_value(row, 'tags')
-                            
-                            matched_op_id = row.get('oportunidade_id')
-                            try:
-                                matched_op_id = int(matched_op_id) if pd.notna(matched_op_id) else None
-                            except (ValueError, TypeError):
-                                matched_op_id = None
-                            
-                            saved, msg = salvar_avaliacao_chat(
-                                opportunity_id=matched_op_id,
-                                chat_id=chat_id,
-                                classification=eval_result.get('classificacao', 'outros'),
-                                classification_reason=eval_result.get('motivo') or '',
-                                ai_evaluation=eval_result.get('ai_evaluation'),
-                                transcript=_analysis_cache.get(chat_id, {}).get('transcricao', ''),
-                                lead_score=eval_result.get('lead_score'),
-                                vendor_score=eval_result.get('vendor_score'),
-                                main_product=eval_result.get('main_product'),
-                                vendedor_disclaimer=eval_result.get('vendedor_disclaimer'),
-                                lead_disclaimer=eval_result.get('lead_disclaimer'),
-                                octa_agent=_get_clean_value(row, 'agent.name'),
-                                octa_channel=_get_clean_value(row, 'channel'),
-                                octa_status=_get_clean_value(row, 'status'),
-                                octa_tags=tags_str,
-                                octa_group=_get_clean_value(row, 'group.name'),
-                                octa_origin=_get_clean_value(row, 'conversationOriginLabel'),
-                                octa_contact_name=_get_clean_value(row, 'contact.name'),
-                                octa_contact_phone=_get_clean_value(row, 'Telefone Cliente'),
-                                octa_bot_name=_get_clean_value(row, 'botName'),
-                                octa_created_at=_get_clean_value(row, 'createdAt'),
-                                octa_survey_response=_get_clean_value(row, 'conversationOriginLabel')
-                            )
-                            if saved:
-                                sucesso += 1
-                                if crm_sync_habilitado() and matched_op_id and eval_result.get('deve_avaliar'):
-                                    try:
-                                        _payload = montar_payload_crm(
-                                            opportunity_id=matched_op_id,
-                                            canal='whatsapp',
-                                            origem_id=chat_id,
-                                            transcript=_analysis_cache.get(chat_id, {}).get('transcricao', ''),
-                                            ai_evaluation=eval_result.get('ai_evaluation'),
-                                            data_evento=_get_clean_value(row, 'createdAt'),
-                                            agente=_get_clean_value(row, 'agent.name'),
-                                        )
-                                        _ok_crm, _msg_crm = sincronizar_interacao_crm(_payload)
-                                        if not _ok_crm:
-                                            st.caption(f"⚠️ CRM sync ({chat_id}): {_msg_crm}")
-                                    except Exception as _crm_e:
-                                        st.caption(f"⚠️ CRM sync falhou p/ {chat_id}: {_crm_e}")
-                            else:
-                                st.error(f"❌ Falha banco {chat_id}: {msg}")
-                        
-                        progress_bar.progress(1.0, text="✅ Concluído!")
-                    
-                    st.success(f"🎉 {sucesso}/{total} avaliações salvas com sucesso.")
+                        if resumo['duplicados']:
+                            st.info(f"{resumo['duplicados']} chat(s) já estava(m) na fila e foi(ram) ignorado(s).")
+
+                    if chats_inaptos:
+                        st.success(f"🎉 {sucesso}/{len(chats_inaptos)} chat(s) inapto(s) salvos com sucesso.")
                     if sucesso > 0:
                         # Invalidar cache para recarregar avaliados do banco na próxima renderização
                         st.session_state.pop('octa_evaluated_ids', None)
@@ -1572,21 +1554,6 @@ def run_page():
                         if not chat_id or not chat_ctx.get('avaliavel'):
                             continue
 
-                        _op_id = row.get('oportunidade_id')
-                        try:
-                            _op_id = int(_op_id) if pd.notna(_op_id) else None
-                        except (ValueError, TypeError):
-                            _op_id = None
-
-                        _tags_raw = row.get('tags')
-                        if isinstance(_tags_raw, list):
-                            _tags_str = ', '.join(
-                                t.get('name', str(t)) if isinstance(t, dict) else str(t)
-                                for t in _tags_raw if t
-                            ) or None
-                        else:
-                            _tags_str = str(_tags_raw) if _tags_raw is not None and str(_tags_raw).strip() else None
-
                         chats_batch.append({
                             'chat_id': chat_id,
                             'transcript': chat_ctx.get('transcricao', ''),
@@ -1600,21 +1567,7 @@ def run_page():
                                 canal_octa=str(row.get('channel')) if row.get('channel') is not None else None,
                             ),
                         })
-                        manifest_meta[chat_id] = {
-                            'opportunity_id': _op_id,
-                            'transcript': chat_ctx.get('transcricao', ''),
-                            'octa_agent': str(row.get('agent.name', '') or '') or None,
-                            'octa_channel': str(row.get('channel', '') or '') or None,
-                            'octa_status': str(row.get('status', '') or '') or None,
-                            'octa_tags': _tags_str,
-                            'octa_group': str(row.get('group.name', '') or '') or None,
-                            'octa_origin': str(row.get('conversationOriginLabel', '') or '') or None,
-                            'octa_contact_name': str(row.get('contact.name', '') or '') or None,
-                            'octa_contact_phone': str(row.get('Telefone Cliente', '') or '') or None,
-                            'octa_bot_name': str(row.get('botName', '') or '') or None,
-                            'octa_created_at': str(row.get('createdAt', '') or '') or None,
-                            'octa_survey_response': str(row.get('conversationOriginLabel', '') or '') or None,
-                        }
+                        manifest_meta[chat_id] = _meta_gravacao_chat(row, chat_ctx.get('transcricao', ''))
 
                     if chats_batch:
                         with st.spinner(f"Enviando {len(chats_batch)} chats para Batch API..."):
@@ -1623,7 +1576,7 @@ def run_page():
                         if batch_id:
                             _salvar_manifest_batch(batch_id, manifest_meta)
                             st.success(f"✅ Batch criado: `{batch_id}` — {len(chats_batch)} chats. Resultados em até 24h (geralmente minutos).")
-                            st.info("Use o Batch ID para consultar resultados depois.")
+                            st.info("Os resultados são coletados e salvos automaticamente pelo poller (batch_poller_cron.py); o Batch ID também pode ser consultado abaixo.")
                             # Salvar batch_id no session_state para consulta futura
                             if 'batch_ids' not in st.session_state:
                                 st.session_state['batch_ids'] = []
@@ -1640,6 +1593,8 @@ def run_page():
             f"Verifique a data selecionada ou clique em **📥 Sincronizar** para importar dados."
         )
 
+    _painel_fila_chats()
+
     # ══════════════════════════════════════════════════════════════
     # SEÇÃO BATCH — Consulta e coleta de resultados (independente de filtro)
     # ══════════════════════════════════════════════════════════════
@@ -1719,68 +1674,23 @@ def run_page():
                 disabled=not _coleta_ok,
                 help="Disponível após consultar e confirmar que o batch está finalizado (ended)",
             ):
-                _analyzer2 = ChatIAAnalyzer()
+                _bid = batch_input.strip()
+                if batch_avaliacoes.obter(_bid) is None:
+                    _manifest = _carregar_manifest_batch(_bid)
+                    if not _manifest:
+                        st.caption("ℹ️ Manifest do batch não encontrado — salvando sem vínculo de oportunidade/metadados.")
+                    batch_avaliacoes.registrar(_bid, 'whatsapp', _manifest if isinstance(_manifest, dict) else {})
                 with st.spinner("Coletando resultados do batch..."):
-                    _resultados = _analyzer2.coletar_resultados_batch(batch_input.strip())
+                    _resumo = batch_avaliacoes.coletar(_bid)
 
-                if not _resultados:
+                if _resumo['status'] != 'coletado':
                     st.warning("Nenhum resultado retornado ou batch ainda não finalizado.")
+                    for _e in _resumo.get('erros', []):
+                        st.caption(_e)
                 else:
-                    _manifest = _carregar_manifest_batch(batch_input.strip())
-                    if not _manifest:
-                        st.caption("ℹ️ Manifest do batch não encontrado — salvando sem vínculo de oportunidade/metadados.")
-                    _sucesso, _erros = 0, []
-                    for _res in _resultados:
-                        _cid = _res.get('chat_id', '')
-                        if _res.get('erro'):
-                            _erros.append(f"{_cid}: {_res['erro']}")
-                            continue
-                        _meta = _manifest.get(_cid, {}) if isinstance(_manifest, dict) else {}
-                        _saved, _msg = salvar_avaliacao_chat(
-                            opportunity_id=_meta.get('opportunity_id'),
-                            chat_id=_cid,
-                            classification=_res.get('classificacao', 'outros'),
-                            classification_reason=_res.get('motivo', ''),
-                            ai_evaluation=_res.get('ai_evaluation'),
-                            transcript=_meta.get('transcript', ''),
-                            lead_score=_res.get('lead_score'),
-                            vendor_score=_res.get('vendor_score'),
-                            main_product=_res.get('main_product'),
-                            vendedor_disclaimer=_res.get('vendedor_disclaimer'),
-                            lead_disclaimer=_res.get('lead_disclaimer'),
-                            octa_agent=_meta.get('octa_agent'),
-                            octa_channel=_meta.get('octa_channel'),
-                            octa_status=_meta.get('octa_status'),
-                            octa_tags=_meta.get('octa_tags'),
-                            octa_group=_meta.get('octa_group'),
-                            octa_origin=_meta.get('octa_origin'),
-                            octa_contact_name=_meta.get('octa_contact_name'),
-                            octa_contact_phone=_meta.get('octa_contact_phone'),
-                            octa_bot_name=_meta.get('octa_bot_name'),
-                            octa_created_at=_meta.get('octa_created_at'),
-                            octa_survey_response=_meta.get('octa_survey_response'),
-                        )
-                        if _saved:
-                            _sucesso += 1
-                            if crm_sync_habilitado() and _meta.get('opportunity_id') and _res.get('deve_avaliar'):
-                                try:
-                                    _payload = montar_payload_crm(
-                                        opportunity_id=_meta['opportunity_id'],
-                                        canal='whatsapp',
-                                        origem_id=_cid,
-                                        transcript=_meta.get('transcript', ''),
-                                        ai_evaluation=_res.get('ai_evaluation'),
-                                        data_evento=_meta.get('octa_created_at'),
-                                        agente=_meta.get('octa_agent'),
-                                    )
-                                    sincronizar_interacao_crm(_payload)
-                                except Exception as _crm_e:
-                                    _erros.append(f"{_cid}: CRM sync — {_crm_e}")
-                        else:
-                            _erros.append(f"{_cid}: {_msg}")
-
-                    st.success(f"🎉 {_sucesso}/{len(_resultados)} avaliações salvas.")
-                    if _sucesso > 0:
+                    _erros = _resumo.get('erros', [])
+                    st.success(f"🎉 {_resumo['salvos']} avaliações salvas.")
+                    if _resumo['salvos'] > 0:
                         st.session_state.pop('octa_evaluated_ids', None)
                     if _erros:
                         with st.expander(f"⚠️ {len(_erros)} erros"):
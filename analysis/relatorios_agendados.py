@@ -0,0 +1,147 @@
+"""
+Relatórios IA pré-gerados: coleta → análise → entrega, sem Streamlit.
+
+Na página Relatórios IA cada relatório custa a coleta das contas e alguns
+minutos de Claude com o usuário esperando. Os presets padrão (alerta de
+ontem e últimos 7 dias, por empresa) são gerados de madrugada pelo
+relatorios_ia_cron.py e salvos com o mesmo tipo e data_ref que a página
+usaria; a página abre o relatório pronto (buscar_relatorio) e só chama o
+Claude sob demanda para períodos personalizados.
+
+  - coleta: _pages.relatorios_ia.coletar_dados_ads (collectors.* e armazém
+    diário), sequencial por empresa — FacebookAdsApi.init é global;
+  - análise: transmitir_com_claude (mesmo prompt e modelo da página), em
+    paralelo com a coleta da empresa seguinte;
+  - entrega: salvar_relatorio (MySQL ai_reports, fallback data/historico)
+    e aviso opcional no Slack (delivery.slack).
+
+Um (tipo, data_ref) já salvo não é gerado de novo, então rodar o cron duas
+vezes no mesmo dia não paga o Claude duas vezes (forcar=True refaz).
+
+Uso:
+    from analysis import relatorios_agendados
+    resultados = relatorios_agendados.executar(["alerta", "semanal"], ["Degrau Cultural"])
+    # [{'preset', 'empresa', 'tipo', 'data_ref', 'status', 'erro', 'duracao', ...}, ...]
+
+ENV VARS:
+  RELATORIOS_IA_ANALISES_PARALELAS — análises no Claude ao mesmo tempo (default 2)
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+ANALISES_PARALELAS = int(os.getenv("RELATORIOS_IA_ANALISES_PARALELAS", "2"))
+
+# Presets da página: período relativo a `hoje` (ontem / últimos 7 dias até ontem)
+PRESETS = {
+    "alerta": {"nome": "Alerta Diário (Ads)", "tipo": "alerta", "janela": 1,
+               "prompt": "SYSTEM_PROMPT_ALERTA_DIARIO"},
+    "semanal": {"nome": "Últimos 7 dias (Ads)", "tipo": "completo_ads", "janela": 7,
+                "prompt": "SYSTEM_PROMPT_ADS_V2"},
+}
+
+
+def periodo(preset: str, hoje: Optional[date] = None):
+    """(início, fim) do preset — os mesmos da página para o mesmo dia."""
+    hoje = hoje or date.today()
+    fim = hoje - timedelta(days=1)
+    return fim - timedelta(days=PRESETS[preset]["janela"] - 1), fim
+
+
+def _pagina():
+    # import tardio: a página traz Streamlit e os SDKs de anúncios
+    from _pages import relatorios_ia
+    return relatorios_ia
+
+
+def _resultado(preset: str, empresa: str, data_ref: Optional[str] = None) -> Dict:
+    return {"preset": preset, "empresa": empresa, "tipo": PRESETS[preset]["tipo"], "data_ref": data_ref,
+            "status": None, "erro": None, "avisos": [], "duracao": 0.0, "destino": None}
+
+
+def _analisar_e_entregar(resultado: Dict, dados_consolidados: str, prompt: str, notificar: bool) -> Dict:
+    pagina = _pagina()
+    inicio = time.monotonic()
+    estado = {}
+    for _ in pagina.transmitir_com_claude(dados_consolidados, prompt, resultado["tipo"], estado):
+        pass
+    resultado["duracao"] += time.monotonic() - inicio
+    if not estado.get("concluido"):
+        resultado.update(status="erro", erro=estado.get("erro") or "análise não concluída")
+        return resultado
+
+    resultado["destino"] = pagina.salvar_relatorio(
+        estado["texto"], dados_consolidados, resultado["data_ref"], resultado["tipo"])
+    resultado["status"] = "gerado"
+    if notificar:
+        from delivery import slack
+        titulo = f"{PRESETS[resultado['preset']]['nome']} — {resultado['empresa']} ({resultado['data_ref']})"
+        if not slack.enviar_relatorio(titulo, estado["texto"]):
+            resultado["avisos"].append("aviso no Slack não enviado")
+    return resultado
+
+
+def executar(
+    presets: Sequence[str],
+    empresas: Sequence[str],
+    hoje: Optional[date] = None,
+    forcar: bool = False,
+    dry_run: bool = False,
+    notificar: bool = True,
+) -> List[Dict]:
+    """Gera os relatórios presets × empresas. dry_run coleta e monta o payload, sem Claude.
+
+    status de cada resultado: 'existente' (já salvo), 'gerado', 'sem_dados',
+    'coletado' (dry_run) ou 'erro'.
+    """
+    pagina = _pagina()
+    resultados: List[Dict] = []
+    futuros = []
+    with ThreadPoolExecutor(max_workers=max(1, ANALISES_PARALELAS), thread_name_prefix="relatorio-ia") as pool:
+        for empresa in empresas:
+            for preset in presets:
+                inicio_p, fim_p = periodo(preset, hoje)
+                data_ref = pagina.data_ref_relatorio(inicio_p, fim_p, empresa)
+                resultado = _resultado(preset, empresa, data_ref)
+                resultados.append(resultado)
+                if not forcar and not dry_run and pagina.buscar_relatorio(resultado["tipo"], data_ref):
+                    resultado["status"] = "existente"
+                    logger.info("[%s] %s já salvo — pulando", preset, data_ref)
+                    continue
+
+                inicio = time.monotonic()
+                try:
+                    coleta = pagina.coletar_dados_ads(
+                        pagina.EMPRESAS_ADS[empresa]["contas"], inicio_p, fim_p,
+                        PRESETS[preset]["janela"], empresa=empresa,
+                    )
+                except Exception as exc:
+                    logger.exception("[%s] coleta de %s falhou", preset, data_ref)
+                    resultado.update(status="erro", erro=f"coleta: {exc}")
+                    continue
+                resultado["duracao"] = time.monotonic() - inicio
+                resultado["avisos"].extend(coleta["avisos"] + coleta["erros"])
+                if coleta["dados_consolidados"] is None:
+                    resultado["status"] = "sem_dados"
+                    continue
+                if dry_run:
+                    resultado.update(status="coletado", payload_caracteres=len(coleta["dados_consolidados"]))
+                    continue
+
+                prompt = getattr(pagina, PRESETS[preset]["prompt"])
+                futuros.append((resultado, pool.submit(
+                    _analisar_e_entregar, resultado, coleta["dados_consolidados"], prompt, notificar)))
+
+        for resultado, futuro in futuros:
+            try:
+                futuro.result()
+            except Exception as exc:
+                logger.exception("[%s] análise de %s falhou", resultado["preset"], resultado["data_ref"])
+                resultado.update(status="erro", erro=str(exc))
+    return resultados
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+avaliacao_worker.py - Worker da fila de avaliações de IA (ligações e WhatsApp)
+
+Consome utils/fila_avaliacoes: reserva jobs enfileirados pelas páginas,
+avalia com o Claude (cliente assíncrono, mesmo limitador/cache das páginas)
+e grava no MySQL pelos writers de sempre (utils.batch_avaliacoes.persistir).
+Roda fora do Streamlit: a página pode ser recarregada ou fechada sem perder
+nada. A cada sinal de vida o worker renova o lease dos jobs em andamento
+(incluindo os que esperam vez no llm_limiter), então um job lento não é
+reservado por outro worker; um worker que morre no meio deixa de renovar e
+seus jobs são retomados quando o lease expira.
+
+EXECUÇÃO:
+  Daemon (systemd / tmux):
+     python3 avaliacao_worker.py                    # concorrência derivada do limitador
+     python3 avaliacao_worker.py --concorrencia 16  # mais avaliações em voo
+     python3 avaliacao_worker.py --canal ligacao    # só ligações
+
+  Esvaziar a fila e sair (cron):
+     */10 * * * * cd /home/ulisses/dados_degrau_py && python3 avaliacao_worker.py --uma-vez >> data_cache/avaliacao_worker.log 2>&1
+
+  Vários processos podem rodar ao mesmo tempo (a reserva é atômica):
+  throughput ≈ processos × --concorrencia, limitado pelo rate limit da conta.
+
+ENV VARS:
+  AVALIACAO_WORKER_CONCORRENCIA — default: llm_limiter.concorrencia()
+  AVALIACAO_WORKER_INTERVALO    — espera (s) com a fila vazia (default 5)
+  (mais as da fila: FILA_AVALIACOES_DB, FILA_LEASE_SEGUNDOS, FILA_MAX_TENTATIVAS)
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(PROJECT_ROOT))
+load_dotenv(PROJECT_ROOT / ".env")
+
+from utils import batch_avaliacoes, fila_avaliacoes
+from utils.chat_ia_analyzer import ChatIAAnalyzer
+from utils.transcricao_analyzer import TranscricaoAnalyzer
+
+LOG_DIR = PROJECT_ROOT / "data_cache"
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler(str(LOG_DIR / "avaliacao_worker.log"), encoding="utf-8", delay=True),
+    ]
+)
+logger = logging.getLogger("avaliacao_worker")
+
+INTERVALO = float(os.getenv("AVALIACAO_WORKER_INTERVALO", "5"))
+_SINAL_DE_VIDA = 30  # s — também o intervalo de renovação dos leases (bem abaixo de FILA_LEASE_SEGUNDOS)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class _Falha(Exception):
+    """Falha recuperável: o job volta para a fila (até FILA_MAX_TENTATIVAS)."""
+
+
+async def _processar_ligacao(job, ia: TranscricaoAnalyzer, aclient) -> dict:
+    payload = job['payload']
+    tid = job['item_id']
+    tx = payload.get('transcricao')
+    if tx is None:
+        from utils.transcricoes_loader import carregar_detalhe_transcricao
+        detalhe = await asyncio.to_thread(carregar_detalhe_transcricao, int(tid))
+        if detalhe.get('erro'):
+            raise _Falha(f"Erro ao carregar transcrição: {detalhe['erro']}")
+        tx = detalhe.get('transcricao', '') or ''
+
+    if len(tx.strip()) < int(payload.get('minimo_chars', 500)):
+        return {'status': 'insuficiente'}
+
+    analise = await ia.analisar_transcricao_async(aclient, tx, contexto_adicional=payload.get('contexto_adicional'))
+    if analise.get('erro'):
+        raise _Falha(analise['erro'])
+
+    gravados = await asyncio.to_thread(
+        batch_avaliacoes.persistir, 'ligacao',
+        [dict(analise, transcricao_id=tid)], {tid: dict(payload.get('meta') or {}, transcricao=tx)},
+    )
+    if gravados['erros']:
+        raise _Falha(gravados['erros'][0])
+    return {
+        'status': 'avaliada' if analise.get('deve_avaliar') else 'nao_venda',
+        'classificacao': analise.get('classificacao_ligacao'),
+        'nota': analise.get('nota_vendedor'),
+    }
+
+
+async def _processar_chat(job, ch: ChatIAAnalyzer, aclient) -> dict:
+    payload = job['payload']
+    chat_id = job['item_id']
+    meta = payload.get('meta') or {}
+    resultado = await ch.avaliar_chat_async(
+        aclient,
+        chat_text=meta.get('transcript', ''),
+        contexto_adicional=payload.get('contexto_adicional'),
+        agent_name=payload.get('agent_name', ''),
+    )
+    if resultado.get('erro'):
+        raise _Falha(resultado['erro'])
+
+    gravados = await asyncio.to_thread(
+        batch_avaliacoes.persistir, 'whatsapp', [dict(resultado, chat_id=chat_id)], {chat_id: meta},
+    )
+    if gravados['erros']:
+        raise _Falha(gravados['erros'][0])
+    return {'status': 'avaliada' if resultado.get('deve_avaliar') else 'nao_venda',
+            'classificacao': resultado.get('classificacao'), 'nota': resultado.get('vendor_score')}
+
+
+async def _consumidor(n: int, canais, processadores, ocupados: set, uma_vez: bool):
+    while True:
+        jobs = await asyncio.to_thread(fila_avaliacoes.reservar, WORKER_ID, 1, canais)
+        if not jobs:
+            if uma_vez and not ocupados:
+                return
+            await asyncio.sleep(INTERVALO)
+            continue
+
+        job = jobs[0]
+        ocupados.add(job['id'])
+        inicio = time.monotonic()
+        try:
+            resultado = await processadores[job['canal']](job)
+        except asyncio.CancelledError:
+            raise  # o lease expira e outro worker retoma o job
+        except Exception as e:
+            erro = str(e) or type(e).__name__
+            logger.warning("[%d] job %s (%s %s) tentativa %d falhou: %s",
+                           n, job['id'], job['canal'], job['item_id'], job['tentativas'], erro)
+            await asyncio.to_thread(fila_avaliacoes.falhar, job['id'], WORKER_ID, erro, job['tentativas'])
+        else:
+            await asyncio.to_thread(fila_avaliacoes.concluir, job['id'], WORKER_ID, resultado)
+            logger.info("[%d] job %s (%s %s) %s em %.1fs",
+                        n, job['id'], job['canal'], job['item_id'], resultado.get('status'),
+                        time.monotonic() - inicio)
+        finally:
+            ocupados.discard(job['id'])
+
+
+async def _sinal_de_vida(info: dict, ocupados: set):
+    while True:
+        await asyncio.to_thread(fila_avaliacoes.sinal_de_vida, WORKER_ID, info)
+        em_andamento = list(ocupados)
+        renovados = await asyncio.to_thread(fila_avaliacoes.renovar, WORKER_ID, em_andamento)
+        if renovados < len(em_andamento):
+            logger.warning("%d job(s) em andamento perderam o lease (retomados por outro worker?)",
+                           len(em_andamento) - renovados)
+        await asyncio.sleep(_SINAL_DE_VIDA)
+
+
+async def executar(concorrencia: int, canais, uma_vez: bool):
+    ia = TranscricaoAnalyzer()
+    ch = ChatIAAnalyzer()
+    concorrencia = concorrencia or int(os.getenv("AVALIACAO_WORKER_CONCORRENCIA", "0")) or ia.concorrencia()
+    logger.info("Worker %s: concorrência %d, canais %s", WORKER_ID, concorrencia, canais or "todos")
+
+    async with ia.cliente_async() as aclient_ligacao, ch.cliente_async() as aclient_chat:
+        processadores = {
+            'ligacao': lambda job: _processar_ligacao(job, ia, aclient_ligacao),
+            'whatsapp': lambda job: _processar_chat(job, ch, aclient_chat),
+        }
+        ocupados: set = set()
+        vida = asyncio.create_task(_sinal_de_vida({'concorrencia': concorrencia, 'canais': canais}, ocupados))
+        try:
+            await asyncio.gather(*(
+                _consumidor(n, canais, processadores, ocupados, uma_vez) for n in range(concorrencia)
+            ))
+        finally:
+            vida.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker da fila de avaliações de IA")
+    parser.add_argument("--concorrencia", type=int, default=0,
+                        help="Avaliações simultâneas neste processo (default: derivado do limitador)")
+    parser.add_argument("--canal", choices=batch_avaliacoes.CANAIS, action="append",
+                        help="Restringe a um canal (pode repetir)")
+    parser.add_argument("--uma-vez", action="store_true", help="Esvazia a fila e sai")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(executar(args.concorrencia, args.canal, args.uma_vez))
+    except KeyboardInterrupt:
+        logger.info("Worker interrompido; jobs em andamento serão retomados quando o lease expirar.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+batch_poller_cron.py - Coleta automática dos batches de avaliação (Anthropic)
+
+Verifica os batches registrados em utils/batch_avaliacoes (ligações e
+WhatsApp) que ainda estão abertos; os que terminaram são coletados e
+gravados no MySQL pelos mesmos writers das páginas. Ninguém precisa voltar
+à página com o Batch ID.
+
+AGENDAMENTO:
+  cron (a cada 15 min):
+     */15 * * * * cd /home/ulisses/dados_degrau_py && python3 batch_poller_cron.py >> data_cache/batch_poller.log 2>&1
+
+  ou como daemon (systemd / tmux):
+     python3 batch_poller_cron.py --loop 300
+
+  Outras opções:
+     python3 batch_poller_cron.py --canal ligacao   # só batches de ligações
+     python3 batch_poller_cron.py --listar          # mostra os batches registrados e sai
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(PROJECT_ROOT))
+load_dotenv(PROJECT_ROOT / ".env")
+
+from utils import batch_avaliacoes
+
+LOG_DIR = PROJECT_ROOT / "data_cache"
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler(str(LOG_DIR / "batch_poller.log"), encoding="utf-8"),
+    ]
+)
+logger = logging.getLogger("batch_poller")
+
+
+def verificar(canal=None) -> int:
+    """Uma passada pelos batches abertos. Retorna quantos continuam abertos."""
+    resumos = batch_avaliacoes.verificar_abertos(canal)
+    if not resumos:
+        logger.info("Nenhum batch aberto.")
+        return 0
+
+    abertos = 0
+    for r in resumos:
+        if r['status'] == 'coletado':
+            logger.info("✅ %s (%s): %d salvos, %d erros",
+                        r['batch_id'], r.get('canal'), r.get('salvos', 0), len(r.get('erros', [])))
+            for erro in r.get('erros', [])[:10]:
+                logger.warning("   %s", erro)
+        elif r['status'] == 'falhou':
+            logger.error("⛔ %s: desistido após falhas seguidas — %s", r['batch_id'], "; ".join(r.get('erros', [])))
+        elif r['status'] == 'erro':
+            abertos += 1
+            logger.error("❌ %s: %s", r['batch_id'], "; ".join(r.get('erros', [])))
+        else:
+            abertos += 1
+            logger.info("⏳ %s (%s): %s", r['batch_id'], r.get('canal'), r.get('processing_status'))
+    return abertos
+
+
+def listar(canal=None):
+    for lote in batch_avaliacoes.listar(canal=canal, limite=100):
+        criado = time.strftime("%Y-%m-%d %H:%M", time.localtime(lote['criado_em']))
+        print(f"{lote['batch_id']}  {lote['canal']:<9} {lote['status']:<9} "
+              f"{lote['processing_status'] or '-':<12} itens={lote['total']:<5} "
+              f"salvos={lote['salvos'] if lote['salvos'] is not None else '-'}  criado={criado}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coleta automática de batches de avaliação")
+    parser.add_argument("--canal", choices=batch_avaliacoes.CANAIS, help="Restringe a um canal")
+    parser.add_argument("--loop", type=int, default=0, metavar="SEGUNDOS",
+                        help="Roda continuamente, verificando a cada N segundos (0 = uma vez)")
+    parser.add_argument("--listar", action="store_true", help="Lista os batches registrados e sai")
+    args = parser.parse_args()
+
+    if args.listar:
+        listar(args.canal)
+        return
+
+    while True:
+        try:
+            verificar(args.canal)
+        except Exception as e:
+            logger.error("Falha na verificação: %s", e)
+            if not args.loop:
+                sys.exit(1)
+        if not args.loop:
+            return
+        time.sleep(args.loop)
+
+
+if __name__ == "__main__":
+    main()
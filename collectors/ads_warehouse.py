@@ -0,0 +1,244 @@
+"""
+Armazém local de métricas diárias de anúncios (Google Ads / Meta Ads).
+
+Os fatos ficam particionados em Parquet por fonte, conta e dia:
+
+    data_cache/ads_warehouse/<fonte>/<conta>/<AAAA-MM-DD>.parquet
+
+Um dia já gravado e fora da janela mutável (atribuição ainda assentando)
+nunca é buscado de novo; só dias ausentes ou recentes vão à API. Dias sem
+dados também são gravados (partição vazia) para não serem consultados outra vez.
+
+Métricas não aditivas entre dias (alcance, usuários únicos, frequência) não
+podem ser recompostas a partir dos dias. Para elas existe carregar_periodo():
+o resultado do período inteiro é guardado quando o período já está fechado.
+
+ENV VARS:
+  ADS_WAREHOUSE_DIR            — default data_cache/ads_warehouse
+  ADS_WAREHOUSE_DIAS_MUTAVEIS  — default 3 (dias recentes sempre re-buscados)
+"""
+
+import logging
+import os
+import re
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+WAREHOUSE_DIR = Path(os.getenv("ADS_WAREHOUSE_DIR", str(_PROJECT_ROOT / "data_cache" / "ads_warehouse")))
+DIAS_MUTAVEIS = int(os.getenv("ADS_WAREHOUSE_DIAS_MUTAVEIS", "3"))
+
+# O lock de (fonte, conta) só cobre a escolha dos dias pendentes e a gravação
+# das partições; a chamada à API roda fora dele, então buscas de dias
+# diferentes (ex.: período atual e anterior na coleta paralela) andam juntas.
+# Cada dia em busca fica reservado em _em_busca: outra thread que precise do
+# mesmo dia espera aquela busca em vez de baixá-lo em dobro.
+_locks: dict = {}
+_locks_guard = threading.Lock()
+_em_busca: dict = {}  # (fonte, conta, dia) → _Busca
+
+
+class _Busca:
+    """Reserva de um dia em busca; ok=False ao terminar = a busca falhou."""
+
+    def __init__(self):
+        self.feito = threading.Event()
+        self.ok = False
+
+
+def _lock(fonte: str, conta: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault((fonte, conta), threading.Lock())
+
+
+def _como_data(valor) -> date:
+    if isinstance(valor, date):
+        return valor
+    return pd.Timestamp(valor).date()
+
+
+def _slug(valor) -> str:
+    return re.sub(r"[^0-9A-Za-z_.-]", "_", str(valor))
+
+
+def _dir_particoes(fonte: str, conta: str) -> Path:
+    return WAREHOUSE_DIR / _slug(fonte) / _slug(conta)
+
+
+def _gravar_parquet(df: pd.DataFrame, caminho: Path):
+    """Gravação atômica (arquivo temporário + replace) para leitores concorrentes."""
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    tmp = caminho.with_name(f".{caminho.name}.{threading.get_ident()}.tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, caminho)
+
+
+def _limite_mutavel(dias_mutaveis: Optional[int]) -> date:
+    """Primeiro dia considerado ainda mutável (hoje - N)."""
+    n = DIAS_MUTAVEIS if dias_mutaveis is None else dias_mutaveis
+    return date.today() - timedelta(days=max(n, 0))
+
+
+def _agrupar_intervalos(dias: List[date]) -> List[Tuple[date, date]]:
+    """Converte uma lista de dias em intervalos contíguos [(ini, fim), ...]."""
+    intervalos: List[Tuple[date, date]] = []
+    for dia in sorted(dias):
+        if intervalos and dia == intervalos[-1][1] + timedelta(days=1):
+            intervalos[-1] = (intervalos[-1][0], dia)
+        else:
+            intervalos.append((dia, dia))
+    return intervalos
+
+
+def dias_pendentes(fonte: str, conta: str, inicio, fim, dias_mutaveis: Optional[int] = None) -> List[date]:
+    """Dias do intervalo que precisam ir à API (ausentes ou ainda mutáveis)."""
+    inicio, fim = _como_data(inicio), _como_data(fim)
+    limite = _limite_mutavel(dias_mutaveis)
+    pasta = _dir_particoes(fonte, conta)
+    pendentes = []
+    dia = inicio
+    while dia <= fim:
+        if dia >= limite or not (pasta / f"{dia.isoformat()}.parquet").exists():
+            pendentes.append(dia)
+        dia += timedelta(days=1)
+    return pendentes
+
+
+def carregar_dias(
+    fonte: str,
+    conta: str,
+    inicio,
+    fim,
+    buscar: Callable[[str, str], pd.DataFrame],
+    dias_mutaveis: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Retorna os fatos diários de [inicio, fim] para (fonte, conta).
+
+    buscar(ini_str, fim_str) deve devolver um DataFrame com uma coluna 'data'
+    ('AAAA-MM-DD') e uma linha por campanha × dia. Só é chamada para os
+    intervalos contíguos de dias pendentes; exceções propagam para o chamador.
+    """
+    inicio, fim = _como_data(inicio), _como_data(fim)
+    if fim < inicio:
+        return pd.DataFrame()
+
+    pasta = _dir_particoes(fonte, conta)
+    with _lock(fonte, conta):
+        a_buscar = dias_pendentes(fonte, conta, inicio, fim, dias_mutaveis)
+    while a_buscar:
+        meus, alheios = _reservar(fonte, conta, a_buscar)
+        try:
+            for ini_int, fim_int in _agrupar_intervalos(list(meus)):
+                _buscar_intervalo(fonte, conta, ini_int, fim_int, buscar, meus)
+        finally:
+            for dia, busca in meus.items():
+                with _lock(fonte, conta):
+                    _em_busca.pop((fonte, conta, dia), None)
+                busca.feito.set()
+        for busca in alheios.values():
+            busca.feito.wait()
+        # dias cuja busca alheia falhou: tenta de novo por conta própria
+        a_buscar = [dia for dia, busca in alheios.items() if not busca.ok]
+
+    arquivos = []
+    dia = inicio
+    while dia <= fim:
+        caminho = pasta / f"{dia.isoformat()}.parquet"
+        if caminho.exists():
+            arquivos.append(caminho)
+        dia += timedelta(days=1)
+
+    frames = [df for df in (pd.read_parquet(a) for a in arquivos) if not df.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def _reservar(fonte: str, conta: str, dias: List[date]) -> Tuple[dict, dict]:
+    """({dia: _Busca} reservados por esta thread, {dia: _Busca} já em busca por outra)."""
+    meus, alheios = {}, {}
+    with _lock(fonte, conta):
+        for dia in dias:
+            busca = _em_busca.get((fonte, conta, dia))
+            if busca is None:
+                busca = meus[dia] = _Busca()
+                _em_busca[(fonte, conta, dia)] = busca
+            else:
+                alheios[dia] = busca
+    return meus, alheios
+
+
+def _buscar_intervalo(fonte: str, conta: str, ini_int: date, fim_int: date,
+                      buscar: Callable[[str, str], pd.DataFrame], meus: dict):
+    """Busca [ini_int, fim_int] na API (sem lock) e grava uma partição por dia (com lock)."""
+    df_novo = buscar(ini_int.isoformat(), fim_int.isoformat())
+    if df_novo is None:
+        df_novo = pd.DataFrame()
+    logger.info(
+        "[ads_warehouse] %s/%s %s..%s: %d linha(s) da API",
+        fonte, conta, ini_int, fim_int, len(df_novo),
+    )
+    por_dia = dict(tuple(df_novo.groupby("data"))) if not df_novo.empty else {}
+    pasta = _dir_particoes(fonte, conta)
+    with _lock(fonte, conta):
+        dia = ini_int
+        while dia <= fim_int:
+            chave = dia.isoformat()
+            df_dia = por_dia.get(chave)
+            if df_dia is None:
+                df_dia = df_novo.iloc[0:0]
+            _gravar_parquet(df_dia.reset_index(drop=True), pasta / f"{chave}.parquet")
+            meus[dia].ok = True
+            dia += timedelta(days=1)
+
+
+def carregar_periodo(
+    fonte: str,
+    conta: str,
+    inicio,
+    fim,
+    buscar: Callable[[str, str], pd.DataFrame],
+    dias_mutaveis: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Resultado de um período inteiro, para métricas não aditivas por dia.
+    Períodos totalmente fechados ficam guardados; os demais vão sempre à API.
+    """
+    inicio, fim = _como_data(inicio), _como_data(fim)
+    fechado = fim < _limite_mutavel(dias_mutaveis)
+    caminho = _dir_particoes(fonte, conta) / "_periodos" / f"{inicio.isoformat()}_{fim.isoformat()}.parquet"
+
+    if fechado and caminho.exists():
+        return pd.read_parquet(caminho)
+
+    df = buscar(inicio.isoformat(), fim.isoformat())
+    if df is None:
+        df = pd.DataFrame()
+    if fechado:
+        _gravar_parquet(df.reset_index(drop=True), caminho)
+    return df
+
+
+def resumo() -> pd.DataFrame:
+    """Uma linha por (fonte, conta) com o intervalo de dias armazenado."""
+    linhas = []
+    if not WAREHOUSE_DIR.exists():
+        return pd.DataFrame(columns=["fonte", "conta", "dias", "primeiro", "ultimo"])
+    for pasta_fonte in sorted(p for p in WAREHOUSE_DIR.iterdir() if p.is_dir()):
+        for pasta_conta in sorted(p for p in pasta_fonte.iterdir() if p.is_dir()):
+            dias = sorted(a.stem for a in pasta_conta.glob("*.parquet"))
+            linhas.append({
+                "fonte": pasta_fonte.name,
+                "conta": pasta_conta.name,
+                "dias": len(dias),
+                "primeiro": dias[0] if dias else None,
+                "ultimo": dias[-1] if dias else None,
+            })
+    return pd.DataFrame(linhas, columns=["fonte", "conta", "dias", "primeiro", "ultimo"])
@@ -0,0 +1,100 @@
+"""
+Coleta concorrente de dados das plataformas de anúncios.
+
+Executa várias buscas independentes (conta × período) em paralelo, cada uma
+isolada: um erro ou timeout numa fonte não derruba as demais. O chamador
+recebe os resultados à medida que ficam prontos (callback) e, ao final, um
+dicionário com o resultado de todas as tarefas.
+
+Uso típico:
+    tarefas = {
+        ("google_degrau", "atual"): lambda: buscar(client, cid, ini, fim),
+        ("google_degrau", "anterior"): lambda: buscar(client, cid, ini_ant, fim_ant),
+    }
+    resultados = coletar_em_paralelo(tarefas, timeout=90, callback=mostrar)
+
+Cada resultado é um dict:
+    {'dados': <retorno da função ou None>, 'erro': str | None, 'duracao': float}
+
+ENV VARS:
+  COLETA_TIMEOUT_SEGUNDOS  — default 120 (prazo total da coleta)
+  COLETA_MAX_WORKERS       — default 8
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_PADRAO = float(os.getenv("COLETA_TIMEOUT_SEGUNDOS", "120"))
+MAX_WORKERS_PADRAO = int(os.getenv("COLETA_MAX_WORKERS", "8"))
+
+
+def _executar(func: Callable[[], Any]) -> Dict:
+    inicio = time.monotonic()
+    try:
+        dados = func()
+        return {'dados': dados, 'erro': None, 'duracao': time.monotonic() - inicio}
+    except Exception as e:
+        logger.warning("Falha na coleta: %s", e)
+        return {'dados': None, 'erro': str(e) or type(e).__name__, 'duracao': time.monotonic() - inicio}
+
+
+def coletar_em_paralelo(
+    tarefas: Dict[Hashable, Callable[[], Any]],
+    timeout: Optional[float] = None,
+    max_workers: Optional[int] = None,
+    callback: Optional[Callable[[Hashable, Dict, int, int], None]] = None,
+) -> Dict[Hashable, Dict]:
+    """
+    Executa as tarefas concorrentemente e devolve {chave: resultado}.
+
+    timeout: prazo total (segundos) a partir do início da coleta. Tarefas não
+             concluídas no prazo voltam com erro de timeout; a thread
+             correspondente é abandonada (não bloqueia o retorno).
+    callback(chave, resultado, concluidas, total): chamado na thread do
+             chamador assim que cada tarefa termina — seguro para Streamlit.
+    """
+    if not tarefas:
+        return {}
+
+    timeout = TIMEOUT_PADRAO if timeout is None else timeout
+    workers = max(1, min(max_workers or MAX_WORKERS_PADRAO, len(tarefas)))
+    resultados: Dict[Hashable, Dict] = {}
+    total = len(tarefas)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="coleta")
+    try:
+        futures = {executor.submit(_executar, func): chave for chave, func in tarefas.items()}
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                chave = futures[future]
+                resultados[chave] = future.result()
+                if callback:
+                    try:
+                        callback(chave, resultados[chave], len(resultados), total)
+                    except Exception:
+                        pass
+        except FuturesTimeoutError:
+            for future, chave in futures.items():
+                if chave in resultados:
+                    continue
+                future.cancel()
+                resultados[chave] = {
+                    'dados': None,
+                    'erro': f'Timeout após {timeout:.0f}s',
+                    'duracao': timeout,
+                }
+                logger.warning("Coleta %s excedeu o timeout de %.0fs", chave, timeout)
+                if callback:
+                    try:
+                        callback(chave, resultados[chave], len(resultados), total)
+                    except Exception:
+                        pass
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return resultados
@@ -0,0 +1,363 @@
+"""
+Relatórios do GA4 (Data API) em lote e com cache local.
+
+Uma página declara de uma vez todos os relatórios que vai exibir (canais,
+demografia, tecnologia, conversões...) e buscar_relatorios() resolve tudo
+com o mínimo de chamadas: o que já está em cache não vai à API e o restante
+segue em batch_run_reports (até 5 relatórios por chamada). As respostas são
+convertidas direto em DataFrame, com colunas nomeadas pela API
+(ex.: 'sessionDefaultChannelGroup', 'activeUsers').
+
+Cache (SQLite, data_cache/ga4_cache.db):
+  - dias:     relatórios só com métricas aditivas (custo, eventos, sessões...)
+              são guardados por dia — a consulta à API leva a dimensão 'date'
+              e só os dias ausentes ou ainda mutáveis são buscados. O período
+              pedido é recomposto somando os dias; ordenação e limite são
+              aplicados localmente.
+  - periodos: relatórios com métricas não aditivas (usuários ativos,
+              top N por usuários...) são guardados pelo período inteiro —
+              para sempre quando o período já está fechado, por
+              GA4_CACHE_TTL_SEGUNDOS quando inclui dias recentes.
+
+Uso típico:
+    relatorios = {
+        'canais': ga4_reports.relatorio(['sessionDefaultChannelGroup'], ['sessions', 'activeUsers']),
+        'eventos': ga4_reports.relatorio(['eventName'], ['eventCount'], limit=200, ordenar_por='eventCount'),
+    }
+    dfs = ga4_reports.buscar_relatorios(client, PROPERTY_ID, relatorios, inicio, fim)
+    dfs['canais']  # DataFrame
+
+ENV VARS:
+  GA4_CACHE_DB            — default data_cache/ga4_cache.db
+  GA4_DIAS_MUTAVEIS       — default 3 (dias recentes sempre re-buscados)
+  GA4_CACHE_TTL_SEGUNDOS  — default 900 (períodos que incluem dias mutáveis)
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from google.analytics.data_v1beta.types import (
+    BatchRunReportsRequest,
+    DateRange,
+    Dimension,
+    Metric,
+    OrderBy,
+    RunReportRequest,
+)
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+_DB_PATH = Path(os.getenv("GA4_CACHE_DB", str(_PROJECT_ROOT / "data_cache" / "ga4_cache.db")))
+DIAS_MUTAVEIS = int(os.getenv("GA4_DIAS_MUTAVEIS", "3"))
+TTL_PERIODO_ABERTO = int(os.getenv("GA4_CACHE_TTL_SEGUNDOS", "900"))
+
+MAX_POR_LOTE = 5          # limite da API para batch_run_reports
+MAX_DATE_RANGES = 4       # limite da API por RunReportRequest
+LIMITE_LINHAS_DIA = 100000
+
+# Métricas que somam corretamente entre dias. Usuários (activeUsers, totalUsers,
+# newUsers) são contagens distintas e ficam de fora.
+METRICAS_ADITIVAS = frozenset({
+    'advertiserAdCost', 'advertiserAdClicks', 'advertiserAdImpressions',
+    'conversions', 'keyEvents', 'eventCount', 'eventValue',
+    'sessions', 'engagedSessions', 'screenPageViews', 'userEngagementDuration',
+    'purchaseRevenue', 'totalRevenue', 'transactions', 'ecommercePurchases',
+})
+
+
+def relatorio(
+    dimensoes: Sequence[str] = (),
+    metricas: Sequence[str] = (),
+    limit: int = 15,
+    ordenar_por: Optional[str] = None,
+    desc: bool = True,
+) -> Dict:
+    """Especificação de um relatório (ordenar_por é o nome de uma métrica)."""
+    return {
+        'dimensoes': tuple(dimensoes),
+        'metricas': tuple(metricas),
+        'limit': int(limit),
+        'ordenar_por': ordenar_por,
+        'desc': bool(desc),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Cache SQLite
+# ---------------------------------------------------------------------------
+
+_schema_pronto = set()  # caminhos de banco com o schema já criado neste processo
+
+
+@contextlib.contextmanager
+def _conectar() -> Iterator[sqlite3.Connection]:
+    """`with _conectar() as con:` — commit (ou rollback) e fechamento da conexão ao sair."""
+    _DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(_DB_PATH)
+    try:
+        with con:
+            if _DB_PATH not in _schema_pronto:
+                _criar_schema(con)
+                _schema_pronto.add(_DB_PATH)
+            yield con
+    finally:
+        con.close()
+
+
+def _criar_schema(con: sqlite3.Connection):
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS dias (
+            property    TEXT    NOT NULL,
+            assinatura  TEXT    NOT NULL,
+            data        TEXT    NOT NULL,
+            dados       TEXT    NOT NULL,
+            salvo_em    INTEGER NOT NULL,
+            PRIMARY KEY (property, assinatura, data)
+        )
+    """)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS periodos (
+            property    TEXT    NOT NULL,
+            assinatura  TEXT    NOT NULL,
+            inicio      TEXT    NOT NULL,
+            fim         TEXT    NOT NULL,
+            dados       TEXT    NOT NULL,
+            salvo_em    INTEGER NOT NULL,
+            PRIMARY KEY (property, assinatura, inicio, fim)
+        )
+    """)
+
+
+def _df_para_json(df: pd.DataFrame) -> str:
+    return json.dumps(df.to_dict(orient='split', index=False))
+
+
+def _json_para_df(texto: str) -> pd.DataFrame:
+    d = json.loads(texto)
+    return pd.DataFrame(d['data'], columns=d['columns'])
+
+
+def _assinatura(*partes) -> str:
+    return hashlib.sha1(json.dumps(partes, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def limpar_cache(property_id: Optional[str] = None):
+    """Remove o cache (de uma property ou inteiro)."""
+    with _conectar() as con:
+        for tabela in ('dias', 'periodos'):
+            if property_id is None:
+                con.execute(f"DELETE FROM {tabela}")
+            else:
+                con.execute(f"DELETE FROM {tabela} WHERE property=?", (str(property_id),))
+
+
+# ---------------------------------------------------------------------------
+# Conversão de respostas
+# ---------------------------------------------------------------------------
+
+def resposta_para_df(resposta) -> pd.DataFrame:
+    """RunReportResponse → DataFrame (uma coluna por dimensão/métrica, métricas numéricas)."""
+    dims = [h.name for h in resposta.dimension_headers]
+    mets = [h.name for h in resposta.metric_headers]
+    linhas = list(resposta.rows)
+    dados = {}
+    for i, nome in enumerate(dims):
+        dados[nome] = [r.dimension_values[i].value for r in linhas]
+    for j, nome in enumerate(mets):
+        dados[nome] = pd.to_numeric(pd.Series([r.metric_values[j].value for r in linhas], dtype=object), errors='coerce').fillna(0)
+    return pd.DataFrame(dados, columns=dims + mets)
+
+
+def _vazio(spec: Dict) -> pd.DataFrame:
+    return pd.DataFrame(columns=list(spec['dimensoes']) + list(spec['metricas']))
+
+
+def _ordenar_limitar(df: pd.DataFrame, spec: Dict) -> pd.DataFrame:
+    if spec['ordenar_por'] and spec['ordenar_por'] in df.columns:
+        df = df.sort_values(spec['ordenar_por'], ascending=not spec['desc'], kind='stable')
+    return df.head(spec['limit']).reset_index(drop=True)
+
+
+# ---------------------------------------------------------------------------
+# Planejamento
+# ---------------------------------------------------------------------------
+
+def _como_data(valor) -> date:
+    if isinstance(valor, date):
+        return valor
+    return pd.Timestamp(valor).date()
+
+
+def _intervalos(dias: List[date]) -> List[Tuple[date, date]]:
+    """Dias → intervalos contíguos; acima do limite da API vira um intervalo único."""
+    intervalos: List[Tuple[date, date]] = []
+    for dia in sorted(dias):
+        if intervalos and dia == intervalos[-1][1] + timedelta(days=1):
+            intervalos[-1] = (intervalos[-1][0], dia)
+        else:
+            intervalos.append((dia, dia))
+    if len(intervalos) > MAX_DATE_RANGES:
+        intervalos = [(intervalos[0][0], intervalos[-1][1])]
+    return intervalos
+
+
+def _eh_aditivo(spec: Dict) -> bool:
+    return bool(spec['metricas']) and all(m in METRICAS_ADITIVAS for m in spec['metricas'])
+
+
+def _request(spec: Dict, intervalos, por_dia: bool) -> RunReportRequest:
+    dimensoes = list(spec['dimensoes']) + (['date'] if por_dia else [])
+    order_bys = []
+    if spec['ordenar_por'] and not por_dia:
+        order_bys = [OrderBy(metric=OrderBy.MetricOrderBy(metric_name=spec['ordenar_por']), desc=spec['desc'])]
+    return RunReportRequest(
+        dimensions=[Dimension(name=d) for d in dimensoes],
+        metrics=[Metric(name=m) for m in spec['metricas']],
+        date_ranges=[DateRange(start_date=i.isoformat(), end_date=f.isoformat()) for i, f in intervalos],
+        limit=LIMITE_LINHAS_DIA if por_dia else spec['limit'],
+        order_bys=order_bys,
+    )
+
+
+def _executar_lotes(client, property_id: str, requests: List[RunReportRequest]) -> List[pd.DataFrame]:
+    """Envia os requests em batch_run_reports de até MAX_POR_LOTE. Propaga exceções."""
+    resultados: List[pd.DataFrame] = []
+    for i in range(0, len(requests), MAX_POR_LOTE):
+        lote = requests[i:i + MAX_POR_LOTE]
+        resposta = client.batch_run_reports(
+            BatchRunReportsRequest(property=f"properties/{property_id}", requests=lote)
+        )
+        resultados.extend(resposta_para_df(r) for r in resposta.reports)
+    logger.info(
+        "[ga4_reports] properties/%s: %d relatório(s) em %d chamada(s)",
+        property_id, len(requests), -(-len(requests) // MAX_POR_LOTE),
+    )
+    return resultados
+
+
+# ---------------------------------------------------------------------------
+# API pública
+# ---------------------------------------------------------------------------
+
+def buscar_relatorios(
+    client,
+    property_id,
+    relatorios: Dict[str, Dict],
+    inicio,
+    fim,
+    dias_mutaveis: Optional[int] = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Executa os relatórios de uma página para [inicio, fim] e devolve {nome: DataFrame}.
+
+    relatorios: {nome: relatorio(...)}. Erros da API propagam para o chamador.
+    """
+    property_id = str(property_id)
+    inicio, fim = _como_data(inicio), _como_data(fim)
+    n_mutaveis = DIAS_MUTAVEIS if dias_mutaveis is None else dias_mutaveis
+    limite_mutavel = date.today() - timedelta(days=max(n_mutaveis, 0))
+    fechado = fim < limite_mutavel
+    agora = int(time.time())
+    todos_dias = [inicio + timedelta(days=i) for i in range((fim - inicio).days + 1)]
+
+    resultados: Dict[str, pd.DataFrame] = {}
+    pendentes = []  # (nome, tipo, assinatura, dias_pedidos, request)
+
+    with _conectar() as con:
+        for nome, spec in relatorios.items():
+            if not todos_dias:
+                resultados[nome] = _vazio(spec)
+                continue
+
+            if _eh_aditivo(spec):
+                assinatura = _assinatura('dia', spec['dimensoes'], spec['metricas'])
+                guardados = {
+                    row[0] for row in con.execute(
+                        "SELECT data FROM dias WHERE property=? AND assinatura=? AND data BETWEEN ? AND ?",
+                        (property_id, assinatura, inicio.isoformat(), fim.isoformat()),
+                    )
+                }
+                faltando = [d for d in todos_dias if d >= limite_mutavel or d.isoformat() not in guardados]
+                if faltando:
+                    intervalos = _intervalos(faltando)
+                    dias_pedidos = [d for d in todos_dias if any(i <= d <= f for i, f in intervalos)]
+                    pendentes.append((nome, 'dia', assinatura, dias_pedidos, _request(spec, intervalos, True)))
+                else:
+                    resultados[nome] = None  # montado a partir do cache abaixo
+            else:
+                assinatura = _assinatura(
+                    'periodo', spec['dimensoes'], spec['metricas'], spec['limit'], spec['ordenar_por'], spec['desc'],
+                )
+                row = con.execute(
+                    "SELECT dados, salvo_em FROM periodos WHERE property=? AND assinatura=? AND inicio=? AND fim=?",
+                    (property_id, assinatura, inicio.isoformat(), fim.isoformat()),
+                ).fetchone()
+                if row and (fechado or agora - row[1] < TTL_PERIODO_ABERTO):
+                    resultados[nome] = _json_para_df(row[0])
+                else:
+                    pendentes.append((nome, 'periodo', assinatura, None, _request(spec, [(inicio, fim)], False)))
+
+    if pendentes:
+        dfs = _executar_lotes(client, property_id, [p[4] for p in pendentes])
+        with _conectar() as con:
+            for (nome, tipo, assinatura, dias_pedidos, _), df in zip(pendentes, dfs):
+                spec = relatorios[nome]
+                if tipo == 'periodo':
+                    con.execute(
+                        "INSERT OR REPLACE INTO periodos (property, assinatura, inicio, fim, dados, salvo_em) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (property_id, assinatura, inicio.isoformat(), fim.isoformat(), _df_para_json(df), agora),
+                    )
+                    resultados[nome] = df
+                    continue
+
+                # Por dia: grava cada dia pedido (inclusive vazios) no formato AAAA-MM-DD
+                df = df.drop(columns=['dateRange'], errors='ignore')
+                df['date'] = pd.to_datetime(df['date'], format='%Y%m%d').dt.strftime('%Y-%m-%d')
+                por_dia = dict(tuple(df.groupby('date'))) if not df.empty else {}
+                colunas = list(spec['dimensoes']) + list(spec['metricas'])
+                con.executemany(
+                    "INSERT OR REPLACE INTO dias (property, assinatura, data, dados, salvo_em) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (property_id, assinatura, d.isoformat(),
+                         _df_para_json(por_dia.get(d.isoformat(), df.iloc[0:0])[colunas]), agora)
+                        for d in dias_pedidos
+                    ],
+                )
+                resultados[nome] = None
+
+    # Relatórios aditivos: recompõe o período a partir dos dias guardados
+    with _conectar() as con:
+        for nome, spec in relatorios.items():
+            if resultados.get(nome) is not None:
+                continue
+            assinatura = _assinatura('dia', spec['dimensoes'], spec['metricas'])
+            frames = [
+                _json_para_df(row[0]) for row in con.execute(
+                    "SELECT dados FROM dias WHERE property=? AND assinatura=? AND data BETWEEN ? AND ?",
+                    (property_id, assinatura, inicio.isoformat(), fim.isoformat()),
+                )
+            ]
+            frames = [f for f in frames if not f.empty]
+            if not frames:
+                resultados[nome] = _vazio(spec)
+                continue
+            df = pd.concat(frames, ignore_index=True)
+            metricas = list(spec['metricas'])
+            if spec['dimensoes']:
+                df = df.groupby(list(spec['dimensoes']), as_index=False, sort=False)[metricas].sum()
+            else:
+                df = df[metricas].sum().to_frame().T
+            resultados[nome] = _ordenar_limitar(df, spec)
+
+    return resultados
@@ -0,0 +1,372 @@
+"""
+Coleta de campanhas do Google Ads com granularidade diária.
+
+Os fatos campanha × dia passam pelo armazém local (collectors.ads_warehouse):
+só dias ausentes ou ainda mutáveis vão à API. carregar_campanhas() agrega os
+dias por campanha e recalcula as taxas a partir das somas, de modo que o
+resultado é igual ao de uma consulta única para o período.
+
+Nome, status, lance e tCPA das partições são os do dia gravado; como dias
+fechados não voltam à API, carregar_campanhas() sobrepõe a eles os atributos
+atuais das campanhas (uma consulta sem segmento de data a cada carga).
+
+Colunas de carregar_campanhas():
+  campanha_id, campanha, status, canal, subtipo, tipo_lance, tcpa,
+  custo, impressoes, cliques, interacoes, conversoes, valor_conversoes,
+  engajamentos, video_views,
+  ctr_pct, cpc, cpm, cpa, taxa_conv_pct, taxa_interacao_pct, taxa_engajamento_pct,
+  is_perdida_orcamento_pct, is_perdida_rank_pct, taxa_view_pct, cpv,
+  q25_pct, q50_pct, q75_pct, q100_pct
+  (+ usuarios_unicos, freq_media quando com_alcance=True)
+"""
+
+from operator import attrgetter
+
+import numpy as np
+import pandas as pd
+
+from collectors import ads_warehouse
+
+FONTE_CAMPANHAS = "google_campanhas"
+FONTE_ALCANCE = "google_alcance"
+
+# ---- Lookup dicts para resolver enums numéricos da API ----
+_CHANNEL_TYPE_MAP = {
+    2: "SEARCH", 3: "DISPLAY", 4: "SHOPPING", 5: "HOTEL",
+    6: "VIDEO", 7: "MULTI_CHANNEL", 9: "DISCOVERY",
+}
+_STATUS_MAP = {
+    2: "ENABLED", 3: "PAUSED", 4: "REMOVED",
+}
+_BIDDING_MAP = {
+    2: "ENHANCED_CPC", 5: "MANUAL_CPC", 6: "MANUAL_CPM", 7: "MANUAL_CPV",
+    8: "MAXIMIZE_CONVERSIONS", 9: "MAXIMIZE_CONVERSION_VALUE",
+    12: "TARGET_CPA", 13: "TARGET_CPM", 14: "TARGET_IMPRESSION_SHARE",
+    16: "TARGET_ROAS", 17: "TARGET_SPEND",
+}
+_SUB_TYPE_MAP = {
+    10: "VIDEO_OUTSTREAM", 11: "VIDEO_ACTION", 12: "VIDEO_NON_SKIPPABLE",
+    18: "VIDEO_SEQUENCE", 20: "VIDEO_REACH_TARGET_FREQUENCY",
+}
+
+
+def _razao(num, den, fator=1.0):
+    """num/den * fator com 0 onde den == 0 (vetorizado)."""
+    num = np.asarray(num, dtype=float)
+    den = np.asarray(den, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(den > 0, num / den * fator, 0.0)
+
+
+def _query_campanhas(inicio, fim):
+    return f"""
+        SELECT
+            segments.date,
+            campaign.id,
+            campaign.name,
+            campaign.status,
+            campaign.advertising_channel_type,
+            campaign.advertising_channel_sub_type,
+            campaign.bidding_strategy_type,
+            campaign.target_cpa.target_cpa_micros,
+            campaign.maximize_conversions.target_cpa_micros,
+            metrics.cost_micros,
+            metrics.impressions,
+            metrics.clicks,
+            metrics.interactions,
+            metrics.conversions,
+            metrics.conversions_value,
+            metrics.engagements,
+            metrics.search_impression_share,
+            metrics.search_budget_lost_impression_share,
+            metrics.search_rank_lost_impression_share,
+            metrics.video_quartile_p25_rate,
+            metrics.video_quartile_p50_rate,
+            metrics.video_quartile_p75_rate,
+            metrics.video_quartile_p100_rate
+        FROM campaign
+        WHERE segments.date BETWEEN '{inicio}' AND '{fim}'
+    """
+
+
+def _query_video(inicio, fim):
+    # Métricas de vídeo são incompatíveis com search impression share
+    return f"""
+        SELECT
+            segments.date,
+            campaign.id,
+            metrics.video_views,
+            metrics.video_view_rate,
+            metrics.average_cpv
+        FROM campaign
+        WHERE segments.date BETWEEN '{inicio}' AND '{fim}'
+            AND campaign.advertising_channel_type = 'VIDEO'
+    """
+
+
+# (coluna, caminho do campo no GoogleAdsRow) — extraídos como vieram da API;
+# toda conversão (enums, micros, taxas) é feita depois, por coluna.
+_CAMPOS_CAMPANHAS = [
+    ('data', 'segments.date'),
+    ('campanha_id', 'campaign.id'),
+    ('campanha', 'campaign.name'),
+    ('status', 'campaign.status'),
+    ('canal', 'campaign.advertising_channel_type'),
+    ('subtipo', 'campaign.advertising_channel_sub_type'),
+    ('tipo_lance', 'campaign.bidding_strategy_type'),
+    ('tcpa_micros', 'campaign.target_cpa.target_cpa_micros'),
+    ('tcpa_maxconv_micros', 'campaign.maximize_conversions.target_cpa_micros'),
+    ('custo_micros', 'metrics.cost_micros'),
+    ('impressoes', 'metrics.impressions'),
+    ('cliques', 'metrics.clicks'),
+    ('interacoes', 'metrics.interactions'),
+    ('conversoes', 'metrics.conversions'),
+    ('valor_conversoes', 'metrics.conversions_value'),
+    ('engajamentos', 'metrics.engagements'),
+    ('is_share', 'metrics.search_impression_share'),
+    ('is_perdida_orcamento', 'metrics.search_budget_lost_impression_share'),
+    ('is_perdida_rank', 'metrics.search_rank_lost_impression_share'),
+    ('q25', 'metrics.video_quartile_p25_rate'),
+    ('q50', 'metrics.video_quartile_p50_rate'),
+    ('q75', 'metrics.video_quartile_p75_rate'),
+    ('q100', 'metrics.video_quartile_p100_rate'),
+]
+
+_CAMPOS_VIDEO = [
+    ('data', 'segments.date'),
+    ('campanha_id', 'campaign.id'),
+    ('video_views', 'metrics.video_views'),
+    ('video_view_rate', 'metrics.video_view_rate'),
+    ('cpv_micros', 'metrics.average_cpv'),
+]
+
+# (coluna, nome do enum no client, fallback estático)
+_ENUMS = [
+    ('status', 'CampaignStatusEnum', _STATUS_MAP),
+    ('canal', 'AdvertisingChannelTypeEnum', _CHANNEL_TYPE_MAP),
+    ('subtipo', 'AdvertisingChannelSubTypeEnum', _SUB_TYPE_MAP),
+    ('tipo_lance', 'BiddingStrategyTypeEnum', _BIDDING_MAP),
+]
+
+
+def _mapa_enum(client, nome_enum, fallback):
+    """{valor inteiro: nome} do enum da API; usa o dict estático se o client não expuser."""
+    mapa = dict(fallback)
+    try:
+        for membro in getattr(client.enums, nome_enum):
+            mapa[int(membro.value)] = membro.name
+    except Exception:
+        pass
+    return mapa
+
+
+def _stream_colunas(ga_service, customer_id, query, campos) -> pd.DataFrame:
+    """Executa search_stream e devolve os campos brutos como colunas.
+    Por linha só há a extração dos campos (attrgetter, em C); nenhuma lógica Python."""
+    colunas = [c for c, _ in campos]
+    extrair = attrgetter(*[caminho for _, caminho in campos])
+    registros = []
+    for batch in ga_service.search_stream(customer_id=customer_id, query=query):
+        registros.extend(map(extrair, batch.results))
+    return pd.DataFrame.from_records(registros, columns=colunas)
+
+
+def _enum_para_nome(serie: pd.Series, mapa) -> pd.Series:
+    """Enum (proto-plus ou int) → nome, vetorizado; valores desconhecidos viram o próprio número."""
+    codigos = serie.astype('int64')
+    return codigos.map(mapa).fillna(codigos.astype(str))
+
+
+def buscar_campanhas_dia(client, customer_id, inicio, fim) -> pd.DataFrame:
+    """Fatos campanha × dia direto da API (sem armazém). Propaga exceções.
+    Duas consultas via search_stream: métricas de vídeo não podem ser
+    selecionadas junto com search impression share."""
+    ga_service = client.get_service("GoogleAdsService")
+
+    df = _stream_colunas(ga_service, customer_id, _query_campanhas(inicio, fim), _CAMPOS_CAMPANHAS)
+    if df.empty:
+        return pd.DataFrame()
+
+    for coluna, nome_enum, fallback in _ENUMS:
+        df[coluna] = _enum_para_nome(df[coluna], _mapa_enum(client, nome_enum, fallback))
+
+    df['campanha_id'] = df['campanha_id'].astype('int64')
+    numericas = [c for c, caminho in _CAMPOS_CAMPANHAS if caminho.startswith('metrics.') or c.endswith('_micros')]
+    num = df[numericas].apply(pd.to_numeric, errors='coerce').fillna(0)
+    df['custo'] = num['custo_micros'] / 1_000_000
+    tcpa = num['tcpa_micros'].where(num['tcpa_micros'] > 0, num['tcpa_maxconv_micros'])
+    df['tcpa'] = tcpa / 1_000_000
+    impressoes = num['impressoes']
+    # Impressões elegíveis da rede de pesquisa: permitem somar as parcelas
+    # perdidas entre dias ponderando pelo tamanho do leilão de cada dia.
+    elegiveis = pd.Series(_razao(impressoes, num['is_share']), index=df.index)
+    df['is_elegiveis'] = elegiveis
+    df['is_perdida_orcamento_imps'] = num['is_perdida_orcamento'] * elegiveis
+    df['is_perdida_rank_imps'] = num['is_perdida_rank'] * elegiveis
+    for q in ('q25', 'q50', 'q75', 'q100'):
+        df[f'{q}_imps'] = num[q] * impressoes
+    for coluna in ('impressoes', 'cliques', 'interacoes', 'engajamentos'):
+        df[coluna] = num[coluna].astype('int64')
+    df['conversoes'] = num['conversoes']
+    df['valor_conversoes'] = num['valor_conversoes']
+
+    df_video = _stream_colunas(ga_service, customer_id, _query_video(inicio, fim), _CAMPOS_VIDEO)
+    if df_video.empty:
+        df_video = pd.DataFrame(columns=['data', 'campanha_id', 'video_views', 'impressoes_video', 'custo_views'])
+    else:
+        df_video['campanha_id'] = df_video['campanha_id'].astype('int64')
+        vnum = df_video[['video_views', 'video_view_rate', 'cpv_micros']].apply(pd.to_numeric, errors='coerce').fillna(0)
+        df_video = pd.DataFrame({
+            'data': df_video['data'],
+            'campanha_id': df_video['campanha_id'],
+            'video_views': vnum['video_views'],
+            'impressoes_video': _razao(vnum['video_views'], vnum['video_view_rate']),
+            'custo_views': vnum['cpv_micros'] / 1_000_000 * vnum['video_views'],
+        })
+
+    df = df.merge(df_video, on=['data', 'campanha_id'], how='left')
+    df[['video_views', 'impressoes_video', 'custo_views']] = df[['video_views', 'impressoes_video', 'custo_views']].fillna(0)
+    df['video_views'] = df['video_views'].astype('int64')
+
+    return df.drop(columns=[
+        'tcpa_micros', 'tcpa_maxconv_micros', 'custo_micros',
+        'is_share', 'is_perdida_orcamento', 'is_perdida_rank', 'q25', 'q50', 'q75', 'q100',
+    ])
+
+
+def buscar_alcance_periodo(client, customer_id, inicio, fim) -> pd.DataFrame:
+    """Usuários únicos e frequência do período (não aditivos entre dias)."""
+    ga_service = client.get_service("GoogleAdsService")
+    query = f"""
+        SELECT
+            campaign.id,
+            metrics.unique_users,
+            metrics.average_impression_frequency_per_user
+        FROM campaign
+        WHERE segments.date BETWEEN '{inicio}' AND '{fim}'
+            AND metrics.impressions > 0
+    """
+    df = _stream_colunas(ga_service, customer_id, query, [
+        ('campanha_id', 'campaign.id'),
+        ('usuarios_unicos', 'metrics.unique_users'),
+        ('freq_media', 'metrics.average_impression_frequency_per_user'),
+    ])
+    df['campanha_id'] = df['campanha_id'].astype('int64')
+    df['usuarios_unicos'] = pd.to_numeric(df['usuarios_unicos'], errors='coerce').fillna(0).astype('int64')
+    df['freq_media'] = pd.to_numeric(df['freq_media'], errors='coerce').fillna(0.0)
+    return df
+
+
+_CAMPOS_ATRIBUTOS = [
+    ('campanha_id', 'campaign.id'),
+    ('campanha', 'campaign.name'),
+    ('status', 'campaign.status'),
+    ('canal', 'campaign.advertising_channel_type'),
+    ('subtipo', 'campaign.advertising_channel_sub_type'),
+    ('tipo_lance', 'campaign.bidding_strategy_type'),
+    ('tcpa_micros', 'campaign.target_cpa.target_cpa_micros'),
+    ('tcpa_maxconv_micros', 'campaign.maximize_conversions.target_cpa_micros'),
+]
+
+
+def buscar_atributos_atuais(client, customer_id, campanha_ids) -> pd.DataFrame:
+    """Nome, status, canal, lance e tCPA de hoje das campanhas (sem segmento de data)."""
+    ids = sorted({int(i) for i in campanha_ids})
+    if not ids:
+        return pd.DataFrame()
+    ga_service = client.get_service("GoogleAdsService")
+    query = f"""
+        SELECT
+            {", ".join(caminho for _, caminho in _CAMPOS_ATRIBUTOS)}
+        FROM campaign
+        WHERE campaign.id IN ({", ".join(map(str, ids))})
+    """
+    df = _stream_colunas(ga_service, customer_id, query, _CAMPOS_ATRIBUTOS)
+    if df.empty:
+        return pd.DataFrame()
+    for coluna, nome_enum, fallback in _ENUMS:
+        df[coluna] = _enum_para_nome(df[coluna], _mapa_enum(client, nome_enum, fallback))
+    df['campanha_id'] = df['campanha_id'].astype('int64')
+    micros = df[['tcpa_micros', 'tcpa_maxconv_micros']].apply(pd.to_numeric, errors='coerce').fillna(0)
+    df['tcpa'] = micros['tcpa_micros'].where(micros['tcpa_micros'] > 0, micros['tcpa_maxconv_micros']) / 1_000_000
+    return df.drop(columns=['tcpa_micros', 'tcpa_maxconv_micros'])
+
+
+def _atualizar_atributos(df: pd.DataFrame, df_atuais: pd.DataFrame) -> pd.DataFrame:
+    """Sobrepõe os atributos atuais aos do último dia gravado (campanhas ausentes ficam como estão)."""
+    if df_atuais is None or df_atuais.empty:
+        return df
+    df = df.copy()
+    atuais = df_atuais.set_index('campanha_id')
+    ids = df['campanha_id']
+    for coluna in atuais.columns:
+        if coluna in df.columns:
+            df[coluna] = ids.map(atuais[coluna]).where(ids.isin(atuais.index), df[coluna])
+    return df
+
+
+def agregar_campanhas(df_dias: pd.DataFrame) -> pd.DataFrame:
+    """Soma os fatos diários por campanha e recalcula as taxas do período.
+    Atributos (nome, status, lance...) ficam os do último dia gravado."""
+    if df_dias is None or df_dias.empty:
+        return pd.DataFrame()
+
+    df_dias = df_dias.sort_values('data')
+    atributos = ['campanha', 'status', 'canal', 'subtipo', 'tipo_lance', 'tcpa']
+    somas = [
+        'custo', 'impressoes', 'cliques', 'interacoes', 'conversoes', 'valor_conversoes',
+        'engajamentos', 'is_elegiveis', 'is_perdida_orcamento_imps', 'is_perdida_rank_imps',
+        'q25_imps', 'q50_imps', 'q75_imps', 'q100_imps',
+        'video_views', 'impressoes_video', 'custo_views',
+    ]
+    agg = {col: 'last' for col in atributos}
+    agg.update({col: 'sum' for col in somas})
+    df = df_dias.groupby('campanha_id', as_index=False, sort=False).agg(agg)
+
+    df['ctr_pct'] = _razao(df['cliques'], df['impressoes'], 100)
+    df['cpc'] = _razao(df['custo'], df['cliques'])
+    df['cpm'] = _razao(df['custo'], df['impressoes'], 1000)
+    df['cpa'] = _razao(df['custo'], df['conversoes'])
+    df['taxa_conv_pct'] = _razao(df['conversoes'], df['interacoes'], 100)
+    df['taxa_interacao_pct'] = _razao(df['interacoes'], df['impressoes'], 100)
+    df['taxa_engajamento_pct'] = _razao(df['engajamentos'], df['impressoes'], 100)
+    df['taxa_view_pct'] = _razao(df['video_views'], df['impressoes_video'], 100)
+    df['cpv'] = _razao(df['custo_views'], df['video_views'])
+    for q in ('q25', 'q50', 'q75', 'q100'):
+        df[f'{q}_pct'] = _razao(df[f'{q}_imps'], df['impressoes'], 100)
+    # Parcela de impressão só existe para campanhas de pesquisa (NaN nas demais)
+    sem_is = df['is_elegiveis'] <= 0
+    df['is_perdida_orcamento_pct'] = _razao(df['is_perdida_orcamento_imps'], df['is_elegiveis'], 100)
+    df['is_perdida_rank_pct'] = _razao(df['is_perdida_rank_imps'], df['is_elegiveis'], 100)
+    df.loc[sem_is, ['is_perdida_orcamento_pct', 'is_perdida_rank_pct']] = np.nan
+
+    auxiliares = [
+        'is_elegiveis', 'is_perdida_orcamento_imps', 'is_perdida_rank_imps',
+        'q25_imps', 'q50_imps', 'q75_imps', 'q100_imps', 'impressoes_video', 'custo_views',
+    ]
+    return df.drop(columns=auxiliares).sort_values('custo', ascending=False).reset_index(drop=True)
+
+
+def carregar_campanhas(client, customer_id, inicio, fim, com_alcance=False, dias_mutaveis=None) -> pd.DataFrame:
+    """Campanhas agregadas do período, lendo do armazém local. Propaga exceções."""
+    customer_id = str(customer_id).replace("-", "")
+    df_dias = ads_warehouse.carregar_dias(
+        FONTE_CAMPANHAS, customer_id, inicio, fim,
+        lambda ini, f: buscar_campanhas_dia(client, customer_id, ini, f),
+        dias_mutaveis=dias_mutaveis,
+    )
+    df = agregar_campanhas(df_dias)
+    if df.empty:
+        return df
+    df = _atualizar_atributos(df, buscar_atributos_atuais(client, customer_id, df['campanha_id']))
+    if not com_alcance:
+        return df
+
+    df_alcance = ads_warehouse.carregar_periodo(
+        FONTE_ALCANCE, customer_id, inicio, fim,
+        lambda ini, f: buscar_alcance_periodo(client, customer_id, ini, f),
+        dias_mutaveis=dias_mutaveis,
+    )
+    df = df.merge(df_alcance, on='campanha_id', how='left')
+    df[['usuarios_unicos', 'freq_media']] = df[['usuarios_unicos', 'freq_media']].fillna(0)
+    return df
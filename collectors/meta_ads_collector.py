@@ -0,0 +1,359 @@
+"""
+Coleta de campanhas do Meta Ads com granularidade diária.
+
+Mesma ideia do google_ads_collector: fatos campanha × dia (time_increment=1)
+guardados no armazém local e agregados por campanha com taxas recalculadas.
+Alcance e frequência não somam entre dias e vêm de uma consulta do período
+(guardada quando o período já está fechado).
+
+atribuicao_conta=True usa a configuração de atribuição da conta (igual ao
+Gerenciador de Anúncios); os números diferem da atribuição padrão da API, por
+isso cada variante tem sua própria partição no armazém.
+
+Consultas à API de insights:
+  - períodos longos (>= META_INSIGHTS_ASYNC_DIAS) rodam como relatório
+    assíncrono (AdReportRun) acompanhado com backoff; consultas síncronas
+    recusadas por volume ("reduce the amount of data") também caem nesse
+    caminho;
+  - o cursor é consumido página a página e cada página vira um DataFrame;
+  - breakdowns independentes são buscados em paralelo (carregar_breakdowns).
+O armazém é particionado por conta, nível (campaign/account), breakdown e dia
+(fonte meta_<nivel>[_<breakdown>][_atrib_conta]).
+
+Colunas de carregar_campanhas():
+  campanha_id, campanha, objetivo, custo, impressoes, cliques, cliques_link,
+  lead_presencial, lead_live, lead_online, compras, conversoes,
+  ctr_pct, cpc, cpm, ctr_link_pct, cpc_link, cpa
+  (+ alcance, frequencia quando com_alcance=True)
+
+ENV VARS:
+  META_INSIGHTS_ASYNC_DIAS     — default 14 (a partir daí usa relatório assíncrono)
+  META_INSIGHTS_ASYNC_TIMEOUT  — default 600 (segundos aguardando um relatório assíncrono)
+  META_INSIGHTS_PAGE_SIZE      — default 500 (linhas por página do cursor)
+"""
+
+import logging
+import os
+import time
+from datetime import date
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+from facebook_business.adobjects.adreportrun import AdReportRun
+from facebook_business.adobjects.adsinsights import AdsInsights
+from facebook_business.exceptions import FacebookRequestError
+
+from collectors import ads_warehouse
+from collectors.coleta_paralela import coletar_em_paralelo
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DIAS = int(os.getenv("META_INSIGHTS_ASYNC_DIAS", "14"))
+ASYNC_TIMEOUT = float(os.getenv("META_INSIGHTS_ASYNC_TIMEOUT", "600"))
+PAGE_SIZE = int(os.getenv("META_INSIGHTS_PAGE_SIZE", "500"))
+
+# Erros de "volume grande demais" da API síncrona — refeitos como relatório assíncrono
+_ERROS_VOLUME = (1, 2)
+_SUBCODES_VOLUME = (1487534,)
+
+# action_types que contam como conversão (fallback quando não há submit_application_total)
+CONVERSION_ACTIONS = {
+    'purchase', 'lead', 'omni_purchase',
+    'offsite_conversion.fb_pixel_purchase',
+    'offsite_conversion.fb_pixel_lead',
+    'submit_application_total',
+    'onsite_conversion.lead_grouped',
+}
+
+# Eventos pixel de lead (campo 'conversions')
+LEAD_EVENTS = {
+    'offsite_conversion.fb_pixel_custom.lead_presencial': 'lead_presencial',
+    'offsite_conversion.fb_pixel_custom.lead_live': 'lead_live',
+    'offsite_conversion.fb_pixel_custom.lead_online': 'lead_online',
+}
+
+# "Compras no site" do Gerenciador = pixel purchase offsite
+VENDA_ACTIONS = {
+    'offsite_conversion.fb_pixel_purchase',
+}
+
+
+def _fonte(nivel, breakdown=None, atribuicao_conta=False):
+    """Nome da partição no armazém: meta_<nivel>[_<breakdown>][_atrib_conta]."""
+    fonte = f"meta_{nivel}"
+    if breakdown:
+        fonte += f"_{breakdown}"
+    return f"{fonte}_atrib_conta" if atribuicao_conta else fonte
+
+
+def _conta(account) -> str:
+    return str(account.get_id())
+
+
+def _params_base(inicio, fim, atribuicao_conta, nivel='campaign'):
+    params = {
+        'level': nivel,
+        'time_range': {'since': str(inicio), 'until': str(fim)},
+    }
+    if atribuicao_conta:
+        params['use_account_attribution_setting'] = True
+    return params
+
+
+def _dias(params) -> int:
+    intervalo = params['time_range']
+    return (date.fromisoformat(intervalo['until']) - date.fromisoformat(intervalo['since'])).days + 1
+
+
+def _erro_de_volume(e: FacebookRequestError) -> bool:
+    return (
+        e.api_error_code() in _ERROS_VOLUME
+        or e.api_error_subcode() in _SUBCODES_VOLUME
+        or 'reduce the amount of data' in (e.api_error_message() or '')
+    )
+
+
+def _aguardar_relatorio(job):
+    """Acompanha um AdReportRun até concluir (backoff de 1s a 15s)."""
+    espera = 1.0
+    limite = time.monotonic() + ASYNC_TIMEOUT
+    while True:
+        job = job.api_get(fields=[
+            AdReportRun.Field.async_status,
+            AdReportRun.Field.async_percent_completion,
+        ])
+        status = job[AdReportRun.Field.async_status]
+        if status == 'Job Completed':
+            return job
+        if status in ('Job Failed', 'Job Skipped'):
+            raise RuntimeError(f"Relatório assíncrono do Meta terminou com status '{status}'")
+        if time.monotonic() > limite:
+            raise TimeoutError(f"Relatório assíncrono do Meta não concluiu em {ASYNC_TIMEOUT:.0f}s")
+        logger.debug("[meta] relatório %s: %s%%", job.get_id(), job[AdReportRun.Field.async_percent_completion])
+        time.sleep(espera)
+        espera = min(espera * 1.5, 15.0)
+
+
+def _cursor_insights(account, fields, params):
+    """Cursor de insights: síncrono para períodos curtos, assíncrono para longos."""
+    params = dict(params, limit=PAGE_SIZE)
+    if _dias(params) < ASYNC_DIAS:
+        try:
+            # execute() já carrega a primeira página: erros de volume aparecem aqui
+            return account.get_insights(fields=fields, params=params)
+        except FacebookRequestError as e:
+            if not _erro_de_volume(e):
+                raise
+            logger.info("[meta] consulta síncrona recusada por volume; usando relatório assíncrono")
+    job = account.get_insights(fields=fields, params=params, is_async=True)
+    return _aguardar_relatorio(job).get_result(params={'limit': PAGE_SIZE})
+
+
+def _paginas(cursor, tamanho=None) -> Iterator[List]:
+    """Consome o cursor em blocos do tamanho da página (a próxima página só é pedida ao esgotar a atual)."""
+    tamanho = tamanho or PAGE_SIZE
+    pagina = []
+    for item in cursor:
+        pagina.append(item)
+        if len(pagina) >= tamanho:
+            yield pagina
+            pagina = []
+    if pagina:
+        yield pagina
+
+
+def _insights_df(account, fields, params, linha, colunas=None) -> pd.DataFrame:
+    """Executa a consulta e monta um DataFrame por página do cursor, concatenados no final."""
+    frames = [
+        pd.DataFrame.from_records([linha(i) for i in pagina], columns=colunas)
+        for pagina in _paginas(_cursor_insights(account, fields, params))
+    ]
+    if not frames:
+        return pd.DataFrame(columns=colunas)
+    return pd.concat(frames, ignore_index=True)
+
+
+_CAMPOS_CAMPANHA_DIA = [
+    AdsInsights.Field.campaign_id,
+    AdsInsights.Field.campaign_name,
+    AdsInsights.Field.objective,
+    AdsInsights.Field.spend,
+    AdsInsights.Field.impressions,
+    AdsInsights.Field.clicks,
+    'inline_link_clicks',
+    AdsInsights.Field.actions,
+    'conversions',
+]
+
+
+def _linha_campanha_dia(insight) -> Dict:
+    leads = {'lead_presencial': 0, 'lead_live': 0, 'lead_online': 0}
+    conv_submit = 0
+    for conv in insight.get('conversions', []) or []:
+        atype = conv.get('action_type', '')
+        val = int(float(conv.get('value', 0)))
+        if atype in LEAD_EVENTS:
+            leads[LEAD_EVENTS[atype]] += val
+        elif atype == 'submit_application_total':
+            conv_submit += val
+
+    compras = 0
+    conv_acoes = 0
+    for action in insight.get(AdsInsights.Field.actions, []) or []:
+        atype = action.get('action_type', '')
+        val = int(float(action.get('value', 0)))
+        if atype in VENDA_ACTIONS:
+            compras += val
+        if atype in CONVERSION_ACTIONS:
+            conv_acoes += val
+
+    return {
+        'data': insight.get('date_start'),
+        'campanha_id': str(insight.get(AdsInsights.Field.campaign_id, '')),
+        'campanha': insight.get(AdsInsights.Field.campaign_name, ''),
+        'objetivo': insight.get(AdsInsights.Field.objective, ''),
+        'custo': float(insight.get(AdsInsights.Field.spend, 0)),
+        'impressoes': int(insight.get(AdsInsights.Field.impressions, 0)),
+        'cliques': int(insight.get(AdsInsights.Field.clicks, 0)),
+        'cliques_link': int(insight.get('inline_link_clicks', 0)),
+        'compras': compras,
+        'conv_submit': conv_submit,
+        'conv_acoes': conv_acoes,
+        **leads,
+    }
+
+
+def buscar_campanhas_dia(account, inicio, fim, atribuicao_conta=False) -> pd.DataFrame:
+    """Fatos campanha × dia direto da API (sem armazém). Propaga exceções."""
+    params = _params_base(inicio, fim, atribuicao_conta)
+    params['time_increment'] = 1
+    df = _insights_df(account, _CAMPOS_CAMPANHA_DIA, params, _linha_campanha_dia)
+    return df if not df.empty else pd.DataFrame()
+
+
+def buscar_alcance_periodo(account, inicio, fim) -> pd.DataFrame:
+    """Alcance e frequência do período (não aditivos entre dias)."""
+    fields = [
+        AdsInsights.Field.campaign_id,
+        AdsInsights.Field.reach,
+        AdsInsights.Field.frequency,
+    ]
+    return _insights_df(
+        account, fields, _params_base(inicio, fim, False),
+        lambda insight: {
+            'campanha_id': str(insight.get(AdsInsights.Field.campaign_id, '')),
+            'alcance': int(insight.get(AdsInsights.Field.reach, 0)),
+            'frequencia': float(insight.get(AdsInsights.Field.frequency, 0)),
+        },
+        colunas=['campanha_id', 'alcance', 'frequencia'],
+    )
+
+
+def buscar_breakdown_dia(account, inicio, fim, breakdown, nivel='account') -> pd.DataFrame:
+    """Custo por segmento (age, gender, ...) e dia, direto da API."""
+    params = _params_base(inicio, fim, False, nivel)
+    params['time_increment'] = 1
+    params['breakdowns'] = [breakdown]
+    df = _insights_df(
+        account, [AdsInsights.Field.spend], params,
+        lambda insight: {
+            'data': insight.get('date_start'),
+            'segmento': insight.get(breakdown),
+            'custo': float(insight.get(AdsInsights.Field.spend, 0)),
+        },
+    )
+    return df if not df.empty else pd.DataFrame()
+
+
+def _razao(num, den, fator=1.0):
+    num = np.asarray(num, dtype=float)
+    den = np.asarray(den, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(den > 0, num / den * fator, 0.0)
+
+
+def agregar_campanhas(df_dias: pd.DataFrame) -> pd.DataFrame:
+    """Soma os fatos diários por campanha e recalcula as taxas do período."""
+    if df_dias is None or df_dias.empty:
+        return pd.DataFrame()
+
+    df_dias = df_dias.sort_values('data')
+    somas = [
+        'custo', 'impressoes', 'cliques', 'cliques_link', 'compras',
+        'conv_submit', 'conv_acoes', 'lead_presencial', 'lead_live', 'lead_online',
+    ]
+    agg = {'campanha': 'last', 'objetivo': 'last'}
+    agg.update({col: 'sum' for col in somas})
+    df = df_dias.groupby('campanha_id', as_index=False, sort=False).agg(agg)
+
+    # submit_application_total quando houver; senão, soma dos action_types de conversão
+    df['conversoes'] = df['conv_submit'].where(df['conv_submit'] > 0, df['conv_acoes'])
+    df['ctr_pct'] = _razao(df['cliques'], df['impressoes'], 100)
+    df['cpc'] = _razao(df['custo'], df['cliques'])
+    df['cpm'] = _razao(df['custo'], df['impressoes'], 1000)
+    df['ctr_link_pct'] = _razao(df['cliques_link'], df['impressoes'], 100)
+    df['cpc_link'] = _razao(df['custo'], df['cliques_link'])
+    df['cpa'] = _razao(df['custo'], df['conversoes'])
+    return (
+        df.drop(columns=['conv_submit', 'conv_acoes'])
+        .sort_values('custo', ascending=False)
+        .reset_index(drop=True)
+    )
+
+
+def carregar_campanhas(account, inicio, fim, atribuicao_conta=False, com_alcance=False,
+                       dias_mutaveis=None) -> pd.DataFrame:
+    """Campanhas agregadas do período, lendo do armazém local. Propaga exceções."""
+    conta = _conta(account)
+    df_dias = ads_warehouse.carregar_dias(
+        _fonte('campaign', atribuicao_conta=atribuicao_conta), conta, inicio, fim,
+        lambda ini, f: buscar_campanhas_dia(account, ini, f, atribuicao_conta),
+        dias_mutaveis=dias_mutaveis,
+    )
+    df = agregar_campanhas(df_dias)
+    if df.empty or not com_alcance:
+        return df
+
+    df_alcance = ads_warehouse.carregar_periodo(
+        _fonte('campaign', 'alcance'), conta, inicio, fim,
+        lambda ini, f: buscar_alcance_periodo(account, ini, f),
+        dias_mutaveis=dias_mutaveis,
+    )
+    df = df.merge(df_alcance, on='campanha_id', how='left')
+    df[['alcance', 'frequencia']] = df[['alcance', 'frequencia']].fillna(0)
+    return df
+
+
+def carregar_breakdown(account, inicio, fim, breakdown, nivel='account', dias_mutaveis=None) -> pd.DataFrame:
+    """
+    Custo total por segmento no período (colunas: Segmento, Custo).
+
+    nivel='account' devolve os mesmos totais de custo que o nível de campanha
+    com uma linha por segmento × dia (em vez de campanha × segmento × dia).
+    """
+    df_dias = ads_warehouse.carregar_dias(
+        _fonte(nivel, breakdown), _conta(account), inicio, fim,
+        lambda ini, f: buscar_breakdown_dia(account, ini, f, breakdown, nivel),
+        dias_mutaveis=dias_mutaveis,
+    )
+    if df_dias.empty:
+        return pd.DataFrame(columns=['Segmento', 'Custo'])
+    return (
+        df_dias.groupby('segmento')['custo'].sum()
+        .sort_values(ascending=False)
+        .reset_index()
+        .rename(columns={'segmento': 'Segmento', 'custo': 'Custo'})
+    )
+
+
+def carregar_breakdowns(account, inicio, fim, breakdowns, nivel='account', dias_mutaveis=None) -> Dict[str, Dict]:
+    """
+    Vários breakdowns em paralelo. Devolve {breakdown: resultado} no formato de
+    coletar_em_paralelo ({'dados': DataFrame | None, 'erro': str | None, 'duracao': float}).
+    """
+    tarefas = {
+        b: (lambda b=b: carregar_breakdown(account, inicio, fim, b, nivel, dias_mutaveis))
+        for b in breakdowns
+    }
+    return coletar_em_paralelo(tarefas, timeout=ASYNC_TIMEOUT)
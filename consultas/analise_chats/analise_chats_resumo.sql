@@ -0,0 +1,75 @@
+-- Versão enxuta de analise_chats.sql para listas e agregações:
+-- sem c.transcript e sem o JSON completo de c.ai_evaluation. Do JSON vem só
+-- o que os painéis agregam (avaliacao_resumo, mesma estrutura do original).
+-- Transcrição e avaliação completa: utils.transcricoes_loader.carregar_detalhes_chats.
+SELECT
+    COALESCE(c.opportunity_id, i.id) as oportunidade_id,
+    ip.p1_score as p1_pontos,
+    ip.p2_score as p2_pontos,
+    ip.total_score as score_bot_total,
+    s2.name as etapa_crm,
+    c.chat_id,
+    c.octa_created_at as data_chat,
+    c.created_at as data_criacao_sistema,
+    CASE
+        WHEN c.octa_origin LIKE '%2139701015%' OR c.octa_origin LIKE '%Degrau%' THEN 'Degrau'
+        WHEN c.octa_origin LIKE '%1130178800%' OR c.octa_origin LIKE '%Central%' THEN 'Central'
+        WHEN i.school_id = 1 THEN 'Degrau'
+        WHEN i.school_id IS NOT NULL THEN 'Central'
+        ELSE 'Degrau'
+    END as empresa,
+    COALESCE(c.octa_agent, u.full_name) as agente,
+    o.name as origem,
+    CASE WHEN c.ai_evaluation IS NOT NULL AND c.ai_evaluation != '' THEN 1 ELSE 0 END as avaliada,
+    CASE WHEN c.transcript IS NOT NULL AND CHAR_LENGTH(c.transcript) >= 300 THEN 1 ELSE 0 END as avaliavel,
+    c.vendor_score as evaluation_ia,
+    c.lead_score,
+    c.main_product as produto_recomendado,
+    c.classification as classificacao_triagem,
+    c.classification_reason as motivo_triagem,
+    CASE WHEN JSON_VALID(c.ai_evaluation) THEN JSON_OBJECT(
+        'lead_classificacao',  JSON_EXTRACT(c.ai_evaluation, '$.lead_classificacao'),
+        'vendedor_disclaimer', JSON_EXTRACT(c.ai_evaluation, '$.vendedor_disclaimer'),
+        'lead_disclaimer',     JSON_EXTRACT(c.ai_evaluation, '$.lead_disclaimer'),
+        'avaliacao_lead', JSON_OBJECT(
+            'classificacao',          JSON_EXTRACT(c.ai_evaluation, '$.avaliacao_lead.classificacao'),
+            'perguntas_que_faltaram', JSON_EXTRACT(c.ai_evaluation, '$.avaliacao_lead.perguntas_que_faltaram'),
+            'perguntas_faltantes',    JSON_EXTRACT(c.ai_evaluation, '$.avaliacao_lead.perguntas_faltantes')
+        ),
+        'avaliacao_vendedor', JSON_OBJECT(
+            'pontos_fortes',       JSON_EXTRACT(c.ai_evaluation, '$.avaliacao_vendedor.pontos_fortes'),
+            'melhorias',           JSON_EXTRACT(c.ai_evaluation, '$.avaliacao_vendedor.melhorias'),
+            'erro_mais_caro',      JSON_EXTRACT(c.ai_evaluation, '$.avaliacao_vendedor.erro_mais_caro'),
+            'alertas',             JSON_EXTRACT(c.ai_evaluation, '$.avaliacao_vendedor.alertas'),
+            'notas_por_categoria', JSON_EXTRACT(c.ai_evaluation, '$.avaliacao_vendedor.notas_por_categoria'),
+            'tratamento_lead_qualificado', JSON_OBJECT(
+                'status', JSON_EXTRACT(c.ai_evaluation, '$.avaliacao_vendedor.tratamento_lead_qualificado.status')
+            )
+        ),
+        'qualidade_entrada', JSON_OBJECT(
+            'iqh_0_100', JSON_EXTRACT(c.ai_evaluation, '$.qualidade_entrada.iqh_0_100')
+        ),
+        'extracao', JSON_OBJECT(
+            'dores_principais', JSON_EXTRACT(c.ai_evaluation, '$.extracao.dores_principais'),
+            'restricoes',       JSON_EXTRACT(c.ai_evaluation, '$.extracao.restricoes'),
+            'concurso_area',    JSON_EXTRACT(c.ai_evaluation, '$.extracao.concurso_area')
+        )
+    ) END as avaliacao_resumo,
+    c.vendedor_disclaimer,
+    c.lead_disclaimer,
+    c.octa_origin,
+    c.octa_group,
+    c.octa_status,
+    c.octa_contact_name,
+    c.octa_contact_phone
+FROM seducar.chat_ai_evaluations c
+LEFT JOIN (
+    SELECT chat_id, MAX(id) AS id FROM seducar.interesteds GROUP BY chat_id
+) i_latest ON c.chat_id = i_latest.chat_id
+LEFT JOIN seducar.interesteds i ON i.id = i_latest.id
+LEFT JOIN seducar.users u ON i.owner_id = u.id
+LEFT JOIN seducar.opportunity_origins o ON i.opportunity_origin_id = o.id
+LEFT JOIN seducar.interesteds i2 ON i2.id = COALESCE(c.opportunity_id, i.id)
+LEFT JOIN seducar.interested_pontuations ip ON ip.interested_id = i2.id
+LEFT JOIN seducar.opportunity_steps s2 ON i2.opportunity_step_id = s2.id
+ORDER BY c.octa_created_at DESC
@@ -0,0 +1,6 @@
+SELECT
+    c.chat_id,
+    c.transcript,
+    c.ai_evaluation
+FROM seducar.chat_ai_evaluations c
+WHERE c.chat_id IN ({ids})
@@ -1,6 +1,5 @@
 SELECT
     s.transcription_id,
-    s.ai_insight AS ai_evaluation,
     s.ai_evaluation AS evaluation_ia,
     s.lead_score,
     s.lead_classification,
@@ -8,10 +7,9 @@ SELECT
     s.improvements,
     s.most_expensive_mistake,
     s.contest_area,
-    s.main_product,
     s.vendedor_disclaimer,
     s.lead_disclaimer,
-    t.agent AS agente,
+    COALESCE(t.agent, JSON_UNQUOTE(JSON_EXTRACT(t.original_transcript, '$.agente'))) AS agente,
     t.date AS data_avaliacao,
     CASE
         WHEN t.school_id = 1 THEN 'Degrau'
@@ -0,0 +1,12 @@
+-- Chats já classificados para treinar a triagem local.
+SELECT
+    c.chat_id               AS item_id,
+    c.transcript            AS texto,
+    c.classification        AS rotulo,
+    c.classification_reason AS motivo,
+    c.octa_agent            AS agente
+FROM seducar.chat_ai_evaluations c
+WHERE c.classification IS NOT NULL
+  AND c.transcript IS NOT NULL
+ORDER BY c.octa_created_at DESC
+LIMIT {limite}
@@ -0,0 +1,17 @@
+-- Ligações já classificadas (Claude ou heurística) para treinar a triagem local.
+-- rotulo: classificacao_ligacao (insight mínimo de não-venda) ou tipo (avaliação completa).
+SELECT
+    s.transcription_id AS item_id,
+    t.transcript       AS texto,
+    COALESCE(
+        JSON_UNQUOTE(JSON_EXTRACT(s.ai_insight, '$.classificacao_ligacao')),
+        JSON_UNQUOTE(JSON_EXTRACT(s.ai_insight, '$.tipo'))
+    )                  AS rotulo,
+    JSON_UNQUOTE(JSON_EXTRACT(s.ai_insight, '$.motivo')) AS motivo,
+    NULL               AS agente
+FROM seducar.transcription_ai_summaries s
+JOIN seducar.opportunity_transcripts t ON t.id = s.transcription_id
+WHERE JSON_VALID(s.ai_insight)
+  AND t.transcript IS NOT NULL
+ORDER BY s.transcription_id DESC
+LIMIT {limite}
@@ -0,0 +1,34 @@
+"""
+Aviso de relatório pronto num canal do Slack (Incoming Webhook).
+
+Só o título e o começo da análise — o relatório completo fica na página
+Relatórios IA. Sem webhook configurado, não faz nada.
+
+ENV VARS:
+  SLACK_WEBHOOK_RELATORIOS  — URL do Incoming Webhook (vazio = desligado)
+  SLACK_RELATORIO_CARACTERES — trecho da análise incluído no aviso (default 2500)
+"""
+
+import logging
+import os
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CARACTERES = int(os.getenv("SLACK_RELATORIO_CARACTERES", "2500"))
+
+
+def enviar_relatorio(titulo: str, analise: str, webhook_url: str = None) -> bool:
+    """Posta o aviso. False só quando o webhook está configurado e o envio falhou."""
+    webhook_url = webhook_url or os.getenv("SLACK_WEBHOOK_RELATORIOS")
+    if not webhook_url:
+        return True
+    trecho = analise[:CARACTERES] + ("\n…" if len(analise) > CARACTERES else "")
+    try:
+        resposta = requests.post(webhook_url, json={"text": f"*{titulo}*\n\n{trecho}"}, timeout=15)
+        resposta.raise_for_status()
+        return True
+    except requests.RequestException as e:
+        logger.warning("Falha ao enviar aviso ao Slack: %s", e)
+        return False
@@ -14,11 +14,11 @@ USO:
 """
 
 import argparse
-import json
 import logging
 import sqlite3
 import sys
 import time
+import zlib
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).resolve().parent
@@ -26,6 +26,8 @@ sys.path.insert(0, str(PROJECT_ROOT))
 
 from dotenv import load_dotenv
 
+import octadesk_db
+
 load_dotenv()
 
 # Logging para console e arquivo
@@ -54,6 +56,7 @@ def _sqlite_conn():
     if not SQLITE_DB.exists():
         logger.error("Arquivo SQLite não encontrado: %s", SQLITE_DB)
         sys.exit(1)
+    octadesk_db.init_db()  # converte bancos no formato antigo (raw_json) antes de ler
     conn = sqlite3.connect(str(SQLITE_DB))
     conn.row_factory = sqlite3.Row
     return conn
@@ -70,14 +73,14 @@ def iter_chats(batch_size: int):
     """Gera batches de chats do SQLite."""
     with _sqlite_conn() as conn:
         cursor = conn.execute(
-            "SELECT id, raw_json, cached_at FROM octadesk_chats ORDER BY created_at ASC"
+            "SELECT id, payload, cached_at FROM octadesk_chats ORDER BY created_at ASC"
         )
         batch = []
         for row in cursor:
             try:
-                chat = json.loads(row["raw_json"])
+                chat = octadesk_db.load_payload(row["payload"])
                 chat["_cached_at"] = row["cached_at"]  # injeta para preservar timestamp original
-            except (json.JSONDecodeError, TypeError):
+            except (ValueError, TypeError, zlib.error):
                 continue
             batch.append(chat)
             if len(batch) >= batch_size:
@@ -102,7 +105,7 @@ def iter_messages(batch_size: int):
         with _sqlite_conn() as conn:
             placeholders = ",".join("?" * len(chunk))
             rows = conn.execute(
-                f"SELECT chat_id, id, raw_json, cached_at FROM octadesk_messages "
+                f"SELECT chat_id, id, payload, cached_at FROM octadesk_messages "
                 f"WHERE chat_id IN ({placeholders}) ORDER BY chat_id",
                 chunk,
             ).fetchall()
@@ -114,12 +117,12 @@ def iter_messages(batch_size: int):
             if cid not in by_chat:
                 by_chat[cid] = {"msgs": [], "cached_at": row["cached_at"]}
             try:
-                msg = json.loads(row["raw_json"])
+                msg = octadesk_db.load_payload(row["payload"])
                 # Garante que o id da linha sqlite está no dict (pode ser gerado)
                 if not msg.get("id") and not msg.get("_id"):
                     msg["id"] = row["id"]
                 by_chat[cid]["msgs"].append(msg)
-            except (json.JSONDecodeError, TypeError):
+            except (ValueError, TypeError, zlib.error):
                 continue
 
         yield by_chat
@@ -142,6 +145,7 @@ def migrate_chats(batch_size: int, dry_run: bool) -> int:
 
     migrated = 0
     batch_num = 0
+    start = time.time()
 
     for batch in iter_chats(batch_size):
         batch_num += 1
@@ -156,17 +160,16 @@ def migrate_chats(batch_size: int, dry_run: bool) -> int:
 
         pct = (migrated / total * 100) if total else 0
         logger.info(
-            "Batch %d: %d chats salvos | Total: %d/%d (%.1f%%)",
-            batch_num, saved, migrated, total, pct,
+            "Batch %d: %d chats salvos | Total: %d/%d (%.1f%%) | %.0f chats/s",
+            batch_num, saved, migrated, total, pct, migrated / max(time.time() - start, 1e-6),
         )
-        time.sleep(0.1)  # pausa mínima para não sobrecarregar o banco
 
     logger.info("Migração de chats concluída: %d/%d", migrated, total)
     return migrated
 
 
 def migrate_messages(batch_size: int, dry_run: bool) -> int:
-    from utils.octadesk_mysql_writer import save_messages_mysql
+    from utils.octadesk_mysql_writer import save_messages_mysql_batch
 
     counts = count_sqlite()
     total = counts["messages"]
@@ -178,16 +181,20 @@ def migrate_messages(batch_size: int, dry_run: bool) -> int:
 
     migrated = 0
     batch_num = 0
+    start = time.time()
 
     for by_chat in iter_messages(batch_size):
         batch_num += 1
-        batch_msgs = 0
-        for chat_id, data in by_chat.items():
-            saved = save_messages_mysql(chat_id, data["msgs"], cached_at=data["cached_at"])
-            batch_msgs += saved
-            migrated += saved
-        logger.info("Batch %d: %d mensagens salvas | Total acumulado: %d", batch_num, batch_msgs, migrated)
-        time.sleep(0.1)
+        batch_msgs = save_messages_mysql_batch(
+            {chat_id: data["msgs"] for chat_id, data in by_chat.items()},
+            cached_at_by_chat={chat_id: data["cached_at"] for chat_id, data in by_chat.items()},
+        )
+        migrated += batch_msgs
+        pct = (migrated / total * 100) if total else 0
+        logger.info(
+            "Batch %d: %d mensagens salvas | Total: %d/%d (%.1f%%) | %.0f msgs/s",
+            batch_num, batch_msgs, migrated, total, pct, migrated / max(time.time() - start, 1e-6),
+        )
 
     logger.info("Migração de mensagens concluída: %d", migrated)
     return migrated
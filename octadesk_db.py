@@ -1,23 +1,126 @@
 # octadesk_db.py - Cache SQLite para chats e mensagens do Octadesk
 # Armazena TODOS os chats e mensagens para preservar histórico
 # (a API só retém ~30 dias de dados) e evitar chamadas repetidas.
+#
+# Schema (versão 2, PRAGMA user_version):
+#   - os campos que a página filtra/exibe ficam em colunas próprias e
+#     indexadas (status, agente, grupo, criação/fechamento, telefone, email,
+#     canal, tags; nas mensagens: remetente, papel, texto, createdAt);
+#   - o payload completo da API fica em `payload`, JSON comprimido com zstd
+#     (pacote opcional `zstandard`; sem ele, zlib), lido só em drill-downs.
+# Leituras do caminho quente (get_cached_chats_df / get_cached_messages_df)
+# são SELECTs de colunas, sem json.loads. Bancos no formato antigo (raw_json)
+# são migrados automaticamente na primeira abertura.
+#
+# Concorrência: a página lê o cache enquanto o cron escreve. O banco fica em
+# WAL (leitores não bloqueiam o escritor nem vice-versa), cada thread mantém
+# uma conexão própria e reaproveitada, e escritas longas são divididas em
+# transações de OCTADESK_DB_WRITE_CHUNK linhas para liberar o lock de escrita
+# entre os lotes. Benchmark: scripts/benchmark_octadesk_cache.py.
+#
+# ENV VARS:
+#   OCTADESK_DB_WRITE_CHUNK   — linhas por transação de escrita (default 500)
+#   OCTADESK_DB_BUSY_TIMEOUT  — espera máxima por lock, em ms (default 10000)
+#   OCTADESK_DB_CACHE_MB      — page cache por conexão, em MB (default 32)
+#   OCTADESK_DB_MMAP_MB       — janela de mmap, em MB (default 256)
 
 import json
 import os
 import sqlite3
+import threading
+import zlib
 from datetime import datetime, timedelta
 from pathlib import Path
 
+import pandas as pd
+
+try:
+    import zstandard as _zstd
+except ImportError:  # zlib como fallback; payloads zstd existentes exigem o pacote
+    _zstd = None
+
 # Path absoluto baseado na localização deste arquivo (raiz do projeto)
 _PROJECT_ROOT = Path(__file__).resolve().parent
 DB_DIR = str(_PROJECT_ROOT / "data_cache")
 DB_FILE = str(_PROJECT_ROOT / "data_cache" / "octadesk_cache.db")
-_PLACEHOLDER_LIKE_PATTERNS = ('%"type": "placeholder"%', '%"type":"placeholder"%')
-
 
-def _placeholder_sql(alias: str = "") -> str:
-    prefix = f"{alias}." if alias else ""
-    return f"({prefix}raw_json LIKE ? OR {prefix}raw_json LIKE ?)"
+SCHEMA_VERSION = 2
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_MIGRATION_CHUNK = 2000
+_initialized = set()
+
+WRITE_CHUNK = max(1, int(os.getenv("OCTADESK_DB_WRITE_CHUNK", "500")))
+BUSY_TIMEOUT_MS = int(os.getenv("OCTADESK_DB_BUSY_TIMEOUT", "10000"))
+CACHE_MB = int(os.getenv("OCTADESK_DB_CACHE_MB", "32"))
+MMAP_MB = int(os.getenv("OCTADESK_DB_MMAP_MB", "256"))
+
+_local = threading.local()
+
+# Coluna SQLite → nome da coluna no DataFrame (mesmos nomes do json_normalize
+# do payload, para que a página funcione igual com dados do cache ou da API)
+CHAT_COLUMNS = {
+    'id': 'id',
+    'number': 'number',
+    'status': 'status',
+    'channel': 'channel',
+    'conversation_origin': 'conversationOrigin',
+    'created_at': 'createdAt',
+    'updated_at': 'updatedAt',
+    'closed_at': 'closedAt',
+    'agent_id': 'agent.id',
+    'agent_name': 'agent.name',
+    'group_id': 'group.id',
+    'group_name': 'group.name',
+    'contact_id': 'contact.id',
+    'contact_name': 'contact.name',
+    'contact_email': 'contact.email',
+    'phone': 'phone',
+    'tags': 'tags',
+    'bot_name': 'botName',
+    'bot_first_human_response_at': 'bot.firstHumanResponseAt',
+}
+
+MESSAGE_COLUMNS = {
+    'id': 'id',
+    'chat_id': 'chatId',
+    'created_at': 'createdAt',
+    'msg_type': 'type',
+    'sender_id': 'sentBy.id',
+    'sender_name': 'sentBy.name',
+    'sender_role': 'sentBy.type',
+    'body': 'body',
+}
+
+# Candidatos (em ordem de prioridade) usados para extrair remetente, papel e
+# texto das mensagens — mesma ordem de build_chat_transcripts em _pages/octadesk.py
+_SENDER_PATHS = [
+    'sentBy', 'sender', 'from', 'author', 'user', 'agent', 'owner', 'bot', 'contact',
+    'customer', 'client', 'visitor', 'person', 'responsible', 'assignee',
+]
+_SENDER_KEYS = ['name', 'fullName', 'displayName', 'nickname']
+_TEXT_PATHS = [
+    'body', 'text', 'content', 'message',
+    'payload.text', 'payload.content', 'payload.message',
+    'payload.body', 'payload.html', 'html',
+]
+_ROLE_PATHS = [
+    'sentBy.type', 'sentBy.role',
+    'sender.type', 'sender.role',
+    'from.type', 'from.role',
+    'author.type', 'author.role',
+    'user.type', 'user.role',
+    'type', 'messageType', 'direction', 'origin', 'source', 'side', 'flow',
+    'eventType', 'event.type',
+]
+_SENDER_ID_PATHS = [
+    'sentBy.id',
+    'sender.id', 'from.id', 'author.id', 'user.id',
+    'agent.id', 'owner.id', 'contact.id', 'customer.id', 'client.id',
+    'visitor.id', 'person.id', 'responsible.id', 'assignee.id',
+    'sentById', 'senderId', 'fromId', 'authorId', 'userId',
+    'agentId', 'ownerId', 'contactId', 'customerId', 'clientId',
+    'visitorId', 'personId', 'responsibleId', 'assigneeId',
+]
 
 
 def _is_placeholder_message(msg) -> bool:
@@ -28,63 +131,120 @@ def _is_placeholder_message(msg) -> bool:
     return not any(str(msg.get(field) or '').strip() for field in ('body', 'text', 'content', 'message'))
 
 
-def _get_connection():
-    """Retorna conexão ao banco SQLite com WAL mode para melhor concorrência."""
+def _open_connection():
     Path(DB_DIR).mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT_MS / 1000)
     conn.execute("PRAGMA journal_mode=WAL")
+    # NORMAL é seguro em WAL (só o último commit pode se perder numa queda de energia)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_MB * 1024}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_MB * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
 
 
-def init_db():
-    """Inicializa as tabelas do banco de cache."""
-    with _get_connection() as conn:
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS octadesk_chats (
-                id TEXT PRIMARY KEY,
-                status TEXT,
-                created_at TEXT,
-                phone TEXT,
-                raw_json TEXT NOT NULL,
-                cached_at TEXT DEFAULT CURRENT_TIMESTAMP
-            );
-
-            CREATE TABLE IF NOT EXISTS octadesk_messages (
-                id TEXT PRIMARY KEY,
-                chat_id TEXT NOT NULL,
-                raw_json TEXT NOT NULL,
-                cached_at TEXT DEFAULT CURRENT_TIMESTAMP
-            );
-
-            CREATE TABLE IF NOT EXISTS octadesk_sync_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sync_type TEXT,
-                pages_fetched INTEGER,
-                chats_saved INTEGER,
-                messages_saved INTEGER,
-                oldest_chat_date TEXT,
-                newest_chat_date TEXT,
-                synced_at TEXT DEFAULT CURRENT_TIMESTAMP
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_chats_status ON octadesk_chats(status);
-            CREATE INDEX IF NOT EXISTS idx_chats_created_at ON octadesk_chats(created_at);
-            CREATE INDEX IF NOT EXISTS idx_messages_chat_id ON octadesk_messages(chat_id);
-        """)
+def _get_connection():
+    """Conexão SQLite da thread atual (criada na primeira chamada e reaproveitada).
+
+    Usar como `with _get_connection() as conn:` — o bloco faz commit/rollback,
+    mas não fecha a conexão.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'db_file', None) != DB_FILE:
+        if conn is not None:
+            conn.close()
+        conn = _open_connection()
+        _local.conn = conn
+        _local.db_file = DB_FILE
+    return conn
 
-        # Migração: adiciona coluna phone se tabela já existia sem ela
+
+def close_connection():
+    """Fecha a conexão da thread atual (threads de longa duração, testes)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def _write_chunked(conn, sql, rows):
+    """executemany em transações de WRITE_CHUNK linhas (libera o lock entre lotes)."""
+    for i in range(0, len(rows), WRITE_CHUNK):
+        with conn:
+            conn.executemany(sql, rows[i:i + WRITE_CHUNK])
+
+
+# ==============================================================================
+# PAYLOAD COMPRIMIDO
+# ==============================================================================
+
+def _compress(obj) -> bytes:
+    raw = json.dumps(obj, default=str, ensure_ascii=False).encode('utf-8')
+    if _zstd is not None:
+        return _zstd.ZstdCompressor(level=6).compress(raw)
+    return zlib.compress(raw, 6)
+
+
+def load_payload(blob):
+    """Payload → dict. Aceita zstd, zlib e o JSON em texto do formato antigo."""
+    if blob is None:
+        return None
+    if isinstance(blob, str):
+        return json.loads(blob)
+    blob = bytes(blob)
+    if blob[:4] == _ZSTD_MAGIC:
+        if _zstd is None:
+            raise RuntimeError("Payload comprimido com zstd: instale o pacote 'zstandard'")
+        return json.loads(_zstd.ZstdDecompressor().decompress(blob))
+    return json.loads(zlib.decompress(blob))
+
+
+def _decode_rows(rows):
+    results = []
+    for (blob,) in rows:
         try:
-            conn.execute("ALTER TABLE octadesk_chats ADD COLUMN phone TEXT")
-        except sqlite3.OperationalError:
-            pass  # coluna já existe
+            results.append(load_payload(blob))
+        except (ValueError, TypeError, zlib.error):
+            continue
+    return results
+
 
-        # Índice na coluna phone (criado após garantir que a coluna existe)
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_chats_phone ON octadesk_chats(phone)")
+# ==============================================================================
+# EXTRAÇÃO DE CAMPOS
+# ==============================================================================
+
+def _get_path(obj, path):
+    for key in path.split('.'):
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+def _pick(obj, paths, dict_keys=()):
+    """Primeiro valor de texto não vazio entre os caminhos (dicts: tenta dict_keys)."""
+    for path in paths:
+        val = _get_path(obj, path)
+        if isinstance(val, str) and val.strip():
+            return val
+        if isinstance(val, dict):
+            for k in dict_keys:
+                v = val.get(k)
+                if isinstance(v, str) and v.strip():
+                    return v
+    return None
+
+
+def _text_or_none(value):
+    if value is None or value == '':
+        return None
+    return str(value)
 
 
 def _extract_phone_from_chat(chat):
     """Extrai telefone(s) do cliente a partir do dict do chat.
-    
+
     Retorna string formatada ex: '+5521967261242' ou '+5521967261242 / +5588988407203'.
     """
     contact = chat.get('contact', {})
@@ -105,118 +265,373 @@ def _extract_phone_from_chat(chat):
     return ' / '.join(phones) if phones else ''
 
 
+def _extract_tags(chat):
+    tags = chat.get('tags') or []
+    if not isinstance(tags, list):
+        return _text_or_none(tags)
+    names = [
+        str(t.get('name', '')) if isinstance(t, dict) else str(t)
+        for t in tags
+    ]
+    return ', '.join(n for n in names if n.strip()) or None
+
+
+def _chat_row(chat):
+    """Dict raw do chat → tupla de colunas (na ordem de CHAT_COLUMNS) + payload."""
+    first_human = _get_path(chat, 'bot.firstHumanResponseAt')
+    values = {
+        'id': chat.get('id'),
+        'number': _text_or_none(chat.get('number')),
+        'status': str(chat.get('status', '')).lower(),
+        'channel': _text_or_none(chat.get('channel')),
+        'conversation_origin': _text_or_none(chat.get('conversationOrigin')),
+        'created_at': chat.get('createdAt', ''),
+        'updated_at': _text_or_none(chat.get('updatedAt')),
+        'closed_at': _text_or_none(chat.get('closedAt')),
+        'agent_id': _text_or_none(_get_path(chat, 'agent.id')),
+        'agent_name': _text_or_none(_get_path(chat, 'agent.name')),
+        'group_id': _text_or_none(_get_path(chat, 'group.id')),
+        'group_name': _text_or_none(_get_path(chat, 'group.name')),
+        'contact_id': _text_or_none(_get_path(chat, 'contact.id')),
+        'contact_name': _text_or_none(_get_path(chat, 'contact.name')),
+        'contact_email': _text_or_none(_get_path(chat, 'contact.email')),
+        'phone': _extract_phone_from_chat(chat),
+        'tags': _extract_tags(chat),
+        'bot_name': _text_or_none(chat.get('botName') or _get_path(chat, 'bot.name')),
+        'bot_first_human_response_at': _text_or_none(first_human) if not isinstance(first_human, (list, dict)) else None,
+    }
+    return tuple(values[c] for c in CHAT_COLUMNS) + (_compress(chat), datetime.now().isoformat())
+
+
+def _message_row(chat_id, msg, idx):
+    """Dict raw da mensagem → tupla de colunas (na ordem de MESSAGE_COLUMNS) + payload."""
+    values = {
+        'id': msg.get('id') or msg.get('_id') or f"{chat_id}_{idx}",
+        'chat_id': chat_id,
+        'created_at': _text_or_none(msg.get('createdAt') or msg.get('time')),
+        'msg_type': _text_or_none(msg.get('type')) if not isinstance(msg.get('type'), dict) else None,
+        'sender_id': _pick(msg, _SENDER_ID_PATHS, ('id',)),
+        'sender_name': _pick(msg, _SENDER_PATHS, tuple(_SENDER_KEYS) + ('email',)),
+        'sender_role': (_pick(msg, _ROLE_PATHS, ('type', 'role', 'kind')) or '').lower() or None,
+        'body': _pick(msg, _TEXT_PATHS, ('text', 'content', 'message', 'body', 'html')),
+    }
+    return tuple(values[c] for c in MESSAGE_COLUMNS) + (_compress(msg), datetime.now().isoformat())
+
+
+def chats_to_df(chats_list):
+    """Converte chats da API (dicts) no mesmo DataFrame de get_cached_chats_df."""
+    rows = [_chat_row(c)[:len(CHAT_COLUMNS)] for c in (chats_list or []) if c.get('id')]
+    return _with_aliases(pd.DataFrame(rows, columns=list(CHAT_COLUMNS.values())))
+
+
+def _with_aliases(df):
+    # build_chat_transcripts procura o nome do bot em 'bot.name'
+    df['bot.name'] = df['botName']
+    return df
+
+
+# ==============================================================================
+# SCHEMA E MIGRAÇÃO
+# ==============================================================================
+
+_CHAT_INSERT = (
+    f"INSERT OR REPLACE INTO octadesk_chats ({', '.join(CHAT_COLUMNS)}, payload, cached_at) "
+    f"VALUES ({', '.join('?' * (len(CHAT_COLUMNS) + 2))})"
+)
+_MESSAGE_INSERT = (
+    f"INSERT OR REPLACE INTO octadesk_messages ({', '.join(MESSAGE_COLUMNS)}, payload, cached_at) "
+    f"VALUES ({', '.join('?' * (len(MESSAGE_COLUMNS) + 2))})"
+)
+
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS octadesk_chats (
+        id TEXT PRIMARY KEY,
+        number TEXT,
+        status TEXT,
+        channel TEXT,
+        conversation_origin TEXT,
+        created_at TEXT,
+        updated_at TEXT,
+        closed_at TEXT,
+        agent_id TEXT,
+        agent_name TEXT,
+        group_id TEXT,
+        group_name TEXT,
+        contact_id TEXT,
+        contact_name TEXT,
+        contact_email TEXT,
+        phone TEXT,
+        tags TEXT,
+        bot_name TEXT,
+        bot_first_human_response_at TEXT,
+        payload BLOB,
+        cached_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS octadesk_messages (
+        id TEXT PRIMARY KEY,
+        chat_id TEXT NOT NULL,
+        created_at TEXT,
+        msg_type TEXT,
+        sender_id TEXT,
+        sender_name TEXT,
+        sender_role TEXT,
+        body TEXT,
+        payload BLOB,
+        cached_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS octadesk_sync_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sync_type TEXT,
+        pages_fetched INTEGER,
+        chats_saved INTEGER,
+        messages_saved INTEGER,
+        oldest_chat_date TEXT,
+        newest_chat_date TEXT,
+        synced_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_chats_status ON octadesk_chats(status)",
+    "CREATE INDEX IF NOT EXISTS idx_chats_created_at ON octadesk_chats(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_chats_closed_at ON octadesk_chats(closed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_chats_phone ON octadesk_chats(phone)",
+    "CREATE INDEX IF NOT EXISTS idx_chats_contact_email ON octadesk_chats(contact_email)",
+    "CREATE INDEX IF NOT EXISTS idx_chats_agent_name ON octadesk_chats(agent_name)",
+    "CREATE INDEX IF NOT EXISTS idx_chats_channel ON octadesk_chats(channel)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_chat_id ON octadesk_messages(chat_id, created_at)",
+)
+
+# Cópia das tabelas antigas: não sobrescreve o que já foi sincronizado no schema novo
+_CHAT_INSERT_LEGACY = _CHAT_INSERT.replace("INSERT OR REPLACE", "INSERT OR IGNORE", 1)
+_MESSAGE_INSERT_LEGACY = _MESSAGE_INSERT.replace("INSERT OR REPLACE", "INSERT OR IGNORE", 1)
+
+
+def _create_tables(conn):
+    # conn.execute, não executescript: executescript faz COMMIT implícito e
+    # quebraria a transação da migração
+    for statement in _SCHEMA:
+        conn.execute(statement)
+
+
+def _table_columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _table_exists(conn, table):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)
+    ).fetchone() is not None
+
+
+def _migrate_legacy(conn):
+    """Converte tabelas no formato antigo (raw_json) para o schema estruturado.
+
+    Roda dentro da transação de init_db. Tabelas *_legacy deixadas por uma
+    migração interrompida (versões anteriores, que não eram atômicas) são
+    copiadas para o schema novo e removidas. Retorna True se houve migração.
+    """
+    legacy = {
+        table for table in ('octadesk_chats', 'octadesk_messages')
+        if 'raw_json' in _table_columns(conn, table)
+    }
+    for table in legacy:
+        conn.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+        # Índices seguem a tabela renomeada; são recriados no schema novo
+        for (index,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL",
+            (f"{table}_legacy",),
+        ).fetchall():
+            conn.execute(f"DROP INDEX {index}")
+    pending = {
+        table for table in ('octadesk_chats', 'octadesk_messages')
+        if _table_exists(conn, f"{table}_legacy")
+    }
+    if not pending:
+        return False
+    _create_tables(conn)
+
+    if 'octadesk_chats' in pending:
+        cursor = conn.execute("SELECT raw_json FROM octadesk_chats_legacy")
+        while True:
+            chunk = cursor.fetchmany(_MIGRATION_CHUNK)
+            if not chunk:
+                break
+            rows = [_chat_row(chat) for chat in _decode_rows(chunk) if isinstance(chat, dict) and chat.get('id')]
+            conn.executemany(_CHAT_INSERT_LEGACY, rows)
+        conn.execute("DROP TABLE octadesk_chats_legacy")
+
+    if 'octadesk_messages' in pending:
+        cursor = conn.execute("SELECT id, chat_id, raw_json FROM octadesk_messages_legacy")
+        while True:
+            chunk = cursor.fetchmany(_MIGRATION_CHUNK)
+            if not chunk:
+                break
+            rows = []
+            for msg_id, chat_id, raw in chunk:
+                try:
+                    msg = json.loads(raw)
+                except (json.JSONDecodeError, TypeError):
+                    continue
+                if not isinstance(msg, dict) or _is_placeholder_message(msg):
+                    continue
+                row = _message_row(chat_id, msg, 0)
+                rows.append((msg_id,) + row[1:])  # preserva o id já gravado
+            conn.executemany(_MESSAGE_INSERT_LEGACY, rows)
+        conn.execute("DROP TABLE octadesk_messages_legacy")
+    return True
+
+
+def init_db():
+    """Inicializa as tabelas do banco de cache (e migra o formato antigo, se houver).
+
+    Tudo numa transação BEGIN IMMEDIATE: uma queda no meio da migração
+    desfaz o rename, e um segundo processo abrindo o banco ao mesmo tempo
+    espera o lock e encontra o schema já migrado.
+    """
+    if DB_FILE in _initialized:
+        return
+    conn = _get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        migrated = _migrate_legacy(conn)
+        _create_tables(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    if migrated:
+        # Recupera o espaço do JSON em texto
+        conn.execute("VACUUM")
+    _initialized.add(DB_FILE)
+
+
+# ==============================================================================
+# ESCRITA
+# ==============================================================================
+
 def save_chats(chats_list):
     """Salva lista de chats (dicts raw da API) no banco. Retorna quantidade salva."""
     if not chats_list:
         return 0
     init_db()
-    saved = 0
-    with _get_connection() as conn:
-        for chat in chats_list:
-            chat_id = chat.get('id')
-            if not chat_id:
-                continue
-            status = str(chat.get('status', '')).lower()
-            created_at = chat.get('createdAt', '')
-            phone = _extract_phone_from_chat(chat)
-            try:
-                conn.execute(
-                    "INSERT OR REPLACE INTO octadesk_chats (id, status, created_at, phone, raw_json, cached_at) "
-                    "VALUES (?, ?, ?, ?, ?, ?)",
-                    (chat_id, status, created_at, phone, json.dumps(chat, default=str), datetime.now().isoformat())
-                )
-                saved += 1
-            except Exception:
-                continue
-        conn.commit()
-    return saved
+    rows = [_chat_row(chat) for chat in chats_list if chat.get('id')]
+    _write_chunked(_get_connection(), _CHAT_INSERT, rows)
+    return len(rows)
 
 
 def save_messages(chat_id, messages_list):
     """Salva mensagens de um chat no banco. Retorna quantidade salva."""
-    if not messages_list:
-        return 0
-    valid_messages = [msg for msg in messages_list if not _is_placeholder_message(msg)]
-    if not valid_messages:
-        return 0
+    return save_messages_batch({chat_id: messages_list}).get(chat_id, 0)
+
+
+def save_messages_batch(messages_by_chat):
+    """Salva mensagens de vários chats em transações de até WRITE_CHUNK linhas.
+
+    messages_by_chat: {chat_id: [mensagens]}. Retorna {chat_id: quantidade salva}.
+    """
+    if not messages_by_chat:
+        return {}
     init_db()
-    saved = 0
-    with _get_connection() as conn:
-        for idx, msg in enumerate(valid_messages):
-            msg_id = msg.get('id') or msg.get('_id') or f"{chat_id}_{idx}"
-            try:
-                conn.execute(
-                    "INSERT OR REPLACE INTO octadesk_messages (id, chat_id, raw_json, cached_at) "
-                    "VALUES (?, ?, ?, ?)",
-                    (msg_id, chat_id, json.dumps(msg, default=str), datetime.now().isoformat())
-                )
-                saved += 1
-            except Exception:
-                continue
-        conn.commit()
+    saved = {}
+    rows = []
+    for chat_id, messages_list in messages_by_chat.items():
+        valid_messages = [msg for msg in (messages_list or []) if not _is_placeholder_message(msg)]
+        rows.extend(_message_row(chat_id, msg, idx) for idx, msg in enumerate(valid_messages))
+        saved[chat_id] = len(valid_messages)
+    _write_chunked(_get_connection(), _MESSAGE_INSERT, rows)
     return saved
 
 
-def get_cached_chats(start_date=None, end_date=None, status_filter=None):
-    """Retorna chats do cache como lista de dicts, filtrados por data e/ou status.
-    
+# ==============================================================================
+# LEITURA
+# ==============================================================================
+
+def _chat_filters(start_date=None, end_date=None, status_filter=None):
+    """WHERE de chats por data/status.
+
     NOTA: As datas no banco estão em UTC (createdAt da API) mas o filtro do
     usuário é em horário local (America/Sao_Paulo, UTC-3). Expandimos o range
     em ±1 dia para não perder chats de madrugada/noite. O filtro preciso
     é feito depois no DataFrame com tz_convert.
     """
+    where = " WHERE 1=1"
+    params = []
+    if status_filter:
+        where += " AND status = ?"
+        params.append(status_filter.lower())
+    if start_date:
+        # -1 dia para cobrir chats UTC que são do dia anterior no fuso local
+        where += " AND created_at >= ?"
+        params.append(str(start_date - timedelta(days=1)))
+    if end_date:
+        # +2 dias para cobrir chats UTC que são do dia seguinte no fuso local
+        where += " AND created_at < ?"
+        params.append(str(end_date + timedelta(days=2)))
+    return where, params
+
+
+def get_cached_chats_df(start_date=None, end_date=None, status_filter=None):
+    """Chats do cache como DataFrame de colunas estruturadas (sem ler o payload).
+
+    Colunas com os nomes do json_normalize da API (ver CHAT_COLUMNS).
+    """
     init_db()
+    where, params = _chat_filters(start_date, end_date, status_filter)
+    select = ", ".join(f'{col} AS "{name}"' for col, name in CHAT_COLUMNS.items())
     with _get_connection() as conn:
-        query = "SELECT raw_json FROM octadesk_chats WHERE 1=1"
-        params = []
-
-        if status_filter:
-            query += " AND status = ?"
-            params.append(status_filter.lower())
-
-        if start_date:
-            # -1 dia para cobrir chats UTC que são do dia anterior no fuso local
-            adjusted_start = start_date - timedelta(days=1)
-            query += " AND created_at >= ?"
-            params.append(str(adjusted_start))
-
-        if end_date:
-            # +2 dias para cobrir chats UTC que são do dia seguinte no fuso local
-            adjusted_end = end_date + timedelta(days=2)
-            query += " AND created_at < ?"
-            params.append(str(adjusted_end))
-
-        query += " ORDER BY created_at DESC"
-
-        cursor = conn.execute(query, params)
-        results = []
-        for row in cursor.fetchall():
-            try:
-                results.append(json.loads(row[0]))
-            except (json.JSONDecodeError, TypeError):
-                continue
-        return results
+        df = pd.read_sql_query(
+            f"SELECT {select} FROM octadesk_chats{where} ORDER BY created_at DESC",
+            conn, params=params,
+        )
+    return _with_aliases(df)
+
+
+def get_cached_chats(start_date=None, end_date=None, status_filter=None):
+    """Retorna chats do cache como lista de dicts (payload completo), filtrados por data e/ou status.
+
+    Descomprime o payload de cada chat — para o caminho quente use get_cached_chats_df.
+    """
+    init_db()
+    where, params = _chat_filters(start_date, end_date, status_filter)
+    with _get_connection() as conn:
+        cursor = conn.execute(f"SELECT payload FROM octadesk_chats{where} ORDER BY created_at DESC", params)
+        return _decode_rows(cursor.fetchall())
+
+
+def get_cached_messages_df(chat_ids):
+    """Mensagens de vários chats como DataFrame de colunas estruturadas (ver MESSAGE_COLUMNS)."""
+    columns = list(MESSAGE_COLUMNS.values())
+    if not chat_ids:
+        return pd.DataFrame(columns=columns)
+    init_db()
+    select = ", ".join(f'{col} AS "{name}"' for col, name in MESSAGE_COLUMNS.items())
+    frames = []
+    with _get_connection() as conn:
+        # Lotes abaixo do limite de variáveis do SQLite
+        for i in range(0, len(chat_ids), 500):
+            chunk = list(chat_ids[i:i + 500])
+            placeholders = ",".join("?" * len(chunk))
+            frames.append(pd.read_sql_query(
+                f"SELECT {select} FROM octadesk_messages WHERE chat_id IN ({placeholders}) "
+                "ORDER BY chat_id, created_at",
+                conn, params=chunk,
+            ))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
 
 
 def get_cached_messages(chat_id):
-    """Retorna mensagens de um chat do cache como lista de dicts."""
+    """Retorna mensagens de um chat do cache como lista de dicts (payload completo)."""
     init_db()
     with _get_connection() as conn:
         cursor = conn.execute(
-            f"SELECT raw_json FROM octadesk_messages WHERE chat_id = ? AND NOT {_placeholder_sql()} ORDER BY cached_at",
-            (chat_id, *_PLACEHOLDER_LIKE_PATTERNS)
+            "SELECT payload FROM octadesk_messages WHERE chat_id = ? ORDER BY created_at, cached_at",
+            (chat_id,)
         )
-        results = []
-        for row in cursor.fetchall():
-            try:
-                results.append(json.loads(row[0]))
-            except (json.JSONDecodeError, TypeError):
-                continue
-        return results
+        return _decode_rows(cursor.fetchall())
 
 
 def get_cached_messages_batch(chat_ids):
-    """Retorna mensagens de múltiplos chats em uma única query SQLite.
+    """Retorna mensagens (payload completo) de múltiplos chats em uma única query SQLite.
     Retorna dict: {chat_id: [lista de mensagens]}
     """
     if not chat_ids:
@@ -225,14 +640,14 @@ def get_cached_messages_batch(chat_ids):
     placeholders = ",".join("?" * len(chat_ids))
     with _get_connection() as conn:
         cursor = conn.execute(
-            f"SELECT chat_id, raw_json FROM octadesk_messages WHERE chat_id IN ({placeholders}) AND NOT {_placeholder_sql()} ORDER BY chat_id, cached_at",
-            [*chat_ids, *_PLACEHOLDER_LIKE_PATTERNS],
+            f"SELECT chat_id, payload FROM octadesk_messages WHERE chat_id IN ({placeholders}) ORDER BY chat_id, created_at",
+            list(chat_ids),
         )
         result = {}
-        for chat_id, raw in cursor.fetchall():
+        for chat_id, blob in cursor.fetchall():
             try:
-                msg = json.loads(raw)
-            except (json.JSONDecodeError, TypeError):
+                msg = load_payload(blob)
+            except (ValueError, TypeError, zlib.error):
                 continue
             result.setdefault(chat_id, []).append(msg)
         return result
@@ -243,23 +658,23 @@ def has_cached_messages(chat_id):
     init_db()
     with _get_connection() as conn:
         cursor = conn.execute(
-            f"SELECT COUNT(*) FROM octadesk_messages WHERE chat_id = ? AND NOT {_placeholder_sql()}",
-            (chat_id, *_PLACEHOLDER_LIKE_PATTERNS)
+            "SELECT 1 FROM octadesk_messages WHERE chat_id = ? LIMIT 1",
+            (chat_id,)
         )
-        return cursor.fetchone()[0] > 0
+        return cursor.fetchone() is not None
+
+
+_WITHOUT_MESSAGES = (
+    "FROM octadesk_chats c "
+    "WHERE NOT EXISTS (SELECT 1 FROM octadesk_messages m WHERE m.chat_id = c.id)"
+)
 
 
 def get_chats_without_messages():
     """Retorna lista de IDs de chats que NÃO possuem mensagens em cache."""
     init_db()
     with _get_connection() as conn:
-        cursor = conn.execute(
-            "SELECT c.id FROM octadesk_chats c "
-            f"LEFT JOIN octadesk_messages m ON c.id = m.chat_id AND NOT {_placeholder_sql('m')} "
-            "WHERE m.id IS NULL "
-            "ORDER BY c.created_at DESC",
-            _PLACEHOLDER_LIKE_PATTERNS,
-        )
+        cursor = conn.execute(f"SELECT c.id {_WITHOUT_MESSAGES} ORDER BY c.created_at DESC")
         return [row[0] for row in cursor.fetchall()]
 
 
@@ -267,24 +682,17 @@ def count_chats_without_messages():
     """Retorna contagem de chats sem mensagens em cache."""
     init_db()
     with _get_connection() as conn:
-        cursor = conn.execute(
-            "SELECT COUNT(*) FROM octadesk_chats c "
-            f"LEFT JOIN octadesk_messages m ON c.id = m.chat_id AND NOT {_placeholder_sql('m')} "
-            "WHERE m.id IS NULL",
-            _PLACEHOLDER_LIKE_PATTERNS,
-        )
-        return cursor.fetchone()[0]
+        return conn.execute(f"SELECT COUNT(*) {_WITHOUT_MESSAGES}").fetchone()[0]
 
 
 def purge_placeholder_messages():
-    """Remove mensagens placeholder antigas que contaminam o cache local."""
+    """Remove mensagens placeholder (sem texto) que contaminam o cache local."""
     init_db()
     with _get_connection() as conn:
         cursor = conn.execute(
-            f"DELETE FROM octadesk_messages WHERE {_placeholder_sql()}",
-            _PLACEHOLDER_LIKE_PATTERNS,
+            "DELETE FROM octadesk_messages "
+            "WHERE lower(msg_type) = 'placeholder' AND (body IS NULL OR trim(body) = '')"
         )
-        conn.commit()
         return max(cursor.rowcount or 0, 0)
 
 
@@ -301,7 +709,6 @@ def log_sync(sync_type, pages_fetched, chats_saved, messages_saved=0, oldest_dat
              str(newest_date) if newest_date else None,
              datetime.now().isoformat())
         )
-        conn.commit()
 
 
 def get_cache_stats():
@@ -315,18 +722,10 @@ def get_cache_stats():
         cursor = conn.execute("SELECT COUNT(*) FROM octadesk_chats WHERE status = 'closed'")
         stats['closed_chats'] = cursor.fetchone()[0]
 
-        cursor = conn.execute(
-            f"SELECT COUNT(*) FROM octadesk_messages WHERE NOT {_placeholder_sql()}",
-            _PLACEHOLDER_LIKE_PATTERNS,
-        )
+        cursor = conn.execute("SELECT COUNT(*) FROM octadesk_messages")
         stats['total_messages'] = cursor.fetchone()[0]
 
-        cursor = conn.execute(
-            "SELECT COUNT(*) FROM octadesk_chats c "
-            f"LEFT JOIN octadesk_messages m ON c.id = m.chat_id AND NOT {_placeholder_sql('m')} "
-            "WHERE m.id IS NULL",
-            _PLACEHOLDER_LIKE_PATTERNS,
-        )
+        cursor = conn.execute(f"SELECT COUNT(*) {_WITHOUT_MESSAGES}")
         stats['chats_without_messages'] = cursor.fetchone()[0]
 
         cursor = conn.execute("SELECT MIN(created_at), MAX(created_at) FROM octadesk_chats")
@@ -356,28 +755,22 @@ def clear_cache():
 
 def backfill_phones():
     """Preenche a coluna phone para chats já em cache que não têm telefone extraído.
-    
-    Lê o raw_json, extrai o telefone e atualiza a coluna phone.
+
+    Lê o payload, extrai o telefone e atualiza a coluna phone.
     Retorna quantidade de chats atualizados.
     """
     init_db()
-    updated = 0
-    with _get_connection() as conn:
-        cursor = conn.execute(
-            "SELECT id, raw_json FROM octadesk_chats WHERE phone IS NULL OR phone = ''"
-        )
-        rows = cursor.fetchall()
-        for chat_id, raw_json in rows:
-            try:
-                chat = json.loads(raw_json)
-                phone = _extract_phone_from_chat(chat)
-                if phone:
-                    conn.execute(
-                        "UPDATE octadesk_chats SET phone = ? WHERE id = ?",
-                        (phone, chat_id)
-                    )
-                    updated += 1
-            except (json.JSONDecodeError, TypeError):
-                continue
-        conn.commit()
-    return updated
+    conn = _get_connection()
+    rows = conn.execute(
+        "SELECT id, payload FROM octadesk_chats WHERE phone IS NULL OR phone = ''"
+    ).fetchall()
+    updates = []
+    for chat_id, blob in rows:
+        try:
+            phone = _extract_phone_from_chat(load_payload(blob))
+        except (ValueError, TypeError, zlib.error):
+            continue
+        if phone:
+            updates.append((phone, chat_id))
+    _write_chunked(conn, "UPDATE octadesk_chats SET phone = ? WHERE id = ?", updates)
+    return len(updates)
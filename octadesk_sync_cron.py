@@ -20,19 +20,45 @@ CONFIGURAÇÃO:
      python3 octadesk_sync_cron.py --only-messages   # Só busca msgs de chats já cacheados
      python3 octadesk_sync_cron.py --max-pages 50     # Limita páginas de chats
      python3 octadesk_sync_cron.py --max-messages 500  # Limita qtd de chats para buscar msgs
+     python3 octadesk_sync_cron.py --workers 8         # Chats buscados em paralelo na fase 2
+
+REQUISIÇÕES À API:
+  Todas as chamadas passam por uma sessão HTTP keep-alive compartilhada e por
+  um token bucket global (OCTADESK_RATE_PER_SEC); 429/5xx e falhas de conexão
+  são re-tentados num único lugar (_api_request_with_retry), respeitando
+  Retry-After. A fase 1 busca páginas de chats à frente (prefetch) enquanto
+  um writer grava em lotes; no modo incremental para na primeira página
+  inteiramente anterior ao watermark. A fase 2 busca as mensagens de vários
+  chats em paralelo e grava no SQLite/MySQL em lotes, a partir da thread
+  principal.
+
+ENV VARS (opcionais):
+  OCTADESK_SYNC_WORKERS   — default 6 (chats buscados em paralelo)
+  OCTADESK_RATE_PER_SEC   — default 5 (requisições/s somando todas as threads)
+  OCTADESK_RATE_BURST     — default 10 (rajada máxima do token bucket)
+  OCTADESK_WRITE_BATCH    — default 50 (chats por lote de gravação de mensagens)
+  OCTADESK_PREFETCH_PAGES — default 3 (páginas de chats buscadas à frente na fase 1)
+  OCTADESK_CHAT_WRITE_BATCH — default 500 (chats por lote de gravação na fase 1)
 """
 
 import argparse
+import itertools
 import json
 import logging
 import os
+import queue
+import random
 import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from pathlib import Path
 
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 
 # Garante que o diretório do projeto está no path
 PROJECT_ROOT = Path(__file__).resolve().parent
@@ -40,7 +66,8 @@ sys.path.insert(0, str(PROJECT_ROOT))
 
 import octadesk_db
 from utils.octadesk_mysql_writer import (log_sync_mysql, save_chats_mysql,
-                                         save_messages_mysql)
+                                         save_messages_mysql_batch)
+from utils.rate_limiter import TokenBucket
 
 # ==============================================================================
 # CONFIGURAÇÃO DE LOGGING
@@ -59,6 +86,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger("octadesk_sync")
 
+SYNC_WORKERS = int(os.getenv("OCTADESK_SYNC_WORKERS", "6"))
+RATE_PER_SEC = float(os.getenv("OCTADESK_RATE_PER_SEC", "5"))
+RATE_BURST = float(os.getenv("OCTADESK_RATE_BURST", "10"))
+WRITE_BATCH = int(os.getenv("OCTADESK_WRITE_BATCH", "50"))
+PREFETCH_PAGES = max(1, int(os.getenv("OCTADESK_PREFETCH_PAGES", "3")))
+CHAT_WRITE_BATCH = int(os.getenv("OCTADESK_CHAT_WRITE_BATCH", "500"))
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
 
 # ==============================================================================
 # FUNÇÕES DE BUSCA NA API
@@ -114,24 +150,57 @@ def _normalize_list_response(data):
     return []
 
 
+# Sessão HTTP e limitador compartilhados por todas as threads da sincronização
+_limiter = TokenBucket(RATE_PER_SEC, RATE_BURST)
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    """Sessão keep-alive única, com pool de conexões do tamanho do paralelismo."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(SYNC_WORKERS, 4) * 2)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _retry_after(response, attempt):
+    """Espera sugerida pela API (Retry-After) ou backoff exponencial com jitter."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        if value:
+            return max(float(value), 1.0)
+    except ValueError:
+        pass
+    return 2 ** (attempt + 1) + random.uniform(0, 1)
+
+
 def _api_request_with_retry(url, headers, params=None, max_retries=3):
     for attempt in range(max_retries):
+        _limiter.acquire()
         try:
-            response = requests.get(url, params=params, headers=headers, timeout=30)
+            response = _get_session().get(url, params=params, headers=headers, timeout=30)
             response.raise_for_status()
             return response
         except requests.exceptions.HTTPError as exc:
-            status_code = exc.response.status_code if exc.response else None
-            if status_code in {429, 500, 502, 503, 504} and attempt < max_retries - 1:
-                wait_seconds = 2 ** (attempt + 1)
-                logger.warning("Erro HTTP %s em %s. Nova tentativa em %ss.", status_code, url, wait_seconds)
+            status_code = exc.response.status_code if exc.response is not None else None
+            if status_code in _RETRY_STATUS and attempt < max_retries - 1:
+                wait_seconds = _retry_after(exc.response, attempt)
+                if status_code == 429:
+                    # Todas as threads recuam juntas
+                    _limiter.penalizar(wait_seconds)
+                logger.warning("Erro HTTP %s em %s. Nova tentativa em %.1fs.", status_code, url, wait_seconds)
                 time.sleep(wait_seconds)
                 continue
             raise
         except requests.exceptions.ConnectionError:
             if attempt < max_retries - 1:
-                wait_seconds = 2 ** (attempt + 1)
-                logger.warning("Falha de conexão em %s. Nova tentativa em %ss.", url, wait_seconds)
+                wait_seconds = _retry_after(None, attempt)
+                logger.warning("Falha de conexão em %s. Nova tentativa em %.1fs.", url, wait_seconds)
                 time.sleep(wait_seconds)
                 continue
             raise
@@ -148,65 +217,135 @@ def _build_updated_since(last_sync):
         return None
 
 
+def _is_older_than(chat, watermark):
+    """True se o chat não foi atualizado desde o watermark (comparação ISO em segundos)."""
+    updated = str(chat.get("updatedAt") or chat.get("createdAt") or "")
+    return bool(updated) and updated[:19] < watermark[:19]
+
+
+def _fetch_chat_page(url, headers, page, limit, updated_since):
+    """Estágio de busca + parsing (roda nas threads de prefetch): devolve a lista de chats da página."""
+    # No incremental a ordem é por updatedAt: é o campo do filtro e o que
+    # _is_older_than compara para decidir a parada.
+    params = {
+        "page": page,
+        "limit": limit,
+        "sort[property]": "updatedAt" if updated_since else "createdAt",
+        "sort[direction]": "desc",
+    }
+    if updated_since:
+        params["filters[0][property]"] = "updatedAt"
+        params["filters[0][operator]"] = "ge"
+        params["filters[0][value]"] = updated_since
+    response = _api_request_with_retry(url, headers, params)
+    if response is None:
+        raise requests.exceptions.RequestException(f"Falha após retentativas na página {page}")
+    return _normalize_list_response(response.json())
+
+
+class _ChatWriter(threading.Thread):
+    """Estágio de gravação: acumula páginas e grava em lotes no SQLite e no MySQL."""
+
+    def __init__(self, batch_size):
+        super().__init__(name="octadesk-chat-writer", daemon=True)
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=PREFETCH_PAGES * 2)
+        self.saved = 0
+        self._buffer = []
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        try:
+            saved = octadesk_db.save_chats(self._buffer)
+            mysql_saved = save_chats_mysql(self._buffer)
+            self.saved += saved
+            logger.info("Lote de chats: %d → SQLite(%d) MySQL(%d)", len(self._buffer), saved, mysql_saved)
+        except Exception as e:
+            logger.error("Erro ao gravar lote de %d chats: %s", len(self._buffer), e)
+        self._buffer = []
+
+    def run(self):
+        while True:
+            items = self.queue.get()
+            if items is None:
+                break
+            self._buffer.extend(items)
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+        self._flush()
+
+
 def fetch_all_chats(token, base_url, max_pages=120, limit=100, updated_since=None):
-    """Busca chats na API usando paginação e filtro incremental por updatedAt."""
+    """Busca chats na API usando paginação e filtro incremental por updatedAt.
+
+    Pipeline: até PREFETCH_PAGES páginas são buscadas (e decodificadas) à frente
+    em threads, dentro do token bucket global; a thread principal consome as
+    páginas em ordem e decide quando parar; um writer grava em lotes. No modo
+    incremental, a busca para na primeira página inteiramente mais antiga que
+    o watermark (updated_since); para isso as páginas vêm ordenadas por
+    updatedAt desc (na busca completa, por createdAt desc).
+    """
     url = f"{base_url}/chat"
     headers = {"accept": "application/json", "X-API-KEY": token}
     
-    total_saved = 0
-    page = 1
     pages_processed = 0
     
     if updated_since:
         logger.info("Iniciando busca incremental de chats (updatedAt >= %s, máx %d páginas)...", updated_since, max_pages)
     else:
         logger.info("Iniciando busca completa de chats (máx %d páginas)...", max_pages)
-    
-    while page <= max_pages:
-        params = {
-            "page": page,
-            "limit": limit,
-            "sort[property]": "createdAt",
-            "sort[direction]": "desc",
-        }
-        if updated_since:
-            params["filters[0][property]"] = "updatedAt"
-            params["filters[0][operator]"] = "ge"
-            params["filters[0][value]"] = updated_since
+
+    writer = _ChatWriter(CHAT_WRITE_BATCH)
+    writer.start()
+    pending = deque()
+    next_page = 1
+
+    with ThreadPoolExecutor(max_workers=PREFETCH_PAGES, thread_name_prefix="octadesk-chats") as executor:
+        def _prefetch():
+            nonlocal next_page
+            while len(pending) < PREFETCH_PAGES and next_page <= max_pages:
+                pending.append((next_page, executor.submit(
+                    _fetch_chat_page, url, headers, next_page, limit, updated_since,
+                )))
+                next_page += 1
 
         try:
-            response = _api_request_with_retry(url, headers, params)
-            if response is None:
-                logger.error("Falha após retentativas na página %d", page)
-                break
-            data = response.json()
-            items = _normalize_list_response(data)
-            pages_processed += 1
-            
-            if not items:
-                logger.info(f"Página {page}: vazia — fim dos dados")
-                break
-            
-            saved = octadesk_db.save_chats(items)
-            total_saved += saved
-            mysql_saved = save_chats_mysql(items)
-            logger.info(
-                "Página %d: %d chats → SQLite(%d) MySQL(%d)",
-                page, len(items), saved, mysql_saved,
-            )
-            
-            if len(items) < limit:
-                logger.info(f"Página {page}: {len(items)} itens (< {limit}) — última página")
-                break
-            
-            page += 1
-            time.sleep(0.5)
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erro na página {page}: {e}")
-            logger.error(f"Falha definitiva na página {page}. Parando busca de chats.")
-            break
-    
+            _prefetch()
+            while pending:
+                page, future = pending.popleft()
+                try:
+                    items = future.result()
+                except requests.exceptions.RequestException as e:
+                    logger.error(f"Erro na página {page}: {e}")
+                    logger.error(f"Falha definitiva na página {page}. Parando busca de chats.")
+                    break
+                pages_processed += 1
+
+                if not items:
+                    logger.info(f"Página {page}: vazia — fim dos dados")
+                    break
+
+                if updated_since and all(_is_older_than(chat, updated_since) for chat in items):
+                    logger.info("Página %d: todos os chats anteriores ao watermark %s — fim da busca incremental", page, updated_since)
+                    break
+
+                writer.queue.put(items)
+                logger.info("Página %d: %d chats", page, len(items))
+
+                if len(items) < limit:
+                    logger.info(f"Página {page}: {len(items)} itens (< {limit}) — última página")
+                    break
+
+                _prefetch()
+        finally:
+            # Páginas buscadas à frente e não usadas são descartadas
+            for _, future in pending:
+                future.cancel()
+            writer.queue.put(None)
+            writer.join()
+
+    total_saved = writer.saved
     logger.info(f"Fase 1 concluída: {total_saved} chats salvos em {pages_processed} páginas")
     return total_saved, pages_processed
 
@@ -242,9 +381,8 @@ def _fetch_messages_paginated(headers, base_url, chat_id, max_pages=20, limit=10
                     break
 
                 page += 1
-                time.sleep(0.2)
         except requests.exceptions.HTTPError as exc:
-            if exc.response and exc.response.status_code == 404:
+            if exc.response is not None and exc.response.status_code == 404:
                 continue
             logger.warning("Erro ao paginar mensagens do chat %s em %s: %s", chat_id, url, exc)
             continue
@@ -258,9 +396,24 @@ def _fetch_messages_paginated(headers, base_url, chat_id, max_pages=20, limit=10
     return []
 
 
-def fetch_missing_messages(token, base_url, max_messages=None):
-    """Busca mensagens para chats que ainda não têm mensagens em cache."""
+def _flush_messages(buffer):
+    """Grava um lote {chat_id: mensagens} no SQLite e no MySQL. Retorna msgs salvas no SQLite."""
+    if not buffer:
+        return 0
+    saved = sum(octadesk_db.save_messages_batch(buffer).values())
+    save_messages_mysql_batch(buffer)
+    return saved
+
+
+def fetch_missing_messages(token, base_url, max_messages=None, workers=None):
+    """Busca mensagens para chats que ainda não têm mensagens em cache.
+
+    As buscas rodam em paralelo (workers threads, limitadas pelo token bucket
+    global), no máximo workers*2 em voo; a gravação acontece em lotes de
+    WRITE_BATCH chats na thread principal.
+    """
     headers = {"accept": "application/json", "X-API-KEY": token}
+    workers = max(1, workers or SYNC_WORKERS)
     
     chats_missing = octadesk_db.get_chats_without_messages()
     total_missing = len(chats_missing)
@@ -272,27 +425,58 @@ def fetch_missing_messages(token, base_url, max_messages=None):
     if max_messages:
         chats_missing = chats_missing[:max_messages]
     
-    logger.info(f"Buscando mensagens para {len(chats_missing)} chats (de {total_missing} sem cache)...")
+    logger.info(
+        "Buscando mensagens para %d chats (de %d sem cache) com %d workers...",
+        len(chats_missing), total_missing, workers,
+    )
     
     total_msgs_saved = 0
     errors = 0
-    
-    for idx, chat_id in enumerate(chats_missing):
-        if (idx + 1) % 50 == 0:
-            logger.info(f"Progresso: {idx+1}/{len(chats_missing)} — {total_msgs_saved} msgs salvas — {errors} erros")
-
-        msgs = _fetch_messages_paginated(headers, base_url, chat_id)
-        
-        if msgs:
-            saved = octadesk_db.save_messages(chat_id, msgs)
-            total_msgs_saved += saved
-            save_messages_mysql(chat_id, msgs)
-        else:
-            errors += 1
-            # Salva registro vazio para marcar que já tentou (evita re-tentativa infinita)
-            # Não fazemos isso — deixamos tentar novamente no próximo ciclo
-        
-        time.sleep(0.2)
+    buffer = {}
+    start = time.time()
+
+    pendentes = iter(chats_missing)
+    futures = {}
+    concluidos = 0
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="octadesk-msgs") as executor:
+        def _submeter():
+            # Janela limitada: no máximo workers*2 buscas em voo (as respostas
+            # prontas e ainda não gravadas não se acumulam na memória)
+            for chat_id in itertools.islice(pendentes, workers * 2 - len(futures)):
+                futures[executor.submit(_fetch_messages_paginated, headers, base_url, chat_id)] = chat_id
+
+        _submeter()
+        while futures:
+            prontos, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in prontos:
+                chat_id = futures.pop(future)
+                try:
+                    msgs = future.result()
+                except Exception as exc:
+                    logger.warning("Falha inesperada ao buscar mensagens do chat %s: %s", chat_id, exc)
+                    msgs = []
+
+                if msgs:
+                    buffer[chat_id] = msgs
+                else:
+                    # Sem registro vazio: o chat volta a ser tentado no próximo ciclo
+                    errors += 1
+
+                if len(buffer) >= WRITE_BATCH:
+                    total_msgs_saved += _flush_messages(buffer)
+                    buffer = {}
+
+                concluidos += 1
+                if concluidos % 50 == 0:
+                    elapsed = time.time() - start
+                    logger.info(
+                        "Progresso: %d/%d — %d msgs salvas — %d erros — %.1f chats/s",
+                        concluidos, len(chats_missing), total_msgs_saved, errors, concluidos / max(elapsed, 1e-6),
+                    )
+            _submeter()
+
+    total_msgs_saved += _flush_messages(buffer)
     
     logger.info(f"Fase 2 concluída: {total_msgs_saved} mensagens salvas ({errors} chats sem resposta)")
     return total_msgs_saved
@@ -308,6 +492,8 @@ def main():
                         help="Máximo de páginas de chats a buscar (default: 120)")
     parser.add_argument("--max-messages", type=int, default=None,
                         help="Máximo de chats para buscar mensagens (default: todos)")
+    parser.add_argument("--workers", type=int, default=SYNC_WORKERS,
+                        help=f"Chats buscados em paralelo na fase 2 (default: {SYNC_WORKERS})")
     parser.add_argument("--only-messages", action="store_true",
                         help="Pula busca de chats, só busca mensagens de chats já cacheados")
     parser.add_argument("--only-chats", action="store_true",
@@ -347,7 +533,9 @@ def main():
     
     # Fase 2: Mensagens
     if not args.only_chats:
-        total_msgs = fetch_missing_messages(token, base_url, max_messages=args.max_messages)
+        total_msgs = fetch_missing_messages(
+            token, base_url, max_messages=args.max_messages, workers=args.workers,
+        )
     
     elapsed = time.time() - start_time
     
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+relatorios_ia_cron.py - Pré-geração dos relatórios IA de Ads (sem Streamlit)
+
+Coleta Google Ads + Meta Ads, monta o payload (formatar_dados_para_claude),
+roda a análise do Claude e salva com salvar_relatorio para os presets da
+página Relatórios IA — alerta de ontem e últimos 7 dias — de cada empresa
+(analysis/relatorios_agendados.py). A página abre esses relatórios na hora;
+o Claude só roda sob demanda para períodos personalizados.
+
+Relatórios já salvos para o mesmo período não são refeitos (use --forcar).
+
+AGENDAMENTO:
+  cron (todo dia às 06h, antes do expediente):
+     0 6 * * * cd /home/ulisses/dados_degrau_py && python3 relatorios_ia_cron.py >> data_cache/relatorios_ia_cron.log 2>&1
+
+  Outras opções:
+     python3 relatorios_ia_cron.py --preset alerta               # só o alerta diário
+     python3 relatorios_ia_cron.py --empresa degrau              # só Degrau Cultural
+     python3 relatorios_ia_cron.py --data 2026-03-16             # como se hoje fosse 16/03 (reprocessar)
+     python3 relatorios_ia_cron.py --dry-run                     # coleta e mede o payload, sem Claude
+     python3 relatorios_ia_cron.py --forcar --sem-slack          # refaz mesmo se já existir
+
+Código de saída 1 se algum relatório falhou (o cron registra no log).
+Variáveis de ambiente: ver analysis/relatorios_agendados.py e delivery/slack.py.
+"""
+
+import argparse
+import logging
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(PROJECT_ROOT))
+load_dotenv(PROJECT_ROOT / ".env")
+
+from analysis import relatorios_agendados
+
+LOG_DIR = PROJECT_ROOT / "data_cache"
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler(str(LOG_DIR / "relatorios_ia_cron.log"), encoding="utf-8"),
+    ]
+)
+logger = logging.getLogger("relatorios_ia_cron")
+
+EMPRESAS = {"degrau": "Degrau Cultural", "central": "Central de Concursos"}
+
+_ICONES = {"gerado": "✅", "existente": "📦", "coletado": "🔎", "sem_dados": "⚠️", "erro": "❌"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-geração dos relatórios IA de Ads")
+    parser.add_argument("--preset", nargs="+", choices=list(relatorios_agendados.PRESETS),
+                        default=list(relatorios_agendados.PRESETS), help="Presets a gerar (default: todos)")
+    parser.add_argument("--empresa", nargs="+", choices=list(EMPRESAS), default=list(EMPRESAS),
+                        help="Empresas (default: todas)")
+    parser.add_argument("--data", help="Data de referência AAAA-MM-DD no lugar de hoje")
+    parser.add_argument("--forcar", action="store_true", help="Gera mesmo se o relatório já estiver salvo")
+    parser.add_argument("--dry-run", action="store_true", help="Só coleta e monta o payload")
+    parser.add_argument("--sem-slack", action="store_true", help="Não envia o aviso ao Slack")
+    args = parser.parse_args()
+
+    hoje = datetime.strptime(args.data, "%Y-%m-%d").date() if args.data else None
+    resultados = relatorios_agendados.executar(
+        args.preset, [EMPRESAS[e] for e in args.empresa], hoje=hoje,
+        forcar=args.forcar, dry_run=args.dry_run, notificar=not args.sem_slack,
+    )
+
+    for r in resultados:
+        detalhe = r["erro"] or (f"{r['payload_caracteres']} caracteres de payload" if "payload_caracteres" in r
+                                else r["destino"] or "")
+        logger.info("%s %-9s %-20s %s [%s] %.0fs %s", _ICONES.get(r["status"], "?"), r["preset"],
+                    r["empresa"], r["data_ref"], r["status"], r["duracao"], detalhe)
+        for aviso in r["avisos"]:
+            logger.warning("   %s", aviso)
+
+    falhas = sum(1 for r in resultados if r["status"] == "erro")
+    logger.info("%d relatório(s), %d falha(s).", len(resultados), falhas)
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
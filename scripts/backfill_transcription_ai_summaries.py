@@ -1,78 +1,228 @@
+"""
+Backfill de transcription_ai_summaries a partir de opportunity_transcripts.insight_ia.
+
+Percorre as transcrições avaliadas por paginação keyset em ot.id (sem OFFSET:
+cada página começa depois do último id da anterior), extrai os campos do JSON
+em paralelo num pool de processos e grava em upserts multi-linha
+(utils.transcricao_mysql_writer.gravar_transcricoes, só a tabela de resumos).
+
+  - Checkpoint: o último id gravado fica em --checkpoint depois de cada
+    página; rodar de novo continua dali (--recomecar ignora o arquivo).
+    Linhas que falharam ficam sem resumo: --recomecar as pega de novo (o
+    anti-join só lê quem ainda não tem resumo).
+  - Ritmo: --taxa limita as linhas gravadas por segundo (TokenBucket) para
+    rodar em horário comercial sem pesar no primário.
+  - Relatório: a cada página, linhas/s e ETA sobre o total pendente contado
+    no início.
+  - --dry-run lê e extrai tudo, mas não grava nem avança o checkpoint.
+
+USO:
+    python scripts/backfill_transcription_ai_summaries.py                     # tudo que falta
+    python scripts/backfill_transcription_ai_summaries.py --taxa 50           # horário comercial
+    python scripts/backfill_transcription_ai_summaries.py --dry-run --limit 5000
+    python scripts/backfill_transcription_ai_summaries.py --transcricao-id 123
+    python scripts/backfill_transcription_ai_summaries.py --reprocessar --recomecar   # reextrai quem já tem resumo
+"""
+
 import argparse
-from typing import Optional
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
 from sqlalchemy import text
 
 from conexao.mysql_connector import conectar_mysql
-from utils.transcricao_mysql_writer import atualizar_avaliacao_transcricao
+from utils.gravacao_avaliacoes import engine_escrita
+from utils.rate_limiter import TokenBucket
+from utils.transcricao_mysql_writer import gravar_transcricoes, parametros_avaliacao_transcricao
 
+_CHECKPOINT_PADRAO = PROJECT_ROOT / "data_cache" / "backfill_transcription_ai_summaries.json"
 
-def buscar_avaliacoes_pendentes(limite: int, transcricao_id: Optional[int] = None):
-    engine = conectar_mysql()
-    if engine is None:
-        raise RuntimeError("Engine de leitura não inicializado")
+_FILTRO = """
+    FROM seducar.opportunity_transcripts ot
+    {join}
+    WHERE ot.insight_ia IS NOT NULL
+      AND ot.insight_ia <> ''
+      AND ot.id > :ultimo_id
+      {pendentes}
+      {um_id}
+"""
+
+
+def _sql(select: str, reprocessar: bool, um_id: bool, sufixo: str = "") -> str:
+    filtro = _FILTRO.format(
+        join="" if reprocessar else
+        "LEFT JOIN seducar.transcription_ai_summaries tas ON ot.id = tas.transcription_id",
+        pendentes="" if reprocessar else "AND tas.transcription_id IS NULL",
+        um_id="AND ot.id = :transcricao_id" if um_id else "",
+    )
+    return f"SELECT {select} {filtro} {sufixo}"
+
+
+def contar_pendentes(engine, ultimo_id: int, args) -> int:
+    sql = _sql("COUNT(*)", args.reprocessar, args.transcricao_id is not None)
+    with engine.connect() as conn:
+        return int(conn.execute(text(sql), _params(ultimo_id, args)).scalar() or 0)
+
+
+def buscar_pagina(engine, ultimo_id: int, tamanho: int, args):
+    sql = _sql(
+        "ot.id AS transcricao_id, ot.insight_ia AS insight_ia, ot.evaluation_ia AS evaluation_ia",
+        args.reprocessar, args.transcricao_id is not None,
+        "ORDER BY ot.id ASC LIMIT :pagina",
+    )
+    with engine.connect() as conn:
+        return conn.execute(text(sql), dict(_params(ultimo_id, args), pagina=tamanho)).fetchall()
+
+
+def _params(ultimo_id: int, args) -> Dict:
+    params = {"ultimo_id": ultimo_id}
+    if args.transcricao_id is not None:
+        params["transcricao_id"] = args.transcricao_id
+    return params
 
-    base_query = """
-        SELECT
-            ot.id AS transcricao_id,
-            ot.created_at AS created_at,
-            ot.insight_ia AS insight_ia,
-            ot.evaluation_ia AS evaluation_ia
-        FROM seducar.opportunity_transcripts ot
-        LEFT JOIN seducar.transcription_ai_summaries tas
-            ON ot.id = tas.transcription_id
-        WHERE ot.insight_ia IS NOT NULL
-          AND ot.insight_ia <> ''
-          AND tas.transcription_id IS NULL
-    """
-
-    params = {}
-    if transcricao_id is not None:
-        base_query += " AND ot.id = :transcricao_id"
-        params["transcricao_id"] = transcricao_id
-
-    base_query += " ORDER BY ot.id ASC LIMIT :limite"
-    params["limite"] = limite
-
-    with engine.begin() as conn:
-        result = conn.execute(text(base_query), params)
-        return result.fetchall()
+
+def _extrair(registro) -> Optional[Dict]:
+    """Roda nos processos do pool: JSON do insight → linha do upsert."""
+    transcricao_id, insight_ia, evaluation_ia = registro
+    return parametros_avaliacao_transcricao(transcricao_id, insight_ia, evaluation_ia)
+
+
+# ---------------------------------------------------------------------------
+# Checkpoint
+# ---------------------------------------------------------------------------
+
+def ler_checkpoint(caminho: Path) -> Dict:
+    try:
+        return json.loads(caminho.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def salvar_checkpoint(caminho: Path, estado: Dict):
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    tmp = caminho.with_suffix(".tmp")
+    tmp.write_text(json.dumps(estado, indent=2), encoding="utf-8")
+    os.replace(tmp, caminho)
+
+
+# ---------------------------------------------------------------------------
+# Gravação
+# ---------------------------------------------------------------------------
+
+def gravar(engine, linhas: List[Dict]) -> List[str]:
+    """Upsert em lote; se o lote falhar, linha a linha. Retorna os erros ('id: msg')."""
+    try:
+        with engine.begin() as conn:
+            gravar_transcricoes(conn, linhas, atualizar_transcricao=False)
+        return []
+    except Exception as e:
+        if len(linhas) == 1:
+            return [f"{linhas[0]['transcription_id']}: {e}"]
+    erros = []
+    for linha in linhas:
+        erros.extend(gravar(engine, [linha]))
+    return erros
+
+
+def _duracao(segundos: float) -> str:
+    segundos = int(segundos)
+    return f"{segundos // 3600}h{segundos % 3600 // 60:02d}m{segundos % 60:02d}s"
 
 
 def main():
     parser = argparse.ArgumentParser(description="Backfill transcription_ai_summaries")
-    parser.add_argument("--limit", type=int, default=1, help="Quantidade de registros a migrar")
+    parser.add_argument("--limit", type=int, help="Máximo de registros nesta execução (default: todos)")
     parser.add_argument("--transcricao-id", type=int, help="Filtrar por um ID específico")
+    parser.add_argument("--pagina", type=int, default=1000, help="Linhas lidas por consulta keyset")
+    parser.add_argument("--lote", type=int, default=200, help="Linhas por upsert")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Processos de extração do JSON")
+    parser.add_argument("--taxa", type=float, default=0, help="Máximo de linhas gravadas/s (0 = sem limite)")
+    parser.add_argument("--checkpoint", type=Path, default=_CHECKPOINT_PADRAO)
+    parser.add_argument("--recomecar", action="store_true", help="Ignora o checkpoint e começa do id 0")
+    parser.add_argument("--reprocessar", action="store_true", help="Inclui transcrições que já têm resumo")
+    parser.add_argument("--dry-run", action="store_true", help="Lê e extrai, sem gravar")
     args = parser.parse_args()
 
-    registros = buscar_avaliacoes_pendentes(args.limit, args.transcricao_id)
-    if not registros:
-        print("Nenhum registro pendente encontrado.")
+    leitura = conectar_mysql()
+    if leitura is None:
+        raise RuntimeError("Engine de leitura não inicializado")
+    escrita = None
+    if not args.dry_run:
+        escrita = engine_escrita()
+        if escrita is None:
+            raise RuntimeError("Engine de escrita não inicializado")
+
+    usa_checkpoint = args.transcricao_id is None and not args.dry_run
+    estado = {} if args.recomecar or not usa_checkpoint else ler_checkpoint(args.checkpoint)
+    ultimo_id = int(estado.get("ultimo_id", 0))
+    gravados_antes = int(estado.get("gravados", 0))
+    if ultimo_id:
+        print(f"Retomando do checkpoint: ot.id > {ultimo_id} ({gravados_antes} já gravados)")
+
+    pendentes = contar_pendentes(leitura, ultimo_id, args)
+    alvo = min(pendentes, args.limit) if args.limit else pendentes
+    print(f"{pendentes} transcrição(ões) pendente(s); processando {alvo}"
+          f"{' (dry-run)' if args.dry_run else ''}.")
+    if not alvo:
         return
 
-    sucesso = 0
-    falhas = 0
-
-    for row in registros:
-        transcricao_id = row.transcricao_id
-        insight_ia = row.insight_ia
-        evaluation_ia = row.evaluation_ia
-        created_at = row.created_at
-
-        atualizado, erro = atualizar_avaliacao_transcricao(
-            transcricao_id=transcricao_id,
-            insight_ia=insight_ia,
-            evaluation_ia=evaluation_ia,
-            created_at=created_at,
-        )
-
-        if atualizado:
-            sucesso += 1
-            print(f"OK: transcricao_id={transcricao_id}")
-        else:
-            falhas += 1
-            print(f"ERRO: transcricao_id={transcricao_id} ({erro})")
-
-    print(f"Concluído: {sucesso} sucesso(s), {falhas} falha(s).")
+    balde = TokenBucket(args.taxa, capacidade=args.lote) if args.taxa > 0 else None
+    inicio = time.monotonic()
+    processados, gravados, vazios, erros = 0, 0, 0, []
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        while processados < alvo:
+            registros = buscar_pagina(leitura, ultimo_id, min(args.pagina, alvo - processados), args)
+            if not registros:
+                break
+            linhas = list(pool.map(_extrair, [tuple(r) for r in registros],
+                                   chunksize=max(1, len(registros) // (4 * args.workers))))
+            validas = [l for l in linhas if l]
+            vazios += len(linhas) - len(validas)
+
+            for i in range(0, len(validas), args.lote):
+                lote = validas[i:i + args.lote]
+                if balde:
+                    balde.acquire(len(lote))
+                if args.dry_run:
+                    gravados += len(lote)
+                    continue
+                falhas = gravar(escrita, lote)
+                erros.extend(falhas)
+                gravados += len(lote) - len(falhas)
+
+            processados += len(registros)
+            ultimo_id = int(registros[-1][0])
+            if usa_checkpoint:
+                salvar_checkpoint(args.checkpoint, {
+                    "ultimo_id": ultimo_id,
+                    "gravados": gravados_antes + gravados,
+                    "erros": int(estado.get("erros", 0)) + len(erros),
+                    "atualizado_em": time.strftime("%Y-%m-%d %H:%M:%S"),
+                })
+
+            decorrido = time.monotonic() - inicio
+            taxa = processados / decorrido if decorrido else 0.0
+            eta = (alvo - processados) / taxa if taxa else 0.0
+            print(f"[{processados}/{alvo} {processados / alvo:.0%}] ot.id até {ultimo_id} | "
+                  f"{taxa:.0f} linhas/s | gravados {gravados} | erros {len(erros)} | "
+                  f"ETA {_duracao(eta)}", flush=True)
+
+    for erro in erros[:20]:
+        print(f"ERRO: transcricao_id={erro}")
+    if len(erros) > 20:
+        print(f"... e mais {len(erros) - 20} erro(s).")
+    print(f"Concluído em {_duracao(time.monotonic() - inicio)}: {gravados} "
+          f"{'extraído(s) (dry-run)' if args.dry_run else 'gravado(s)'}, "
+          f"{vazios} sem id, {len(erros)} falha(s).")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,425 @@
+"""
+Benchmark offline do pipeline de avaliação de IA (replay de fixtures gravadas).
+
+Duas etapas (utils.replay_avaliacoes):
+
+  gravar  — roda ChatIAAnalyzer / TranscricaoAnalyzer / TranscricaoIAAnalyzer
+            sobre conversas reais através de um proxy local que repassa às
+            APIs de verdade e guarda entradas e pares pedido/resposta
+            SANITIZADOS no arquivo de fixtures. Gasta tokens (uma vez só).
+  replay  — sobe o servidor falso com um perfil de latência/erros/429, aponta
+            os SDKs para ele e roda as mesmas avaliações pelo caminho de
+            produção (asyncio + llm_limiter; TranscricaoIAAnalyzer em threads).
+            Sem rede e sem custo: dá para rodar no laptop ou no CI.
+
+Modos do replay (--modo):
+  direto  — chama os analyzers diretamente (default);
+  worker  — enfileira as entradas numa fila_avaliacoes temporária e roda
+            avaliacao_worker.executar(uma_vez=True): reserva, leases,
+            retentativas e concorrência do worker entram na medida. A gravação
+            no MySQL (batch_avaliacoes.persistir) é trocada por um no-op;
+  batch   — Message Batches da Anthropic simulada pelo servidor: cria o lote,
+            consulta até 'ended' e coleta os resultados (latência = do envio
+            à coleta). Use --latencia-batch para a fila do provedor.
+  worker e batch só cobrem os canais do Claude (whatsapp, ligacao).
+
+Relatório por canal: avaliações/min, latência p50/p95 por avaliação,
+requisições e status servidos, retentativas do SDK, origem da fixture
+(exata / mesmo tipo de pedido / qualquer da API) e tokens.
+O cache de avaliações fica desligado nas duas etapas.
+
+USO:
+    python scripts/benchmark_avaliacoes.py gravar --da-fila 30                     # amostra da fila de avaliações
+    python scripts/benchmark_avaliacoes.py gravar --entradas amostra.jsonl --canal whatsapp
+    python scripts/benchmark_avaliacoes.py replay                                  # perfil 'ideal'
+    python scripts/benchmark_avaliacoes.py replay --perfil instavel --concorrencia 32 --repeticoes 10
+    python scripts/benchmark_avaliacoes.py replay --perfil limitado --rpm 120 --json atual.json
+    python scripts/benchmark_avaliacoes.py replay --json novo.json --comparar atual.json   # CI: antes × depois
+    LLM_RPM=500 python scripts/benchmark_avaliacoes.py replay --perfil rapido      # mudanças no limitador
+    python scripts/benchmark_avaliacoes.py replay --modo worker --perfil instavel --repeticoes 5
+    python scripts/benchmark_avaliacoes.py replay --modo batch --latencia-batch 30
+
+--entradas: JSONL com {"canal": "whatsapp"|"ligacao", "texto": ..., "contexto_adicional": {...}, "agent_name": ...,
+           "nomes": [nomes reais fora do texto — agente, contato; nas ligações é a única fonte]}
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from utils.replay_avaliacoes import FIXTURES_PADRAO, PERFIS, Fixtures, ServidorReplay, nomes_do_payload
+
+CANAIS = ("whatsapp", "ligacao", "ligacao_openai")
+MODOS = ("direto", "worker", "batch")
+
+
+def _apontar_sdks(url: str, replay: bool):
+    """Os analyzers criam os clients depois disto — todos falam com o servidor local."""
+    os.environ["ANTHROPIC_BASE_URL"] = url
+    os.environ["OPENAI_BASE_URL"] = f"{url}/v1"
+    os.environ["AVALIACAO_CACHE_DESATIVADO"] = "1"
+    if replay:
+        os.environ["GROQ_BASE_URL"] = f"{url}/v1"
+        os.environ.setdefault("ANTHROPIC_API_KEY", "replay")
+        os.environ.setdefault("OPENAI_API_KEY", "replay")
+
+
+def _analyzers(canais) -> Dict:
+    from utils.chat_ia_analyzer import ChatIAAnalyzer
+    from utils.transcricao_analyzer import TranscricaoAnalyzer
+    from utils.transcricao_ia_analyzer import TranscricaoIAAnalyzer
+
+    classes = {"whatsapp": ChatIAAnalyzer, "ligacao": TranscricaoAnalyzer, "ligacao_openai": TranscricaoIAAnalyzer}
+    analyzers = {canal: classes[canal]() for canal in canais}
+    # ChatIAAnalyzer recarrega o .env com override: confere que nada escapou do servidor local
+    for canal, analyzer in analyzers.items():
+        base = str(getattr(getattr(analyzer, "client", None), "base_url", "") or "")
+        if base and "127.0.0.1" not in base:
+            raise RuntimeError(f"{canal}: client aponta para {base}, não para o servidor local")
+    return analyzers
+
+
+# ---------------------------------------------------------------------------
+# Execução
+# ---------------------------------------------------------------------------
+
+def _resultado(inicio: float, r: Optional[Dict]) -> Dict:
+    r = r or {}
+    return {"latencia": time.monotonic() - inicio, "erro": r.get("erro")}
+
+
+def _rodar_async(analyzer, itens: List[Dict], concorrencia: int, avaliar) -> List[Dict]:
+    from utils import avaliacao_async
+
+    async def _lote():
+        async with analyzer.cliente_async() as aclient:
+            async def _um(item):
+                inicio = time.monotonic()
+                return _resultado(inicio, await avaliar(aclient, item))
+
+            return await avaliacao_async.executar_lote(
+                itens, _um, concorrencia=analyzer.concorrencia(concorrencia or None),
+                falha=lambda item, erro: {"latencia": None, "erro": erro},
+            )
+
+    return avaliacao_async.rodar(_lote())
+
+
+def avaliar_canal(canal: str, analyzer, itens: List[Dict], concorrencia: int) -> List[Dict]:
+    if canal == "whatsapp":
+        return _rodar_async(analyzer, itens, concorrencia, lambda aclient, item: analyzer.avaliar_chat_async(
+            aclient, chat_text=item["texto"], contexto_adicional=item.get("contexto_adicional"),
+            agent_name=item.get("agent_name") or ""))
+    if canal == "ligacao":
+        return _rodar_async(analyzer, itens, concorrencia, lambda aclient, item: analyzer.analisar_transcricao_async(
+            aclient, item["texto"], contexto_adicional=item.get("contexto_adicional")))
+
+    def _um(item):
+        inicio = time.monotonic()
+        return _resultado(inicio, analyzer.analisar_transcricao(item["texto"], item.get("contexto_adicional")))
+
+    with ThreadPoolExecutor(max_workers=max(1, concorrencia or 8)) as pool:
+        return list(pool.map(_um, itens))
+
+
+def avaliar_worker(canal: str, itens: List[Dict], concorrencia: int) -> List[Dict]:
+    """Passa as entradas pela fila_avaliacoes (banco temporário) e pelo avaliacao_worker, sem gravar no MySQL."""
+    import asyncio
+
+    # antes do import: com o root logger configurado o worker não abre o log de produção
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    import avaliacao_worker
+    from utils import batch_avaliacoes, fila_avaliacoes
+
+    resultados: List[Dict] = []
+
+    def _medir(processar):
+        async def _medido(job, *args):
+            inicio = time.monotonic()
+            try:
+                r = await processar(job, *args)
+            except Exception as e:
+                resultados.append({"latencia": time.monotonic() - inicio, "erro": str(e) or type(e).__name__})
+                raise
+            resultados.append(_resultado(inicio, r))
+            return r
+        return _medido
+
+    def _sem_gravar(canal_, avaliacoes, meta_por_item):
+        return {"salvos": len(avaliacoes), "erros": []}
+
+    if canal == "whatsapp":
+        jobs = [{"item_id": f"bench-{i}", "payload": {
+            "meta": {"transcript": item["texto"]}, "contexto_adicional": item.get("contexto_adicional"),
+            "agent_name": item.get("agent_name") or ""}} for i, item in enumerate(itens)]
+    else:
+        jobs = [{"item_id": f"bench-{i}", "payload": {
+            "transcricao": item["texto"], "minimo_chars": 0,
+            "contexto_adicional": item.get("contexto_adicional")}} for i, item in enumerate(itens)]
+
+    pasta = Path(tempfile.mkdtemp(prefix="benchmark_fila_"))
+    originais = (fila_avaliacoes._DB_PATH, batch_avaliacoes.persistir,
+                 avaliacao_worker._processar_ligacao, avaliacao_worker._processar_chat)
+    fila_avaliacoes._DB_PATH = pasta / "fila_avaliacoes.db"
+    batch_avaliacoes.persistir = _sem_gravar
+    avaliacao_worker._processar_ligacao = _medir(originais[2])
+    avaliacao_worker._processar_chat = _medir(originais[3])
+    try:
+        lote = fila_avaliacoes.enfileirar(canal, jobs)["lote"]
+        asyncio.run(avaliacao_worker.executar(concorrencia, [canal], uma_vez=True))
+        pendentes = fila_avaliacoes.progresso(lote)["pendente"]
+        if pendentes:
+            print(f"[{canal}] {pendentes} job(s) ficaram na fila esperando nova tentativa (contados com erro)")
+    finally:
+        (fila_avaliacoes._DB_PATH, batch_avaliacoes.persistir,
+         avaliacao_worker._processar_ligacao, avaliacao_worker._processar_chat) = originais
+        shutil.rmtree(pasta, ignore_errors=True)
+    return resultados
+
+
+def avaliar_batch(canal: str, analyzer, itens: List[Dict], intervalo: float) -> List[Dict]:
+    """Cria um lote na Batches API (simulada), consulta até terminar e coleta; latência = envio → coleta."""
+    inicio = time.monotonic()
+    resolvidos = []
+    if canal == "whatsapp":
+        batch_id = analyzer.criar_batch([
+            {"chat_id": f"bench-{i}", "transcript": item["texto"], "agent_name": item.get("agent_name") or "",
+             "contexto_adicional": item.get("contexto_adicional")} for i, item in enumerate(itens)])
+    else:
+        preparado = analyzer.preparar_batch([
+            {"transcricao_id": f"bench-{i}", "transcricao": item["texto"],
+             "contexto_adicional": item.get("contexto_adicional")} for i, item in enumerate(itens)])
+        resolvidos = [_resultado(inicio, r) for r in preparado["resolvidos"]]
+        if not preparado["requests"]:
+            return resolvidos
+        batch_id = analyzer.enviar_batch(preparado["requests"])
+    if batch_id is None:
+        return resolvidos + [{"latencia": None, "erro": "batch não criado"}]
+
+    while True:
+        estado = analyzer.consultar_batch(batch_id)
+        if estado.get("erro"):
+            return resolvidos + [{"latencia": None, "erro": f"consulta do batch: {estado['erro']}"}]
+        if estado.get("processing_status") == "ended":
+            break
+        time.sleep(intervalo)
+    return resolvidos + [_resultado(inicio, r) for r in analyzer.coletar_resultados_batch(batch_id)]
+
+
+def _percentil(valores: List[float], p: float) -> Optional[float]:
+    valores = sorted(valores)
+    if not valores:
+        return None
+    return round(valores[max(0, math.ceil(len(valores) * p) - 1)], 3)
+
+
+def relatorio(canal: str, resultados: List[Dict], duracao: float, stats: Dict) -> Dict:
+    latencias = [r["latencia"] for r in resultados if r.get("latencia") is not None]
+    return {
+        "canal": canal,
+        "avaliacoes": len(resultados),
+        "erros": sum(1 for r in resultados if r.get("erro")),
+        "duracao_s": round(duracao, 2),
+        "avaliacoes_min": round(len(resultados) / duracao * 60, 1) if duracao else None,
+        "latencia_p50": _percentil(latencias, 0.5),
+        "latencia_p95": _percentil(latencias, 0.95),
+        **stats,
+    }
+
+
+def _imprimir(r: Dict, base: Optional[Dict] = None):
+    def _delta(campo):
+        if not base or base.get(campo) in (None, 0) or r.get(campo) is None:
+            return ""
+        return f" ({(r[campo] - base[campo]) / base[campo]:+.0%})"
+
+    print(f"\n[{r['canal']}] {r['avaliacoes']} avaliação(ões) em {r['duracao_s']}s — "
+          f"{r['avaliacoes_min']} aval/min{_delta('avaliacoes_min')}, {r['erros']} com erro")
+    print(f"  latência por avaliação: p50 {r['latencia_p50']}s{_delta('latencia_p50')} | "
+          f"p95 {r['latencia_p95']}s{_delta('latencia_p95')}")
+    print(f"  requisições {r['requisicoes']} (status {r['status']}) | retentativas do SDK {r['retentativas_sdk']} | "
+          f"fixture {r['fixture']}")
+    if (r.get("batch") or {}).get("lotes"):
+        print(f"  batch: {r['batch']['lotes']} lote(s), {r['batch']['itens']} item(ns), "
+              f"{r['batch']['erros']} com erro")
+    print(f"  tokens: entrada {r['input_tokens']}{_delta('input_tokens')} | "
+          f"saída {r['output_tokens']}{_delta('output_tokens')}")
+
+
+# ---------------------------------------------------------------------------
+# Subcomandos
+# ---------------------------------------------------------------------------
+
+def _entradas_da_fila(canais, limite: int) -> List[Dict]:
+    from utils import fila_avaliacoes
+
+    entradas = []
+    if "whatsapp" in canais:
+        for job in fila_avaliacoes.amostrar("whatsapp", limite):
+            p = job["payload"]
+            entradas.append({"canal": "whatsapp", "texto": (p.get("meta") or {}).get("transcript") or "",
+                             "contexto_adicional": p.get("contexto_adicional"), "agent_name": p.get("agent_name"),
+                             "nomes": nomes_do_payload(p)})
+    if {"ligacao", "ligacao_openai"} & set(canais):
+        from utils.transcricoes_loader import carregar_detalhe_transcricao
+        for job in fila_avaliacoes.amostrar("ligacao", limite):
+            p = job["payload"]
+            texto = p.get("transcricao")
+            nomes = nomes_do_payload(p)
+            if texto is None:
+                detalhe = carregar_detalhe_transcricao(int(job["item_id"]))
+                texto = detalhe.get("transcricao") or ""
+                nomes += [n for n in nomes_do_payload(detalhe) if n not in nomes]
+            # sem remetente por linha na transcrição: os nomes vêm do payload (agente, contato)
+            entradas.append({"canal": "ligacao", "texto": texto, "contexto_adicional": p.get("contexto_adicional"),
+                             "agent_name": (p.get("meta") or {}).get("agente"), "nomes": nomes})
+    return [e for e in entradas if e["texto"].strip()]
+
+
+def gravar(args):
+    from dotenv import load_dotenv
+    load_dotenv(PROJECT_ROOT / ".env")
+
+    canais = args.canal or ["whatsapp", "ligacao"]
+    if args.entradas:
+        with open(args.entradas, encoding="utf-8") as f:
+            entradas = [json.loads(l) for l in f if l.strip()]
+    else:
+        entradas = _entradas_da_fila(canais, args.da_fila)
+    if not entradas:
+        print("Nenhuma entrada para gravar (use --entradas ou --da-fila com a fila populada).")
+        return 1
+
+    fixtures = Fixtures(args.fixtures)
+    pares_antes = len(fixtures.pares)
+    with ServidorReplay(fixtures, porta=args.porta, gravando=True) as srv:
+        srv.iniciar()
+        _apontar_sdks(srv.url, replay=False)
+        analyzers = _analyzers(canais)
+        for entrada in entradas:
+            fixtures.adicionar_entrada(entrada)
+        for canal in canais:
+            itens = [e for e in entradas if e["canal"] == ("ligacao" if canal == "ligacao_openai" else canal)]
+            if not itens:
+                continue
+            print(f"[{canal}] gravando {len(itens)} avaliação(ões) contra a API real...", flush=True)
+            resultados = avaliar_canal(canal, analyzers[canal], itens, args.concorrencia)
+            erros = [r["erro"] for r in resultados if r.get("erro")]
+            print(f"[{canal}] {len(itens) - len(erros)} ok, {len(erros)} com erro"
+                  + (f" (ex.: {erros[0]})" if erros else ""))
+        stats = srv.estatisticas()
+    print(f"\n{len(entradas)} entrada(s) e {len(fixtures.pares) - pares_antes} par(es) novo(s) em {fixtures.caminho} "
+          f"(requisições: {stats['status']}). Revise a sanitização antes de versionar o arquivo.")
+    return 0
+
+
+def replay(args):
+    fixtures = Fixtures(args.fixtures)
+    if not fixtures.pares:
+        print(f"Sem pares gravados em {fixtures.caminho}. Rode o subcomando 'gravar' antes.")
+        return 1
+    canais = args.canal or [c for c in CANAIS if fixtures.entradas_do_canal(c)]
+    ajustes = {"latencia": args.latencia, "fator_latencia": args.fator_latencia, "jitter": args.jitter,
+               "erro": args.erro, "taxa_429": args.taxa_429, "rpm": args.rpm, "retry_after": args.retry_after,
+               "latencia_batch": args.latencia_batch}
+
+    relatorios = []
+    with ServidorReplay(fixtures, perfil=args.perfil, porta=args.porta, semente=args.semente, **ajustes) as srv:
+        srv.iniciar()
+        _apontar_sdks(srv.url, replay=True)
+        analyzers = _analyzers(canais)
+        print(f"Perfil {args.perfil}: {srv.perfil} | {len(fixtures.pares)} par(es), servidor {srv.url} "
+              f"| modo {args.modo}")
+        for canal in canais:
+            if args.modo != "direto" and canal == "ligacao_openai":
+                print(f"\n[{canal}] modo {args.modo} só cobre os canais do Claude — pulando.")
+                continue
+            itens = fixtures.entradas_do_canal(canal)
+            if args.limite:
+                itens = itens[:args.limite]
+            itens = itens * max(1, args.repeticoes)
+            if not itens:
+                print(f"\n[{canal}] sem entradas gravadas — pulando.")
+                continue
+            srv.zerar()
+            inicio = time.monotonic()
+            if args.modo == "worker":
+                resultados = avaliar_worker(canal, itens, args.concorrencia)
+            elif args.modo == "batch":
+                resultados = avaliar_batch(canal, analyzers[canal], itens, args.intervalo_batch)
+            else:
+                resultados = avaliar_canal(canal, analyzers[canal], itens, args.concorrencia)
+            relatorios.append(relatorio(canal, resultados, time.monotonic() - inicio, srv.estatisticas()))
+
+    base = {}
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = {r["canal"]: r for r in json.load(f)["canais"]}
+    for r in relatorios:
+        _imprimir(r, base.get(r["canal"]))
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({
+            "perfil": args.perfil, "modo": args.modo, "ajustes": srv.perfil, "concorrencia": args.concorrencia,
+            "repeticoes": args.repeticoes, "gerado_em": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "canais": relatorios,
+        }, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nRelatório salvo em {args.json}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline das avaliações de IA (gravação e replay)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    comum = argparse.ArgumentParser(add_help=False)
+    comum.add_argument("--fixtures", type=Path, default=FIXTURES_PADRAO, help="Arquivo JSONL de fixtures")
+    comum.add_argument("--canal", choices=CANAIS, action="append", help="Canal/analyzer (pode repetir)")
+    comum.add_argument("--porta", type=int, default=0, help="Porta do servidor local (0 = livre)")
+    comum.add_argument("--concorrencia", type=int, default=0,
+                       help="Avaliações simultâneas (0 = padrão do analyzer / limitador)")
+
+    g = sub.add_parser("gravar", parents=[comum], help="Grava fixtures contra as APIs reais (custa tokens)")
+    origem = g.add_mutually_exclusive_group(required=True)
+    origem.add_argument("--entradas", type=Path, help="JSONL de conversas a avaliar")
+    origem.add_argument("--da-fila", type=int, metavar="N", help="Últimos N jobs de cada canal da fila de avaliações")
+    g.set_defaults(func=gravar)
+
+    r = sub.add_parser("replay", parents=[comum], help="Roda o benchmark contra o servidor falso")
+    r.add_argument("--perfil", choices=sorted(PERFIS), default="ideal")
+    r.add_argument("--modo", choices=MODOS, default="direto",
+                   help="direto (analyzers), worker (fila + avaliacao_worker) ou batch (Batches API)")
+    r.add_argument("--latencia", type=float, help="Latência fixa (s) no lugar da gravada")
+    r.add_argument("--fator-latencia", type=float, help="Multiplica a latência")
+    r.add_argument("--jitter", type=float, help="Variação relativa da latência (0.3 = ±30%%)")
+    r.add_argument("--erro", type=float, help="Fração de respostas 5xx")
+    r.add_argument("--taxa-429", type=float, help="Fração de 429 aleatórios")
+    r.add_argument("--rpm", type=int, help="Limite de requisições/min do servidor (429 acima dele)")
+    r.add_argument("--retry-after", type=int, help="retry-after (s) dos 429 aleatórios")
+    r.add_argument("--latencia-batch", type=float, help="Modo batch: segundos extras até o lote terminar")
+    r.add_argument("--intervalo-batch", type=float, default=0.5, help="Modo batch: espera (s) entre consultas")
+    r.add_argument("--repeticoes", type=int, default=1, help="Repete as entradas N vezes (mais carga)")
+    r.add_argument("--limite", type=int, help="Máximo de entradas por canal (antes das repetições)")
+    r.add_argument("--semente", type=int, default=42, help="Semente dos sorteios de erro/latência")
+    r.add_argument("--json", help="Salva o relatório neste arquivo")
+    r.add_argument("--comparar", help="Relatório JSON anterior para mostrar a variação")
+    r.set_defaults(func=replay)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Micro-benchmark de latência de leitura do cache Octadesk durante uma sincronização.
+
+Popula um banco temporário com chats/mensagens sintéticos e mede as leituras
+da página (get_cached_chats_df de um intervalo + get_cached_messages_df de
+um lote de chats) em dois cenários: banco ocioso e com uma thread escrevendo
+páginas de chats e mensagens sem parar, como o cron faz.
+
+USO:
+    python scripts/benchmark_octadesk_cache.py
+    python scripts/benchmark_octadesk_cache.py --chats 20000 --leituras 200
+    OCTADESK_DB_WRITE_CHUNK=100000 python scripts/benchmark_octadesk_cache.py   # escrita numa transação só
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import octadesk_db
+
+_INICIO = datetime(2026, 1, 1)
+
+
+def _chat(i: int) -> dict:
+    criado = _INICIO + timedelta(minutes=7 * i)
+    return {
+        "id": f"chat-{i}",
+        "number": i,
+        "status": random.choice(["closed", "open", "talking"]),
+        "channel": random.choice(["whatsapp", "webchat"]),
+        "createdAt": criado.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "agent": {"id": f"a{i % 12}", "name": f"Agente {i % 12}"},
+        "group": {"name": f"Grupo {i % 4}"},
+        "contact": {
+            "name": f"Contato {i}",
+            "email": f"contato{i}@exemplo.com",
+            "phoneContacts": [{"countryCode": "55", "number": f"2199{i:07d}"}],
+        },
+        "tags": [{"name": "lead"}, {"name": f"tag{i % 9}"}],
+    }
+
+
+def _mensagens(i: int, n: int) -> list:
+    criado = _INICIO + timedelta(minutes=7 * i)
+    return [
+        {
+            "id": f"msg-{i}-{k}",
+            "createdAt": (criado + timedelta(seconds=30 * k)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "sentBy": {"name": "Cliente" if k % 2 else "Agente", "type": "customer" if k % 2 else "agent"},
+            "body": "Mensagem de teste " * random.randint(1, 12),
+        }
+        for k in range(n)
+    ]
+
+
+def _popular(chats: int, msgs_por_chat: int, inicio: int = 0):
+    for base in range(inicio, inicio + chats, 500):
+        ids = range(base, min(base + 500, inicio + chats))
+        octadesk_db.save_chats([_chat(i) for i in ids])
+        octadesk_db.save_messages_batch({f"chat-{i}": _mensagens(i, msgs_por_chat) for i in ids})
+
+
+def _medir(leituras: int, total_chats: int, lote: int) -> list:
+    latencias = []
+    for _ in range(leituras):
+        i = random.randrange(total_chats)
+        dia = (_INICIO + timedelta(minutes=7 * i)).date()
+        t0 = time.perf_counter()
+        df = octadesk_db.get_cached_chats_df(start_date=dia, end_date=dia + timedelta(days=1))
+        octadesk_db.get_cached_messages_df(df["id"].head(lote).tolist())
+        latencias.append((time.perf_counter() - t0) * 1000)
+    return latencias
+
+
+def _resumo(nome: str, latencias: list):
+    ordenadas = sorted(latencias)
+    p95 = ordenadas[int(len(ordenadas) * 0.95) - 1]
+    print(
+        f"{nome:<22} n={len(latencias):>4}  p50={statistics.median(latencias):7.1f} ms  "
+        f"p95={p95:7.1f} ms  máx={ordenadas[-1]:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência de leitura do cache Octadesk com sync em andamento")
+    parser.add_argument("--chats", type=int, default=5000, help="Chats pré-carregados (default: 5000)")
+    parser.add_argument("--mensagens", type=int, default=20, help="Mensagens por chat (default: 20)")
+    parser.add_argument("--leituras", type=int, default=100, help="Leituras por cenário (default: 100)")
+    parser.add_argument("--lote", type=int, default=50, help="Chats por leitura de mensagens (default: 50)")
+    args = parser.parse_args()
+
+    random.seed(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        octadesk_db.DB_DIR = tmp
+        octadesk_db.DB_FILE = str(Path(tmp) / "octadesk_cache.db")
+        print(f"Populando {args.chats} chats × {args.mensagens} mensagens...")
+        _popular(args.chats, args.mensagens)
+        print(f"Escrita em transações de {octadesk_db.WRITE_CHUNK} linhas\n")
+
+        _resumo("ocioso", _medir(args.leituras, args.chats, args.lote))
+
+        parar = threading.Event()
+        escritos = [0]
+
+        def _escritor():
+            proximo = args.chats
+            while not parar.is_set():
+                _popular(500, args.mensagens, inicio=proximo)
+                proximo += 500
+                escritos[0] += 500
+            octadesk_db.close_connection()
+
+        escritor = threading.Thread(target=_escritor, daemon=True)
+        escritor.start()
+        time.sleep(0.2)
+        t0 = time.perf_counter()
+        latencias = _medir(args.leituras, args.chats, args.lote)
+        duracao = time.perf_counter() - t0
+        parar.set()
+        escritor.join()
+
+        _resumo("durante sincronização", latencias)
+        print(f"\nEscritor: {escritos[0]} chats ({escritos[0] * args.mensagens} mensagens) "
+              f"gravados em {duracao:.1f}s de medição")
+        octadesk_db.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Teste offline do utils.llm_limiter / utils.rate_limiter.
+
+Confere:
+
+  devolução — com o orçamento de saída esgotado pela estimativa, uma
+              chamada esperando (thread ou corrotina) é liberada assim que
+              as anteriores concluem e devolvem o que não usaram, em vez de
+              dormir o déficit inteiro (15 s com os defaults);
+  espera    — sem devolução, a espera continua sendo a da taxa do balde;
+  stream    — stream abandonado pelo chamador ou que falha depois do
+              message_start é acertado pelo usage já cobrado (entrada exata
+              + saída recebida); só o que falha antes de responder devolve a
+              reserva inteira;
+  cancelado — criar_mensagem_async cancelada em voo mantém a reserva.
+
+Os streams vêm de um servidor SSE local no formato da Anthropic.
+Sem rede e sem custo. Sai com código 1 se alguma verificação falhar.
+
+USO:
+    python scripts/testar_llm_limiter.py
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import anthropic  # noqa: E402
+
+from utils import llm_limiter  # noqa: E402
+from utils.llm_limiter import LimitadorLLM  # noqa: E402
+from utils.rate_limiter import TokenBucket  # noqa: E402
+
+OTPM = 8000
+ESTIMATIVA_SAIDA = 2000
+ENTRADA_COBRADA = 1000
+TEXTO_PARCIAL = "Resposta parcial do modelo. " * 20
+CAPACIDADE = 100_000
+
+falhas = []
+
+
+def verificar(condicao: bool, descricao: str):
+    print(f"  {'✅' if condicao else '❌'} {descricao}")
+    if not condicao:
+        falhas.append(descricao)
+
+
+def _limitador_esgotado():
+    """Limitador com o orçamento de saída todo reservado por 4 chamadas."""
+    lim = LimitadorLLM("teste", rpm=600, itpm=1_000_000, otpm=OTPM)
+    reservas = [lim.reservar(100, ESTIMATIVA_SAIDA) for _ in range(OTPM // ESTIMATIVA_SAIDA)]
+    return lim, reservas
+
+
+def _concluir_depois(lim, reservas, atraso: float):
+    def _concluir():
+        time.sleep(atraso)
+        for reserva in reservas:
+            lim.concluir(reserva, SimpleNamespace(input_tokens=100, output_tokens=50))
+    threading.Thread(target=_concluir, daemon=True).start()
+
+
+def testar_devolucao():
+    print("\nDevolução libera quem espera")
+    lim, reservas = _limitador_esgotado()
+    _concluir_depois(lim, reservas, 0.1)
+    inicio = time.monotonic()
+    lim.reservar(100, ESTIMATIVA_SAIDA)
+    duracao = time.monotonic() - inicio
+    verificar(duracao < 1.0, f"thread liberada pela devolução ({duracao:.2f}s)")
+
+    lim, reservas = _limitador_esgotado()
+    _concluir_depois(lim, reservas, 0.1)
+    inicio = time.monotonic()
+    asyncio.run(lim.reservar_async(100, ESTIMATIVA_SAIDA))
+    duracao = time.monotonic() - inicio
+    verificar(duracao < 1.0, f"corrotina liberada pela devolução ({duracao:.2f}s)")
+
+
+def testar_espera():
+    print("\nSem devolução, espera pela taxa")
+    balde = TokenBucket(taxa=10, capacidade=1)
+    balde.acquire(1)
+    inicio = time.monotonic()
+    balde.acquire(1)
+    duracao = time.monotonic() - inicio
+    verificar(0.05 < duracao < 0.5, f"acquire espera o próximo token ({duracao:.2f}s)")
+
+    balde.acquire(1)
+    inicio = time.monotonic()
+    asyncio.run(balde.acquire_async(1))
+    duracao = time.monotonic() - inicio
+    verificar(0.05 < duracao < 0.5, f"acquire_async espera o próximo token ({duracao:.2f}s)")
+
+
+class _Interrompido(BaseException):
+    """Como o StopException/RerunException do Streamlit: não é Exception."""
+
+
+def _sse(handler, evento: dict):
+    handler.wfile.write(f"event: {evento['type']}\ndata: {json.dumps(evento)}\n\n".encode())
+    handler.wfile.flush()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """/v1/messages; o comportamento vem do nome do modelo (falha_antes, falha_no_meio, abandono, lento)."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        corpo = json.loads(self.rfile.read(int(self.headers.get("content-length") or 0)))
+        modelo = corpo["model"]
+        if modelo == "falha_antes":
+            dados = json.dumps({"type": "error", "error": {"type": "api_error", "message": "falha"}}).encode()
+            self.send_response(500)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+            return
+        if modelo == "lento":
+            time.sleep(2)
+            self.send_response(500)
+            self.send_header("content-length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.end_headers()
+        try:
+            _sse(self, {"type": "message_start", "message": {
+                "id": "msg_teste", "type": "message", "role": "assistant", "model": modelo, "content": [],
+                "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": ENTRADA_COBRADA, "output_tokens": 1}}})
+            _sse(self, {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+            _sse(self, {"type": "content_block_delta", "index": 0,
+                        "delta": {"type": "text_delta", "text": TEXTO_PARCIAL}})
+            if modelo == "falha_no_meio":
+                _sse(self, {"type": "error", "error": {"type": "overloaded_error", "message": "sobrecarga"}})
+            else:
+                time.sleep(1)
+        except OSError:  # cliente fechou a conexão
+            pass
+
+
+def _consumido(modelo: str):
+    """Limitador do modelo com baldes que quase não repõem: (entrada, saída) gastos desde o início."""
+    lim = llm_limiter.limitador(modelo)
+    for chave in ("entrada", "saida"):
+        lim.baldes[chave] = TokenBucket(1e-6, capacidade=CAPACIDADE)
+    return lambda: tuple(round(CAPACIDADE - lim.baldes[c]._tokens) for c in ("entrada", "saida"))
+
+
+def _stream(client, modelo: str, interromper: bool = False):
+    kwargs = {"model": modelo, "max_tokens": 4000, "messages": [{"role": "user", "content": "oi"}]}
+    try:
+        with llm_limiter.stream_mensagem(client, **kwargs) as stream:
+            for _ in stream.text_stream:
+                if interromper:
+                    raise _Interrompido()
+    except (_Interrompido, anthropic.APIError):
+        pass
+
+
+def testar_stream(client):
+    print("\nStream interrompido")
+    saida_recebida = llm_limiter.limitador("abandono").contar_tokens(len(TEXTO_PARCIAL))
+
+    consumido = _consumido("abandono")
+    _stream(client, "abandono", interromper=True)
+    entrada, saida = consumido()
+    verificar(entrada == ENTRADA_COBRADA and saida == saida_recebida,
+              f"abandonado pelo chamador: cobra entrada e saída recebida ({entrada}, {saida})")
+
+    consumido = _consumido("falha_no_meio")
+    _stream(client, "falha_no_meio")
+    entrada, saida = consumido()
+    verificar(entrada == ENTRADA_COBRADA and saida == saida_recebida,
+              f"falha depois do message_start: cobra o que já veio ({entrada}, {saida})")
+
+    consumido = _consumido("falha_antes")
+    _stream(client, "falha_antes")
+    verificar(consumido() == (0, 0), f"falha antes de responder: devolve a reserva inteira {consumido()}")
+
+
+def testar_cancelado(url: str):
+    print("\nCancelamento assíncrono")
+    consumido = _consumido("lento")
+
+    async def _cancelar():
+        aclient = anthropic.AsyncAnthropic(api_key="teste", base_url=url, max_retries=0)
+        tarefa = asyncio.create_task(llm_limiter.criar_mensagem_async(
+            aclient, model="lento", max_tokens=4000, messages=[{"role": "user", "content": "oi"}]))
+        await asyncio.sleep(0.3)
+        tarefa.cancel()
+        try:
+            await tarefa
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(_cancelar())
+    entrada, saida = consumido()
+    verificar(entrada > 0 and saida == ESTIMATIVA_SAIDA,
+              f"cancelada em voo: reserva mantida ({entrada}, {saida})")
+
+
+def main():
+    testar_devolucao()
+    testar_espera()
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.server_address[1]}"
+    try:
+        testar_stream(anthropic.Anthropic(api_key="teste", base_url=url, max_retries=0))
+        testar_cancelado(url)
+    finally:
+        servidor.shutdown()
+    print()
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam")
+        return 1
+    print("✅ Limitador OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
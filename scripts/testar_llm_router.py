@@ -0,0 +1,212 @@
+"""
+Teste offline do utils.llm_router: fallback, suspensão e hedge.
+
+Sobe dois servidores falsos (utils.replay_avaliacoes.ServidorReplay), um no
+formato da Anthropic e outro no da OpenAI, com fixtures mínimas num arquivo
+temporário, e confere:
+
+  fallback  — Anthropic devolvendo 529: a resposta vem da OpenAI, com o erro
+              do primeiro alvo em 'erros' e provedor/modelo/alvo de quem respondeu;
+  suspensão — após LLM_ROTA_FALHAS falhas seguidas (ou um 429 com retry-after)
+              o alvo vai para o fim da rota e a chamada seguinte nem chega nele;
+  hedge     — com o p95 do alvo conhecido e a Anthropic lenta, a requisição
+              extra na OpenAI responde primeiro (hedge=True);
+  cache     — TranscricaoIAAnalyzer respondido pelo fallback não grava no
+              cache de avaliações; respondido pelo primário, grava.
+
+Sem rede e sem custo (chaves falsas, cache num banco temporário).
+Sai com código 1 se alguma verificação falhar.
+
+USO:
+    python scripts/testar_llm_router.py
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+_TMP = Path(tempfile.mkdtemp(prefix="testar_llm_router_"))
+os.environ["AVALIACAO_CACHE_DB"] = str(_TMP / "avaliacao_cache.db")
+os.environ.pop("AVALIACAO_CACHE_DESATIVADO", None)
+
+import anthropic  # noqa: E402
+from openai import OpenAI  # noqa: E402
+
+from utils import llm_router  # noqa: E402
+from utils.replay_avaliacoes import Fixtures, ServidorReplay  # noqa: E402
+
+MENSAGENS = [{"role": "user", "content": "Responda em JSON."}]
+RESPOSTA_JSON = json.dumps({
+    "tipo": "venda", "motivo": "teste", "confianca": 0.9, "deve_avaliar": True,
+    "avaliacao_vendedor": {"nota_final_0_100": 70},
+})
+
+falhas = []
+
+
+def verificar(condicao: bool, descricao: str):
+    print(f"  {'✅' if condicao else '❌'} {descricao}")
+    if not condicao:
+        falhas.append(descricao)
+
+
+def _fixtures() -> Fixtures:
+    fixtures = Fixtures(_TMP / "fixtures.jsonl")
+    fixtures.adicionar_par(
+        "anthropic",
+        {"model": "claude-teste", "max_tokens": 100, "messages": MENSAGENS},
+        {"type": "message", "role": "assistant", "model": "claude-teste", "stop_reason": "end_turn",
+         "content": [{"type": "text", "text": RESPOSTA_JSON}],
+         "usage": {"input_tokens": 10, "output_tokens": 5}},
+        {}, 0.0,
+    )
+    fixtures.adicionar_par(
+        "openai",
+        {"model": "gpt-teste", "messages": MENSAGENS},
+        {"object": "chat.completion", "created": 0, "model": "gpt-teste",
+         "choices": [{"index": 0, "finish_reason": "stop",
+                      "message": {"role": "assistant", "content": RESPOSTA_JSON}}],
+         "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}},
+        {}, 0.0,
+    )
+    return fixtures
+
+
+def _requisicoes(srv: ServidorReplay) -> int:
+    return srv.estatisticas()["requisicoes"]
+
+
+def testar_fallback(clientes, srv_anthropic):
+    print("\nFallback")
+    srv_anthropic.perfil["erro"] = 1.0
+    resposta = llm_router.completar(
+        "teste_fallback", MENSAGENS, max_tokens=100, clientes=clientes, hedge=False,
+        rota_padrao=["anthropic:claude-fallback", "openai:gpt-fallback"],
+    )
+    srv_anthropic.perfil["erro"] = 0.0
+    verificar(resposta["provedor"] == "openai", f"respondido pela OpenAI (provedor={resposta['provedor']})")
+    verificar(resposta["alvo"] == "openai:gpt-fallback", f"alvo de quem respondeu ({resposta['alvo']})")
+    verificar(resposta["modelo"] == "gpt-fallback", f"modelo de quem respondeu ({resposta['modelo']})")
+    verificar(len(resposta["erros"]) == 1 and resposta["erros"][0].startswith("anthropic:claude-fallback"),
+              f"falha do primário em 'erros' ({resposta['erros']})")
+
+
+def testar_suspensao(clientes, srv_anthropic):
+    print("\nSuspensão")
+    rota = ["anthropic:claude-suspenso", "openai:gpt-suspenso"]
+    srv_anthropic.perfil["erro"] = 1.0
+    for _ in range(llm_router.FALHAS_SUSPENSAO):
+        llm_router.completar("teste_suspensao", MENSAGENS, max_tokens=100, clientes=clientes,
+                             hedge=False, rota_padrao=rota)
+    srv_anthropic.perfil["erro"] = 0.0
+    verificar(llm_router.saude(rota[0]).suspenso(),
+              f"suspenso após {llm_router.FALHAS_SUSPENSAO} falhas seguidas")
+    antes = _requisicoes(srv_anthropic)
+    resposta = llm_router.completar("teste_suspensao", MENSAGENS, max_tokens=100, clientes=clientes,
+                                    hedge=False, rota_padrao=rota)
+    verificar(_requisicoes(srv_anthropic) == antes, "alvo suspenso não recebe a chamada seguinte")
+    verificar(resposta["alvo"] == rota[1] and not resposta["erros"],
+              f"chamada seguinte vai direto ao próximo alvo ({resposta['alvo']})")
+
+    rota = ["anthropic:claude-429", "openai:gpt-429"]
+    srv_anthropic.perfil.update(taxa_429=1.0, retry_after=30)
+    resposta = llm_router.completar("teste_suspensao", MENSAGENS, max_tokens=100, clientes=clientes,
+                                    hedge=False, rota_padrao=rota)
+    srv_anthropic.perfil.update(taxa_429=0.0, retry_after=1)
+    suspenso_por = llm_router.estado()[rota[0]]["suspenso_por"]
+    verificar(resposta["alvo"] == rota[1], "429 passa para o próximo alvo")
+    verificar(20 < suspenso_por <= 30, f"429 suspende pelo retry-after ({suspenso_por}s)")
+
+
+def testar_hedge(clientes, srv_anthropic):
+    print("\nHedge")
+    rota = ["anthropic:claude-hedge", "openai:gpt-hedge"]
+    for _ in range(llm_router.HEDGE_AMOSTRAS):
+        llm_router.saude(rota[0]).sucesso("teste_hedge", 0.1)
+    hedge_min, llm_router.HEDGE_MIN = llm_router.HEDGE_MIN, 0.2
+    srv_anthropic.perfil["latencia"] = 1.5
+    try:
+        inicio = time.monotonic()
+        resposta = llm_router.completar("teste_hedge", MENSAGENS, max_tokens=100, clientes=clientes,
+                                        hedge=True, rota_padrao=rota)
+        duracao = time.monotonic() - inicio
+    finally:
+        llm_router.HEDGE_MIN = hedge_min
+        srv_anthropic.perfil["latencia"] = None
+    verificar(resposta["hedge"] is True, "resposta veio da requisição extra (hedge=True)")
+    verificar(resposta["alvo"] == rota[1], f"hedge respondido pela OpenAI ({resposta['alvo']})")
+    verificar(duracao < 1.0, f"sem esperar o alvo lento ({duracao:.2f}s)")
+
+
+def testar_cache_do_analyzer(srv_openai, srv_anthropic):
+    print("\nCache do TranscricaoIAAnalyzer")
+    from utils import avaliacao_cache
+    from utils.transcricao_ia_analyzer import TranscricaoIAAnalyzer
+
+    analyzer = TranscricaoIAAnalyzer()
+    analyzer.client = OpenAI(api_key="teste", base_url=f"{srv_openai.url}/v1", max_retries=0)
+    analyzer.model = analyzer.model_classificacao = "gpt-cache"
+    os.environ["LLM_ROTA_AVALIACAO_LIGACAO"] = "openai:gpt-cache,anthropic:claude-cache"
+    os.environ["LLM_ROTA_CLASSIFICACAO_LIGACAO"] = "openai:gpt-cache,anthropic:claude-cache"
+    os.environ["ANTHROPIC_API_KEY"] = "teste"
+    os.environ["ANTHROPIC_BASE_URL"] = srv_anthropic.url
+    transcricao = "\n".join(
+        f"Vendedor: fala {i} sobre o curso preparatório\nCliente: resposta {i} sobre o concurso"
+        for i in range(6)
+    )
+    chave = avaliacao_cache.chave("ligacao_openai", transcricao, None, analyzer._modelos_cache(),
+                                  analyzer._prompt_versao)
+
+    srv_openai.perfil["erro"] = 1.0
+    analise = analyzer.analisar_transcricao(transcricao)
+    srv_openai.perfil["erro"] = 0.0
+    verificar(analise.get("provedor") == "anthropic", f"fallback respondeu ({analise.get('alvo')})")
+    verificar(avaliacao_cache.buscar(chave, "ligacao_openai") is None,
+              "resposta de fallback não é cacheada sob a chave do primário")
+
+    llm_router.saude("openai:gpt-cache").sucesso("teste", 0.0)  # zera as falhas seguidas acima
+    analise = analyzer.analisar_transcricao(transcricao)
+    cacheado = avaliacao_cache.buscar(chave, "ligacao_openai")
+    verificar(analise.get("alvo") == "openai:gpt-cache", f"primário respondeu ({analise.get('alvo')})")
+    verificar(cacheado is not None and cacheado.get("alvo") == "openai:gpt-cache",
+              "resposta do primário é cacheada com o alvo que respondeu")
+
+
+def main():
+    try:
+        _rodar()
+    finally:
+        shutil.rmtree(_TMP, ignore_errors=True)
+    print()
+    if falhas:
+        print(f"❌ {len(falhas)} verificação(ões) falharam")
+        return 1
+    print("✅ Roteador OK")
+    return 0
+
+
+def _rodar():
+    fixtures = _fixtures()
+    with ServidorReplay(fixtures, perfil="rapido") as srv_anthropic, \
+            ServidorReplay(fixtures, perfil="rapido") as srv_openai:
+        srv_anthropic.iniciar()
+        srv_openai.iniciar()
+        clientes = {
+            "anthropic": anthropic.Anthropic(api_key="teste", base_url=srv_anthropic.url, max_retries=0),
+            "openai": OpenAI(api_key="teste", base_url=f"{srv_openai.url}/v1", max_retries=0),
+        }
+        testar_fallback(clientes, srv_anthropic)
+        testar_suspensao(clientes, srv_anthropic)
+        testar_hedge(clientes, srv_anthropic)
+        testar_cache_do_analyzer(srv_openai, srv_anthropic)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
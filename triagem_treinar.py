@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+triagem_treinar.py - Treino e relatório do classificador de triagem local
+
+Lê do MySQL as ligações/chats já classificados (consultas/triagem/*.sql),
+aplica o mesmo pré-processamento do pipeline (ligações já pegas pela
+heurística e chats inaptos pela regra ficam de fora — o modelo só vê o que
+chegaria ao Claude), separa um conjunto de teste fixo (hash do id) e treina
+utils/triagem_local. O relatório de precisão/recall no teste é impresso,
+salvo junto do modelo (data_cache/triagem/<canal>_relatorio.json) e
+registrado no log.
+
+Classificações feitas pela própria triagem local não entram no treino.
+
+EXECUÇÃO:
+     python3 triagem_treinar.py                         # ligações e WhatsApp
+     python3 triagem_treinar.py --canal ligacao --limite 50000
+     python3 triagem_treinar.py --apenas-relatorio      # avalia o modelo atual, sem retreinar
+
+  Retreino semanal (cron):
+     0 4 * * 1 cd /home/ulisses/dados_degrau_py && python3 triagem_treinar.py >> data_cache/triagem_treinar.log 2>&1
+
+  Os processos em execução (Streamlit, avaliacao_worker.py) passam a usar o
+  modelo novo na próxima triagem — sem restart.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import zlib
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(PROJECT_ROOT))
+load_dotenv(PROJECT_ROOT / ".env")
+
+import pandas as pd
+
+from conexao.mysql_connector import conectar_mysql
+from utils import triagem_local
+from utils.chat_ia_analyzer import filtrar_mensagens_bot, verificar_avaliabilidade
+from utils.transcricao_analyzer import _heuristica_triagem
+
+LOG_DIR = PROJECT_ROOT / "data_cache"
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler(str(LOG_DIR / "triagem_treinar.log"), encoding="utf-8"),
+    ]
+)
+logger = logging.getLogger("triagem_treinar")
+
+CANAIS = ("ligacao", "whatsapp")
+_SQL = {
+    "ligacao": PROJECT_ROOT / "consultas" / "triagem" / "rotulos_ligacoes.sql",
+    "whatsapp": PROJECT_ROOT / "consultas" / "triagem" / "rotulos_chats.sql",
+}
+# Resultados que não são uma classificação do conteúdo
+_ROTULOS_IGNORADOS = {"erro", "falha_avaliacao", "inapto_regra", "inapto_ia", ""}
+
+
+def carregar_rotulados(canal: str, limite: int) -> pd.DataFrame:
+    engine = conectar_mysql()
+    if not engine:
+        raise RuntimeError("Sem conexão com o MySQL")
+    sql = _SQL[canal].read_text().replace("{limite}", str(int(limite)))
+    return pd.read_sql(sql, engine)
+
+
+def preparar(canal: str, df: pd.DataFrame):
+    """(ids, textos, rótulos) no formato que triagem_local.triar recebe no pipeline."""
+    ids, textos, rotulos = [], [], []
+    descartados = {"rotulo": 0, "triagem_local": 0, "regra": 0}
+    for row in df.itertuples(index=False):
+        rotulo = str(row.rotulo or "").strip().lower()
+        if rotulo in _ROTULOS_IGNORADOS:
+            descartados["rotulo"] += 1
+            continue
+        if str(row.motivo or "").startswith("Triagem local"):
+            descartados["triagem_local"] += 1
+            continue
+        texto = str(row.texto or "")
+        if canal == "ligacao":
+            if _heuristica_triagem(texto):
+                descartados["regra"] += 1
+                continue
+        else:
+            filtro = filtrar_mensagens_bot(texto)
+            if not verificar_avaliabilidade(filtro, str(row.agente or ""))[0]:
+                descartados["regra"] += 1
+                continue
+            texto = filtro["transcricao_limpa"]
+        ids.append(str(row.item_id))
+        textos.append(texto)
+        rotulos.append(rotulo)
+    logger.info("[%s] %d exemplos úteis; descartados: %s", canal, len(rotulos), descartados)
+    return ids, textos, rotulos
+
+
+def _agrupar_raros(rotulos, minimo: int):
+    """Classes com menos de `minimo` exemplos viram 'outros' (venda nunca é agrupada)."""
+    contagem = pd.Series(rotulos).value_counts()
+    raros = {c for c, n in contagem.items() if n < minimo and c != triagem_local.CLASSE_VENDA}
+    return ["outros" if r in raros else r for r in rotulos], raros
+
+
+def _eh_teste(item_id: str, fracao: float) -> bool:
+    # Split estável: o mesmo item cai sempre do mesmo lado (relatórios comparáveis entre treinos)
+    return zlib.crc32(item_id.encode("utf-8")) % 1000 < fracao * 1000
+
+
+def _log_relatorio(canal: str, rel: dict, limiar: float):
+    logger.info("[%s] teste: %d amostras, acurácia %.3f", canal, rel["amostras"], rel["acuracia"] or 0)
+    for classe, m in rel["por_classe"].items():
+        logger.info("   %-20s precisão=%-6s recall=%-6s suporte=%d",
+                    classe, m["precisao"], m["recall"], m["suporte"])
+    logger.info("   Pular o Claude quando P(não-venda) >= limiar:")
+    for lim, m in rel["por_limiar"].items():
+        marca = "  ◀ atual" if abs(float(lim) - limiar) < 1e-9 else ""
+        logger.info("   limiar %s: pula %5.1f%% | precisão=%-6s recall=%-6s vendas perdidas=%d%s",
+                    lim, m["pulados_pct"] * 100, m["precisao"], m["recall"], m["vendas_perdidas"], marca)
+
+
+def processar(canal: str, args) -> bool:
+    df = carregar_rotulados(canal, args.limite)
+    ids, textos, rotulos = preparar(canal, df)
+    if triagem_local.CLASSE_VENDA not in rotulos or len(set(rotulos)) < 2:
+        logger.warning("[%s] dados insuficientes (precisa de vendas e não-vendas rotuladas)", canal)
+        return False
+
+    rotulos, raros = _agrupar_raros(rotulos, args.min_exemplos)
+    if raros:
+        logger.info("[%s] classes raras agrupadas em 'outros': %s", canal, sorted(raros))
+
+    teste = [_eh_teste(i, args.teste) for i in ids]
+    tx_tr = [t for t, e in zip(textos, teste) if not e]
+    y_tr = [r for r, e in zip(rotulos, teste) if not e]
+    tx_te = [t for t, e in zip(textos, teste) if e]
+    y_te = [r for r, e in zip(rotulos, teste) if e]
+    limiares = sorted({0.8, 0.9, 0.95, 0.98, args.limiar})
+    caminho = triagem_local.caminho_modelo(canal)
+
+    if args.apenas_relatorio:
+        if not caminho.exists():
+            logger.warning("[%s] sem modelo em %s", canal, caminho)
+            return False
+        modelo = triagem_local.ClassificadorTriagem.carregar(caminho)
+    else:
+        logger.info("[%s] treinando com %d exemplos (%d no teste)...", canal, len(y_tr), len(y_te))
+        modelo = triagem_local.ClassificadorTriagem().treinar(tx_tr, y_tr, iteracoes=args.iteracoes)
+
+    rel = triagem_local.relatorio(modelo, tx_te, y_te, limiares)
+    _log_relatorio(canal, rel, args.limiar)
+
+    if not args.apenas_relatorio:
+        modelo.meta["relatorio"] = rel
+        modelo.salvar(caminho)
+        logger.info("[%s] modelo salvo em %s", canal, caminho)
+    caminho.with_name(f"{canal}_relatorio.json").write_text(
+        json.dumps(dict(rel, modelo=modelo.meta.get("treinado_em")), ensure_ascii=False, indent=2),
+        encoding="utf-8",
+    )
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Treino/relatório da triagem local")
+    parser.add_argument("--canal", choices=CANAIS, action="append", help="Restringe a um canal (pode repetir)")
+    parser.add_argument("--limite", type=int, default=20000, help="Máximo de itens rotulados lidos por canal")
+    parser.add_argument("--teste", type=float, default=0.2, help="Fração reservada para o relatório")
+    parser.add_argument("--limiar", type=float, default=triagem_local.LIMIAR, help="Limiar destacado no relatório")
+    parser.add_argument("--min-exemplos", type=int, default=20, help="Mínimo por classe (menos que isso vira 'outros')")
+    parser.add_argument("--iteracoes", type=int, default=300)
+    parser.add_argument("--apenas-relatorio", action="store_true", help="Avalia o modelo salvo, sem retreinar")
+    args = parser.parse_args()
+
+    falhas = 0
+    for canal in args.canal or CANAIS:
+        try:
+            if not processar(canal, args):
+                falhas += 1
+        except Exception as e:
+            logger.error("[%s] falha: %s", canal, e)
+            falhas += 1
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,14 @@ def _cor_nota(nota) -> str:
     return "🔴"
 
 
+def _sem_nulos(j):
+    """Remove chaves nulas de um resumo de avaliação montado com JSON_OBJECT no
+    SQL (que mantém null onde o JSON original simplesmente não tinha a chave)."""
+    if isinstance(j, dict):
+        return {k: _sem_nulos(v) for k, v in j.items() if v is not None}
+    return j
+
+
 def _top_items(series: pd.Series, n: int = 10) -> list:
     """Retorna top-n textos (sem prefixo [categoria]) com contagem."""
     itens = []
@@ -0,0 +1,118 @@
+"""
+Motor assíncrono de avaliação em lote (chats do WhatsApp e ligações).
+
+Substitui os ThreadPoolExecutor das avaliações em massa: cada item vira uma
+corrotina e as chamadas ao Claude usam anthropic.AsyncAnthropic, então uma
+thread só mantém dezenas de avaliações em voo (cada uma custa uma corrotina,
+não uma thread parada esperando a rede).
+
+O fluxo de cada item continua o mesmo (triagem → avaliação → gravação); o
+motor só decide quantos itens rodam ao mesmo tempo e reporta o progresso:
+  - semáforo: quantas chamadas ficam em voo (ver
+    llm_limiter.LimitadorLLM.concorrencia — derivado do limite de
+    requisições/min); o ritmo fino continua com os baldes do limitador;
+  - progresso(concluidos, total, indice, resultado): chamado na thread do
+    chamador a cada item concluído — seguro para Streamlit;
+  - cancelamento: threading.Event; ao ser acionado, os itens que ainda não
+    terminaram são cancelados (inclusive requisições HTTP em andamento) e
+    voltam como falha(item, 'cancelado'). Um Stop do Streamlit interrompe o
+    loop do mesmo jeito.
+
+Uso:
+    async def _lote():
+        async with analyzer.cliente_async() as aclient:
+            return await avaliacao_async.executar_lote(
+                itens, lambda item: avaliar(aclient, item),
+                concorrencia=analyzer.concorrencia(), progresso=cb,
+                falha=lambda item, erro: {...},
+            )
+    resultados = avaliacao_async.rodar(_lote())
+
+Trabalho bloqueante dentro de um item (ex.: gravação no MySQL) deve ir para
+asyncio.to_thread para não travar as demais corrotinas.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+_INTERVALO_CANCELAMENTO = 0.5  # s entre verificações do Event de cancelamento
+
+
+async def executar_lote(
+    itens: Sequence[Any],
+    avaliar: Callable[[Any], Awaitable[Any]],
+    concorrencia: int,
+    progresso: Optional[Callable[[int, int, int, Any], None]] = None,
+    cancelamento: Optional[threading.Event] = None,
+    falha: Optional[Callable[[Any, str], Any]] = None,
+) -> List[Any]:
+    """
+    Avalia os itens com no máximo `concorrencia` em andamento e devolve os
+    resultados na ordem de entrada.
+
+    falha(item, erro) monta o resultado de um item que levantou exceção ou foi
+    cancelado; sem ela, esses itens voltam como None.
+    """
+    total = len(itens)
+    resultados: List[Any] = [None] * total
+    if not total:
+        return resultados
+
+    semaforo = asyncio.Semaphore(max(1, concorrencia))
+
+    async def _um(indice: int):
+        async with semaforo:
+            if cancelamento is not None and cancelamento.is_set():
+                raise asyncio.CancelledError
+            return await avaliar(itens[indice])
+
+    tarefas = {asyncio.ensure_future(_um(i)): i for i in range(total)}
+    pendentes = set(tarefas)
+    concluidos = 0
+    try:
+        while pendentes:
+            prontas, pendentes = await asyncio.wait(
+                pendentes, timeout=_INTERVALO_CANCELAMENTO, return_when=asyncio.FIRST_COMPLETED,
+            )
+            for tarefa in prontas:
+                indice = tarefas[tarefa]
+                if tarefa.cancelled():
+                    resultados[indice] = falha(itens[indice], "cancelado") if falha else None
+                elif tarefa.exception() is not None:
+                    erro = tarefa.exception()
+                    logger.warning("Falha ao avaliar item %d: %s", indice, erro)
+                    resultados[indice] = falha(itens[indice], str(erro) or type(erro).__name__) if falha else None
+                else:
+                    resultados[indice] = tarefa.result()
+                concluidos += 1
+                if progresso:
+                    try:
+                        progresso(concluidos, total, indice, resultados[indice])
+                    except Exception:
+                        pass
+            if cancelamento is not None and cancelamento.is_set() and pendentes:
+                logger.info("Lote cancelado: %d de %d itens não concluídos", len(pendentes), total)
+                for tarefa in pendentes:
+                    tarefa.cancel()
+    finally:
+        for tarefa in pendentes:
+            tarefa.cancel()
+    return resultados
+
+
+def rodar(corrotina: Awaitable[Any]) -> Any:
+    """Executa a corrotina até o fim a partir de código síncrono (páginas, scripts).
+
+    Se a thread atual já tem um event loop rodando, usa uma thread auxiliar.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(corrotina)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, corrotina).result()
@@ -0,0 +1,219 @@
+"""
+Cache SQLite de avaliações de IA (chats do WhatsApp e ligações).
+
+Reavaliar uma conversa que não mudou não deve gastar uma chamada ao modelo.
+A chave de uma avaliação é o hash de:
+  - canal ('whatsapp', 'ligacao', ...);
+  - transcrição normalizada (espaços, quebras de linha e Unicode);
+  - contexto adicional enviado no prompt (JSON com chaves ordenadas);
+  - modelo;
+  - versão da régua (REGUA_VERSAO);
+  - versão do prompt (hash do system prompt + template, ver versao_prompt).
+Mudou qualquer um desses itens → chave nova → a API é chamada de novo.
+
+Só resultados bem-sucedidos são gravados. Cada consulta contabiliza
+acerto/erro por canal e os tokens que a chamada original consumiu, para
+reportar taxa de acerto e tokens poupados (estatisticas()).
+
+ENV VARS:
+  AVALIACAO_CACHE_DB          — caminho do banco (default data_cache/avaliacao_cache.db)
+  AVALIACAO_CACHE_DESATIVADO  — "1" desliga leitura e gravação
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, Optional
+
+from utils.venda_consultiva_core import REGUA_VERSAO
+
+logger = logging.getLogger(__name__)
+
+_DB_PATH = Path(os.getenv(
+    "AVALIACAO_CACHE_DB",
+    str(Path(__file__).resolve().parent.parent / "data_cache" / "avaliacao_cache.db"),
+))
+_ESPACOS = re.compile("[ \t\u00a0]+")
+
+
+def ativo() -> bool:
+    return os.getenv("AVALIACAO_CACHE_DESATIVADO", "").strip().lower() not in ("1", "true", "sim")
+
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_pronto = set()  # caminhos de banco com o schema já criado neste processo
+
+
+def _criar_schema(con: sqlite3.Connection):
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS avaliacoes (
+            chave         TEXT PRIMARY KEY,
+            canal         TEXT NOT NULL,
+            modelo        TEXT,
+            regua_versao  TEXT,
+            prompt_versao TEXT,
+            resultado     TEXT NOT NULL,
+            tokens        INTEGER NOT NULL DEFAULT 0,
+            salvo_em      INTEGER NOT NULL,
+            hits          INTEGER NOT NULL DEFAULT 0,
+            ultimo_hit    INTEGER
+        )
+    """)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS estatisticas (
+            canal           TEXT PRIMARY KEY,
+            hits            INTEGER NOT NULL DEFAULT 0,
+            misses          INTEGER NOT NULL DEFAULT 0,
+            tokens_poupados INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    con.commit()
+
+
+def _conectar() -> sqlite3.Connection:
+    """Conexão SQLite da thread atual (criada na primeira chamada e reaproveitada).
+
+    Usar como `with _conectar() as con:` — o bloco faz commit/rollback, mas não
+    fecha a conexão. O schema é criado uma vez por processo.
+    """
+    con = getattr(_local, "con", None)
+    if con is not None and getattr(_local, "caminho", None) == _DB_PATH:
+        return con
+    if con is not None:
+        con.close()
+    _DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(_DB_PATH, timeout=30.0)
+    with _schema_lock:
+        if _DB_PATH not in _schema_pronto:
+            _criar_schema(con)
+            _schema_pronto.add(_DB_PATH)
+    _local.con, _local.caminho = con, _DB_PATH
+    return con
+
+
+def fechar():
+    """Fecha a conexão da thread atual (threads de longa duração, testes)."""
+    con = getattr(_local, "con", None)
+    if con is not None:
+        con.close()
+        _local.con = None
+
+
+# ---------------------------------------------------------------------------
+# Chave
+# ---------------------------------------------------------------------------
+
+def normalizar_transcricao(texto: str) -> str:
+    """Forma canônica da transcrição: NFC, sem espaços redundantes nem linhas vazias."""
+    texto = unicodedata.normalize("NFC", texto or "").replace("\r\n", "\n").replace("\r", "\n")
+    linhas = (_ESPACOS.sub(" ", linha).strip() for linha in texto.split("\n"))
+    return "\n".join(linha for linha in linhas if linha)
+
+
+def versao_prompt(*partes: str) -> str:
+    """Impressão digital dos textos fixos do prompt (system + template)."""
+    return hashlib.sha256("\x1e".join(partes).encode("utf-8")).hexdigest()[:16]
+
+
+def chave(canal: str, transcricao: str, contexto: Optional[Dict], modelo: str,
+          prompt_versao: str, regua_versao: str = REGUA_VERSAO) -> str:
+    material = json.dumps(
+        [canal, regua_versao, modelo, prompt_versao,
+         normalizar_transcricao(transcricao), contexto or {}],
+        ensure_ascii=False, sort_keys=True, default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Leitura / gravação
+# ---------------------------------------------------------------------------
+
+def buscar(chave_avaliacao: str, canal: str) -> Optional[Dict]:
+    """Resultado cacheado (cópia nova a cada chamada) ou None. Contabiliza acerto/erro."""
+    if not ativo():
+        return None
+    try:
+        return _buscar(chave_avaliacao, canal)
+    except sqlite3.Error as e:
+        logger.warning("Cache de avaliações indisponível (leitura): %s", e)
+        return None
+
+
+def _buscar(chave_avaliacao: str, canal: str) -> Optional[Dict]:
+    agora = int(time.time())
+    with _conectar() as con:
+        row = con.execute(
+            "SELECT resultado, tokens FROM avaliacoes WHERE chave=?", [chave_avaliacao]
+        ).fetchone()
+        con.execute("INSERT OR IGNORE INTO estatisticas (canal) VALUES (?)", [canal])
+        if row is None:
+            con.execute("UPDATE estatisticas SET misses = misses + 1 WHERE canal=?", [canal])
+            return None
+        con.execute(
+            "UPDATE avaliacoes SET hits = hits + 1, ultimo_hit=? WHERE chave=?",
+            [agora, chave_avaliacao],
+        )
+        con.execute(
+            "UPDATE estatisticas SET hits = hits + 1, tokens_poupados = tokens_poupados + ? WHERE canal=?",
+            [row[1], canal],
+        )
+    return json.loads(row[0])
+
+
+def salvar(chave_avaliacao: str, canal: str, resultado: Dict, tokens: Optional[int] = None,
+           modelo: Optional[str] = None, prompt_versao: Optional[str] = None,
+           regua_versao: str = REGUA_VERSAO):
+    """Grava um resultado bem-sucedido. Resultados com 'erro' são ignorados."""
+    if not ativo() or not isinstance(resultado, dict) or resultado.get("erro"):
+        return
+    try:
+        with _conectar() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO avaliacoes "
+                "(chave, canal, modelo, regua_versao, prompt_versao, resultado, tokens, salvo_em) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [chave_avaliacao, canal, modelo, regua_versao, prompt_versao,
+                 json.dumps(resultado, ensure_ascii=False, default=str), int(tokens or 0), int(time.time())],
+            )
+    except sqlite3.Error as e:
+        logger.warning("Cache de avaliações indisponível (gravação): %s", e)
+
+
+def estatisticas(canal: Optional[str] = None) -> Dict:
+    """Acertos, erros, taxa de acerto e tokens poupados (de um canal ou de todos)."""
+    filtro, params = ("WHERE canal=?", [canal]) if canal else ("", [])
+    with _conectar() as con:
+        hits, misses, poupados = con.execute(
+            f"SELECT COALESCE(SUM(hits),0), COALESCE(SUM(misses),0), COALESCE(SUM(tokens_poupados),0) "
+            f"FROM estatisticas {filtro}", params,
+        ).fetchone()
+        total = con.execute(f"SELECT COUNT(*) FROM avaliacoes {filtro}", params).fetchone()[0]
+    consultas = hits + misses
+    return {
+        "entradas": total,
+        "hits": hits,
+        "misses": misses,
+        "taxa_acerto": hits / consultas if consultas else 0.0,
+        "tokens_poupados": poupados,
+    }
+
+
+def limpar(regua_versao: Optional[str] = None) -> int:
+    """Remove entradas (todas, ou só as de outra régua quando regua_versao é dado)."""
+    with _conectar() as con:
+        if regua_versao:
+            cur = con.execute("DELETE FROM avaliacoes WHERE regua_versao <> ?", [regua_versao])
+        else:
+            cur = con.execute("DELETE FROM avaliacoes")
+            con.execute("DELETE FROM estatisticas")
+    return cur.rowcount
@@ -0,0 +1,463 @@
+"""
+Registro e coleta automática de batches de avaliação (Anthropic Message Batches).
+
+Um batch custa metade do preço do tempo real, mas o resultado chega horas
+depois — e até agora dependia de alguém voltar à página com o ID em mãos
+(session_state / manifests JSON). Este módulo guarda cada batch enviado num
+SQLite, junto com os metadados de cada item necessários para gravar o
+resultado no MySQL, e sabe coletar e persistir um batch finalizado sozinho:
+
+  - ligações: utils.transcricao_mysql_writer (mesmas colunas de atualizar_avaliacao_transcricao)
+  - WhatsApp: utils.chat_mysql_writer (mesmas colunas de salvar_avaliacao_chat)
+  gravados em lote por utils.gravacao_avaliacoes (+ CRM sync, nas mesmas
+  condições das páginas)
+
+Fluxo:
+    resumo = batch_avaliacoes.enviar_ligacoes(itens)   # página / script noturno
+    ...
+    batch_avaliacoes.verificar_abertos()                # batch_poller_cron.py (cron/daemon)
+
+Ligações resolvidas sem o Claude (heurística de triagem ou cache de
+avaliações) são gravadas na hora por enviar_ligacoes; só o resto vai no batch.
+
+Coleta: o batch finalizado é reivindicado (coletando_desde) antes de baixar os
+resultados, então dois pollers não gravam o mesmo batch duas vezes. Só é
+marcado 'coletado' quando vieram todos os resultados (request_counts da API);
+uma coleta parcial não grava nada e conta como falha. Depois de
+BATCH_MAX_FALHAS falhas seguidas (consulta ou coleta) o batch vai para
+'falhou' e sai do polling — coletar() manual ainda pode recuperá-lo.
+
+ENV VARS:
+  BATCH_AVALIACOES_DB — caminho do banco (default data_cache/batch_avaliacoes.db)
+  BATCH_COLETA_LEASE  — segundos de posse de um batch em coleta (default 1800)
+  BATCH_MAX_FALHAS    — falhas seguidas até 'falhou' (default 20)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_DB_PATH = Path(os.getenv(
+    "BATCH_AVALIACOES_DB",
+    str(Path(__file__).resolve().parent.parent / "data_cache" / "batch_avaliacoes.db"),
+))
+
+COLETA_LEASE = int(os.getenv("BATCH_COLETA_LEASE", "1800"))
+MAX_FALHAS = int(os.getenv("BATCH_MAX_FALHAS", "20"))
+
+CANAIS = ("ligacao", "whatsapp")
+
+
+def _conectar() -> sqlite3.Connection:
+    _DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(_DB_PATH, timeout=30.0)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS lotes (
+            batch_id          TEXT PRIMARY KEY,
+            canal             TEXT NOT NULL,
+            status            TEXT NOT NULL DEFAULT 'aberto',
+            processing_status TEXT,
+            total             INTEGER NOT NULL DEFAULT 0,
+            criado_em         INTEGER NOT NULL,
+            verificado_em     INTEGER,
+            coletado_em       INTEGER,
+            salvos            INTEGER,
+            erros             INTEGER,
+            detalhe           TEXT,
+            coletando_desde   INTEGER,
+            falhas            INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    colunas = {row[1] for row in con.execute("PRAGMA table_info(lotes)")}
+    for coluna, tipo in (("coletando_desde", "INTEGER"), ("falhas", "INTEGER NOT NULL DEFAULT 0")):
+        if coluna not in colunas:
+            con.execute(f"ALTER TABLE lotes ADD COLUMN {coluna} {tipo}")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS itens (
+            batch_id    TEXT NOT NULL,
+            item_id     TEXT NOT NULL,
+            meta        TEXT,
+            chave_cache TEXT,
+            PRIMARY KEY (batch_id, item_id)
+        )
+    """)
+    return con
+
+
+# ---------------------------------------------------------------------------
+# Registro
+# ---------------------------------------------------------------------------
+
+def registrar(batch_id: str, canal: str, meta_por_item: Dict[str, Dict],
+              chaves_cache: Optional[Dict[str, str]] = None):
+    """Guarda um batch recém-criado e os metadados de cada item (por custom_id)."""
+    if canal not in CANAIS:
+        raise ValueError(f"canal inválido: {canal}")
+    chaves_cache = chaves_cache or {}
+    with _conectar() as con:
+        con.execute(
+            "INSERT OR IGNORE INTO lotes (batch_id, canal, total, criado_em) VALUES (?, ?, ?, ?)",
+            [batch_id, canal, len(meta_por_item), int(time.time())],
+        )
+        con.executemany(
+            "INSERT OR REPLACE INTO itens (batch_id, item_id, meta, chave_cache) VALUES (?, ?, ?, ?)",
+            [
+                (batch_id, str(item_id), json.dumps(meta, ensure_ascii=False, default=str),
+                 chaves_cache.get(str(item_id)))
+                for item_id, meta in meta_por_item.items()
+            ],
+        )
+
+
+def obter(batch_id: str) -> Optional[Dict]:
+    with _conectar() as con:
+        row = con.execute("SELECT * FROM lotes WHERE batch_id=?", [batch_id]).fetchone()
+    return dict(row) if row else None
+
+
+def listar(canal: Optional[str] = None, apenas_abertos: bool = False, limite: int = 50) -> List[Dict]:
+    """Batches registrados, mais recentes primeiro."""
+    filtros, params = [], []
+    if canal:
+        filtros.append("canal=?")
+        params.append(canal)
+    if apenas_abertos:
+        filtros.append("status='aberto'")
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    with _conectar() as con:
+        rows = con.execute(
+            f"SELECT * FROM lotes {where} ORDER BY criado_em DESC LIMIT ?", params + [limite]
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def itens(batch_id: str) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+    """(metadados por item, chaves do cache de avaliações por item) de um batch."""
+    meta, chaves = {}, {}
+    with _conectar() as con:
+        for row in con.execute("SELECT item_id, meta, chave_cache FROM itens WHERE batch_id=?", [batch_id]):
+            meta[row["item_id"]] = json.loads(row["meta"]) if row["meta"] else {}
+            if row["chave_cache"]:
+                chaves[row["item_id"]] = row["chave_cache"]
+    return meta, chaves
+
+
+def _atualizar(batch_id: str, **campos):
+    sets = ", ".join(f"{k}=?" for k in campos)
+    with _conectar() as con:
+        con.execute(f"UPDATE lotes SET {sets} WHERE batch_id=?", list(campos.values()) + [batch_id])
+
+
+def _reivindicar(batch_id: str) -> bool:
+    """Toma posse do batch para coletar. False se outro processo já está coletando."""
+    agora = int(time.time())
+    with _conectar() as con:
+        cur = con.execute(
+            "UPDATE lotes SET coletando_desde=? WHERE batch_id=? AND status!='coletado' "
+            "AND (coletando_desde IS NULL OR coletando_desde < ?)",
+            [agora, batch_id, agora - COLETA_LEASE],
+        )
+    return cur.rowcount == 1
+
+
+def _registrar_falha(batch_id: str, detalhe: str) -> str:
+    """Conta uma falha seguida; na MAX_FALHAS-ésima o batch vai para 'falhou'. Retorna o status."""
+    with _conectar() as con:
+        con.execute(
+            "UPDATE lotes SET falhas=falhas+1, detalhe=?, verificado_em=?, "
+            "status=CASE WHEN falhas+1 >= ? THEN 'falhou' ELSE status END WHERE batch_id=?",
+            [detalhe, int(time.time()), MAX_FALHAS, batch_id],
+        )
+        row = con.execute("SELECT status, falhas FROM lotes WHERE batch_id=?", [batch_id]).fetchone()
+    if row and row["status"] == 'falhou':
+        logger.error("Batch %s desistido após %d falhas seguidas: %s", batch_id, row["falhas"], detalhe)
+    return row["status"] if row else 'erro'
+
+
+# ---------------------------------------------------------------------------
+# Persistência (mesmas regras das páginas)
+# ---------------------------------------------------------------------------
+
+def _crm_habilitado() -> bool:
+    try:
+        from utils.crm_sync_writer import crm_sync_habilitado
+    except Exception:  # módulo opcional até o deploy completo do CRM sync
+        return False
+    return crm_sync_habilitado()
+
+
+def _int_ou_none(valor) -> Optional[int]:
+    try:
+        return int(float(valor)) if valor is not None and str(valor).strip() not in ('', 'nan', 'None') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _linha_ligacao(item_id: str, analise: Dict, meta: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+    from utils.transcricao_mysql_writer import parametros_avaliacao_transcricao
+
+    tid = _int_ou_none(item_id)
+    if tid is None:
+        return None, f"ID inválido: {item_id}"
+
+    # Não-venda: insight mínimo (igual à avaliação em tempo real)
+    insight = analise.get('avaliacao_completa')
+    if not insight and not analise.get('deve_avaliar'):
+        insight = json.dumps({
+            'classificacao_ligacao': analise.get('classificacao_ligacao', 'outros'),
+            'motivo': analise.get('motivo', ''),
+        }, ensure_ascii=False)
+
+    return parametros_avaliacao_transcricao(
+        transcricao_id=tid,
+        insight_ia=insight,
+        evaluation_ia=analise.get('nota_vendedor'),
+        created_at=meta.get('data_trancricao'),
+        agent=meta.get('agente'),
+        duration=meta.get('duracao'),
+        phone=meta.get('telefone_lead'),
+        type_=meta.get('tipo_ligacao'),
+        vendedor_disclaimer=analise.get('vendedor_disclaimer'),
+        lead_disclaimer=analise.get('lead_disclaimer'),
+    ), None
+
+
+def _crm_ligacao(item_id: str, analise: Dict, meta: Dict):
+    op_id = _int_ou_none(meta.get('oportunidade_id'))
+    if op_id and analise.get('deve_avaliar') and _crm_habilitado():
+        from utils.crm_sync_writer import montar_payload_crm, sincronizar_interacao_crm
+        try:
+            ai_eval = json.loads(analise.get('avaliacao_completa') or '{}')
+        except (TypeError, ValueError):
+            ai_eval = {}
+        try:
+            sincronizar_interacao_crm(montar_payload_crm(
+                opportunity_id=op_id,
+                canal='ligacao',
+                origem_id=str(_int_ou_none(item_id)),
+                transcript=meta.get('transcricao', ''),
+                ai_evaluation=ai_eval,
+                data_evento=meta.get('data_ligacao'),
+                agente=meta.get('agente'),
+            ))
+        except Exception as e:
+            logger.warning("CRM sync falhou p/ ligação %s: %s", item_id, e)
+
+
+def _linha_chat(item_id: str, resultado: Dict, meta: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+    from utils.chat_mysql_writer import parametros_avaliacao_chat
+
+    linha = parametros_avaliacao_chat(
+        opportunity_id=meta.get('opportunity_id'),
+        chat_id=item_id,
+        classification=resultado.get('classificacao', 'outros'),
+        classification_reason=resultado.get('motivo', ''),
+        ai_evaluation=resultado.get('ai_evaluation'),
+        transcript=meta.get('transcript', ''),
+        lead_score=resultado.get('lead_score'),
+        vendor_score=resultado.get('vendor_score'),
+        main_product=resultado.get('main_product'),
+        vendedor_disclaimer=resultado.get('vendedor_disclaimer'),
+        lead_disclaimer=resultado.get('lead_disclaimer'),
+        octa_agent=meta.get('octa_agent'),
+        octa_channel=meta.get('octa_channel'),
+        octa_status=meta.get('octa_status'),
+        octa_tags=meta.get('octa_tags'),
+        octa_group=meta.get('octa_group'),
+        octa_origin=meta.get('octa_origin'),
+        octa_contact_name=meta.get('octa_contact_name'),
+        octa_contact_phone=meta.get('octa_contact_phone'),
+        octa_bot_name=meta.get('octa_bot_name'),
+        octa_created_at=meta.get('octa_created_at'),
+        octa_survey_response=meta.get('octa_survey_response'),
+    )
+    return linha, None if linha else "chat_id ausente"
+
+
+def _crm_chat(item_id: str, resultado: Dict, meta: Dict):
+    if meta.get('opportunity_id') and resultado.get('deve_avaliar') and _crm_habilitado():
+        from utils.crm_sync_writer import montar_payload_crm, sincronizar_interacao_crm
+        try:
+            sincronizar_interacao_crm(montar_payload_crm(
+                opportunity_id=meta['opportunity_id'],
+                canal='whatsapp',
+                origem_id=item_id,
+                transcript=meta.get('transcript', ''),
+                ai_evaluation=resultado.get('ai_evaluation'),
+                data_evento=meta.get('octa_created_at'),
+                agente=meta.get('octa_agent'),
+            ))
+        except Exception as e:
+            logger.warning("CRM sync falhou p/ chat %s: %s", item_id, e)
+
+
+def persistir(canal: str, resultados: List[Dict], meta_por_item: Dict[str, Dict]) -> Dict:
+    """Grava resultados (formato avaliar_chat / analisar_transcricao) no MySQL.
+
+    As linhas vão para utils.gravacao_avaliacoes (upsert multi-linha, engine
+    compartilhado): chamadas simultâneas — ex.: consumidores do worker — se
+    juntam no mesmo lote. O CRM sync roda depois, só para os itens gravados.
+    """
+    from utils import gravacao_avaliacoes
+
+    chave_id, montar, crm = (
+        ('transcricao_id', _linha_ligacao, _crm_ligacao) if canal == 'ligacao'
+        else ('chat_id', _linha_chat, _crm_chat)
+    )
+    salvos, erros, enviados = 0, [], []
+    for resultado in resultados:
+        item_id = str(resultado.get(chave_id, ''))
+        if resultado.get('erro'):
+            erros.append(f"{item_id}: {resultado['erro']}")
+            continue
+        meta = meta_por_item.get(item_id, {})
+        try:
+            linha, msg = montar(item_id, resultado, meta)
+        except Exception as e:
+            linha, msg = None, str(e)
+        if linha is None:
+            erros.append(f"{item_id}: {msg}")
+            continue
+        enviados.append((item_id, resultado, meta, gravacao_avaliacoes.enviar(canal, linha)))
+
+    for item_id, resultado, meta, futuro in enviados:
+        ok, msg = futuro.result()
+        if ok:
+            salvos += 1
+            crm(item_id, resultado, meta)
+        else:
+            erros.append(f"{item_id}: {msg}")
+    return {'salvos': salvos, 'erros': erros}
+
+
+# ---------------------------------------------------------------------------
+# Envio e coleta
+# ---------------------------------------------------------------------------
+
+def _analyzer(canal: str):
+    if canal == 'ligacao':
+        from utils.transcricao_analyzer import TranscricaoAnalyzer
+        return TranscricaoAnalyzer()
+    from utils.chat_ia_analyzer import ChatIAAnalyzer
+    return ChatIAAnalyzer()
+
+
+def enviar_ligacoes(itens_envio: List[Dict], analyzer=None) -> Dict:
+    """
+    Avalia ligações via Batch API.
+    itens_envio: dicts com transcricao_id, transcricao, contexto_adicional e
+                 meta (campos da linha usados na gravação: data_trancricao,
+                 agente, duracao, telefone_lead, tipo_ligacao, oportunidade_id,
+                 data_ligacao).
+    Retorna {'batch_id', 'enviados', 'resolvidos', 'salvos', 'erros'}.
+    """
+    analyzer = analyzer or _analyzer('ligacao')
+    preparado = analyzer.preparar_batch(itens_envio)
+    meta_por_item = {
+        str(item.get('transcricao_id', '')): dict(item.get('meta') or {}, transcricao=item.get('transcricao', ''))
+        for item in itens_envio
+    }
+
+    resumo = {'batch_id': None, 'enviados': len(preparado['requests']),
+              'resolvidos': len(preparado['resolvidos']), 'salvos': 0, 'erros': []}
+    if preparado['resolvidos']:
+        gravados = persistir('ligacao', preparado['resolvidos'], meta_por_item)
+        resumo['salvos'], resumo['erros'] = gravados['salvos'], gravados['erros']
+
+    if preparado['requests']:
+        batch_id = analyzer.enviar_batch(preparado['requests'])
+        if not batch_id:
+            resumo['erros'].append("Falha ao criar batch (ver logs)")
+            return resumo
+        enviados = {r['custom_id'] for r in preparado['requests']}
+        registrar(batch_id, 'ligacao',
+                  {k: v for k, v in meta_por_item.items() if k in enviados},
+                  preparado['chaves_cache'])
+        resumo['batch_id'] = batch_id
+    return resumo
+
+
+def coletar(batch_id: str, analyzer=None) -> Dict:
+    """
+    Consulta um batch registrado; se finalizado, coleta, grava no MySQL e o
+    marca como coletado. Retorna {'batch_id', 'canal', 'status',
+    'processing_status', 'salvos', 'erros'} (status: aberto/coletado/erro/falhou;
+    'erro' também quando outro processo está coletando o mesmo batch).
+    """
+    lote = obter(batch_id)
+    if lote is None:
+        return {'batch_id': batch_id, 'status': 'erro', 'erros': ['Batch não registrado']}
+    resumo = {'batch_id': batch_id, 'canal': lote['canal'], 'status': lote['status'],
+              'processing_status': lote['processing_status'], 'salvos': 0, 'erros': []}
+    if lote['status'] == 'coletado':
+        resumo['salvos'] = lote['salvos'] or 0
+        return resumo
+
+    analyzer = analyzer or _analyzer(lote['canal'])
+    status = analyzer.consultar_batch(batch_id)
+    agora = int(time.time())
+    if 'erro' in status:
+        return dict(resumo, status=_falha(batch_id, status['erro']), erros=[status['erro']])
+
+    resumo['processing_status'] = status.get('processing_status')
+    _atualizar(batch_id, verificado_em=agora, processing_status=resumo['processing_status'])
+    if resumo['processing_status'] != 'ended':
+        # ainda processando: a sequência de falhas recomeça (e um 'falhou' volta ao polling)
+        _atualizar(batch_id, falhas=0, status='aberto')
+        return dict(resumo, status='aberto')
+
+    if not _reivindicar(batch_id):
+        return dict(resumo, status='erro', erros=['Batch já está sendo coletado por outro processo'])
+    try:
+        meta, chaves = itens(batch_id)
+        if lote['canal'] == 'ligacao':
+            resultados = analyzer.coletar_resultados_batch(batch_id, chaves_cache=chaves)
+        else:
+            resultados = analyzer.coletar_resultados_batch(batch_id)
+        # o analyzer devolve a lista parcial se a iteração cair no meio:
+        # nada é gravado e o batch continua aberto para a próxima passada
+        esperado = sum((status.get('request_counts') or {}).values()) or lote['total']
+        if len(resultados) < esperado:
+            msg = (f"Coleta incompleta: {len(resultados)} de {esperado} resultados" if resultados
+                   else 'Nenhum resultado retornado pela API')
+            return dict(resumo, status=_falha(batch_id, msg), erros=[msg])
+
+        gravados = persistir(lote['canal'], resultados, meta)
+        _atualizar(
+            batch_id, status='coletado', coletado_em=int(time.time()),
+            salvos=gravados['salvos'], erros=len(gravados['erros']),
+            detalhe="\n".join(gravados['erros'][:50]) or None,
+        )
+    finally:
+        _atualizar(batch_id, coletando_desde=None)
+    logger.info("Batch %s (%s) coletado: %d salvos, %d erros",
+                batch_id, lote['canal'], gravados['salvos'], len(gravados['erros']))
+    return dict(resumo, status='coletado', **gravados)
+
+
+def _falha(batch_id: str, detalhe: str) -> str:
+    """Status do resumo após uma falha: 'falhou' quando esgotou, senão 'erro'."""
+    return 'falhou' if _registrar_falha(batch_id, detalhe) == 'falhou' else 'erro'
+
+
+def verificar_abertos(canal: Optional[str] = None) -> List[Dict]:
+    """Passa por todos os batches abertos e coleta os finalizados (uso: poller/cron)."""
+    resumos = []
+    analyzers = {}
+    for lote in listar(canal=canal, apenas_abertos=True, limite=1000):
+        if lote['canal'] not in analyzers:
+            analyzers[lote['canal']] = _analyzer(lote['canal'])
+        try:
+            resumos.append(coletar(lote['batch_id'], analyzers[lote['canal']]))
+        except Exception as e:
+            logger.error("Erro ao coletar batch %s: %s", lote['batch_id'], e)
+            resumos.append({'batch_id': lote['batch_id'], 'canal': lote['canal'], 'status': 'erro', 'erros': [str(e)]})
+    return resumos
@@ -1,38 +1,57 @@
 import json
-from typing import Optional, Tuple
+import math
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
 
 from sqlalchemy import text
 
-from conexao.mysql_connector import conectar_mysql_writer
+from utils.gravacao_avaliacoes import engine_escrita
 
 _migration_nullable_done = False
+_migration_lock = threading.Lock()
 
 def _ensure_opportunity_id_nullable(engine) -> None:
-    """Garante que opportunity_id aceita NULL e que colunas de disclaimer existem."""
+    """Garante que opportunity_id aceita NULL e que colunas de disclaimer existem (uma vez por processo)."""
     global _migration_nullable_done
     if _migration_nullable_done:
         return
-    _migration_nullable_done = True
-    try:
-        with engine.begin() as conn:
-            conn.execute(text(
-                "ALTER TABLE seducar.chat_ai_evaluations "
-                "MODIFY COLUMN opportunity_id INT NULL"
-            ))
-    except Exception:
-        pass
-    # Migração: adicionar colunas de disclaimer se não existem
-    for col in ('vendedor_disclaimer', 'lead_disclaimer'):
+    with _migration_lock:
+        if _migration_nullable_done:
+            return
         try:
             with engine.begin() as conn:
                 conn.execute(text(
-                    f"ALTER TABLE seducar.chat_ai_evaluations "
-                    f"ADD COLUMN {col} TEXT NULL"
+                    "ALTER TABLE seducar.chat_ai_evaluations "
+                    "MODIFY COLUMN opportunity_id INT NULL"
                 ))
         except Exception:
-            pass  # Coluna já existe
+            pass
+        # Migração: adicionar colunas de disclaimer se não existem
+        for col in ('vendedor_disclaimer', 'lead_disclaimer'):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(
+                        f"ALTER TABLE seducar.chat_ai_evaluations "
+                        f"ADD COLUMN {col} TEXT NULL"
+                    ))
+            except Exception:
+                pass  # Coluna já existe
+        _migration_nullable_done = True
 
-def salvar_avaliacao_chat(
+
+def _sanitize(v):
+    if v is None:
+        return None
+    try:
+        if math.isnan(float(v)) or math.isinf(float(v)):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return v
+
+
+def parametros_avaliacao_chat(
     opportunity_id: Optional[int],
     chat_id: str,
     classification: str,
@@ -56,160 +75,135 @@ def salvar_avaliacao_chat(
     octa_created_at: Optional[str] = None,
     octa_closed_at: Optional[str] = None,
     octa_survey_response: Optional[str] = None
-) -> Tuple[bool, Optional[str]]:
-    """
-    Salva ou atualiza a avaliação de um chat na tabela chat_ai_evaluations, 
-    junto com os metadados do Octadesk e o texto do chat original.
-    """
+) -> Optional[Dict]:
+    """Linha pronta para gravar_chats (None se faltar o chat_id)."""
     if not chat_id:
-        return False, "chat_id ausente"
-
-    import math
-    def _sanitize(v):
-        if v is None:
-            return None
-        try:
-            if math.isnan(float(v)) or math.isinf(float(v)):
-                return None
-        except (TypeError, ValueError):
-            pass
-        return v
-
-    lead_score = _sanitize(lead_score)
-    vendor_score = _sanitize(vendor_score)
-
-    engine = conectar_mysql_writer()
-    if engine is None:
-        return False, "engine MySQL não inicializado"
-
-    _ensure_opportunity_id_nullable(engine)
-
+        return None
     try:
         ai_evaluation_json = json.dumps(ai_evaluation, ensure_ascii=False) if ai_evaluation else None
     except Exception:
         ai_evaluation_json = None
 
-    import uuid
-    chat_uuid = str(uuid.uuid4())
+    return {
+        "uuid": str(uuid.uuid4()),
+        "opportunity_id": opportunity_id,
+        "chat_id": chat_id,
+        "classification": classification,
+        "classification_reason": classification_reason,
+        "ai_evaluation": ai_evaluation_json,
+        "transcript": transcript,
+        "lead_score": _sanitize(lead_score),
+        "vendor_score": _sanitize(vendor_score),
+        "main_product": main_product,
+        "vendedor_disclaimer": vendedor_disclaimer,
+        "lead_disclaimer": lead_disclaimer,
+        "octa_agent": octa_agent,
+        "octa_channel": octa_channel,
+        "octa_status": octa_status,
+        "octa_tags": octa_tags,
+        "octa_group": octa_group,
+        "octa_origin": octa_origin,
+        "octa_contact_name": octa_contact_name,
+        "octa_contact_phone": octa_contact_phone,
+        "octa_bot_name": octa_bot_name,
+        "octa_created_at": octa_created_at,
+        "octa_closed_at": octa_closed_at,
+        "octa_survey_response": octa_survey_response,
+    }
 
-    query = text(
-        """
+
+_COLUNAS = (
+    "uuid", "opportunity_id", "chat_id", "classification", "classification_reason",
+    "ai_evaluation", "transcript", "lead_score", "vendor_score", "main_product",
+    "vendedor_disclaimer", "lead_disclaimer", "octa_agent", "octa_channel",
+    "octa_status", "octa_tags", "octa_group", "octa_origin", "octa_contact_name",
+    "octa_contact_phone", "octa_bot_name", "octa_created_at", "octa_closed_at",
+    "octa_survey_response",
+)
+_ATUALIZADAS = tuple(c for c in _COLUNAS if c not in ("uuid", "chat_id", "opportunity_id"))
+
+
+def _sql_lote(n: int):
+    valores = ",\n".join(
+        "(" + ", ".join(f":{c}_{i}" for c in _COLUNAS) + ", CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+        for i in range(n)
+    )
+    return text(
+        f"""
         INSERT INTO seducar.chat_ai_evaluations (
-            uuid,
-            opportunity_id,
-            chat_id,
-            classification,
-            classification_reason,
-            ai_evaluation,
-            transcript,
-            lead_score,
-            vendor_score,
-            main_product,
-            vendedor_disclaimer,
-            lead_disclaimer,
-            octa_agent,
-            octa_channel,
-            octa_status,
-            octa_tags,
-            octa_group,
-            octa_origin,
-            octa_contact_name,
-            octa_contact_phone,
-            octa_bot_name,
-            octa_created_at,
-            octa_closed_at,
-            octa_survey_response,
-            created_at,
-            updated_at
-        ) VALUES (
-            :uuid,
-            :opportunity_id,
-            :chat_id,
-            :classification,
-            :classification_reason,
-            :ai_evaluation,
-            :transcript,
-            :lead_score,
-            :vendor_score,
-            :main_product,
-            :vendedor_disclaimer,
-            :lead_disclaimer,
-            :octa_agent,
-            :octa_channel,
-            :octa_status,
-            :octa_tags,
-            :octa_group,
-            :octa_origin,
-            :octa_contact_name,
-            :octa_contact_phone,
-            :octa_bot_name,
-            :octa_created_at,
-            :octa_closed_at,
-            :octa_survey_response,
-            CURRENT_TIMESTAMP,
-            CURRENT_TIMESTAMP
-        )
+            {", ".join(_COLUNAS)}, created_at, updated_at
+        ) VALUES
+        {valores}
         ON DUPLICATE KEY UPDATE
             opportunity_id = COALESCE(VALUES(opportunity_id), opportunity_id),
-            classification = VALUES(classification),
-            classification_reason = VALUES(classification_reason),
-            ai_evaluation = VALUES(ai_evaluation),
-            transcript = VALUES(transcript),
-            lead_score = VALUES(lead_score),
-            vendor_score = VALUES(vendor_score),
-            main_product = VALUES(main_product),
-            vendedor_disclaimer = VALUES(vendedor_disclaimer),
-            lead_disclaimer = VALUES(lead_disclaimer),
-            octa_agent = VALUES(octa_agent),
-            octa_channel = VALUES(octa_channel),
-            octa_status = VALUES(octa_status),
-            octa_tags = VALUES(octa_tags),
-            octa_group = VALUES(octa_group),
-            octa_origin = VALUES(octa_origin),
-            octa_contact_name = VALUES(octa_contact_name),
-            octa_contact_phone = VALUES(octa_contact_phone),
-            octa_bot_name = VALUES(octa_bot_name),
-            octa_created_at = VALUES(octa_created_at),
-            octa_closed_at = VALUES(octa_closed_at),
-            octa_survey_response = VALUES(octa_survey_response),
+            {", ".join(f"{c} = VALUES({c})" for c in _ATUALIZADAS)},
             updated_at = CURRENT_TIMESTAMP
         """
     )
-    
+
+
+def gravar_chats(conn, linhas: List[Dict]) -> None:
+    """Upsert multi-linha de avaliações (parametros_avaliacao_chat) num statement.
+    Levanta a exceção do banco — a transação do chamador decide o rollback."""
+    por_id = {linha["chat_id"]: linha for linha in linhas}  # mesmo chat 2x: vale o último
+    linhas = list(por_id.values())
+    if not linhas:
+        return
+    _ensure_opportunity_id_nullable(conn.engine)
+    params = {f"{k}_{i}": v for i, linha in enumerate(linhas) for k, v in linha.items()}
+    conn.execute(_sql_lote(len(linhas)), params)
+
+
+def salvar_avaliacao_chat(
+    opportunity_id: Optional[int],
+    chat_id: str,
+    classification: str,
+    classification_reason: str,
+    ai_evaluation: Optional[dict],
+    transcript: Optional[str] = None,
+    lead_score: Optional[int] = None,
+    vendor_score: Optional[int] = None,
+    main_product: Optional[str] = None,
+    vendedor_disclaimer: Optional[str] = None,
+    lead_disclaimer: Optional[str] = None,
+    octa_agent: Optional[str] = None,
+    octa_channel: Optional[str] = None,
+    octa_status: Optional[str] = None,
+    octa_tags: Optional[str] = None,
+    octa_group: Optional[str] = None,
+    octa_origin: Optional[str] = None,
+    octa_contact_name: Optional[str] = None,
+    octa_contact_phone: Optional[str] = None,
+    octa_bot_name: Optional[str] = None,
+    octa_created_at: Optional[str] = None,
+    octa_closed_at: Optional[str] = None,
+    octa_survey_response: Optional[str] = None
+) -> Tuple[bool, Optional[str]]:
+    """
+    Salva ou atualiza a avaliação de um chat na tabela chat_ai_evaluations,
+    junto com os metadados do Octadesk e o texto do chat original.
+    """
+    linha = parametros_avaliacao_chat(
+        opportunity_id, chat_id, classification, classification_reason, ai_evaluation,
+        transcript=transcript, lead_score=lead_score, vendor_score=vendor_score,
+        main_product=main_product, vendedor_disclaimer=vendedor_disclaimer,
+        lead_disclaimer=lead_disclaimer, octa_agent=octa_agent, octa_channel=octa_channel,
+        octa_status=octa_status, octa_tags=octa_tags, octa_group=octa_group,
+        octa_origin=octa_origin, octa_contact_name=octa_contact_name,
+        octa_contact_phone=octa_contact_phone, octa_bot_name=octa_bot_name,
+        octa_created_at=octa_created_at, octa_closed_at=octa_closed_at,
+        octa_survey_response=octa_survey_response,
+    )
+    if linha is None:
+        return False, "chat_id ausente"
+
+    engine = engine_escrita()
+    if engine is None:
+        return False, "engine MySQL não inicializado"
+
     try:
         with engine.begin() as conn:
-            conn.execute(
-                query,
-                {
-                    "uuid": chat_uuid,
-                    "opportunity_id": opportunity_id,
-                    "chat_id": chat_id,
-                    "classification": classification,
-                    "classification_reason": classification_reason,
-                    "ai_evaluation": ai_evaluation_json,
-                    "transcript": transcript,
-                    "lead_score": lead_score,
-                    "vendor_score": vendor_score,
-                    "main_product": main_product,
-                    "vendedor_disclaimer": vendedor_disclaimer,
-                    "lead_disclaimer": lead_disclaimer,
-                    "octa_agent": octa_agent,
-                    "octa_channel": octa_channel,
-                    "octa_status": octa_status,
-                    "octa_tags": octa_tags,
-                    "octa_group": octa_group,
-                    "octa_origin": octa_origin,
-                    "octa_contact_name": octa_contact_name,
-                    "octa_contact_phone": octa_contact_phone,
-                    "octa_bot_name": octa_bot_name,
-                    "octa_created_at": octa_created_at,
-                    "octa_closed_at": octa_closed_at,
-                    "octa_survey_response": octa_survey_response
-                }
-            )
+            gravar_chats(conn, [linha])
         return True, None
     except Exception as e:
         return False, str(e)
-
-        return False, str(e)
-
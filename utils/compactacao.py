@@ -0,0 +1,155 @@
+"""
+Compactação de transcrições antes das chamadas ao Claude.
+
+Substitui o corte cego por caracteres (texto[:CLAUDE_MAX_INPUT_CHARS]), que
+mandava ruído inteiro e, nas conversas longas, cortava justamente o
+fechamento. Sobre o parse de utils.chat_ia_analyzer.filtrar_mensagens_bot:
+  1. descarta mensagens de bot/template (mesma regra do filtro de chats);
+  2. normaliza espaços e troca URLs por [link];
+  3. junta mensagens repetidas em sequência do mesmo remetente ("ok" ×3);
+  4. remove mensagens longas repetidas mais adiante (templates colados pelo
+     atendente, reenvio de textos);
+  5. no WhatsApp, encurta o timestamp para HH:MM e marca a data só quando ela
+     muda;
+  6. se ainda passar do orçamento de tokens, mantém início + final da
+     conversa (COMPACTACAO_CABECA do orçamento para o início, o resto para o
+     final) e marca quantas mensagens ficaram de fora no meio.
+
+Tokens contados por utils.llm_limiter.contar_tokens (razão chars/token
+recalibrada com o usage da API). Cada chamada registra antes → depois no log.
+
+ENV VARS:
+  COMPACTACAO_ATIVA   — '0' desliga (volta ao corte por caracteres) (default 1)
+  COMPACTACAO_CABECA  — fração do orçamento reservada ao início (default 0.35)
+"""
+
+import logging
+import os
+import re
+from typing import Dict, List
+
+from utils import llm_limiter
+
+logger = logging.getLogger(__name__)
+
+ATIVA = os.getenv("COMPACTACAO_ATIVA", "1") != "0"
+CABECA = float(os.getenv("COMPACTACAO_CABECA", "0.35"))
+
+# Entra na versão do prompt do cache de avaliações (via versao()): mudar as regras
+# abaixo invalida o cache
+VERSAO = "1"
+
+_URL = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+_ESPACOS = re.compile(r"[ \t ]+")
+_TS = re.compile(r"^(\d{4})-(\d{2})-(\d{2})\s+(\d{2}):(\d{2})")
+_MIN_CHARS_REPETIDA = 40
+_SEM_REMETENTE = ("(desconhecido)", "(sem remetente)")
+
+
+def _limpar(texto: str) -> str:
+    return _ESPACOS.sub(" ", _URL.sub("[link]", texto or "")).strip()
+
+
+def _mensagens(texto: str) -> List[Dict]:
+    """Mensagens humanas em ordem, já limpas e sem repetições."""
+    from utils.chat_ia_analyzer import filtrar_mensagens_bot
+
+    saida: List[Dict] = []
+    vistas = set()
+    for msg in filtrar_mensagens_bot(texto)["mensagens_humanas"]:
+        corpo = _limpar(msg["texto"])
+        if not corpo:
+            continue
+        remetente = msg["remetente"]
+        chave = (remetente.lower(), corpo.lower())
+        anterior = saida[-1] if saida else None
+        if anterior and (anterior["remetente"].lower(), anterior["texto"].lower()) == chave:
+            anterior["repeticoes"] += 1
+            continue
+        if len(corpo) >= _MIN_CHARS_REPETIDA:
+            if chave in vistas:
+                continue
+            vistas.add(chave)
+        saida.append({"remetente": remetente, "texto": corpo, "timestamp": msg["timestamp"], "repeticoes": 1})
+    return saida
+
+
+def _linhas(mensagens: List[Dict]) -> List[str]:
+    linhas, data_atual = [], None
+    for msg in mensagens:
+        corpo = msg["texto"] + (f" (×{msg['repeticoes']})" if msg["repeticoes"] > 1 else "")
+        prefixo = ""
+        ts = _TS.match(msg["timestamp"] or "")
+        if ts:
+            data = f"{ts.group(3)}/{ts.group(2)}/{ts.group(1)}"
+            if data != data_atual:
+                linhas.append(f"— {data} —")
+                data_atual = data
+            prefixo = f"{ts.group(4)}:{ts.group(5)} "
+        if msg["remetente"] in _SEM_REMETENTE:
+            linhas.append(prefixo + corpo)
+        else:
+            linhas.append(f"{prefixo}{msg['remetente']}: {corpo}")
+    return linhas
+
+
+def _janela(linhas: List[str], orcamento: int, modelo: str) -> tuple:
+    """Início + final dentro do orçamento. Retorna (linhas, omitidas)."""
+    marcador = 20
+    # Uma mensagem sozinha não pode ocupar mais que a parte do final da conversa
+    maximo_linha = max(1, int((orcamento - marcador) * (1 - CABECA)))
+    linhas = [_corte_caracteres(l, maximo_linha, modelo) for l in linhas]
+    custos = [llm_limiter.contar_tokens(l, modelo) + 1 for l in linhas]
+    if sum(custos) <= orcamento:
+        return linhas, 0
+
+    limite_cabeca = int((orcamento - marcador) * CABECA)
+    cabeca, usado = 0, 0
+    while cabeca < len(linhas) and usado + custos[cabeca] <= limite_cabeca:
+        usado += custos[cabeca]
+        cabeca += 1
+    cauda = len(linhas)
+    while cauda > cabeca and usado + custos[cauda - 1] <= orcamento - marcador:
+        cauda -= 1
+        usado += custos[cauda]
+
+    omitidas = cauda - cabeca
+    tokens_omitidos = sum(custos[cabeca:cauda])
+    meio = [f"[... {omitidas} mensagens do meio da conversa omitidas (~{tokens_omitidos} tokens) ...]"]
+    return linhas[:cabeca] + meio + linhas[cauda:], omitidas
+
+
+def _corte_caracteres(texto: str, orcamento: int, modelo: str) -> str:
+    """Início + final por caracteres (mensagem gigante, transcrição sem quebras de linha)."""
+    limite = int(orcamento * llm_limiter.limitador(modelo).chars_por_token)
+    if len(texto) <= limite:
+        return texto
+    inicio = int(limite * CABECA)
+    return texto[:inicio] + "\n[... trecho omitido ...]\n" + texto[-(limite - inicio):]
+
+
+def versao(orcamento_tokens: int) -> str:
+    """VERSAO + o que muda o texto compactado: COMPACTACAO_* e o orçamento de tokens."""
+    return f"{VERSAO}|ativa={int(ATIVA)}|cabeca={CABECA}|orcamento={orcamento_tokens}"
+
+
+def compactar(canal: str, texto: str, orcamento_tokens: int, modelo: str = "") -> str:
+    """Transcrição pronta para o prompt, dentro de `orcamento_tokens`."""
+    if not texto:
+        return texto or ""
+    tokens_antes = llm_limiter.contar_tokens(texto, modelo)
+    if not ATIVA:
+        return _corte_caracteres(texto, orcamento_tokens, modelo)
+
+    mensagens = _mensagens(texto)
+    linhas, omitidas = _janela(_linhas(mensagens), orcamento_tokens, modelo)
+    resultado = _corte_caracteres("\n".join(linhas), orcamento_tokens, modelo)
+
+    tokens_depois = llm_limiter.contar_tokens(resultado, modelo)
+    logger.info(
+        "[compactação/%s] tokens %d → %d (%.0f%%) | %d mensagens, %d omitidas no meio",
+        canal, tokens_antes, tokens_depois,
+        100.0 * (tokens_depois - tokens_antes) / max(tokens_antes, 1),
+        len(mensagens), omitidas,
+    )
+    return resultado
@@ -0,0 +1,296 @@
+"""
+Fila durável de avaliações de IA (SQLite), desacoplada do Streamlit.
+
+As páginas só enfileiram (ids + metadados da linha) e mostram o progresso;
+quem chama o Claude e grava no MySQL é o avaliacao_worker.py, um processo à
+parte. Rerun da página, aba fechada ou restart do Streamlit não perdem nada:
+o trabalho fica no banco até ser concluído.
+
+Ciclo de um job:
+    pendente ──reservar──▶ executando ──concluir──▶ concluido
+                              │
+                              └──falhar──▶ pendente (nova tentativa com espera)
+                                           └─▶ falhou (esgotou FILA_MAX_TENTATIVAS)
+
+  - reservar() marca o job com um lease (FILA_LEASE_SEGUNDOS) que o worker
+    renova (renovar) enquanto o job está em andamento — inclusive esperando
+    vez no llm_limiter; se o worker morrer no meio, o lease deixa de ser
+    renovado, expira e outro worker retoma o job.
+  - Deduplicação: um mesmo (canal, item_id) não entra duas vezes enquanto
+    estiver pendente/executando — enfileirar de novo é ignorado.
+  - Vários workers (processos ou corrotinas) podem consumir a mesma fila;
+    a reserva é atômica (BEGIN IMMEDIATE).
+  - Jobs são agrupados em lotes (um clique na página = um lote) para a
+    barra de progresso.
+
+ENV VARS:
+  FILA_AVALIACOES_DB    — caminho do banco (default data_cache/fila_avaliacoes.db)
+  FILA_LEASE_SEGUNDOS   — validade da reserva de um job (default 600)
+  FILA_MAX_TENTATIVAS   — tentativas antes de marcar 'falhou' (default 3)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+_DB_PATH = Path(os.getenv(
+    "FILA_AVALIACOES_DB",
+    str(Path(__file__).resolve().parent.parent / "data_cache" / "fila_avaliacoes.db"),
+))
+LEASE_SEGUNDOS = int(os.getenv("FILA_LEASE_SEGUNDOS", "600"))
+MAX_TENTATIVAS = int(os.getenv("FILA_MAX_TENTATIVAS", "3"))
+
+STATUS = ("pendente", "executando", "concluido", "falhou")
+_ESPERA_RETENTATIVA = 30  # s × 2^(tentativa-1)
+
+
+def _conectar() -> sqlite3.Connection:
+    _DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(_DB_PATH, timeout=30.0, isolation_level=None)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA busy_timeout=30000")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id             INTEGER PRIMARY KEY AUTOINCREMENT,
+            canal          TEXT NOT NULL,
+            item_id        TEXT NOT NULL,
+            lote           TEXT NOT NULL,
+            payload        TEXT,
+            status         TEXT NOT NULL DEFAULT 'pendente',
+            tentativas     INTEGER NOT NULL DEFAULT 0,
+            disponivel_em  INTEGER NOT NULL DEFAULT 0,
+            lease_ate      INTEGER,
+            worker         TEXT,
+            resultado      TEXT,
+            erro           TEXT,
+            criado_em      INTEGER NOT NULL,
+            atualizado_em  INTEGER NOT NULL
+        )
+    """)
+    # Deduplicação: no máximo um job ativo por item
+    con.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_jobs_ativos ON jobs (canal, item_id)
+        WHERE status IN ('pendente', 'executando')
+    """)
+    con.execute("CREATE INDEX IF NOT EXISTS ix_jobs_fila ON jobs (status, disponivel_em)")
+    con.execute("CREATE INDEX IF NOT EXISTS ix_jobs_lote ON jobs (lote)")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS workers (
+            worker   TEXT PRIMARY KEY,
+            visto_em INTEGER NOT NULL,
+            info     TEXT
+        )
+    """)
+    return con
+
+
+# ---------------------------------------------------------------------------
+# Lado da página
+# ---------------------------------------------------------------------------
+
+def enfileirar(canal: str, itens: Sequence[Dict], lote: Optional[str] = None) -> Dict:
+    """
+    Enfileira itens {'item_id': ..., 'payload': {...}} de um canal.
+    Itens que já têm job pendente/executando são ignorados (deduplicação).
+    Retorna {'lote', 'enfileirados', 'duplicados'}.
+    """
+    lote = lote or uuid.uuid4().hex[:12]
+    agora = int(time.time())
+    con = _conectar()
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        antes = con.total_changes
+        con.executemany(
+            "INSERT OR IGNORE INTO jobs (canal, item_id, lote, payload, criado_em, atualizado_em) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (canal, str(item['item_id']), lote,
+                 json.dumps(item.get('payload') or {}, ensure_ascii=False, default=str), agora, agora)
+                for item in itens
+            ],
+        )
+        enfileirados = con.total_changes - antes
+        con.execute("COMMIT")
+    finally:
+        con.close()
+    return {'lote': lote, 'enfileirados': enfileirados, 'duplicados': len(itens) - enfileirados}
+
+
+def progresso(lote: str) -> Dict:
+    """Contagem por status de um lote + erros recentes."""
+    con = _conectar()
+    try:
+        contagem = dict.fromkeys(STATUS, 0)
+        for row in con.execute("SELECT status, COUNT(*) n FROM jobs WHERE lote=? GROUP BY status", [lote]):
+            contagem[row['status']] = row['n']
+        erros = [
+            f"{r['item_id']}: {r['erro']}"
+            for r in con.execute(
+                "SELECT item_id, erro FROM jobs WHERE lote=? AND status='falhou' ORDER BY atualizado_em DESC LIMIT 20",
+                [lote],
+            )
+        ]
+    finally:
+        con.close()
+    total = sum(contagem.values())
+    return dict(contagem, total=total, finalizado=total > 0 and contagem['pendente'] + contagem['executando'] == 0,
+                erros=erros)
+
+
+def workers_ativos(janela: int = 120) -> List[Dict]:
+    """Workers que deram sinal de vida nos últimos `janela` segundos."""
+    con = _conectar()
+    try:
+        rows = con.execute(
+            "SELECT worker, visto_em, info FROM workers WHERE visto_em >= ?", [int(time.time()) - janela]
+        ).fetchall()
+    finally:
+        con.close()
+    return [dict(r) for r in rows]
+
+
+def reabrir_falhas(lote: Optional[str] = None) -> int:
+    """Devolve jobs 'falhou' para a fila (tentativas zeradas)."""
+    filtro, params = ("AND lote=?", [lote]) if lote else ("", [])
+    con = _conectar()
+    try:
+        cur = con.execute(
+            f"UPDATE OR IGNORE jobs SET status='pendente', tentativas=0, disponivel_em=0, erro=NULL, "
+            f"atualizado_em=? WHERE status='falhou' {filtro}",
+            [int(time.time())] + params,
+        )
+        return cur.rowcount
+    finally:
+        con.close()
+
+
+def amostrar(canal: str, limite: int) -> List[Dict]:
+    """Jobs mais recentes de um canal (qualquer status), com o payload decodificado.
+    Usado como amostra de conversas reais (ex.: scripts/benchmark_avaliacoes.py)."""
+    con = _conectar()
+    try:
+        rows = con.execute(
+            "SELECT item_id, payload FROM jobs WHERE canal=? ORDER BY id DESC LIMIT ?", [canal, int(limite)]
+        ).fetchall()
+    finally:
+        con.close()
+    return [{'item_id': r['item_id'], 'payload': json.loads(r['payload'] or '{}')} for r in rows]
+
+
+# ---------------------------------------------------------------------------
+# Lado do worker
+# ---------------------------------------------------------------------------
+
+def sinal_de_vida(worker: str, info: Optional[Dict] = None):
+    con = _conectar()
+    try:
+        con.execute(
+            "INSERT OR REPLACE INTO workers (worker, visto_em, info) VALUES (?, ?, ?)",
+            [worker, int(time.time()), json.dumps(info or {}, default=str)],
+        )
+    finally:
+        con.close()
+
+
+def reservar(worker: str, limite: int = 1, canais: Optional[Sequence[str]] = None) -> List[Dict]:
+    """
+    Reserva até `limite` jobs prontos (pendentes, ou executando com lease
+    vencido) para este worker. Retorna dicts com id, canal, item_id, lote,
+    payload (já decodificado) e tentativas.
+    """
+    agora = int(time.time())
+    filtro_canal = ""
+    params: List = [agora, agora]
+    if canais:
+        filtro_canal = f"AND canal IN ({','.join('?' * len(canais))})"
+        params += list(canais)
+
+    con = _conectar()
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        # Lease vencido com tentativas esgotadas: o worker morreu na última chance
+        con.execute(
+            "UPDATE jobs SET status='falhou', erro=COALESCE(erro, 'lease expirado'), atualizado_em=? "
+            "WHERE status='executando' AND lease_ate < ? AND tentativas >= ?",
+            [agora, agora, MAX_TENTATIVAS],
+        )
+        rows = con.execute(
+            f"SELECT id, canal, item_id, lote, payload, tentativas FROM jobs "
+            f"WHERE ((status='pendente' AND disponivel_em <= ?) OR (status='executando' AND lease_ate < ?)) "
+            f"{filtro_canal} ORDER BY id LIMIT ?",
+            params + [limite],
+        ).fetchall()
+        if rows:
+            con.executemany(
+                "UPDATE jobs SET status='executando', tentativas=tentativas+1, lease_ate=?, worker=?, "
+                "atualizado_em=? WHERE id=?",
+                [(agora + LEASE_SEGUNDOS, worker, agora, r['id']) for r in rows],
+            )
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+    return [
+        {'id': r['id'], 'canal': r['canal'], 'item_id': r['item_id'], 'lote': r['lote'],
+         'payload': json.loads(r['payload'] or '{}'), 'tentativas': r['tentativas'] + 1}
+        for r in rows
+    ]
+
+
+def renovar(worker: str, job_ids: Sequence[int]) -> int:
+    """Estende o lease dos jobs em andamento deste worker. Retorna quantos ainda eram dele."""
+    if not job_ids:
+        return 0
+    agora = int(time.time())
+    con = _conectar()
+    try:
+        cur = con.execute(
+            f"UPDATE jobs SET lease_ate=?, atualizado_em=? "
+            f"WHERE worker=? AND status='executando' AND id IN ({','.join('?' * len(job_ids))})",
+            [agora + LEASE_SEGUNDOS, agora, worker] + list(job_ids),
+        )
+        return cur.rowcount
+    finally:
+        con.close()
+
+
+def concluir(job_id: int, worker: str, resultado: Optional[Dict] = None):
+    """Marca o job como concluído (só se o lease ainda é deste worker)."""
+    con = _conectar()
+    try:
+        con.execute(
+            "UPDATE jobs SET status='concluido', resultado=?, erro=NULL, lease_ate=NULL, atualizado_em=? "
+            "WHERE id=? AND worker=? AND status='executando'",
+            [json.dumps(resultado or {}, ensure_ascii=False, default=str), int(time.time()), job_id, worker],
+        )
+    finally:
+        con.close()
+
+
+def falhar(job_id: int, worker: str, erro: str, tentativas: int):
+    """Devolve o job para a fila com espera exponencial, ou marca 'falhou' se esgotou as tentativas."""
+    agora = int(time.time())
+    esgotou = tentativas >= MAX_TENTATIVAS
+    con = _conectar()
+    try:
+        con.execute(
+            "UPDATE jobs SET status=?, erro=?, disponivel_em=?, lease_ate=NULL, atualizado_em=? "
+            "WHERE id=? AND worker=? AND status='executando'",
+            ['falhou' if esgotou else 'pendente', erro[:2000],
+             agora + _ESPERA_RETENTATIVA * 2 ** (tentativas - 1), agora, job_id, worker],
+        )
+    finally:
+        con.close()
+    if esgotou:
+        logger.warning("Job %s falhou após %d tentativas: %s", job_id, tentativas, erro)
@@ -0,0 +1,186 @@
+"""
+Gravação em lote das avaliações no MySQL (ligações e WhatsApp).
+
+Os writers (utils.transcricao_mysql_writer / utils.chat_mysql_writer) gravavam
+uma linha por chamada e cada chamada criava o seu engine: 200 avaliações
+terminando juntas no worker eram 200 engines e 200 transações. Aqui:
+
+  - engine_escrita(): um engine de escrita por processo (pool do SQLAlchemy),
+    usado também pelas gravações avulsas dos writers;
+  - enviar(canal, linha): põe a linha (parametros_avaliacao_* do writer) numa
+    fila em memória e devolve um Future com (ok, erro) daquele item;
+  - uma thread descarrega a fila em upserts multi-linha quando junta
+    GRAVACAO_LOTE itens ou a cada GRAVACAO_INTERVALO segundos;
+  - se o statement do lote falhar, os itens são regravados um a um para que
+    só o item problemático receba o erro;
+  - os ids gravados saem do LRU de detalhes (utils.transcricoes_loader), se
+    o processo o tiver carregado — o dashboard não mostra a avaliação antiga.
+
+Uso:
+    futuros = [gravacao_avaliacoes.enviar('whatsapp', linha) for linha in linhas]
+    resultados = [f.result() for f in futuros]      # [(ok, erro), ...]
+    # ou: resultados = gravacao_avaliacoes.gravar('whatsapp', linhas)
+
+ENV VARS:
+  GRAVACAO_LOTE       — itens por upsert (default 50)
+  GRAVACAO_INTERVALO  — espera máxima (s) antes de descarregar um lote incompleto (default 1.0)
+"""
+
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LOTE = int(os.getenv("GRAVACAO_LOTE", "50"))
+INTERVALO = float(os.getenv("GRAVACAO_INTERVALO", "1.0"))
+
+CANAIS = ("ligacao", "whatsapp")
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def engine_escrita():
+    """Engine de escrita compartilhado pelo processo (None sem credenciais — tenta de novo depois)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from conexao.mysql_connector import conectar_mysql_writer
+                _engine = conectar_mysql_writer()
+    return _engine
+
+
+def _gravador(canal: str):
+    if canal == "ligacao":
+        from utils.transcricao_mysql_writer import gravar_transcricoes
+        return gravar_transcricoes
+    from utils.chat_mysql_writer import gravar_chats
+    return gravar_chats
+
+
+def _invalidar_detalhes(canal: str, linhas: List[Dict]):
+    """Tira as avaliações recém-gravadas do LRU de detalhes (só onde o loader já foi importado)."""
+    loader = sys.modules.get("utils.transcricoes_loader")
+    if loader is None:  # worker / scripts: não há LRU a invalidar
+        return
+    coluna = "transcription_id" if canal == "ligacao" else "chat_id"
+    loader.limpar_detalhes(canal, [linha.get(coluna) for linha in linhas])
+
+
+class _Sink:
+    def __init__(self, lote: int = LOTE, intervalo: float = INTERVALO):
+        self.lote = max(1, lote)
+        self.intervalo = intervalo
+        self._pendentes: Dict[str, List[Tuple[Dict, Future]]] = {c: [] for c in CANAIS}
+        self._desde: Dict[str, Optional[float]] = {c: None for c in CANAIS}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def enviar(self, canal: str, linha: Dict) -> Future:
+        if canal not in CANAIS:
+            raise ValueError(f"Canal inválido: {canal}")
+        futuro: Future = Future()
+        with self._cond:
+            if not self._pendentes[canal]:
+                self._desde[canal] = time.monotonic()
+            self._pendentes[canal].append((linha, futuro))
+            self._iniciar()
+            if len(self._pendentes[canal]) >= self.lote:
+                self._cond.notify()
+        return futuro
+
+    def _iniciar(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._laco, name="gravacao-avaliacoes", daemon=True)
+            self._thread.start()
+
+    def _prontos(self, forcar: bool = False) -> List[Tuple[str, List]]:
+        """Retira da fila os lotes cheios ou vencidos (chamar com o lock)."""
+        agora, prontos = time.monotonic(), []
+        for canal, itens in self._pendentes.items():
+            if not itens:
+                continue
+            vencido = agora - self._desde[canal] >= self.intervalo
+            if not (forcar or vencido or len(itens) >= self.lote):
+                continue
+            while itens and (forcar or vencido or len(itens) >= self.lote):
+                prontos.append((canal, itens[:self.lote]))
+                del itens[:self.lote]
+            self._desde[canal] = agora if itens else None
+        return prontos
+
+    def _laco(self):
+        while True:
+            with self._cond:
+                prontos = self._prontos()
+                if not prontos:
+                    self._cond.wait(timeout=self.intervalo / 2 or 0.05)
+                    continue
+            for canal, itens in prontos:
+                self._gravar_seguro(canal, itens)
+
+    def _gravar_seguro(self, canal: str, itens: List[Tuple[Dict, Future]]):
+        try:
+            self._gravar(canal, itens)
+        except Exception as e:  # nenhum chamador pode ficar esperando um Future sem resposta
+            logger.exception("[gravação/%s] falha inesperada", canal)
+            for _, futuro in itens:
+                if not futuro.done():
+                    futuro.set_result((False, str(e)))
+
+    def _gravar(self, canal: str, itens: List[Tuple[Dict, Future]]):
+        gravar = _gravador(canal)
+        engine = engine_escrita()
+        if engine is None:
+            for _, futuro in itens:
+                futuro.set_result((False, "engine MySQL não inicializado"))
+            return
+        inicio = time.monotonic()
+        try:
+            with engine.begin() as conn:
+                gravar(conn, [linha for linha, _ in itens])
+        except Exception as e:
+            if len(itens) == 1:
+                itens[0][1].set_result((False, str(e)))
+                return
+            logger.warning("[gravação/%s] lote de %d falhou (%s) — gravando item a item", canal, len(itens), e)
+            for item in itens:
+                self._gravar(canal, [item])
+            return
+        logger.info("[gravação/%s] %d avaliação(ões) em %.2fs", canal, len(itens), time.monotonic() - inicio)
+        _invalidar_detalhes(canal, [linha for linha, _ in itens])
+        for _, futuro in itens:
+            futuro.set_result((True, None))
+
+    def descarregar(self):
+        """Grava já tudo o que está na fila (na thread de quem chamou)."""
+        with self._cond:
+            prontos = self._prontos(forcar=True)
+        for canal, itens in prontos:
+            self._gravar_seguro(canal, itens)
+
+
+_sink = _Sink()
+atexit.register(_sink.descarregar)
+
+
+def enviar(canal: str, linha: Dict) -> Future:
+    """Agenda a gravação de uma linha; Future → (ok, erro)."""
+    return _sink.enviar(canal, linha)
+
+
+def gravar(canal: str, linhas: List[Dict], timeout: Optional[float] = None) -> List[Tuple[bool, Optional[str]]]:
+    """Envia as linhas e espera o resultado de cada uma (mesma ordem)."""
+    futuros = [enviar(canal, linha) for linha in linhas]
+    return [f.result(timeout=timeout) for f in futuros]
+
+
+def descarregar():
+    _sink.descarregar()
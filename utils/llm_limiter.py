@@ -0,0 +1,310 @@
+"""
+Limitador adaptativo compartilhado para chamadas ao Claude (Anthropic).
+
+Substitui o intervalo fixo entre chamadas (CLAUDE_THROTTLE_SECONDS) por três
+orçamentos por modelo, cada um um TokenBucket (utils.rate_limiter):
+  - requisições/min;
+  - tokens de entrada/min (estimados pelo tamanho do prompt);
+  - tokens de saída/min (reserva min(max_tokens, LLM_ESTIMATIVA_SAIDA)).
+Depois da chamada, a diferença entre o reservado e o usage real é creditada
+ou debitada. A reserva só volta inteira quando a requisição falha antes de
+qualquer resposta; um stream interrompido depois do message_start é acertado
+pelo que a API já cobrou (entrada + saída gerada até ali) e uma chamada
+assíncrona cancelada em voo fica com a reserva estimada. Várias chamadas ficam em voo ao mesmo tempo enquanto houver
+orçamento; não há lock serializando as requisições.
+
+Adaptação pelos cabeçalhos da resposta:
+  - anthropic-ratelimit-{requests,input-tokens,output-tokens}-limit
+    ajusta taxa e capacidade ao limite real da conta;
+  - ...-remaining alinha o saldo local ao do servidor (cobre outros
+    processos usando a mesma chave, ex.: cron + Streamlit);
+  - 429 com retry-after suspende todas as threads pelo tempo pedido.
+
+Contagem de tokens: a estimativa parte de ~3.5 caracteres/token e é
+recalibrada (média móvel, por modelo) com o usage que a API devolve — o
+tokenizer do fornecedor, sem chamada extra. contar_tokens(texto, modelo)
+usa a mesma razão (ex.: orçamento de utils.compactacao).
+
+Uso:
+    from utils import llm_limiter
+    resposta = llm_limiter.criar_mensagem(client, model=..., max_tokens=..., system=..., messages=[...])
+
+    with llm_limiter.stream_mensagem(client, model=..., ...) as stream:
+        texto = stream.get_final_text()
+
+    # asyncio (anthropic.AsyncAnthropic) — mesmos orçamentos das threads
+    resposta = await llm_limiter.criar_mensagem_async(aclient, model=..., ...)
+
+concorrencia() sugere quantas chamadas manter em voo (semáforo do motor
+assíncrono, utils.avaliacao_async): requisições/s × latência média.
+
+ENV VARS (valores iniciais; os cabeçalhos os corrigem na primeira resposta):
+  LLM_RPM                 — requisições/min por modelo (default 50)
+  LLM_ITPM                — tokens de entrada/min por modelo (default 30000)
+  LLM_OTPM                — tokens de saída/min por modelo (default 8000)
+  LLM_ESTIMATIVA_SAIDA    — tokens de saída reservados por chamada (default 2000)
+  LLM_ESPERA_429          — espera (s) após 429 sem retry-after (default 15)
+  LLM_LATENCIA_MEDIA      — latência típica (s) de uma avaliação, para concorrencia() (default 30)
+  LLM_MAX_EM_VOO          — teto de chamadas simultâneas por modelo (default 32)
+"""
+
+import asyncio
+import logging
+import math
+import os
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+from utils.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+RPM = float(os.getenv("LLM_RPM", "50"))
+ITPM = float(os.getenv("LLM_ITPM", "30000"))
+OTPM = float(os.getenv("LLM_OTPM", "8000"))
+ESTIMATIVA_SAIDA = int(os.getenv("LLM_ESTIMATIVA_SAIDA", "2000"))
+ESPERA_429 = float(os.getenv("LLM_ESPERA_429", "15"))
+LATENCIA_MEDIA = float(os.getenv("LLM_LATENCIA_MEDIA", "30"))
+MAX_EM_VOO = int(os.getenv("LLM_MAX_EM_VOO", "32"))
+
+# Aproximação conservadora para português: ~3.5 caracteres por token
+# (valor inicial; LimitadorLLM.calibrar ajusta pelo usage real)
+_CHARS_POR_TOKEN = 3.5
+_PESO_CALIBRACAO = 0.2
+
+_PREFIXO = "anthropic-ratelimit-"
+_CABECALHOS = {"requests": "requisicoes", "input-tokens": "entrada", "output-tokens": "saida"}
+
+
+class LimitadorLLM:
+    """Orçamentos de requisições e tokens/min de um modelo."""
+
+    def __init__(self, nome: str, rpm: float = RPM, itpm: float = ITPM, otpm: float = OTPM):
+        self.nome = nome
+        self.baldes: Dict[str, TokenBucket] = {
+            "requisicoes": TokenBucket(rpm / 60, capacidade=rpm),
+            "entrada": TokenBucket(itpm / 60, capacidade=itpm),
+            "saida": TokenBucket(otpm / 60, capacidade=otpm),
+        }
+        self._limites = {"requisicoes": rpm, "entrada": itpm, "saida": otpm}
+        self.chars_por_token = _CHARS_POR_TOKEN
+
+    def reservar(self, tokens_entrada: int, tokens_saida: int, chars: int = 0) -> Dict[str, int]:
+        """Bloqueia até caber a chamada nos três orçamentos. Retorna a reserva."""
+        espera = self.baldes["requisicoes"].acquire(1)
+        espera += self.baldes["entrada"].acquire(tokens_entrada)
+        espera += self.baldes["saida"].acquire(tokens_saida)
+        if espera > 1:
+            logger.info("[LLM %s] aguardou %.1fs por orçamento de rate limit", self.nome, espera)
+        return {"entrada": tokens_entrada, "saida": tokens_saida, "chars": chars}
+
+    async def reservar_async(self, tokens_entrada: int, tokens_saida: int, chars: int = 0) -> Dict[str, int]:
+        """reservar para corrotinas (não bloqueia o event loop)."""
+        espera = await self.baldes["requisicoes"].acquire_async(1)
+        espera += await self.baldes["entrada"].acquire_async(tokens_entrada)
+        espera += await self.baldes["saida"].acquire_async(tokens_saida)
+        if espera > 1:
+            logger.info("[LLM %s] aguardou %.1fs por orçamento de rate limit", self.nome, espera)
+        return {"entrada": tokens_entrada, "saida": tokens_saida, "chars": chars}
+
+    def concorrencia(self, latencia: float = LATENCIA_MEDIA, maximo: int = MAX_EM_VOO) -> int:
+        """Chamadas simultâneas que o limite de requisições comporta (rpm/60 × latência)."""
+        return max(1, min(maximo, math.ceil(self._limites["requisicoes"] / 60 * latencia)))
+
+    def calibrar(self, chars: int, tokens: int):
+        """Aproxima chars_por_token do tokenizer real (média móvel exponencial)."""
+        if chars > 0 and tokens > 0:
+            razao = min(8.0, max(1.5, chars / tokens))
+            self.chars_por_token += _PESO_CALIBRACAO * (razao - self.chars_por_token)
+
+    def contar_tokens(self, chars: int) -> int:
+        return max(1, math.ceil(chars / self.chars_por_token)) if chars else 0
+
+    def concluir(self, reserva: Dict[str, int], usage=None, headers=None):
+        """Acerta a reserva com o usage real e aplica os cabeçalhos de rate limit."""
+        if usage is not None:
+            entrada = (getattr(usage, "input_tokens", None) or 0) + (
+                getattr(usage, "cache_creation_input_tokens", None) or 0)
+            saida = getattr(usage, "output_tokens", None) or 0
+            self.calibrar(reserva.get("chars", 0),
+                          entrada + (getattr(usage, "cache_read_input_tokens", None) or 0))
+            self.baldes["entrada"].ajustar(reserva["entrada"] - entrada)
+            self.baldes["saida"].ajustar(reserva["saida"] - saida)
+        if headers is not None:
+            self.aplicar_cabecalhos(headers)
+
+    def cancelar(self, reserva: Dict[str, int]):
+        """Devolve os tokens de uma chamada que não chegou a consumir (erro antes da resposta)."""
+        self.baldes["entrada"].ajustar(reserva["entrada"])
+        self.baldes["saida"].ajustar(reserva["saida"])
+
+    def aplicar_cabecalhos(self, headers):
+        for sufixo, chave in _CABECALHOS.items():
+            limite = _numero(headers.get(f"{_PREFIXO}{sufixo}-limit"))
+            if limite and limite != self._limites[chave]:
+                logger.info("[LLM %s] limite de %s/min: %.0f → %.0f", self.nome, chave, self._limites[chave], limite)
+                self._limites[chave] = limite
+                self.baldes[chave].configurar(limite / 60, capacidade=limite)
+            restante = _numero(headers.get(f"{_PREFIXO}{sufixo}-remaining"))
+            if restante is not None:
+                self.baldes[chave].sincronizar(restante)
+
+    def penalizar(self, headers=None):
+        """429: suspende todos os orçamentos pelo retry-after (ou LLM_ESPERA_429)."""
+        espera = _numero(headers.get("retry-after")) if headers is not None else None
+        espera = espera if espera is not None else ESPERA_429
+        logger.warning("[LLM %s] 429 — suspendendo chamadas por %.0fs", self.nome, espera)
+        for balde in self.baldes.values():
+            balde.penalizar(espera)
+
+
+def _numero(valor) -> Optional[float]:
+    try:
+        return float(valor) if valor not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+_limitadores: Dict[str, LimitadorLLM] = {}
+_lock = threading.Lock()
+
+
+def limitador(modelo: str) -> LimitadorLLM:
+    """Limitador do modelo (um por processo, compartilhado por todos os módulos)."""
+    with _lock:
+        if modelo not in _limitadores:
+            _limitadores[modelo] = LimitadorLLM(modelo)
+        return _limitadores[modelo]
+
+
+def _chars(valor) -> int:
+    if valor is None:
+        return 0
+    if isinstance(valor, str):
+        return len(valor)
+    if isinstance(valor, dict):
+        return _chars(valor.get("text")) + _chars(valor.get("content"))
+    if isinstance(valor, (list, tuple)):
+        return sum(_chars(v) for v in valor)
+    return 0
+
+
+def estimar_tokens_entrada(system=None, messages=None, modelo: str = "") -> int:
+    """Estimativa de tokens de entrada pelo tamanho do texto (system + mensagens)."""
+    return max(1, limitador(modelo).contar_tokens(_chars(system) + _chars(messages)))
+
+
+def contar_tokens(texto: str, modelo: str = "") -> int:
+    """Tokens de um texto pela razão chars/token calibrada do modelo."""
+    return limitador(modelo).contar_tokens(len(texto or ""))
+
+
+def _estimativa(kwargs) -> tuple:
+    chars = _chars(kwargs.get("system")) + _chars(kwargs.get("messages"))
+    entrada = max(1, limitador(kwargs.get("model", "")).contar_tokens(chars))
+    saida = min(int(kwargs.get("max_tokens") or ESTIMATIVA_SAIDA), ESTIMATIVA_SAIDA)
+    return entrada, saida, chars
+
+
+def _reserva_para(kwargs) -> tuple:
+    lim = limitador(kwargs.get("model", ""))
+    return lim, lim.reservar(*_estimativa(kwargs))
+
+
+def _headers_do_erro(exc):
+    resposta = getattr(exc, "response", None)
+    return getattr(resposta, "headers", None)
+
+
+def _tratar_erro(lim: LimitadorLLM, reserva, exc):
+    if getattr(exc, "status_code", None) == 429:
+        lim.penalizar(_headers_do_erro(exc))
+    else:
+        lim.cancelar(reserva)
+        headers = _headers_do_erro(exc)
+        if headers is not None:
+            lim.aplicar_cabecalhos(headers)
+
+
+def criar_mensagem(client, **kwargs):
+    """client.messages.create(**kwargs) dentro do orçamento do modelo.
+
+    Exceções do SDK são propagadas (cada chamador mantém sua política de retentativa);
+    um 429 suspende o limitador antes de propagar.
+    """
+    lim, reserva = _reserva_para(kwargs)
+    try:
+        bruto = client.messages.with_raw_response.create(**kwargs)
+    except Exception as exc:
+        _tratar_erro(lim, reserva, exc)
+        raise
+    resposta = bruto.parse()
+    lim.concluir(reserva, getattr(resposta, "usage", None), bruto.headers)
+    return resposta
+
+
+def _acertar_stream_parcial(lim: LimitadorLLM, reserva, stream) -> bool:
+    """Stream que já recebeu o message_start: acerta a reserva pelo que foi cobrado.
+
+    A entrada vem exata no message_start; a saída só é totalizada no
+    message_delta final, então vale o maior entre ela e o texto já recebido.
+    Retorna False se o stream nem começou (a reserva deve voltar inteira).
+    """
+    if stream is None:
+        return False
+    try:
+        snapshot = stream.current_message_snapshot
+    except AssertionError:  # sem message_start
+        return False
+    usage = snapshot.usage
+    recebido = lim.contar_tokens(sum(len(getattr(b, "text", None) or "") for b in snapshot.content or []))
+    parcial = SimpleNamespace(
+        input_tokens=getattr(usage, "input_tokens", None),
+        cache_creation_input_tokens=getattr(usage, "cache_creation_input_tokens", None),
+        cache_read_input_tokens=getattr(usage, "cache_read_input_tokens", None),
+        output_tokens=max(getattr(usage, "output_tokens", None) or 0, recebido),
+    )
+    lim.concluir(reserva, parcial, getattr(getattr(stream, "response", None), "headers", None))
+    return True
+
+
+@contextmanager
+def stream_mensagem(client, **kwargs):
+    """client.messages.stream(**kwargs) dentro do orçamento do modelo."""
+    lim, reserva = _reserva_para(kwargs)
+    stream = None
+    try:
+        with client.messages.stream(**kwargs) as stream:
+            yield stream
+            final = stream.get_final_message()
+    except Exception as exc:
+        if not _acertar_stream_parcial(lim, reserva, stream):
+            _tratar_erro(lim, reserva, exc)
+        raise
+    except BaseException:
+        # streaming interrompido pelo chamador (GeneratorExit, rerun do Streamlit)
+        if not _acertar_stream_parcial(lim, reserva, stream):
+            lim.cancelar(reserva)
+        raise
+    resposta_http = getattr(stream, "response", None)
+    lim.concluir(reserva, getattr(final, "usage", None), getattr(resposta_http, "headers", None))
+
+
+async def criar_mensagem_async(client, **kwargs):
+    """criar_mensagem para anthropic.AsyncAnthropic. Cancelamento em voo mantém a reserva."""
+    lim = limitador(kwargs.get("model", ""))
+    reserva = await lim.reservar_async(*_estimativa(kwargs))
+    try:
+        bruto = await client.messages.with_raw_response.create(**kwargs)
+    except asyncio.CancelledError:
+        # a requisição já saiu: a API cobra a entrada (e a saída que gerar) mesmo
+        # sem ninguém esperando a resposta — a reserva fica como consumo estimado
+        raise
+    except Exception as exc:
+        _tratar_erro(lim, reserva, exc)
+        raise
+    resposta = bruto.parse()
+    lim.concluir(reserva, getattr(resposta, "usage", None), bruto.headers)
+    return resposta
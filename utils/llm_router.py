@@ -0,0 +1,500 @@
+"""
+Roteador de chamadas de LLM entre provedores (Anthropic, OpenAI, Groq).
+
+Cada integração chamava o seu SDK direto: quando o provedor ficava lento ou
+devolvia 429, a vazão das avaliações despencava sem alternativa. Aqui todas
+as tarefas falam o mesmo formato e o roteador escolhe o provedor:
+
+  - pedido comum: completar(tarefa, mensagens, system=..., max_tokens=...,
+    temperature=..., json=...) — mensagens no formato [{"role", "content"}];
+  - resposta comum (dict): texto, provedor, modelo, alvo ("provedor:modelo"
+    da rota que respondeu), input_tokens, output_tokens, latencia, hedge (True se veio da requisição extra) e
+    erros (falhas dos provedores tentados antes);
+  - rota por tarefa: lista ordenada de "provedor[:modelo]" (LLM_ROTA_<TAREFA>,
+    senão a rota padrão que o chamador passar, senão LLM_ROTA_PADRAO);
+  - fallback: erro, timeout ou 429 num provedor passa para o próximo da rota;
+  - saúde: por provedor:modelo, falhas seguidas e 429 suspendem o alvo por
+    um tempo (vai para o fim da rota, não é descartado) e as latências de
+    sucesso por tarefa alimentam o p95;
+  - hedge (LLM_HEDGE=1): se a primeira requisição passar do p95 da tarefa
+    naquele alvo, dispara uma segunda no próximo alvo da rota e fica com a
+    que responder primeiro. A perdedora termina em segundo plano (os SDKs
+    síncronos não cancelam) e só entra na estatística de latência.
+
+Anthropic passa por utils.llm_limiter (mesmos orçamentos de rate limit das
+demais chamadas ao Claude). OpenAI e Groq usam o SDK openai (o endpoint do
+Groq é compatível com chat.completions). As URLs base vêm das variáveis
+do próprio SDK, então o roteador roda contra um servidor falso local:
+
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 OPENAI_BASE_URL=http://127.0.0.1:8765/v1 ...
+
+Uso:
+    from utils import llm_router
+    resposta = llm_router.completar(
+        "analise_geral", [{"role": "user", "content": prompt}], system=system,
+        max_tokens=8000, rota_padrao=["anthropic:claude-opus-4-7", "anthropic:claude-opus-4-6"],
+    )
+    resposta["texto"], resposta["provedor"], resposta["modelo"]
+
+Streaming (telas que exibem o texto enquanto ele é gerado):
+
+    resultado = {}
+    for trecho in llm_router.transmitir("analise_geral", mensagens, system=system,
+                                        resultado=resultado, rota_padrao=[...]):
+        ...  # ex.: st.write_stream
+    resultado["modelo"], resultado["output_tokens"], resultado["primeiro_trecho"]
+
+O fallback só vale até o primeiro trecho: depois que o texto começou a
+aparecer, uma falha é propagada (trocar de provedor no meio misturaria duas
+respostas). Não há hedge em streaming.
+
+Quem já tem um client (ex.: chave vinda do st.secrets) passa em
+clientes={"anthropic": client}. Sem credencial, o provedor é pulado.
+Se todos falharem, levanta LLMIndisponivel (com .erros).
+
+ENV VARS:
+  LLM_ROTA_<TAREFA>         — rota da tarefa, ex.: LLM_ROTA_ANALISE_GERAL=anthropic:claude-opus-4-6,openai:gpt-5.1,groq
+  LLM_ROTA_PADRAO           — rota quando nem a env da tarefa nem o chamador definem (default anthropic,openai,groq)
+  LLM_HEDGE                 — 1 liga a requisição extra após o p95 (default 0)
+  LLM_HEDGE_MIN             — espera mínima (s) antes do hedge (default 2)
+  LLM_HEDGE_AMOSTRAS        — latências necessárias para confiar no p95 (default 10)
+  LLM_ROTA_FALHAS           — falhas seguidas que suspendem um alvo (default 3)
+  LLM_ROTA_SUSPENSAO        — suspensão (s) após falhas seguidas ou 429 sem retry-after (default 60)
+  LLM_ROTA_RETENTATIVAS     — retentativas internas do SDK antes do fallback (default 1)
+  LLM_ROTA_TIMEOUT          — timeout (s) de cada requisição (default 600)
+  LLM_ROTA_THREADS          — requisições simultâneas do roteador (default 16)
+  ANTHROPIC_API_KEY / ANTHROPIC_BASE_URL, CLAUDE_MODEL
+  OPENAI_API_KEY / OPENAI_BASE_URL, OPENAI_MODEL
+  GROQ_API_KEY / GROQ_BASE_URL, GROQ_MODEL
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence
+
+from utils import llm_limiter
+
+logger = logging.getLogger(__name__)
+
+ROTA_PADRAO = os.getenv("LLM_ROTA_PADRAO", "anthropic,openai,groq")
+HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+HEDGE_MIN = float(os.getenv("LLM_HEDGE_MIN", "2"))
+HEDGE_AMOSTRAS = int(os.getenv("LLM_HEDGE_AMOSTRAS", "10"))
+FALHAS_SUSPENSAO = int(os.getenv("LLM_ROTA_FALHAS", "3"))
+SUSPENSAO = float(os.getenv("LLM_ROTA_SUSPENSAO", "60"))
+RETENTATIVAS = int(os.getenv("LLM_ROTA_RETENTATIVAS", "1"))
+TIMEOUT = float(os.getenv("LLM_ROTA_TIMEOUT", "600"))
+THREADS = int(os.getenv("LLM_ROTA_THREADS", "16"))
+
+_JANELA = 100
+
+# provedor → (env da chave, env do modelo, modelo default, URL base default)
+PROVEDORES = {
+    "anthropic": ("ANTHROPIC_API_KEY", "CLAUDE_MODEL", "claude-sonnet-4-6", None),
+    "openai": ("OPENAI_API_KEY", "OPENAI_MODEL", "gpt-5.1", None),
+    "groq": ("GROQ_API_KEY", "GROQ_MODEL", "llama-3.3-70b-versatile", "https://api.groq.com/openai/v1"),
+}
+
+
+class LLMIndisponivel(RuntimeError):
+    """Nenhum provedor da rota respondeu. .erros: ['provedor:modelo: mensagem', ...]"""
+
+    def __init__(self, tarefa: str, erros: List[str]):
+        self.erros = erros
+        super().__init__(f"Nenhum provedor respondeu à tarefa '{tarefa}': " + " | ".join(erros or ["rota vazia"]))
+
+
+# ---------------------------------------------------------------------------
+# Rotas
+# ---------------------------------------------------------------------------
+
+def _alvo(item: str) -> str:
+    """'groq' → 'groq:<GROQ_MODEL>'; 'openai:gpt-5.1' fica como está."""
+    provedor, _, modelo = item.strip().partition(":")
+    provedor = provedor.strip().lower()
+    if provedor not in PROVEDORES:
+        raise ValueError(f"Provedor de LLM desconhecido: {provedor}")
+    _, env_modelo, modelo_padrao, _ = PROVEDORES[provedor]
+    return f"{provedor}:{modelo.strip() or os.getenv(env_modelo, modelo_padrao)}"
+
+
+def rota(tarefa: str, padrao: Optional[Sequence[str]] = None) -> List[str]:
+    """Alvos 'provedor:modelo' da tarefa, na ordem de preferência configurada."""
+    configurada = os.getenv(f"LLM_ROTA_{tarefa.upper()}")
+    itens = configurada.split(",") if configurada else list(padrao or ROTA_PADRAO.split(","))
+    alvos = []
+    for item in itens:
+        if item.strip():
+            alvo = _alvo(item)
+            if alvo not in alvos:
+                alvos.append(alvo)
+    return alvos
+
+
+# ---------------------------------------------------------------------------
+# Saúde
+# ---------------------------------------------------------------------------
+
+class SaudeAlvo:
+    """Falhas, suspensão e latências (por tarefa) de um provedor:modelo."""
+
+    def __init__(self, alvo: str):
+        self.alvo = alvo
+        self.sucessos = 0
+        self.falhas = 0
+        self.falhas_seguidas = 0
+        self.suspenso_ate = 0.0
+        self._latencias: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def suspenso(self) -> bool:
+        return time.monotonic() < self.suspenso_ate
+
+    def sucesso(self, tarefa: str, latencia: float):
+        with self._lock:
+            self.sucessos += 1
+            self.falhas_seguidas = 0
+            self.suspenso_ate = 0.0
+            self._latencias.setdefault(tarefa, deque(maxlen=_JANELA)).append(latencia)
+
+    def falha(self, status: Optional[int], retry_after: Optional[float]):
+        with self._lock:
+            self.falhas += 1
+            if status is not None and 400 <= status < 500 and status not in (408, 409, 429):
+                return  # erro do pedido, não do provedor
+            self.falhas_seguidas += 1
+            if status == 429:
+                espera = retry_after if retry_after is not None else SUSPENSAO
+            elif self.falhas_seguidas >= FALHAS_SUSPENSAO:
+                espera = SUSPENSAO
+            else:
+                return
+            self.suspenso_ate = max(self.suspenso_ate, time.monotonic() + espera)
+        logger.warning("[LLM rota] %s suspenso por %.0fs (status=%s, falhas seguidas=%d)",
+                       self.alvo, espera, status, self.falhas_seguidas)
+
+    def percentil(self, tarefa: str, p: float) -> Optional[float]:
+        with self._lock:
+            amostras = sorted(self._latencias.get(tarefa, ()))
+        if len(amostras) < HEDGE_AMOSTRAS:
+            return None
+        return amostras[max(0, math.ceil(p * len(amostras)) - 1)]
+
+
+_saude: Dict[str, SaudeAlvo] = {}
+_saude_lock = threading.Lock()
+
+
+def saude(alvo: str) -> SaudeAlvo:
+    with _saude_lock:
+        if alvo not in _saude:
+            _saude[alvo] = SaudeAlvo(alvo)
+        return _saude[alvo]
+
+
+def estado() -> Dict[str, Dict]:
+    """Retrato da saúde de cada alvo já usado (para logs e diagnóstico)."""
+    retrato = {}
+    for alvo, s in list(_saude.items()):
+        tarefas = {t: {"p50": s.percentil(t, 0.5), "p95": s.percentil(t, 0.95), "amostras": len(l)}
+                   for t, l in list(s._latencias.items())}
+        retrato[alvo] = {
+            "sucessos": s.sucessos,
+            "falhas": s.falhas,
+            "falhas_seguidas": s.falhas_seguidas,
+            "suspenso_por": max(0.0, round(s.suspenso_ate - time.monotonic(), 1)),
+            "tarefas": tarefas,
+        }
+    return retrato
+
+
+def _ordenar(alvos: List[str]) -> List[str]:
+    """Mantém a preferência, mas alvos suspensos vão para o fim."""
+    return [a for a in alvos if not saude(a).suspenso()] + [a for a in alvos if saude(a).suspenso()]
+
+
+# ---------------------------------------------------------------------------
+# Provedores
+# ---------------------------------------------------------------------------
+
+_clientes: Dict[str, object] = {}
+_clientes_lock = threading.Lock()
+
+
+def tem_credencial(provedor: str) -> bool:
+    return bool(os.getenv(PROVEDORES[provedor][0]))
+
+
+def _cliente(provedor: str):
+    """Client do SDK do provedor (um por processo). None sem chave."""
+    with _clientes_lock:
+        if provedor not in _clientes:
+            env_chave, _, _, base_padrao = PROVEDORES[provedor]
+            chave = os.getenv(env_chave)
+            if not chave:
+                return None
+            base = os.getenv(f"{provedor.upper()}_BASE_URL") or base_padrao
+            if provedor == "anthropic":
+                import anthropic
+                _clientes[provedor] = anthropic.Anthropic(
+                    api_key=chave, base_url=base, max_retries=RETENTATIVAS, timeout=TIMEOUT)
+            else:
+                from openai import OpenAI
+                _clientes[provedor] = OpenAI(
+                    api_key=chave, base_url=base, max_retries=RETENTATIVAS, timeout=TIMEOUT)
+        return _clientes[provedor]
+
+
+def _chamar_anthropic(client, modelo: str, pedido: Dict) -> Dict:
+    kwargs = {"model": modelo, "max_tokens": pedido["max_tokens"], "messages": pedido["mensagens"]}
+    if pedido.get("system"):
+        kwargs["system"] = pedido["system"]
+    if pedido.get("temperature") is not None:
+        kwargs["temperature"] = pedido["temperature"]
+    resposta = llm_limiter.criar_mensagem(client, **kwargs)
+    usage = getattr(resposta, "usage", None)
+    return {
+        "texto": "".join(getattr(b, "text", None) or "" for b in getattr(resposta, "content", []) or []),
+        "modelo": getattr(resposta, "model", None) or modelo,
+        "input_tokens": getattr(usage, "input_tokens", None),
+        "output_tokens": getattr(usage, "output_tokens", None),
+    }
+
+
+def _chamar_openai(client, modelo: str, pedido: Dict) -> Dict:
+    mensagens = list(pedido["mensagens"])
+    if pedido.get("system"):
+        mensagens.insert(0, {"role": "system", "content": pedido["system"]})
+    kwargs = {"model": modelo, "messages": mensagens, "max_tokens": pedido["max_tokens"]}
+    if pedido.get("temperature") is not None:
+        kwargs["temperature"] = pedido["temperature"]
+    if pedido.get("json"):
+        kwargs["response_format"] = {"type": "json_object"}
+    resposta = client.chat.completions.create(**kwargs)
+    usage = getattr(resposta, "usage", None)
+    return {
+        "texto": resposta.choices[0].message.content or "",
+        "modelo": getattr(resposta, "model", None) or modelo,
+        "input_tokens": getattr(usage, "prompt_tokens", None),
+        "output_tokens": getattr(usage, "completion_tokens", None),
+    }
+
+
+def _transmitir_anthropic(client, modelo: str, pedido: Dict, meta: Dict):
+    kwargs = {"model": modelo, "max_tokens": pedido["max_tokens"], "messages": pedido["mensagens"]}
+    if pedido.get("system"):
+        kwargs["system"] = pedido["system"]
+    if pedido.get("temperature") is not None:
+        kwargs["temperature"] = pedido["temperature"]
+    with llm_limiter.stream_mensagem(client, **kwargs) as stream:
+        yield from stream.text_stream
+        final = stream.get_final_message()
+    if getattr(final, "stop_reason", None) is None:
+        raise ConnectionError("streaming encerrado antes do fim da resposta")
+    usage = getattr(final, "usage", None)
+    meta.update(modelo=getattr(final, "model", None) or modelo,
+                input_tokens=getattr(usage, "input_tokens", None),
+                output_tokens=getattr(usage, "output_tokens", None))
+
+
+def _transmitir_openai(client, modelo: str, pedido: Dict, meta: Dict):
+    mensagens = list(pedido["mensagens"])
+    if pedido.get("system"):
+        mensagens.insert(0, {"role": "system", "content": pedido["system"]})
+    kwargs = {"model": modelo, "messages": mensagens, "max_tokens": pedido["max_tokens"],
+              "stream": True, "stream_options": {"include_usage": True}}
+    if pedido.get("temperature") is not None:
+        kwargs["temperature"] = pedido["temperature"]
+    meta["modelo"] = modelo
+    fim = None
+    for pedaco in client.chat.completions.create(**kwargs):
+        if getattr(pedaco, "model", None):
+            meta["modelo"] = pedaco.model
+        usage = getattr(pedaco, "usage", None)
+        if usage is not None:
+            meta.update(input_tokens=usage.prompt_tokens, output_tokens=usage.completion_tokens)
+        for escolha in pedaco.choices or []:
+            fim = escolha.finish_reason or fim
+            if escolha.delta and escolha.delta.content:
+                yield escolha.delta.content
+    if fim is None:
+        raise ConnectionError("streaming encerrado antes do fim da resposta")
+
+
+def _status(exc) -> Optional[int]:
+    return getattr(exc, "status_code", None)
+
+
+def _retry_after(exc) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers is not None and headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _executar(tarefa: str, alvo: str, pedido: Dict, clientes: Dict) -> Dict:
+    """Uma requisição a um alvo; registra a saúde (também quando o hedge já foi decidido)."""
+    provedor, _, modelo = alvo.partition(":")
+    client = clientes.get(provedor) or _cliente(provedor)
+    if client is None:
+        raise RuntimeError(f"{PROVEDORES[provedor][0]} não configurada")
+    chamar = _chamar_anthropic if provedor == "anthropic" else _chamar_openai
+    inicio = time.monotonic()
+    try:
+        resposta = chamar(client, modelo, pedido)
+    except Exception as exc:
+        saude(alvo).falha(_status(exc), _retry_after(exc))
+        raise
+    latencia = time.monotonic() - inicio
+    saude(alvo).sucesso(tarefa, latencia)
+    resposta.update(provedor=provedor, alvo=alvo, latencia=round(latencia, 3))
+    return resposta
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(2, THREADS), thread_name_prefix="llm-rota")
+        return _pool
+
+
+# ---------------------------------------------------------------------------
+# API
+# ---------------------------------------------------------------------------
+
+def _alvos_disponiveis(tarefa: str, rota_padrao, clientes: Dict) -> List[str]:
+    return [a for a in rota(tarefa, rota_padrao)
+            if clientes.get(a.partition(":")[0]) is not None or tem_credencial(a.partition(":")[0])]
+
+
+def disponivel(tarefa: str, rota_padrao: Optional[Sequence[str]] = None,
+               clientes: Optional[Dict[str, object]] = None) -> bool:
+    """Algum alvo da rota tem credencial (ou client passado pelo chamador)?"""
+    return bool(_alvos_disponiveis(tarefa, rota_padrao, clientes or {}))
+
+
+def completar(
+    tarefa: str,
+    mensagens: List[Dict],
+    system: Optional[str] = None,
+    max_tokens: int = 4000,
+    temperature: Optional[float] = None,
+    json: bool = False,
+    rota_padrao: Optional[Sequence[str]] = None,
+    clientes: Optional[Dict[str, object]] = None,
+    hedge: Optional[bool] = None,
+) -> Dict:
+    """Executa o pedido na rota da tarefa com fallback (e hedge, se ligado)."""
+    pedido = {"mensagens": mensagens, "system": system, "max_tokens": max_tokens,
+              "temperature": temperature, "json": json}
+    clientes = clientes or {}
+    hedge = HEDGE if hedge is None else hedge
+    fila = _ordenar(_alvos_disponiveis(tarefa, rota_padrao, clientes))
+    erros = [f"{a}: sem credencial" for a in rota(tarefa, rota_padrao) if a not in fila]
+
+    pool = _executor()
+    em_voo: Dict = {}  # future → (alvo, início, é hedge)
+    hedges = 1 if hedge else 0
+
+    def _disparar(eh_hedge: bool = False):
+        alvo = fila.pop(0)
+        em_voo[pool.submit(_executar, tarefa, alvo, pedido, clientes)] = (alvo, time.monotonic(), eh_hedge)
+
+    while fila or em_voo:
+        if not em_voo:
+            _disparar()
+        espera = None
+        if hedges and fila and len(em_voo) == 1:
+            alvo, inicio, _ = next(iter(em_voo.values()))
+            p95 = saude(alvo).percentil(tarefa, 0.95)
+            if p95 is not None:
+                espera = max(0.0, inicio + max(p95, HEDGE_MIN) - time.monotonic())
+        prontos, _ = wait(list(em_voo), timeout=espera, return_when=FIRST_COMPLETED)
+        if not prontos:
+            hedges -= 1
+            logger.info("[LLM rota/%s] %s passou do p95 — hedge em %s", tarefa, alvo, fila[0])
+            _disparar(eh_hedge=True)
+            continue
+        for futuro in prontos:
+            alvo, _, eh_hedge = em_voo.pop(futuro)
+            try:
+                resposta = futuro.result()
+            except Exception as exc:
+                erros.append(f"{alvo}: {exc}")
+                logger.warning("[LLM rota/%s] %s falhou: %s", tarefa, alvo, exc)
+                continue
+            if erros:
+                logger.info("[LLM rota/%s] respondido por %s após %d falha(s)", tarefa, alvo, len(erros))
+            resposta.update(hedge=eh_hedge, erros=erros)
+            return resposta
+    raise LLMIndisponivel(tarefa, erros)
+
+
+def transmitir(
+    tarefa: str,
+    mensagens: List[Dict],
+    system: Optional[str] = None,
+    max_tokens: int = 4000,
+    temperature: Optional[float] = None,
+    rota_padrao: Optional[Sequence[str]] = None,
+    clientes: Optional[Dict[str, object]] = None,
+    resultado: Optional[Dict] = None,
+):
+    """Gerador dos trechos de texto da resposta, na rota da tarefa.
+
+    Falha antes do primeiro trecho passa para o próximo alvo; depois dele,
+    a exceção é propagada. Ao terminar, `resultado` recebe as mesmas chaves
+    de completar() mais primeiro_trecho (s até o primeiro texto).
+    """
+    pedido = {"mensagens": mensagens, "system": system, "max_tokens": max_tokens,
+              "temperature": temperature}
+    clientes = clientes or {}
+    resultado = {} if resultado is None else resultado
+    fila = _ordenar(_alvos_disponiveis(tarefa, rota_padrao, clientes))
+    erros = [f"{a}: sem credencial" for a in rota(tarefa, rota_padrao) if a not in fila]
+
+    for alvo in fila:
+        provedor, _, modelo = alvo.partition(":")
+        client = clientes.get(provedor) or _cliente(provedor)
+        transmitir_alvo = _transmitir_anthropic if provedor == "anthropic" else _transmitir_openai
+        meta: Dict = {}
+        partes: List[str] = []
+        inicio = time.monotonic()
+        primeiro = None
+        try:
+            for trecho in transmitir_alvo(client, modelo, pedido, meta):
+                if primeiro is None:
+                    primeiro = time.monotonic() - inicio
+                partes.append(trecho)
+                yield trecho
+        except Exception as exc:
+            saude(alvo).falha(_status(exc), _retry_after(exc))
+            erros.append(f"{alvo}: {exc}")
+            logger.warning("[LLM rota/%s] %s falhou%s: %s", tarefa, alvo,
+                           " no meio do streaming" if partes else "", exc)
+            if partes:
+                raise
+            continue
+        latencia = time.monotonic() - inicio
+        saude(alvo).sucesso(tarefa, latencia)
+        if erros:
+            logger.info("[LLM rota/%s] respondido por %s após %d falha(s)", tarefa, alvo, len(erros))
+        resultado.update(
+            texto="".join(partes), modelo=meta.get("modelo") or modelo, provedor=provedor,
+            alvo=alvo, input_tokens=meta.get("input_tokens"), output_tokens=meta.get("output_tokens"),
+            latencia=round(latencia, 3), primeiro_trecho=round(primeiro or latencia, 3),
+            hedge=False, erros=erros,
+        )
+        return
+    raise LLMIndisponivel(tarefa, erros)
@@ -5,10 +5,20 @@
 # Schema de octadesk_chats/octadesk_messages: `id` é autoincrement (PK,
 # gerado pelo MySQL, nunca escrito aqui); a chave natural/UNIQUE é
 # `chat_id`/`message_id`. Ver api-analises/INFRA.md §2.1 para o DDL.
+#
+# Escrita em massa: um engine por processo (pool reaproveitado entre
+# chamadas) e upserts multi-linha via executemany em lotes de
+# OCTADESK_MYSQL_CHUNK linhas, cada lote na sua transação. Se um lote
+# falhar, ele é repetido linha a linha para isolar o registro problemático.
+#
+# ENV VARS:
+#   OCTADESK_MYSQL_CHUNK — linhas por upsert multi-linha (default 500)
 
 import json
 import logging
 import os
+import threading
+import time
 from datetime import datetime
 from typing import List, Optional
 
@@ -16,13 +26,19 @@ from sqlalchemy import text
 
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = max(1, int(os.getenv("OCTADESK_MYSQL_CHUNK", "500")))
+
 
 # ──────────────────────────────────────────────────────────────────────────────
 # CONEXÃO — suporta contexto com e sem Streamlit (cron/script)
 # ──────────────────────────────────────────────────────────────────────────────
 
-def _get_engine():
-    """Retorna engine MySQL de escrita, compatível com Streamlit e cron."""
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def _create_engine():
+    """Cria engine MySQL de escrita, compatível com Streamlit e cron."""
     # Tenta via conector padrão do projeto (usa st.secrets ou .env)
     try:
         from conexao.mysql_connector import conectar_mysql_writer
@@ -58,12 +74,56 @@ def _get_engine():
             port=int(creds["port"]),
             database=creds["db_name"],
         )
-        return create_engine(url, pool_recycle=3600)
+        return create_engine(url, pool_recycle=3600, pool_pre_ping=True)
     except Exception as e:
         logger.error("Erro ao criar engine MySQL: %s", e)
         return None
 
 
+def _get_engine():
+    """Retorna o engine de escrita do processo (criado na primeira chamada).
+
+    Falhas não são memorizadas: a próxima chamada tenta criar de novo.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_engine()
+    return _engine
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# ESTATÍSTICAS DE ESCRITA (throughput reportado no log de sync)
+# ──────────────────────────────────────────────────────────────────────────────
+
+_stats_lock = threading.Lock()
+_stats = {"chats": 0, "messages": 0, "chunks": 0, "errors": 0, "seconds": 0.0}
+
+
+def _record(kind: str, rows: int, chunks: int, errors: int, seconds: float):
+    with _stats_lock:
+        _stats[kind] += rows
+        _stats["chunks"] += chunks
+        _stats["errors"] += errors
+        _stats["seconds"] += seconds
+
+
+def get_write_stats() -> dict:
+    """Totais acumulados no processo: linhas, lotes, erros, tempo e linhas/s."""
+    with _stats_lock:
+        stats = dict(_stats)
+    rows = stats["chats"] + stats["messages"]
+    stats["rows_per_second"] = rows / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def reset_write_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0.0 if key == "seconds" else 0
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # HELPERS
 # ──────────────────────────────────────────────────────────────────────────────
@@ -179,9 +239,63 @@ _INSERT_SYNC_LOG = text("""
 """)
 
 
+def _upsert(stmt, rows: List[dict], kind: str, label: str) -> int:
+    """Executa o upsert em lotes de CHUNK_SIZE linhas. Retorna linhas gravadas."""
+    engine = _get_engine()
+    if engine is None:
+        logger.error("%s: engine indisponível, abortando.", label)
+        return 0
+
+    saved = chunks = errors = 0
+    key = "chat_id" if kind == "chats" else "message_id"
+    t0 = time.perf_counter()
+    for i in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[i:i + CHUNK_SIZE]
+        chunks += 1
+        try:
+            with engine.begin() as conn:
+                conn.execute(stmt, chunk)
+            saved += len(chunk)
+            continue
+        except Exception as e:
+            logger.warning("%s: lote de %d falhou (%s); repetindo linha a linha.", label, len(chunk), e)
+        for row in chunk:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(stmt, row)
+                saved += 1
+            except Exception as e:
+                errors += 1
+                logger.warning("%s: erro ao salvar %s: %s", label, row.get(key), e)
+    _record(kind, saved, chunks, errors, time.perf_counter() - t0)
+    return saved
+
+
+def _chat_params(chat: dict, cached_at: str) -> dict:
+    return {
+        "chat_id":   chat["id"],
+        "raw_json":  json.dumps(chat, ensure_ascii=False, default=str),
+        "cached_at": cached_at,
+        **_extract_fields(chat),
+    }
+
+
+def _message_params(chat_id: str, msg: dict, idx: int, cached_at: str) -> dict:
+    return {
+        "message_id": msg.get("id") or msg.get("_id") or f"{chat_id}_{idx}",
+        "chat_id":    chat_id,
+        "raw_json":   json.dumps(msg, ensure_ascii=False, default=str),
+        "cached_at":  cached_at,
+    }
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
 def save_chats_mysql(chats_list: list, cached_at: Optional[str] = None) -> int:
     """
-    Insere ou atualiza chats no MySQL.
+    Insere ou atualiza uma página (ou mais) de chats no MySQL com upserts multi-linha.
     Retorna a quantidade de chats processados com sucesso.
 
     Args:
@@ -191,34 +305,9 @@ def save_chats_mysql(chats_list: list, cached_at: Optional[str] = None) -> int:
     if not chats_list:
         return 0
 
-    engine = _get_engine()
-    if engine is None:
-        logger.error("save_chats_mysql: engine indisponível, abortando.")
-        return 0
-
-    saved = 0
-    _cached_at = cached_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    try:
-        with engine.begin() as conn:
-            for chat in chats_list:
-                chat_id = chat.get("id")
-                if not chat_id:
-                    continue
-                fields = _extract_fields(chat)
-                try:
-                    conn.execute(_INSERT_CHAT, {
-                        "chat_id":          chat_id,
-                        "raw_json":         json.dumps(chat, ensure_ascii=False, default=str),
-                        "cached_at":        _cached_at,
-                        **fields,
-                    })
-                    saved += 1
-                except Exception as e:
-                    logger.warning("Erro ao salvar chat %s: %s", chat_id, e)
-    except Exception as e:
-        logger.error("Erro na transação save_chats_mysql: %s", e)
-
+    _cached_at = cached_at or _now()
+    rows = [_chat_params(chat, _cached_at) for chat in chats_list if chat.get("id")]
+    saved = _upsert(_INSERT_CHAT, rows, "chats", "save_chats_mysql")
     logger.info("save_chats_mysql: %d/%d chats salvos no MySQL.", saved, len(chats_list))
     return saved
 
@@ -230,33 +319,32 @@ def save_messages_mysql(chat_id: str, messages_list: list, cached_at: Optional[s
     """
     if not messages_list or not chat_id:
         return 0
+    return save_messages_mysql_batch({chat_id: messages_list}, cached_at=cached_at)
 
-    engine = _get_engine()
-    if engine is None:
-        logger.error("save_messages_mysql: engine indisponível, abortando.")
-        return 0
-
-    saved = 0
-    _cached_at = cached_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    try:
-        with engine.begin() as conn:
-            for idx, msg in enumerate(messages_list):
-                msg_id = msg.get("id") or msg.get("_id") or f"{chat_id}_{idx}"
-                try:
-                    conn.execute(_INSERT_MESSAGE, {
-                        "message_id": msg_id,
-                        "chat_id":    chat_id,
-                        "raw_json":   json.dumps(msg, ensure_ascii=False, default=str),
-                        "cached_at":  _cached_at,
-                    })
-                    saved += 1
-                except Exception as e:
-                    logger.warning("Erro ao salvar mensagem %s: %s", msg_id, e)
-    except Exception as e:
-        logger.error("Erro na transação save_messages_mysql (chat %s): %s", chat_id, e)
+def save_messages_mysql_batch(
+    messages_by_chat: dict,
+    cached_at: Optional[str] = None,
+    cached_at_by_chat: Optional[dict] = None,
+) -> int:
+    """
+    Insere ou atualiza mensagens de vários chats com upserts multi-linha.
+    messages_by_chat: {chat_id: [mensagens]}. cached_at_by_chat permite preservar
+    o cached_at original de cada chat (migração). Retorna a quantidade de mensagens gravadas.
+    """
+    if not messages_by_chat:
+        return 0
 
-    return saved
+    _cached_at = cached_at or _now()
+    cached_at_by_chat = cached_at_by_chat or {}
+    rows = [
+        _message_params(chat_id, msg, idx, cached_at_by_chat.get(chat_id) or _cached_at)
+        for chat_id, messages_list in messages_by_chat.items() if chat_id
+        for idx, msg in enumerate(messages_list or [])
+    ]
+    if not rows:
+        return 0
+    return _upsert(_INSERT_MESSAGE, rows, "messages", "save_messages_mysql_batch")
 
 
 def log_sync_mysql(
@@ -270,7 +358,17 @@ def log_sync_mysql(
     duration_seconds: Optional[float] = None,
     error_message: Optional[str] = None,
 ) -> bool:
-    """Registra uma entrada de log de sincronização no MySQL."""
+    """Registra uma entrada de log de sincronização no MySQL.
+
+    O throughput de escrita acumulado no processo (get_write_stats) vai para o log.
+    """
+    stats = get_write_stats()
+    if stats["chunks"]:
+        logger.info(
+            "Escrita MySQL (%s): %d chats + %d mensagens em %.1fs — %.0f linhas/s, %d lotes, %d erros",
+            sync_type, stats["chats"], stats["messages"], stats["seconds"],
+            stats["rows_per_second"], stats["chunks"], stats["errors"],
+        )
     engine = _get_engine()
     if engine is None:
         return False
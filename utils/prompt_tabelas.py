@@ -0,0 +1,215 @@
+"""
+Tabelas de DataFrame formatadas para prompts, com orçamento de tokens.
+
+As páginas montavam as tabelas dos prompts linha a linha (iterrows + concatenação
+de strings) e mandavam tudo, ou cortavam num número fixo de linhas sem olhar o
+tamanho. Aqui:
+  1. a formatação é por coluna (operações .str do pandas sobre o frame
+     inteiro), em markdown ou CSV;
+  2. o corte é por orçamento de tokens da seção: as linhas são ordenadas pela
+     coluna de prioridade (ou mantidas na ordem recebida), o tamanho
+     acumulado é comparado com o orçamento e ficam as que cabem — sempre ao
+     menos uma — com uma nota de quantas ficaram de fora;
+  3. o texto pronto é memorizado pela impressão digital dos dados (hash do
+     conteúdo + colunas + parâmetros): o mesmo frame formatado de novo no
+     rerun do Streamlit ou no relatório seguinte não é refeito.
+
+Tokens estimados pela razão chars/token de utils.llm_limiter (recalibrada com
+o usage da API) do modelo informado.
+
+Uso:
+    from utils import prompt_tabelas
+    texto = prompt_tabelas.tabela(df, "Top campanhas", max_linhas=50)
+    texto = prompt_tabelas.tabela(df, "Vendedores", formato="csv", ordenar_por="Receita")
+
+    # formatação própria (blocos de texto por linha) com o mesmo corte/cache:
+    mascara = prompt_tabelas.linhas_no_orcamento(textos, max_tokens=4000, prioridade=df["Custo"])
+    texto = prompt_tabelas.memorizar(("bloco", rotulo), df, lambda: montar(df))
+
+ENV VARS:
+  PROMPT_TOKENS_TABELA     — orçamento padrão de cada tabela (default 2500)
+  PROMPT_TOKENS_CAMPANHAS  — orçamento de cada bloco de campanhas dos
+                             Relatórios IA (default 12000)
+  PROMPT_TABELAS_CACHE     — textos memorizados, 0 desliga (default 256)
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils import llm_limiter
+
+logger = logging.getLogger(__name__)
+
+TOKENS_TABELA = int(os.getenv("PROMPT_TOKENS_TABELA", "2500"))
+TOKENS_CAMPANHAS = int(os.getenv("PROMPT_TOKENS_CAMPANHAS", "12000"))
+CACHE_MAX = int(os.getenv("PROMPT_TABELAS_CACHE", "256"))
+
+VAZIO = "—"
+
+_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def impressao_digital(df: Optional[pd.DataFrame]) -> Optional[str]:
+    """Hash do conteúdo, colunas e tipos do frame. None se houver células não hasheáveis."""
+    if df is None:
+        return "none"
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((list(map(str, df.columns)), list(map(str, df.dtypes)), df.shape)).encode())
+    try:
+        h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    except TypeError:
+        # listas/dicts nas células: sem cache, formata sempre
+        return None
+    return h.hexdigest()
+
+
+def memorizar(partes: Hashable, df: Optional[pd.DataFrame], gerar: Callable[[], str]) -> str:
+    """Devolve gerar() memorizado por (partes, impressão digital de df)."""
+    if CACHE_MAX <= 0:
+        return gerar()
+    digital = impressao_digital(df)
+    if digital is None:
+        return gerar()
+    chave = (partes, digital)
+    with _cache_lock:
+        if chave in _cache:
+            _cache.move_to_end(chave)
+            return _cache[chave]
+    texto = gerar()
+    with _cache_lock:
+        _cache[chave] = texto
+        while len(_cache) > CACHE_MAX:
+            _cache.popitem(last=False)
+    return texto
+
+
+def limpar_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
+def valores_texto(df: pd.DataFrame) -> pd.DataFrame:
+    """Células como texto de uma linha: nulos/vazios → '—', '|' → '/', quebras → espaço."""
+    saida = {}
+    for col in df.columns:
+        serie = df[col]
+        nulos = serie.isna().to_numpy()
+        texto = serie.astype(str).str.replace("|", "/", regex=False).str.replace("\n", " ", regex=False).str.strip()
+        saida[col] = texto.mask(nulos | (texto == "").to_numpy(), VAZIO)
+    return pd.DataFrame(saida, index=df.index, columns=df.columns)
+
+
+def linhas_no_orcamento(
+    textos: pd.Series,
+    max_tokens: Optional[int],
+    prioridade: Optional[pd.Series] = None,
+    ascendente: bool = False,
+    modelo: str = "",
+    separador: int = 1,
+) -> np.ndarray:
+    """Máscara (na ordem de `textos`) das linhas que cabem em max_tokens.
+
+    Com `prioridade`, as linhas entram da maior para a menor (ou o contrário
+    com ascendente=True); sem ela, na ordem recebida. Fica sempre ao menos uma.
+    """
+    n = len(textos)
+    if not max_tokens or max_tokens <= 0 or n == 0:
+        return np.ones(n, dtype=bool)
+    limite = max_tokens * llm_limiter.limitador(modelo).chars_por_token
+    tamanhos = textos.str.len().fillna(0).to_numpy() + separador
+    if tamanhos.sum() <= limite:
+        return np.ones(n, dtype=bool)
+
+    if prioridade is not None:
+        chave = pd.to_numeric(pd.Series(prioridade).reset_index(drop=True), errors="coerce")
+        chave = chave.fillna(np.inf if ascendente else -np.inf).to_numpy()
+        ordem = np.argsort(chave if ascendente else -chave, kind="stable")
+    else:
+        ordem = np.arange(n)
+    cabem = max(1, int(np.searchsorted(np.cumsum(tamanhos[ordem]), limite, side="right")))
+    mascara = np.zeros(n, dtype=bool)
+    mascara[ordem[:cabem]] = True
+    return mascara
+
+
+def _markdown(valores: pd.DataFrame) -> pd.Series:
+    linhas = pd.Series("| ", index=valores.index)
+    for i, col in enumerate(valores.columns):
+        linhas = linhas + (" | " if i else "") + valores[col]
+    return linhas + " |"
+
+
+def _csv(valores: pd.DataFrame):
+    # valores_texto já tirou as quebras de linha: uma linha de CSV por linha do frame
+    cabecalho, *linhas = valores.to_csv(index=False, lineterminator="\n").rstrip("\n").split("\n")
+    return cabecalho, pd.Series(linhas, index=valores.index, dtype=object)
+
+
+def tabela(
+    df: Optional[pd.DataFrame],
+    titulo: str,
+    formato: str = "markdown",
+    max_tokens: Optional[int] = None,
+    ordenar_por: Optional[str] = None,
+    ascendente: bool = False,
+    max_linhas: Optional[int] = None,
+    modelo: str = "",
+    vazio: str = "Sem dados disponíveis no período.",
+) -> str:
+    """Seção '### titulo' com o frame em markdown ou CSV, dentro do orçamento.
+
+    max_tokens=None usa PROMPT_TOKENS_TABELA (0 = sem corte por tokens).
+    max_linhas corta antes do orçamento (mantém o 'top N' das páginas).
+    ordenar_por escolhe quais linhas sobrevivem ao corte; as que ficam saem
+    na ordem original do frame.
+    """
+    if df is None or df.empty:
+        return f"### {titulo}\n{vazio}\n"
+    if formato not in ("markdown", "csv"):
+        raise ValueError(f"formato desconhecido: {formato}")
+    max_tokens = TOKENS_TABELA if max_tokens is None else max_tokens
+    partes = ("tabela", titulo, formato, max_tokens, ordenar_por, ascendente, max_linhas, modelo, vazio)
+    return memorizar(partes, df, lambda: _tabela(df, titulo, formato, max_tokens, ordenar_por,
+                                                 ascendente, max_linhas, modelo))
+
+
+def _tabela(df, titulo, formato, max_tokens, ordenar_por, ascendente, max_linhas, modelo) -> str:
+    total = len(df)
+    trabalho = df
+    if max_linhas is not None and total > max_linhas:
+        if ordenar_por in df.columns:
+            trabalho = df[df[ordenar_por].rank(method="first", ascending=ascendente).le(max_linhas).to_numpy()]
+        else:
+            trabalho = df.head(max_linhas)
+
+    valores = valores_texto(trabalho)
+    if formato == "markdown":
+        cabecalho = [str(c) for c in trabalho.columns]
+        topo = ["| " + " | ".join(cabecalho) + " |", "| " + " | ".join(["---"] * len(cabecalho)) + " |"]
+        linhas = _markdown(valores)
+    else:
+        cabecalho, linhas = _csv(valores)
+        topo = [cabecalho]
+
+    orcamento = max_tokens - llm_limiter.contar_tokens("\n".join([f"### {titulo}", *topo]), modelo) \
+        if max_tokens else None
+    prioridade = trabalho[ordenar_por] if ordenar_por in trabalho.columns else None
+    mascara = linhas_no_orcamento(linhas, max(orcamento, 1) if orcamento is not None else None,
+                                  prioridade, ascendente, modelo)
+    saida = [f"### {titulo}", *topo, *linhas[mascara].tolist()]
+
+    mantidas = int(mascara.sum())
+    if mantidas < len(trabalho):
+        saida.append(f"*top {mantidas} de {total} linhas (orçamento de {max_tokens} tokens)*")
+        logger.debug("tabela '%s': %d de %d linhas no orçamento de %d tokens", titulo, mantidas, total, max_tokens)
+    elif len(trabalho) < total:
+        saida.append(f"*top {len(trabalho)} de {total} linhas*")
+    return "\n".join(saida) + "\n"
@@ -0,0 +1,127 @@
+"""
+Limitador de taxa (token bucket) compartilhado entre threads.
+
+Cada chamada a uma API externa consome um token; os tokens são repostos a
+uma taxa constante até a capacidade (rajada) do balde. Threads que chegam
+com o balde vazio dormem só o necessário para o próximo token — ou menos:
+ajustar/sincronizar/configurar acordam quem espera, que refaz a conta (um
+crédito devolvido por outra chamada libera a espera na hora).
+
+    limiter = TokenBucket(taxa=5, capacidade=10)   # 5 req/s, rajadas de até 10
+    limiter.acquire()
+    requests.get(...)
+
+penalizar(segundos) esvazia o balde e suspende novas aquisições por um
+tempo — usado quando a API responde 429 com Retry-After, para que todas as
+threads recuem juntas em vez de cada uma insistir por conta própria.
+
+Para orçamentos que só se conhecem depois da chamada (tokens de LLM):
+ajustar(delta) credita/debita a diferença entre o reservado e o consumido
+(o saldo pode ficar negativo — as próximas aquisições esperam a dívida),
+sincronizar(disponivel) alinha o saldo ao que o servidor informa e
+configurar(taxa, capacidade) troca os limites em tempo de execução.
+
+acquire_async é a variante para asyncio (mesmo balde, compartilhado com as
+threads): a espera é um asyncio.sleep em fatias de até _FATIA_ASYNC, então
+centenas de corrotinas podem aguardar orçamento sem ocupar threads e ainda
+enxergam créditos devolvidos no meio da espera.
+"""
+
+import asyncio
+import threading
+import time
+
+_FATIA_ASYNC = 0.25  # s — maior espera de acquire_async antes de conferir o saldo de novo
+
+
+class TokenBucket:
+    """Token bucket thread-safe."""
+
+    def __init__(self, taxa: float, capacidade: float = None):
+        if taxa <= 0:
+            raise ValueError("taxa deve ser positiva")
+        self.taxa = float(taxa)
+        self.capacidade = float(capacidade if capacidade is not None else max(taxa, 1))
+        self._tokens = self.capacidade
+        self._ultimo = time.monotonic()
+        self._bloqueado_ate = 0.0
+        self._lock = threading.Lock()
+        self._mudou = threading.Condition(self._lock)  # saldo creditado / limites trocados
+
+    def _repor(self, agora: float):
+        if agora <= self._ultimo:  # ainda dentro de uma penalização
+            return
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    def _tentar(self, tokens: float) -> float:
+        """tentar com o lock já adquirido."""
+        tokens = min(tokens, self.capacidade)
+        agora = time.monotonic()
+        if agora < self._bloqueado_ate:
+            return self._bloqueado_ate - agora
+        self._repor(agora)
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.taxa
+
+    def tentar(self, tokens: float = 1.0) -> float:
+        """Versão não bloqueante de acquire: consome e retorna 0, ou retorna quanto esperar (s)."""
+        with self._lock:
+            return self._tentar(tokens)
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Bloqueia até haver `tokens` disponíveis. Retorna o tempo total de espera (s).
+
+        Pedidos maiores que a capacidade são limitados a ela (senão esperariam para sempre).
+        """
+        inicio = time.monotonic()
+        with self._mudou:
+            while True:
+                espera = self._tentar(tokens)
+                if espera <= 0:
+                    return time.monotonic() - inicio
+                self._mudou.wait(espera)
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        """acquire para corrotinas: espera com asyncio.sleep, sem ocupar a thread do loop."""
+        inicio = time.monotonic()
+        while True:
+            espera = self.tentar(tokens)
+            if espera <= 0:
+                return time.monotonic() - inicio
+            await asyncio.sleep(min(espera, _FATIA_ASYNC))
+
+    def penalizar(self, segundos: float):
+        """Zera o balde e impede novas aquisições pelos próximos `segundos`."""
+        with self._lock:
+            agora = time.monotonic()
+            self._tokens = 0.0
+            self._ultimo = agora + segundos
+            self._bloqueado_ate = max(self._bloqueado_ate, agora + segundos)
+
+    def ajustar(self, delta: float):
+        """Soma `delta` ao saldo (negativo = débito), sem passar da capacidade."""
+        with self._mudou:
+            self._repor(time.monotonic())
+            self._tokens = min(self.capacidade, self._tokens + delta)
+            self._mudou.notify_all()
+
+    def sincronizar(self, disponivel: float):
+        """Reduz o saldo local para `disponivel` se o servidor informar menos."""
+        with self._mudou:
+            self._repor(time.monotonic())
+            self._tokens = min(self._tokens, float(disponivel))
+            self._mudou.notify_all()
+
+    def configurar(self, taxa: float, capacidade: float = None):
+        """Troca taxa e capacidade mantendo o saldo atual (limitado à nova capacidade)."""
+        if taxa <= 0:
+            raise ValueError("taxa deve ser positiva")
+        with self._mudou:
+            self._repor(time.monotonic())
+            self.taxa = float(taxa)
+            self.capacidade = float(capacidade if capacidade is not None else max(taxa, 1))
+            self._tokens = min(self._tokens, self.capacidade)
+            self._mudou.notify_all()
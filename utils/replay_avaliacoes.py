@@ -0,0 +1,633 @@
+"""
+Fixtures e servidor falso para benchmark offline das avaliações de IA.
+
+Medir vazão (workers, limitador, lote) contra as APIs reais custa dinheiro e
+varia com a carga do provedor. Este módulo grava pares pedido/resposta reais
+uma vez e depois os serve localmente, com latência, erros e 429 controlados:
+
+  - Sanitizador: mascara e-mail, CPF/CNPJ, telefone, URLs e sequências
+    longas de dígitos e troca os nomes dos remetentes ("2026-01-02 10:00:00 -
+    Nome:") por pseudônimos estáveis ("Pessoa 3f2a1c"), inclusive onde o nome
+    reaparece no texto e na resposta do modelo. Nomes de bot são mantidos
+    (a triagem depende deles). Transcrições de ligação não têm remetente por
+    linha: os nomes vêm dos campos do payload do job (agente, contato —
+    nomes_do_payload) e uma entrada sem nenhum nome aprendido gera aviso.
+    É best-effort: revise antes de versionar.
+  - Fixtures (JSONL): linhas {"tipo": "entrada", canal, texto, ...} com as
+    conversas sanitizadas e {"tipo": "par", api, chave, tipo_pedido, pedido,
+    resposta, cabecalhos, latencia}.
+  - ServidorReplay: HTTP local no formato das APIs (POST /v1/messages da
+    Anthropic e /v1/chat/completions da OpenAI — os SDKs apontam para ele
+    por ANTHROPIC_BASE_URL / OPENAI_BASE_URL). Cada pedido é respondido pelo
+    par de mesma chave (system + última mensagem), senão por um par do mesmo
+    tipo de pedido (mesmo system), senão por qualquer par da API.
+    Também simula a Message Batches da Anthropic (POST /v1/messages/batches,
+    GET .../{id} e .../{id}/results): cada pedido do lote é respondido pelas
+    fixtures na criação e o lote fica 'in_progress' até a maior latência
+    sorteada dos itens + latencia_batch.
+    Com upstream=True vira proxy de gravação: repassa às APIs reais e guarda
+    o par sanitizado (batches não são gravados: grave pelo caminho síncrono).
+
+Perfis (PERFIS, sobrescrevíveis campo a campo):
+  latencia       — segundos fixos por resposta (None = a latência gravada)
+  fator_latencia — multiplica a latência (gravada ou fixa)
+  jitter         — variação relativa uniforme (0.3 = ±30%)
+  erro           — fração de respostas 529/500
+  taxa_429       — fração de respostas 429 aleatórias
+  rpm            — limite de requisições/min do servidor (0 = sem limite); acima dele, 429
+  retry_after    — segundos no retry-after dos 429 aleatórios
+  latencia_batch — segundos extras até um lote de batch terminar (default 0)
+
+ENV VARS:
+  REPLAY_FIXTURES      — arquivo de fixtures (default data_cache/replay_avaliacoes.jsonl)
+  REPLAY_UPSTREAM_ANTHROPIC / REPLAY_UPSTREAM_OPENAI — destino do proxy de gravação
+                         (default https://api.anthropic.com / https://api.openai.com)
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_PADRAO = Path(os.getenv(
+    "REPLAY_FIXTURES",
+    str(Path(__file__).resolve().parent.parent / "data_cache" / "replay_avaliacoes.jsonl"),
+))
+UPSTREAM = {
+    "anthropic": os.getenv("REPLAY_UPSTREAM_ANTHROPIC", "https://api.anthropic.com"),
+    "openai": os.getenv("REPLAY_UPSTREAM_OPENAI", "https://api.openai.com"),
+}
+
+PERFIS = {
+    "ideal": {"latencia": None, "fator_latencia": 1.0, "jitter": 0.0, "erro": 0.0, "taxa_429": 0.0, "rpm": 0, "retry_after": 1},
+    "rapido": {"latencia": 0.05, "fator_latencia": 1.0, "jitter": 0.0, "erro": 0.0, "taxa_429": 0.0, "rpm": 0, "retry_after": 1},
+    "lento": {"latencia": None, "fator_latencia": 3.0, "jitter": 0.5, "erro": 0.0, "taxa_429": 0.0, "rpm": 0, "retry_after": 1},
+    "instavel": {"latencia": None, "fator_latencia": 1.0, "jitter": 0.3, "erro": 0.05, "taxa_429": 0.05, "rpm": 0, "retry_after": 2},
+    "limitado": {"latencia": None, "fator_latencia": 1.0, "jitter": 0.2, "erro": 0.0, "taxa_429": 0.0, "rpm": 50, "retry_after": 1},
+}
+
+# Cabeçalhos de resposta guardados na gravação e devolvidos no replay
+# (os limites da conta; o llm_limiter se ajusta a eles como em produção)
+_CABECALHOS_GRAVADOS = re.compile(r"^(anthropic-ratelimit-.*-limit|x-ratelimit-limit-.*)$", re.I)
+
+
+# ---------------------------------------------------------------------------
+# Sanitização
+# ---------------------------------------------------------------------------
+
+_RE_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_RE_URL = re.compile(r"https?://\S+")
+_RE_CNPJ = re.compile(r"\b\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}\b")
+_RE_CPF = re.compile(r"\b\d{3}\.?\d{3}\.?\d{3}-?\d{2}\b")
+_RE_TELEFONE = re.compile(r"(?:\+?55\s?)?\(?\b\d{2}\)?\s?9?\d{4}[-\s]?\d{4}\b")
+_RE_DIGITOS = re.compile(r"\d{8,}")
+# "2026-01-02 10:00:00 - Nome:" (Octadesk) e "10:00 Nome:" (utils.compactacao)
+_RE_REMETENTE = re.compile(
+    r"(?m)^\s*(?:\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}\s*-|\d{2}:\d{2})\s*([^:\n]{2,60}?):"
+)
+_RE_PSEUDONIMO = re.compile(r"^Pessoa [0-9a-f]{6}$")
+_CHAVES_NOME = ("nome", "name", "contato", "contact", "agent", "agente", "vendedor")
+_NAO_NOMES = ("não identificado", "nao identificado", "desconhecido", "nan", "none")
+
+
+def _pseudonimo(nome: str) -> str:
+    return "Pessoa " + hashlib.sha1(nome.strip().lower().encode("utf-8")).hexdigest()[:6]
+
+
+class Sanitizador:
+    """Mascara dados pessoais de um pedido/resposta (mesmos pseudônimos nos dois)."""
+
+    def __init__(self, nomes: Optional[Dict[str, str]] = None):
+        self.nomes: Dict[str, str] = dict(nomes or {})
+
+    def _eh_bot(self, nome: str) -> bool:
+        from utils.chat_ia_analyzer import _eh_nome_bot
+        return _eh_nome_bot(nome)
+
+    def aprender_nome(self, nome) -> None:
+        if not isinstance(nome, str):
+            return
+        nome = nome.strip()
+        if len(nome) < 3 or nome.lower() in _NAO_NOMES or _RE_PSEUDONIMO.match(nome) or self._eh_bot(nome):
+            return
+        self.nomes.setdefault(nome, _pseudonimo(nome))
+        primeiro = nome.split()[0]
+        if len(primeiro) >= 3 and primeiro != nome:
+            self.nomes.setdefault(primeiro, self.nomes[nome])
+
+    def aprender(self, valor) -> None:
+        """Coleta remetentes das linhas de chat e valores de chaves de nome (dicts)."""
+        if isinstance(valor, str):
+            for m in _RE_REMETENTE.finditer(valor):
+                self.aprender_nome(m.group(1))
+        elif isinstance(valor, dict):
+            for k, v in valor.items():
+                if isinstance(v, str) and any(c in str(k).lower() for c in _CHAVES_NOME):
+                    self.aprender_nome(v)
+                self.aprender(v)
+        elif isinstance(valor, (list, tuple)):
+            for v in valor:
+                self.aprender(v)
+
+    def texto(self, s: str) -> str:
+        s = _RE_EMAIL.sub("email@exemplo.com", s)
+        s = _RE_URL.sub("https://link.exemplo", s)
+        s = _RE_CNPJ.sub("00.000.000/0000-00", s)
+        s = _RE_CPF.sub("000.000.000-00", s)
+        s = _RE_TELEFONE.sub("(00) 00000-0000", s)
+        s = _RE_DIGITOS.sub(lambda m: "0" * len(m.group(0)), s)
+        # nomes mais longos primeiro ("Maria Souza" antes de "Maria")
+        for nome in sorted(self.nomes, key=len, reverse=True):
+            s = re.sub(rf"\b{re.escape(nome)}\b", self.nomes[nome], s)
+        return s
+
+    def valor(self, v):
+        if isinstance(v, str):
+            # JSON dentro de string (ex.: resposta do modelo) é sanitizado como texto
+            return self.texto(v)
+        if isinstance(v, dict):
+            return {k: self.valor(x) for k, x in v.items()}
+        if isinstance(v, list):
+            return [self.valor(x) for x in v]
+        return v
+
+
+def nomes_do_payload(payload: Optional[Dict]) -> List[str]:
+    """Nomes reais nos campos do payload de um job da fila (agente, contato, ...), inclusive em 'meta'."""
+    encontrados: List[str] = []
+    for origem in (payload or {}, (payload or {}).get("meta") or {}):
+        for k, v in origem.items():
+            if (isinstance(v, str) and any(c in str(k).lower() for c in _CHAVES_NOME)
+                    and v.strip().lower() not in _NAO_NOMES and v.strip() not in encontrados):
+                encontrados.append(v.strip())
+    return encontrados
+
+
+def sanitizar_entrada(entrada: Dict, nomes: Optional[Dict[str, str]] = None) -> Dict:
+    """Entrada {'canal', 'texto', 'contexto_adicional', 'agent_name', 'nomes'} sanitizada.
+    'nomes' (opcional) lista nomes reais de fora do texto (ver nomes_do_payload).
+    `nomes` (argumento, opcional) recebe os pseudônimos aprendidos, para reaproveitar nos pares."""
+    san = Sanitizador()
+    san.aprender(entrada)
+    san.aprender_nome(entrada.get("agent_name"))
+    for nome in entrada.get("nomes") or []:
+        san.aprender_nome(nome)
+    if not san.nomes:
+        logger.warning(
+            "Entrada de %s sem nomes aprendidos: nomes ditos no texto não serão mascarados — revise antes de versionar",
+            entrada.get("canal") or "canal desconhecido",
+        )
+    if nomes is not None:
+        nomes.update(san.nomes)
+    return san.valor(entrada)
+
+
+# ---------------------------------------------------------------------------
+# Chaves dos pedidos
+# ---------------------------------------------------------------------------
+
+def _texto(conteudo) -> str:
+    if isinstance(conteudo, str):
+        return conteudo
+    if isinstance(conteudo, list):
+        return "".join(_texto(b.get("text") if isinstance(b, dict) else b) for b in conteudo)
+    return ""
+
+
+def _partes(api: str, corpo: Dict):
+    mensagens = corpo.get("messages") or []
+    if api == "anthropic":
+        system = _texto(corpo.get("system"))
+    else:
+        system = "".join(_texto(m.get("content")) for m in mensagens if m.get("role") == "system")
+    usuario = [m for m in mensagens if m.get("role") == "user"]
+    return system, _texto(usuario[-1].get("content")) if usuario else ""
+
+
+def _hash(*partes: str) -> str:
+    return hashlib.sha1("\x1f".join(partes).encode("utf-8")).hexdigest()
+
+
+def chaves_pedido(api: str, corpo: Dict):
+    """(chave exata, tipo do pedido) de um corpo já sanitizado."""
+    system, usuario = _partes(api, corpo)
+    return _hash(api, system, usuario), _hash(api, system)
+
+
+def sanitizar_par(api: str, pedido: Dict, resposta: Dict, nomes: Optional[Dict[str, str]] = None):
+    san = Sanitizador(nomes)
+    san.aprender(pedido)
+    return san.valor(pedido), san.valor(resposta)
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+class Fixtures:
+    """Arquivo JSONL de entradas e pares; gravação por append (thread-safe)."""
+
+    def __init__(self, caminho: Path = FIXTURES_PADRAO):
+        self.caminho = Path(caminho)
+        self.entradas: List[Dict] = []
+        self.pares: List[Dict] = []
+        self._por_chave: Dict[str, Dict] = {}
+        self._por_tipo: Dict[str, List[Dict]] = {}
+        self._por_api: Dict[str, List[Dict]] = {}
+        self._nomes: Dict[str, str] = {}  # nomes das entradas desta gravação (sanitizam os pares)
+        self._lock = threading.Lock()
+        if self.caminho.exists():
+            with open(self.caminho, encoding="utf-8") as f:
+                for linha in f:
+                    if linha.strip():
+                        self._indexar(json.loads(linha))
+
+    def _indexar(self, item: Dict):
+        if item.get("tipo") == "entrada":
+            self.entradas.append(item)
+            return
+        self.pares.append(item)
+        self._por_chave[item["chave"]] = item
+        self._por_tipo.setdefault(item["tipo_pedido"], []).append(item)
+        self._por_api.setdefault(item["api"], []).append(item)
+
+    def _gravar(self, item: Dict):
+        with self._lock:
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.caminho, "a", encoding="utf-8") as f:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            self._indexar(item)
+
+    def adicionar_entrada(self, entrada: Dict):
+        self._gravar(dict(sanitizar_entrada(entrada, self._nomes), tipo="entrada"))
+
+    def adicionar_par(self, api: str, pedido: Dict, resposta: Dict, cabecalhos: Dict, latencia: float):
+        # chave só com o que o replay também enxerga (nomes do próprio pedido);
+        # o conteúdo guardado usa também os nomes das entradas
+        chave, tipo_pedido = chaves_pedido(api, sanitizar_par(api, pedido, {})[0])
+        pedido, resposta = sanitizar_par(api, pedido, resposta, self._nomes)
+        if chave in self._por_chave:
+            return
+        self._gravar({
+            "tipo": "par", "api": api, "chave": chave, "tipo_pedido": tipo_pedido,
+            "pedido": pedido, "resposta": resposta, "cabecalhos": cabecalhos,
+            "latencia": round(latencia, 3),
+        })
+
+    def entradas_do_canal(self, canal: str) -> List[Dict]:
+        base = "ligacao" if canal == "ligacao_openai" else canal
+        return [e for e in self.entradas if e.get("canal") == base]
+
+    def resposta_para(self, api: str, corpo: Dict):
+        """(par, como) — como ∈ 'exata', 'tipo', 'api'; (None, None) sem fixture da API."""
+        san = Sanitizador()
+        san.aprender(corpo)
+        chave, tipo_pedido = chaves_pedido(api, san.valor(corpo))
+        if chave in self._por_chave:
+            return self._por_chave[chave], "exata"
+        candidatos = self._por_tipo.get(tipo_pedido)
+        if candidatos:
+            return candidatos[int(chave[:8], 16) % len(candidatos)], "tipo"
+        candidatos = self._por_api.get(api)
+        if candidatos:
+            return candidatos[int(chave[:8], 16) % len(candidatos)], "api"
+        return None, None
+
+
+# ---------------------------------------------------------------------------
+# Servidor
+# ---------------------------------------------------------------------------
+
+_RE_BATCH = re.compile(r"/messages/batches(?:/([^/]+))?(?:/([^/]+))?$")
+
+
+def _api_do_caminho(caminho: str) -> Optional[str]:
+    caminho = caminho.split("?")[0].rstrip("/")
+    if caminho.endswith("/messages"):
+        return "anthropic"
+    if caminho.endswith("/chat/completions"):
+        return "openai"
+    return None
+
+
+def _corpo_erro(api: str, status: int, mensagem: str) -> Dict:
+    if api == "anthropic":
+        tipo = {400: "invalid_request_error", 404: "not_found_error", 429: "rate_limit_error",
+                529: "overloaded_error"}.get(status, "api_error")
+        return {"type": "error", "error": {"type": tipo, "message": mensagem}}
+    return {"error": {"message": mensagem, "type": "rate_limit_exceeded" if status == 429 else "server_error"}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        api = _api_do_caminho(self.path)
+        bruto = self.rfile.read(int(self.headers.get("content-length") or 0))
+        lote = _RE_BATCH.search(self.path.split("?")[0].rstrip("/"))
+        if lote:
+            if lote.group(1):
+                return self._responder(404, _corpo_erro("anthropic", 404, f"rota não simulada: {self.path}"))
+            if self.server.gravando:
+                return self._responder(501, _corpo_erro("anthropic", 501, "batches só no replay"))
+            try:
+                corpo = json.loads(bruto or b"{}")
+            except ValueError:
+                return self._responder(400, _corpo_erro("anthropic", 400, "JSON inválido"))
+            return self._responder(*self.server.criar_batch(corpo, self.headers))
+        if api is None:
+            return self._responder(404, {"error": {"message": f"rota não simulada: {self.path}"}})
+        try:
+            corpo = json.loads(bruto or b"{}")
+        except ValueError:
+            return self._responder(400, _corpo_erro(api, 400, "JSON inválido"))
+        if self.server.gravando:
+            return self._repassar(api, corpo, bruto)
+        status, resposta, cabecalhos = self.server.responder(api, corpo, self.headers)
+        self._responder(status, resposta, cabecalhos)
+
+    def do_GET(self):
+        lote = _RE_BATCH.search(self.path.split("?")[0].rstrip("/"))
+        if not lote or not lote.group(1) or lote.group(2) not in (None, "results"):
+            return self._responder(404, {"error": {"message": f"rota não simulada: {self.path}"}})
+        if self.server.gravando:
+            return self._responder(501, _corpo_erro("anthropic", 501, "batches só no replay"))
+        if lote.group(2) == "results":
+            return self._responder(*self.server.resultados_batch(lote.group(1), self.headers))
+        self._responder(*self.server.consultar_batch(lote.group(1), self.headers))
+
+    def _repassar(self, api: str, corpo: Dict, bruto: bytes):
+        import requests
+
+        cabecalhos = {k: v for k, v in self.headers.items()
+                      if k.lower() not in ("host", "content-length", "accept-encoding", "connection")}
+        inicio = time.monotonic()
+        try:
+            r = requests.post(UPSTREAM[api].rstrip("/") + self.path, data=bruto, headers=cabecalhos, timeout=600)
+        except Exception as e:
+            return self._responder(502, _corpo_erro(api, 502, f"upstream: {e}"))
+        latencia = time.monotonic() - inicio
+        resposta_cab = {k: v for k, v in r.headers.items()
+                        if k.lower() == "retry-after" or k.lower().startswith(("anthropic-", "x-ratelimit-", "request-id", "x-request-id"))}
+        try:
+            resposta = r.json()
+        except ValueError:
+            resposta = {"error": {"message": r.text[:500]}}
+        self.server.contar(r.status_code, self.headers, resposta if r.ok else None)
+        if r.ok:
+            self.server.fixtures.adicionar_par(
+                api, corpo, resposta,
+                {k: v for k, v in resposta_cab.items() if _CABECALHOS_GRAVADOS.match(k)}, latencia,
+            )
+        self._responder(r.status_code, resposta, resposta_cab)
+
+    def _responder(self, status: int, corpo, cabecalhos: Optional[Dict] = None):
+        """corpo: dict (JSON) ou bytes já prontos (JSONL dos resultados de batch)."""
+        if isinstance(corpo, bytes):
+            dados, tipo = corpo, "application/x-jsonl"
+        else:
+            dados, tipo = json.dumps(corpo, ensure_ascii=False).encode("utf-8"), "application/json"
+        self.send_response(status)
+        self.send_header("content-type", tipo)
+        self.send_header("content-length", str(len(dados)))
+        for k, v in (cabecalhos or {}).items():
+            self.send_header(k, str(v))
+        self.end_headers()
+        self.wfile.write(dados)
+
+
+class ServidorReplay(ThreadingHTTPServer):
+    """Servidor falso das APIs de LLM (replay) ou proxy de gravação (gravando=True).
+
+        with ServidorReplay(Fixtures(), perfil="instavel") as srv:
+            srv.iniciar()
+            os.environ["ANTHROPIC_BASE_URL"] = srv.url
+            ...
+            srv.estatisticas()
+    """
+
+    daemon_threads = True
+    request_queue_size = 256  # dezenas de conexões simultâneas dos SDKs
+
+    def __init__(self, fixtures: Fixtures, perfil="ideal", porta: int = 0,
+                 gravando: bool = False, semente: Optional[int] = None, **ajustes):
+        super().__init__(("127.0.0.1", porta), _Handler)
+        self.fixtures = fixtures
+        self.gravando = gravando
+        base = PERFIS[perfil] if isinstance(perfil, str) else perfil
+        self.perfil = dict(base, **{k: v for k, v in ajustes.items() if v is not None})
+        self._aleatorio = random.Random(semente)
+        self._balde = TokenBucket(self.perfil["rpm"] / 60, capacidade=max(1, self.perfil["rpm"] / 6)) \
+            if self.perfil.get("rpm") else None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._batches: Dict[str, Dict] = {}
+        self.zerar()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def iniciar(self) -> "ServidorReplay":
+        self._thread = threading.Thread(target=self.serve_forever, name="replay-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        super().__exit__(*exc)
+
+    # -- estatísticas ------------------------------------------------------
+
+    def zerar(self):
+        with self._lock:
+            self._stats = {
+                "requisicoes": 0, "sucessos": 0, "status": {}, "retentativas_sdk": 0,
+                "fixture": {"exata": 0, "tipo": 0, "api": 0},
+                "input_tokens": 0, "output_tokens": 0,
+                "batch": {"lotes": 0, "itens": 0, "erros": 0},
+            }
+
+    @staticmethod
+    def _somar_tokens(s: Dict, resposta: Dict):
+        usage = resposta.get("usage") or {}
+        s["input_tokens"] += (usage.get("input_tokens") or usage.get("prompt_tokens") or 0) + (
+            usage.get("cache_creation_input_tokens") or 0) + (usage.get("cache_read_input_tokens") or 0)
+        s["output_tokens"] += usage.get("output_tokens") or usage.get("completion_tokens") or 0
+
+    def contar(self, status: int, cabecalhos, resposta: Optional[Dict], como: Optional[str] = None):
+        with self._lock:
+            s = self._stats
+            s["requisicoes"] += 1
+            s["status"][str(status)] = s["status"].get(str(status), 0) + 1
+            if str(cabecalhos.get("x-stainless-retry-count") or "0") not in ("", "0"):
+                s["retentativas_sdk"] += 1
+            if como:
+                s["fixture"][como] += 1
+            if 200 <= status < 300:
+                s["sucessos"] += 1
+                self._somar_tokens(s, resposta or {})
+
+    def estatisticas(self) -> Dict:
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+    # -- replay --------------------------------------------------------------
+
+    def _sortear(self, fracao: float) -> bool:
+        with self._lock:
+            return fracao > 0 and self._aleatorio.random() < fracao
+
+    def _latencia(self, gravada: float) -> float:
+        p = self.perfil
+        base = p["latencia"] if p.get("latencia") is not None else gravada
+        base *= p.get("fator_latencia", 1.0)
+        if p.get("jitter"):
+            with self._lock:
+                base *= 1 + self._aleatorio.uniform(-p["jitter"], p["jitter"])
+        return max(0.0, base)
+
+    def _limitar(self, api: str, cabecalhos):
+        """429 pelo rpm do perfil ou sorteado (status, corpo, cabeçalhos); None se a requisição passa."""
+        p = self.perfil
+        if self._balde is not None:
+            espera = self._balde.tentar(1)
+            if espera > 0:
+                self.contar(429, cabecalhos, None)
+                return 429, _corpo_erro(api, 429, "rpm do perfil excedido"), {"retry-after": str(math.ceil(espera))}
+        if self._sortear(p.get("taxa_429", 0)):
+            self.contar(429, cabecalhos, None)
+            return 429, _corpo_erro(api, 429, "429 simulado"), {"retry-after": str(p.get("retry_after", 1))}
+        return None
+
+    def responder(self, api: str, corpo: Dict, cabecalhos):
+        p = self.perfil
+        limitado = self._limitar(api, cabecalhos)
+        if limitado:
+            return limitado
+
+        par, como = self.fixtures.resposta_para(api, corpo)
+        if par is None:
+            self.contar(500, cabecalhos, None)
+            return 500, _corpo_erro(api, 500, f"nenhuma fixture gravada para {api}"), {}
+        time.sleep(self._latencia(par.get("latencia") or 0.0))
+        if self._sortear(p.get("erro", 0)):
+            status = 529 if api == "anthropic" else 500
+            self.contar(status, cabecalhos, None)
+            return status, _corpo_erro(api, status, "erro simulado"), {}
+
+        resposta = dict(par["resposta"], id=f"replay-{uuid.uuid4().hex[:12]}")
+        if corpo.get("model"):
+            resposta["model"] = corpo["model"]
+        cab = dict(par.get("cabecalhos") or {})
+        if p.get("rpm"):
+            cab["anthropic-ratelimit-requests-limit" if api == "anthropic" else "x-ratelimit-limit-requests"] = str(p["rpm"])
+        self.contar(200, cabecalhos, resposta, como)
+        return 200, resposta, cab
+
+    # -- batches (Message Batches da Anthropic) -----------------------------
+
+    def criar_batch(self, corpo: Dict, cabecalhos):
+        """Responde os pedidos do lote já na criação; o lote termina após a maior latência sorteada."""
+        limitado = self._limitar("anthropic", cabecalhos)
+        if limitado:
+            return limitado
+        pedidos = corpo.get("requests") or []
+        if not pedidos:
+            self.contar(400, cabecalhos, None)
+            return 400, _corpo_erro("anthropic", 400, "requests vazio"), {}
+
+        itens, origens, duracao = [], [], 0.0
+        for pedido in pedidos:
+            params = pedido.get("params") or {}
+            par, como = self.fixtures.resposta_para("anthropic", params)
+            if par is None:
+                resultado = {"type": "errored",
+                             "error": _corpo_erro("anthropic", 500, "nenhuma fixture gravada para anthropic")}
+            else:
+                duracao = max(duracao, self._latencia(par.get("latencia") or 0.0))
+                if self._sortear(self.perfil.get("erro", 0)):
+                    resultado = {"type": "errored", "error": _corpo_erro("anthropic", 500, "erro simulado")}
+                else:
+                    mensagem = dict(par["resposta"], id=f"replay-{uuid.uuid4().hex[:12]}")
+                    if params.get("model"):
+                        mensagem["model"] = params["model"]
+                    resultado = {"type": "succeeded", "message": mensagem}
+            itens.append({"custom_id": pedido.get("custom_id"), "result": resultado})
+            origens.append(como)
+
+        agora = time.time()
+        lote = {"id": f"msgbatch_replay_{uuid.uuid4().hex[:16]}", "criado": agora,
+                "fim": agora + duracao + (self.perfil.get("latencia_batch") or 0.0), "itens": itens}
+        with self._lock:
+            self._batches[lote["id"]] = lote
+            s = self._stats
+            s["batch"]["lotes"] += 1
+            s["batch"]["itens"] += len(itens)
+            for item, como in zip(itens, origens):
+                if item["result"]["type"] == "succeeded":
+                    s["fixture"][como] += 1
+                    self._somar_tokens(s, item["result"]["message"])
+                else:
+                    s["batch"]["erros"] += 1
+        self.contar(200, cabecalhos, None)
+        return 200, self._batch_json(lote), {}
+
+    def consultar_batch(self, batch_id: str, cabecalhos):
+        lote = self._batches.get(batch_id)
+        if lote is None:
+            self.contar(404, cabecalhos, None)
+            return 404, _corpo_erro("anthropic", 404, f"batch {batch_id} não encontrado"), {}
+        self.contar(200, cabecalhos, None)
+        return 200, self._batch_json(lote), {}
+
+    def resultados_batch(self, batch_id: str, cabecalhos):
+        """JSONL com um resultado por pedido (bytes); 400 enquanto o lote não terminou."""
+        lote = self._batches.get(batch_id)
+        if lote is None:
+            self.contar(404, cabecalhos, None)
+            return 404, _corpo_erro("anthropic", 404, f"batch {batch_id} não encontrado"), {}
+        if time.time() < lote["fim"]:
+            self.contar(400, cabecalhos, None)
+            return 400, _corpo_erro("anthropic", 400, f"batch {batch_id} ainda em processamento"), {}
+        self.contar(200, cabecalhos, None)
+        return 200, "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in lote["itens"]).encode("utf-8"), {}
+
+    def _batch_json(self, lote: Dict) -> Dict:
+        """Objeto MessageBatch como a API devolve na criação e na consulta."""
+        def _iso(t: float) -> str:
+            return datetime.fromtimestamp(t, timezone.utc).isoformat().replace("+00:00", "Z")
+
+        encerrado = time.time() >= lote["fim"]
+        contagem = dict.fromkeys(("processing", "succeeded", "errored", "canceled", "expired"), 0)
+        if encerrado:
+            for item in lote["itens"]:
+                contagem[item["result"]["type"]] += 1
+        else:
+            contagem["processing"] = len(lote["itens"])
+        return {
+            "id": lote["id"], "type": "message_batch",
+            "processing_status": "ended" if encerrado else "in_progress",
+            "request_counts": contagem,
+            "created_at": _iso(lote["criado"]), "expires_at": _iso(lote["criado"] + 86400),
+            "ended_at": _iso(lote["fim"]) if encerrado else None,
+            "cancel_initiated_at": None, "archived_at": None,
+            "results_url": f"{self.url}/v1/messages/batches/{lote['id']}/results" if encerrado else None,
+        }
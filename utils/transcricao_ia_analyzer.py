@@ -1,6 +1,16 @@
 """
 Análise de transcrições usando IA (OpenAI)
 Usa contexto completo do negócio para avaliações detalhadas
+
+Resultados são guardados em utils.avaliacao_cache (canal 'ligacao_openai'):
+a mesma transcrição + contexto + modelos + versão do prompt não volta à API.
+Só entra no cache o que foi respondido pelo primeiro alvo da rota (o modelo
+da chave); resposta de fallback/hedge volta ao chamador mas não é guardada.
+O resultado traz provedor/modelo de quem respondeu (avaliação e classificação).
+
+As chamadas passam por utils.llm_router (tarefas 'avaliacao_ligacao' e
+'classificacao_ligacao'): OpenAI por padrão, com fallback/hedge conforme
+LLM_ROTA_<TAREFA>.
 """
 import os
 import json
@@ -8,8 +18,18 @@ from typing import Dict, Optional
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from utils import avaliacao_cache, compactacao, llm_router
+
 load_dotenv()
 
+_CANAL = "ligacao_openai"
+# Tarefas do utils.llm_router (LLM_ROTA_AVALIACAO_LIGACAO / LLM_ROTA_CLASSIFICACAO_LIGACAO
+# podem pôr Groq/Anthropic como fallback do OpenAI)
+_TAREFA_AVALIACAO = "avaliacao_ligacao"
+_TAREFA_CLASSIFICACAO = "classificacao_ligacao"
+# Orçamento da transcrição no prompt completo (≈ 4000 caracteres, o antigo corte fixo)
+_ORCAMENTO_TOKENS = 1150
+
 class TranscricaoIAAnalyzer:
     def __init__(self):
         """Inicializa cliente OpenAI"""
@@ -22,6 +42,10 @@ class TranscricaoIAAnalyzer:
         
         # Carrega contexto do arquivo
         self.contexto = self._carregar_contexto()
+        self._prompt_versao = avaliacao_cache.versao_prompt(
+            self._criar_prompt_completo(""), self._criar_prompt_classificacao(""),
+            compactacao.versao(_ORCAMENTO_TOKENS),
+        )
     
     def _carregar_contexto(self) -> str:
         """Carrega arquivo de contexto"""
@@ -39,7 +63,7 @@ class TranscricaoIAAnalyzer:
         return f"""{self.contexto}
 
 TRANSCRIÇÃO DA LIGAÇÃO:
-{transcricao[:4000]}
+{compactacao.compactar(_CANAL, transcricao, _ORCAMENTO_TOKENS, self.model)}
 
 Analise esta transcrição e retorne APENAS JSON válido no formato especificado acima."""
 
@@ -322,19 +346,19 @@ DADOS ADICIONAIS (SE USAR, NÃO INVENTE):
                 'qualidade_atendimento': 'n/a'
             }
         
-        if not self.api_key:
+        if not self._rota_disponivel(_TAREFA_AVALIACAO, self.model):
             return {
                 'erro': 'OPENAI_API_KEY não configurada no .env',
                 'classificacao_ligacao': 'erro',
                 'qualidade_atendimento': 'n/a'
             }
 
-        if not self.client:
-            return {
-                'erro': 'Cliente OpenAI não inicializado',
-                'classificacao_ligacao': 'erro',
-                'qualidade_atendimento': 'n/a'
-            }
+        chave_cache = avaliacao_cache.chave(
+            _CANAL, transcricao, contexto_adicional, self._modelos_cache(), self._prompt_versao,
+        )
+        cacheado = avaliacao_cache.buscar(chave_cache, _CANAL)
+        if cacheado is not None:
+            return cacheado
 
         try:
             info_interlocutores = self._detectar_troca_interlocutores(transcricao)
@@ -371,32 +395,23 @@ DADOS ADICIONAIS (SE USAR, NÃO INVENTE):
                         'lead_score': None,
                         'lead_classificacao': 'NA',
                         'concurso_area': 'Não identificado',
-                        'produto_recomendado': 'N/A'
+                        'produto_recomendado': 'N/A',
+                        **self._origem(None, classificacao),
                     }
+                    self._salvar_cache(chave_cache, retorno_minimo)
                     return retorno_minimo
 
             contexto_completo = contexto_adicional.copy() if isinstance(contexto_adicional, dict) else {}
             contexto_completo.update(info_interlocutores)
             prompt = self._criar_prompt_otimizado(transcricao, contexto_completo)
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Você é um especialista em análise de vendas educacionais. Retorna sempre JSON válido."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                response_format={"type": "json_object"}
+            response = self._completar(
+                _TAREFA_AVALIACAO, self.model,
+                "Você é um especialista em análise de vendas educacionais. Retorna sempre JSON válido.",
+                prompt, temperature=self.temperature, max_tokens=self.max_tokens,
             )
             
-            content = (response.choices[0].message.content or "").strip()
+            content = (response["texto"] or "").strip()
 
             if content.startswith("```"):
                 content = content.strip("`")
@@ -419,7 +434,7 @@ DADOS ADICIONAIS (SE USAR, NÃO INVENTE):
                 resultado['observacoes'] = observacoes
             
             # Retorna resultado completo com estrutura do avaliacao.txt
-            tokens_avaliacao = getattr(getattr(response, "usage", None), "total_tokens", None)
+            tokens_avaliacao = self._tokens(response)
             tokens_classificacao = classificacao.get('tokens_usados')
             tokens_usados = None
             if tokens_avaliacao is not None or tokens_classificacao is not None:
@@ -434,9 +449,11 @@ DADOS ADICIONAIS (SE USAR, NÃO INVENTE):
                 'lead_score': resultado.get('avaliacao_lead', {}).get('lead_score_0_100', 0),
                 'lead_classificacao': resultado.get('avaliacao_lead', {}).get('classificacao', 'D'),
                 'concurso_area': resultado.get('extracao', {}).get('concurso_area', 'Não identificado'),
-                'produto_recomendado': resultado.get('recomendacao_final', {}).get('produto_principal', {}).get('produto', 'N/A')
+                'produto_recomendado': resultado.get('recomendacao_final', {}).get('produto_principal', {}).get('produto', 'N/A'),
+                **self._origem(response, classificacao),
             }
             
+            self._salvar_cache(chave_cache, analise)
             return analise
             
         except json.JSONDecodeError as e:
@@ -448,6 +465,75 @@ DADOS ADICIONAIS (SE USAR, NÃO INVENTE):
             print(repr(e))
             return {'erro': f'Erro na análise: {type(e).__name__}: {str(e)}', 'classificacao_ligacao': 'erro'}
 
+    def _rota_padrao(self, modelo: str) -> list:
+        return [f"openai:{modelo}"]
+
+    def _alvo_primario(self, tarefa: str, modelo: str) -> str:
+        """Primeiro alvo da rota da tarefa ("provedor:modelo") — o que o cache representa."""
+        return llm_router.rota(tarefa, self._rota_padrao(modelo))[0]
+
+    def _modelos_cache(self) -> str:
+        """Modelos da chave do cache: os primários das duas rotas.
+
+        Na rota padrão (só OpenAI) mantém o formato antigo "modelo|modelo_classificacao",
+        para não invalidar o que já está guardado.
+        """
+        avaliacao = self._alvo_primario(_TAREFA_AVALIACAO, self.model)
+        classificacao = self._alvo_primario(_TAREFA_CLASSIFICACAO, self.model_classificacao)
+        if (avaliacao, classificacao) == (f"openai:{self.model}", f"openai:{self.model_classificacao}"):
+            return f"{self.model}|{self.model_classificacao}"
+        return f"{avaliacao}|{classificacao}"
+
+    @staticmethod
+    def _origem(response: Optional[Dict], classificacao: Dict) -> Dict:
+        """Quem respondeu: provedor/modelo/alvo da avaliação e da classificação (None = sem API)."""
+        response = response or {}
+        return {
+            'provedor': response.get('provedor'),
+            'modelo': response.get('modelo'),
+            'alvo': response.get('alvo'),
+            'provedor_classificacao': classificacao.get('provedor'),
+            'modelo_classificacao': classificacao.get('modelo'),
+            'alvo_classificacao': classificacao.get('alvo'),
+        }
+
+    def _rota_disponivel(self, tarefa: str, modelo: str) -> bool:
+        return llm_router.disponivel(tarefa, self._rota_padrao(modelo), {"openai": self.client})
+
+    def _completar(self, tarefa: str, modelo: str, system: str, prompt: str, temperature: float, max_tokens: int) -> Dict:
+        """Chamada JSON pela rota da tarefa (OpenAI por padrão, com o client desta instância)."""
+        return llm_router.completar(
+            tarefa, [{"role": "user", "content": prompt}], system=system,
+            max_tokens=max_tokens, temperature=temperature, json=True,
+            rota_padrao=self._rota_padrao(modelo), clientes={"openai": self.client},
+        )
+
+    @staticmethod
+    def _tokens(response: Dict) -> Optional[int]:
+        if response.get("input_tokens") is None and response.get("output_tokens") is None:
+            return None
+        return (response.get("input_tokens") or 0) + (response.get("output_tokens") or 0)
+
+    def _salvar_cache(self, chave_cache: str, analise: Dict):
+        # Classificações com erro viram 'outros' com motivo "Erro ao classificar" — não cachear
+        motivo = str(analise.get('motivo_classificacao') or '')
+        if motivo.lower().startswith('erro ao classificar'):
+            return
+        # Fallback/hedge respondeu por outro modelo: não guardar sob a chave do primário
+        primarios = {
+            'alvo': self._alvo_primario(_TAREFA_AVALIACAO, self.model),
+            'alvo_classificacao': self._alvo_primario(_TAREFA_CLASSIFICACAO, self.model_classificacao),
+        }
+        for campo, primario in primarios.items():
+            if analise.get(campo) not in (None, primario):
+                print(f"Análise respondida por {analise[campo]} (rota primária {primario}): não cacheada")
+                return
+        avaliacao_cache.salvar(
+            chave_cache, _CANAL, analise, tokens=analise.get('tokens_usados'),
+            modelo=f"{analise.get('alvo') or '-'}|{analise.get('alvo_classificacao') or 'heuristica'}",
+            prompt_versao=self._prompt_versao,
+        )
+
     def classificar_ligacao(self, transcricao: str) -> Dict:
         """
         Classifica o tipo de ligação para decidir se deve avaliar
@@ -461,7 +547,7 @@ DADOS ADICIONAIS (SE USAR, NÃO INVENTE):
                 'tokens_usados': 0
             }
 
-        if not self.client:
+        if not self._rota_disponivel(_TAREFA_CLASSIFICACAO, self.model_classificacao):
             return {
                 'tipo': 'outros',
                 'motivo': 'Cliente OpenAI não inicializado',
@@ -477,31 +563,23 @@ DADOS ADICIONAIS (SE USAR, NÃO INVENTE):
         prompt = self._criar_prompt_classificacao(transcricao)
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_classificacao,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Você é um especialista em triagem de ligações. Retorna sempre JSON válido."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.1,
-                max_tokens=300,
-                response_format={"type": "json_object"}
+            response = self._completar(
+                _TAREFA_CLASSIFICACAO, self.model_classificacao,
+                "Você é um especialista em triagem de ligações. Retorna sempre JSON válido.",
+                prompt, temperature=0.1, max_tokens=300,
             )
 
-            content = (response.choices[0].message.content or "").strip()
+            content = (response["texto"] or "").strip()
             if content.startswith("```"):
                 content = content.strip("`")
                 if content.lower().startswith("json"):
                     content = content[4:].strip()
 
             resultado = json.loads(content)
-            resultado['tokens_usados'] = getattr(getattr(response, "usage", None), "total_tokens", None)
+            resultado['tokens_usados'] = self._tokens(response)
+            resultado['provedor'] = response.get('provedor')
+            resultado['modelo'] = response.get('modelo')
+            resultado['alvo'] = response.get('alvo')
             if 'deve_avaliar' not in resultado:
                 resultado['deve_avaliar'] = resultado.get('tipo') == 'venda'
             if resultado.get('tipo') == 'venda':
@@ -1,10 +1,39 @@
-"""Funções de carregamento de transcrições, compartilhadas entre páginas."""
+"""Funções de carregamento de transcrições, compartilhadas entre páginas.
+
+Carregamento em duas camadas: as listas/agregações dos dashboards usam SQLs
+enxutos (notas, rótulos e um resumo do JSON de avaliação), e as colunas
+pesadas — transcrição e JSON completo — vêm daqui, sob demanda, por id:
+
+  - carregar_detalhe_transcricao(id): uma ligação (st.cache_data);
+  - carregar_detalhes_transcricoes(ids) / carregar_detalhes_chats(ids):
+    vários ids, buscados em lotes de DETALHES_LOTE com um LRU próprio por id
+    — abrir o mesmo chat de novo ou o relatório de outro agente só consulta
+    o banco para os ids que ainda não estão em memória.
+    Gravar uma avaliação (utils.gravacao_avaliacoes) tira o id do LRU neste
+    processo; o que o avaliacao_worker grava em outro processo aparece
+    quando o item vence (DETALHES_CACHE_TTL).
+
+ENV VARS:
+  DETALHES_LOTE         — ids por consulta (default 50)
+  DETALHES_CACHE_ITENS  — itens mantidos no LRU de cada canal (default 500)
+  DETALHES_CACHE_TTL    — validade (s) de um item no LRU (default 21600)
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
 
 import pandas as pd
 import streamlit as st
 from pathlib import Path
 from conexao.mysql_connector import conectar_mysql
 
+DETALHES_LOTE = int(os.getenv("DETALHES_LOTE", "50"))
+DETALHES_CACHE_ITENS = int(os.getenv("DETALHES_CACHE_ITENS", "500"))
+DETALHES_CACHE_TTL = int(os.getenv("DETALHES_CACHE_TTL", "21600"))
+
 
 @st.cache_data(ttl=21600, show_spinner=False)
 def carregar_detalhe_transcricao(transcricao_id: int) -> dict:
@@ -29,3 +58,124 @@ def carregar_detalhe_transcricao(transcricao_id: int) -> dict:
         }
     except Exception as e:
         return {"erro": str(e)}
+
+
+class _LRU:
+    """LRU por id com validade, compartilhado entre as sessões do processo."""
+
+    def __init__(self, maximo: int, ttl: int):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._itens: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave: str):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            if time.time() - item[0] > self.ttl:
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return item[1]
+
+    def guardar(self, chave: str, valor: dict):
+        with self._lock:
+            self._itens[chave] = (time.time(), valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def descartar(self, chaves: Iterable):
+        with self._lock:
+            for chave in chaves:
+                self._itens.pop(str(chave), None)
+
+
+_lru_transcricoes = _LRU(DETALHES_CACHE_ITENS, DETALHES_CACHE_TTL)
+_lru_chats = _LRU(DETALHES_CACHE_ITENS, DETALHES_CACHE_TTL)
+
+
+def _literal_sql(valor: str) -> str:
+    return "'" + str(valor).replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def _carregar_em_lotes(ids: Iterable, lru: _LRU, caminho_sql: str, coluna_id: str,
+                       formatar_id, montar) -> Dict[str, dict]:
+    """Devolve {id: detalhe} — do LRU quando possível, o resto do banco em lotes."""
+    resultado, faltantes = {}, []
+    for item_id in dict.fromkeys(str(i) for i in ids if i is not None and str(i).strip()):
+        detalhe = lru.obter(item_id)
+        if detalhe is None:
+            faltantes.append(item_id)
+        else:
+            resultado[item_id] = detalhe
+    if not faltantes:
+        return resultado
+
+    engine = conectar_mysql()
+    if not engine:
+        return resultado
+    sql_base = Path(caminho_sql).read_text()
+    for inicio in range(0, len(faltantes), DETALHES_LOTE):
+        lote = faltantes[inicio: inicio + DETALHES_LOTE]
+        sql = sql_base.replace("{ids}", ", ".join(formatar_id(i) for i in lote))
+        try:
+            df = pd.read_sql(sql, engine)
+        except Exception as e:
+            st.error(f"Erro ao carregar detalhes: {e}")
+            return resultado
+        for row in df.to_dict("records"):
+            item_id = str(row.get(coluna_id))
+            detalhe = montar(row)
+            lru.guardar(item_id, detalhe)
+            resultado[item_id] = detalhe
+    return resultado
+
+
+def carregar_detalhes_transcricoes(transcricao_ids: Iterable) -> Dict[str, dict]:
+    """Transcrição + insight_ia de várias ligações: {str(id): detalhe}."""
+    return _carregar_em_lotes(
+        transcricao_ids, _lru_transcricoes,
+        "consultas/transcricoes/transcricao_detalhe.sql", "transcricao_id",
+        lambda i: str(int(float(i))),
+        lambda row: {
+            "transcricao": row.get("transcricao") or "",
+            "agente": row.get("agente") or "Não identificado",
+            "duracao": row.get("duracao"),
+            "telefone": row.get("telefone"),
+            "tipo": row.get("tipo") or "N/Informado",
+            "insight_ia": row.get("insight_ia"),
+        },
+    )
+
+
+def carregar_detalhes_chats(chat_ids: Iterable) -> Dict[str, dict]:
+    """Transcrição + JSON completo da avaliação de vários chats: {chat_id: detalhe}."""
+    return _carregar_em_lotes(
+        chat_ids, _lru_chats,
+        "consultas/analise_chats/chat_detalhe.sql", "chat_id",
+        _literal_sql,
+        lambda row: {
+            "transcript": row.get("transcript") or "",
+            "ai_evaluation": row.get("ai_evaluation"),
+        },
+    )
+
+
+def limpar_detalhes(canal: Optional[str] = None, ids: Optional[Iterable] = None):
+    """Esvazia os LRUs, ou só os ids de um canal ('ligacao' / 'whatsapp').
+
+    Chamado por utils.gravacao_avaliacoes com os ids de cada lote gravado.
+    """
+    lrus = {"ligacao": [_lru_transcricoes], "whatsapp": [_lru_chats]}.get(canal, [_lru_transcricoes, _lru_chats])
+    for lru in lrus:
+        if ids is None:
+            lru.limpar()
+        else:
+            lru.descartar(i for i in ids if i is not None)
@@ -0,0 +1,306 @@
+"""
+Triagem local (CPU, sem API) de ligações e chats antes do Claude.
+
+As heurísticas de palavras-chave (_heuristica_triagem, verificar_avaliabilidade)
+só pegam os casos óbvios; o resto vai ao Claude, muitas vezes só para voltar
+"ura", "ligacao_interna" ou "chamada_errada". Este módulo treina, a partir
+das classificações já gravadas no MySQL (transcription_ai_summaries e
+chat_ai_evaluations), um classificador TF-IDF + regressão logística
+multinomial — em numpy puro, sem scikit-learn/scipy no deploy — e descarta
+sem chamada à API os itens que ele considera não-venda com confiança alta.
+
+  - Features: unigramas + bigramas, hashing (TRIAGEM_N_FEATURES posições,
+    crc32 — estável entre processos), tf sublinear × idf, norma L2.
+  - Decisão: pula o Claude só se P(venda) <= 1 - TRIAGEM_LIMIAR; o tipo
+    gravado é a classe não-venda mais provável. Na dúvida, vai ao Claude.
+  - Um modelo por canal em TRIAGEM_MODELOS_DIR/<canal>.npz; processos em
+    execução recarregam o arquivo quando ele muda (retreino sem restart).
+  - Sem modelo treinado, triar() devolve None e nada muda.
+
+Treino e relatório de precisão/recall: triagem_treinar.py (raiz do projeto).
+
+ENV VARS:
+  TRIAGEM_LOCAL          — '0' desliga a triagem local (default '1')
+  TRIAGEM_LIMIAR         — confiança mínima de não-venda para pular o Claude (default 0.95)
+  TRIAGEM_MODELOS_DIR    — default data_cache/triagem
+  TRIAGEM_N_FEATURES     — tamanho do espaço de hashing no treino (default 262144)
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ATIVA = os.getenv("TRIAGEM_LOCAL", "1") != "0"
+LIMIAR = float(os.getenv("TRIAGEM_LIMIAR", "0.95"))
+MODELOS_DIR = Path(os.getenv(
+    "TRIAGEM_MODELOS_DIR",
+    str(Path(__file__).resolve().parent.parent / "data_cache" / "triagem"),
+))
+N_FEATURES = int(os.getenv("TRIAGEM_N_FEATURES", str(2 ** 18)))
+
+CLASSE_VENDA = "venda"
+_MAX_CHARS = 20000
+_TOKEN = re.compile(r"[^\W\d_]{2,}", re.UNICODE)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# FEATURES (TF-IDF com hashing, matriz esparsa CSR em arrays numpy)
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _termos(texto: str) -> List[str]:
+    palavras = _TOKEN.findall((texto or "")[:_MAX_CHARS].lower())
+    return palavras + [f"{a} {b}" for a, b in zip(palavras, palavras[1:])]
+
+
+def _contagens(textos: Sequence[str], n_features: int):
+    """CSR (indptr, indices, contagens) com os termos de cada texto."""
+    indptr, indices, dados = [0], [], []
+    for texto in textos:
+        hashes = np.fromiter(
+            (zlib.crc32(t.encode("utf-8")) for t in _termos(texto)), dtype=np.int64,
+        ) % n_features
+        unicos, contagem = np.unique(hashes, return_counts=True)
+        indices.append(unicos)
+        dados.append(contagem)
+        indptr.append(indptr[-1] + len(unicos))
+    return (
+        np.asarray(indptr, dtype=np.int64),
+        np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+        np.concatenate(dados).astype(np.float32) if dados else np.zeros(0, dtype=np.float32),
+    )
+
+
+def _tfidf(indptr, indices, contagens, idf):
+    linhas = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    valores = (1.0 + np.log(contagens)) * idf[indices]
+    normas = np.sqrt(np.bincount(linhas, weights=valores ** 2, minlength=len(indptr) - 1))
+    normas[normas == 0] = 1.0
+    return linhas, indices, (valores / normas[linhas]).astype(np.float32)
+
+
+def _produto(linhas, indices, valores, n_linhas, W):
+    """X @ W para X esparsa (linhas, indices, valores)."""
+    return np.stack([
+        np.bincount(linhas, weights=valores * W[indices, c], minlength=n_linhas)
+        for c in range(W.shape[1])
+    ], axis=1)
+
+
+def _softmax(Z):
+    Z = Z - Z.max(axis=1, keepdims=True)
+    E = np.exp(Z)
+    return E / E.sum(axis=1, keepdims=True)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# MODELO
+# ══════════════════════════════════════════════════════════════════════════════
+
+class ClassificadorTriagem:
+    """TF-IDF (hashing) + regressão logística multinomial."""
+
+    def __init__(self, n_features: int = N_FEATURES):
+        self.n_features = n_features
+        self.classes: List[str] = []
+        self.idf: Optional[np.ndarray] = None
+        self.W: Optional[np.ndarray] = None
+        self.b: Optional[np.ndarray] = None
+        self.meta: Dict = {}
+
+    # ── treino ────────────────────────────────────────────────────────────────
+
+    def treinar(self, textos: Sequence[str], rotulos: Sequence[str],
+                iteracoes: int = 300, taxa: float = 0.05, l2: float = 1e-5) -> "ClassificadorTriagem":
+        """Gradiente (Adam) em lote cheio sobre a entropia cruzada + L2."""
+        self.classes = sorted(set(rotulos))
+        idx = {c: i for i, c in enumerate(self.classes)}
+        y = np.array([idx[r] for r in rotulos])
+        n, C = len(textos), len(self.classes)
+
+        indptr, indices, contagens = _contagens(textos, self.n_features)
+        df_termos = np.bincount(indices, minlength=self.n_features)
+        self.idf = (np.log((1 + n) / (1 + df_termos)) + 1).astype(np.float32)
+        linhas, indices, valores = _tfidf(indptr, indices, contagens, self.idf)
+
+        Y = np.zeros((n, C))
+        Y[np.arange(n), y] = 1.0
+        W = np.zeros((self.n_features, C))
+        b = np.log(Y.mean(axis=0) + 1e-9)
+        m = [np.zeros_like(W), np.zeros_like(b)]
+        v = [np.zeros_like(W), np.zeros_like(b)]
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+        for t in range(1, iteracoes + 1):
+            P = _softmax(_produto(linhas, indices, valores, n, W) + b)
+            G = (P - Y) / n
+            gW = np.stack([
+                np.bincount(indices, weights=valores * G[linhas, c], minlength=self.n_features)
+                for c in range(C)
+            ], axis=1) + l2 * W
+            gb = G.sum(axis=0)
+            for k, (param, grad) in enumerate(((W, gW), (b, gb))):
+                m[k] = beta1 * m[k] + (1 - beta1) * grad
+                v[k] = beta2 * v[k] + (1 - beta2) * grad ** 2
+                param -= taxa * (m[k] / (1 - beta1 ** t)) / (np.sqrt(v[k] / (1 - beta2 ** t)) + eps)
+
+        self.W, self.b = W.astype(np.float32), b.astype(np.float32)
+        perda = -np.log(P[np.arange(n), y] + 1e-12).mean()
+        self.meta = {
+            "treinado_em": int(time.time()), "amostras": n,
+            "distribuicao": {c: int((y == i).sum()) for i, c in enumerate(self.classes)},
+            "perda_treino": round(float(perda), 4),
+        }
+        return self
+
+    # ── inferência ────────────────────────────────────────────────────────────
+
+    def probabilidades(self, textos: Sequence[str]) -> np.ndarray:
+        indptr, indices, contagens = _contagens(textos, self.n_features)
+        linhas, indices, valores = _tfidf(indptr, indices, contagens, self.idf)
+        return _softmax(_produto(linhas, indices, valores, len(textos), self.W) + self.b)
+
+    def decidir(self, proba: np.ndarray, limiar: float = LIMIAR) -> Optional[Dict]:
+        """{'tipo', 'confianca'} se o item é não-venda com confiança >= limiar; senão None."""
+        if CLASSE_VENDA not in self.classes or len(self.classes) < 2:
+            return None
+        i_venda = self.classes.index(CLASSE_VENDA)
+        confianca = 1.0 - float(proba[i_venda])
+        if confianca < limiar:
+            return None
+        outras = proba.copy()
+        outras[i_venda] = -1
+        return {"tipo": self.classes[int(outras.argmax())], "confianca": confianca}
+
+    # ── persistência ──────────────────────────────────────────────────────────
+
+    def salvar(self, caminho: Path):
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        tmp = caminho.with_name(caminho.stem + ".tmp.npz")
+        np.savez_compressed(
+            tmp, W=self.W, b=self.b, idf=self.idf, classes=np.array(self.classes),
+            meta=np.array(json.dumps(dict(self.meta, n_features=self.n_features), ensure_ascii=False)),
+        )
+        os.replace(tmp, caminho)  # troca atômica: workers nunca leem um arquivo pela metade
+
+    @classmethod
+    def carregar(cls, caminho: Path) -> "ClassificadorTriagem":
+        with np.load(caminho, allow_pickle=False) as dados:
+            meta = json.loads(str(dados["meta"]))
+            modelo = cls(n_features=int(meta.get("n_features", N_FEATURES)))
+            modelo.W, modelo.b, modelo.idf = dados["W"], dados["b"], dados["idf"]
+            modelo.classes = [str(c) for c in dados["classes"]]
+            modelo.meta = meta
+        return modelo
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# RELATÓRIO OFFLINE
+# ══════════════════════════════════════════════════════════════════════════════
+
+def relatorio(modelo: ClassificadorTriagem, textos: Sequence[str], rotulos: Sequence[str],
+              limiares: Sequence[float] = (0.8, 0.9, 0.95, 0.98)) -> Dict:
+    """
+    Precisão/recall em dados rotulados que o modelo não viu.
+      - por_classe: precisão/recall do argmax (diagnóstico do classificador);
+      - por_limiar: a decisão de pular o Claude — precisão = pulados que de fato
+        não eram venda; recall = não-vendas puladas; vendas_perdidas = vendas
+        que teriam sido descartadas (o custo real de um limiar baixo).
+    """
+    proba = modelo.probabilidades(textos)
+    previstos = [modelo.classes[i] for i in proba.argmax(axis=1)]
+    rotulos = list(rotulos)
+
+    por_classe = {}
+    for c in sorted(set(rotulos) | set(modelo.classes)):
+        vp = sum(1 for r, p in zip(rotulos, previstos) if r == c and p == c)
+        n_prev = previstos.count(c)
+        n_real = rotulos.count(c)
+        por_classe[c] = {
+            "precisao": round(vp / n_prev, 3) if n_prev else None,
+            "recall": round(vp / n_real, 3) if n_real else None,
+            "suporte": n_real,
+        }
+
+    nao_vendas = sum(1 for r in rotulos if r != CLASSE_VENDA)
+    por_limiar = {}
+    for limiar in limiares:
+        pulados = [(r, modelo.decidir(p, limiar)) for r, p in zip(rotulos, proba)]
+        pulados = [(r, d) for r, d in pulados if d]
+        corretos = sum(1 for r, _ in pulados if r != CLASSE_VENDA)
+        por_limiar[f"{limiar:.2f}"] = {
+            "pulados": len(pulados),
+            "pulados_pct": round(len(pulados) / len(rotulos), 3) if rotulos else 0.0,
+            "precisao": round(corretos / len(pulados), 3) if pulados else None,
+            "recall": round(corretos / nao_vendas, 3) if nao_vendas else None,
+            "vendas_perdidas": len(pulados) - corretos,
+            "tipo_correto": round(sum(1 for r, d in pulados if r == d["tipo"]) / len(pulados), 3) if pulados else None,
+        }
+
+    return {
+        "amostras": len(rotulos),
+        "acuracia": round(sum(1 for r, p in zip(rotulos, previstos) if r == p) / len(rotulos), 3) if rotulos else None,
+        "por_classe": por_classe,
+        "por_limiar": por_limiar,
+    }
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# USO PELOS ANALISADORES
+# ══════════════════════════════════════════════════════════════════════════════
+
+_modelos: Dict[str, tuple] = {}
+_lock = threading.Lock()
+
+
+def caminho_modelo(canal: str) -> Path:
+    return MODELOS_DIR / f"{canal}.npz"
+
+
+def _modelo(canal: str) -> Optional[ClassificadorTriagem]:
+    caminho = caminho_modelo(canal)
+    try:
+        mtime = caminho.stat().st_mtime
+    except OSError:
+        return None
+    with _lock:
+        atual = _modelos.get(canal)
+        if atual and atual[0] == mtime:
+            return atual[1]
+        try:
+            modelo = ClassificadorTriagem.carregar(caminho)
+        except Exception as e:
+            logger.warning("Modelo de triagem %s ilegível: %s", caminho, e)
+            modelo = None
+        _modelos[canal] = (mtime, modelo)
+        return modelo
+
+
+def triar(canal: str, texto: str, limiar: Optional[float] = None) -> Optional[Dict]:
+    """
+    {'tipo', 'motivo', 'confianca'} quando o modelo local tem confiança de que
+    o item não é venda; None quando deve seguir para o Claude (inclusive sem
+    modelo treinado ou com TRIAGEM_LOCAL=0).
+    """
+    if not ATIVA or not texto:
+        return None
+    modelo = _modelo(canal)
+    if modelo is None:
+        return None
+    try:
+        decisao = modelo.decidir(modelo.probabilidades([texto])[0], LIMIAR if limiar is None else limiar)
+    except Exception as e:
+        logger.warning("Falha na triagem local (%s): %s", canal, e)
+        return None
+    if decisao:
+        decisao["motivo"] = f"Triagem local: {decisao['tipo']} ({decisao['confianca']:.0%} de confiança)"
+    return decisao
@@ -24,23 +24,43 @@ ENV VARS (unificadas com o canal telefone):
   CLAUDE_MODEL             — default claude-sonnet-4-6
   CLAUDE_TEMPERATURE       — default 0.2
   CLAUDE_MAX_TOKENS        — default 6000
-  CLAUDE_MAX_INPUT_CHARS   — default 25000
-  CHAT_CLAUDE_MAX_WORKERS  — default 2 (paralelismo tempo real)
-  CLAUDE_THROTTLE_SECONDS  — default 4
+  CLAUDE_MAX_INPUT_TOKENS  — orçamento de tokens da transcrição no prompt (default 7000;
+                             utils.compactacao — substitui CLAUDE_MAX_INPUT_CHARS)
+  CHAT_CLAUDE_MAX_WORKERS  — avaliações simultâneas no lote tempo real
+                             (default: llm_limiter.concorrencia(), pelo limite de rpm)
+  LLM_RPM / LLM_ITPM / LLM_OTPM — orçamento inicial do limitador compartilhado
+                             (utils.llm_limiter; ajustado pelos cabeçalhos da API)
+
+CACHE DE AVALIAÇÕES: antes de chamar o Claude, _call_claude consulta
+utils.avaliacao_cache (hash da transcrição normalizada + contexto + modelo +
+REGUA_VERSAO + versão do prompt). Reavaliar um chat que não mudou devolve o
+resultado gravado sem chamada à API.
+
+TRIAGEM LOCAL: chats aptos pela regra passam antes por utils.triagem_local
+(TF-IDF + regressão logística treinados com as classificações já gravadas);
+não-venda com confiança >= TRIAGEM_LIMIAR é gravado sem chamada à API.
+
+LOTE: avaliar_lote_paralelo roda em asyncio (utils.avaliacao_async) com
+anthropic.AsyncAnthropic — dezenas de avaliações em voo numa única thread,
+semáforo dimensionado pelo limitador, callback de progresso e cancelamento
+por threading.Event. A versão corrotina (avaliar_lote_async) serve quem
+já roda num event loop.
 """
 
+import asyncio
+import contextlib
 import json
 import logging
 import os
 import re
 import threading
 import time as _time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Optional, Tuple
 
 import anthropic
 from dotenv import load_dotenv
 
+from utils import avaliacao_async, avaliacao_cache, compactacao, llm_limiter, triagem_local
 from utils.venda_consultiva_core import (
     REGUA_VERSAO,
     build_user_prompt,
@@ -74,6 +94,8 @@ TEMPLATES_BOT = [
 ]
 
 _SYSTEM_PROMPT = system_prompt("whatsapp")
+_CANAL = "whatsapp"
+_PROMPT_BASE = build_user_prompt(_CANAL, "")
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -220,11 +242,15 @@ class ChatIAAnalyzer:
         self.model = os.getenv("CLAUDE_MODEL", "claude-sonnet-4-6")
         self.temperature = float(os.getenv("CLAUDE_TEMPERATURE", "0.2"))
         self.max_tokens = int(os.getenv("CLAUDE_MAX_TOKENS", "6000"))
-        self.max_input_chars = int(os.getenv("CLAUDE_MAX_INPUT_CHARS", "25000"))
-        self.max_workers = int(os.getenv("CHAT_CLAUDE_MAX_WORKERS", "2"))
-        self.throttle_seconds = float(os.getenv("CLAUDE_THROTTLE_SECONDS", "4"))
-        self._throttle_lock = threading.Lock()
-        self._last_request_time = 0.0
+        self.max_input_tokens = int(os.getenv("CLAUDE_MAX_INPUT_TOKENS", "7000"))
+        self.max_workers = int(os.getenv("CHAT_CLAUDE_MAX_WORKERS", "0")) or None
+
+    @property
+    def _prompt_versao(self) -> str:
+        """Versão do prompt no cache: textos fixos + regras e orçamento da compactação."""
+        return avaliacao_cache.versao_prompt(
+            _SYSTEM_PROMPT, _PROMPT_BASE, compactacao.versao(self.max_input_tokens)
+        )
 
     # ── helpers ───────────────────────────────────────────────────────────────
 
@@ -293,83 +319,127 @@ class ChatIAAnalyzer:
             ctx_json = json.dumps(contexto_adicional, ensure_ascii=False)
         return build_user_prompt(
             canal="whatsapp",
-            conteudo=chat_text[:self.max_input_chars],
+            conteudo=compactacao.compactar(_CANAL, chat_text, self.max_input_tokens, self.model),
             contexto_adicional_json=ctx_json,
         )
 
     # ── chamada unitária ao Claude (classificação + avaliação em 1 call) ─────
 
+    def _consultar_cache(self, chat_text: str, contexto_adicional: Optional[Dict]) -> Tuple[str, Optional[Dict]]:
+        chave_cache = avaliacao_cache.chave(
+            _CANAL, chat_text, contexto_adicional, self.model, self._prompt_versao
+        )
+        cacheado = avaliacao_cache.buscar(chave_cache, _CANAL)
+        if cacheado is not None:
+            logger.info("[Claude/chat] cache hit %s (regua=%s)", chave_cache[:12], REGUA_VERSAO)
+        return chave_cache, cacheado
+
+    def _requisicao(self, chat_text: str, contexto_adicional: Optional[Dict]) -> Dict:
+        return dict(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            system=[{
+                "type": "text",
+                "text": _SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"},
+            }],
+            messages=[{"role": "user", "content": self._build_prompt(chat_text, contexto_adicional)}],
+        )
+
+    def _ler_resposta(self, response, tentativa: int, chave_cache: str) -> Optional[Dict]:
+        """Interpreta a resposta do Claude. None = repetir a chamada (resposta vazia, truncada ou JSON inválido)."""
+        usage = getattr(response, 'usage', None)
+        logger.info(
+            "[Claude/chat] modelo=%s regua=%s | tokens in=%s out=%s | stop=%s",
+            self.model, REGUA_VERSAO,
+            getattr(usage, 'input_tokens', None),
+            getattr(usage, 'output_tokens', None),
+            response.stop_reason,
+        )
+
+        content = (response.content[0].text if response.content else "").strip()
+        if not content:
+            return None if tentativa < 2 else {'erro': 'Resposta vazia após retentativas'}
+
+        if response.stop_reason == 'max_tokens':
+            logger.warning("[Claude/chat] max_tokens atingido (tentativa %d)", tentativa + 1)
+            return None if tentativa < 2 else {'erro': 'Resposta truncada (max_tokens) após retentativas'}
+
+        content = self._limpar_markdown(content)
+        try:
+            ai_result = json.loads(content)
+        except json.JSONDecodeError as e:
+            logger.warning(
+                "[Claude/chat] JSONDecodeError tentativa %d: %s | início: %r",
+                tentativa + 1, e, content[:200] if content else "(vazio)",
+            )
+            return None if tentativa < 2 else {'erro': f'JSON inválido: {e}'}
+
+        avaliacao_cache.salvar(
+            chave_cache, _CANAL, ai_result,
+            tokens=(getattr(usage, 'input_tokens', 0) or 0) + (getattr(usage, 'output_tokens', 0) or 0),
+            modelo=self.model, prompt_versao=self._prompt_versao,
+        )
+        return ai_result
+
     def _call_claude(self, chat_text: str, contexto_adicional: Optional[Dict] = None) -> Dict:
         client = self.client
         if client is None:
             return {'erro': 'Anthropic não inicializado (ANTHROPIC_API_KEY ausente)'}
 
-        prompt = self._build_prompt(chat_text, contexto_adicional)
-        content = ""
+        chave_cache, cacheado = self._consultar_cache(chat_text, contexto_adicional)
+        if cacheado is not None:
+            return cacheado
+        requisicao = self._requisicao(chat_text, contexto_adicional)
 
         for tentativa in range(3):
-            with self._throttle_lock:
-                now = _time.time()
-                elapsed = now - self._last_request_time
-                if self.throttle_seconds > 0 and elapsed < self.throttle_seconds:
-                    _time.sleep(self.throttle_seconds - elapsed)
-                self._last_request_time = _time.time()
-
             try:
-                response = client.messages.create(
-                    model=self.model,
-                    max_tokens=self.max_tokens,
-                    temperature=self.temperature,
-                    system=[{
-                        "type": "text",
-                        "text": _SYSTEM_PROMPT,
-                        "cache_control": {"type": "ephemeral"},
-                    }],
-                    messages=[{"role": "user", "content": prompt}],
-                )
-
-                usage = getattr(response, 'usage', None)
-                logger.info(
-                    "[Claude/chat] modelo=%s regua=%s | tokens in=%s out=%s | stop=%s",
-                    self.model, REGUA_VERSAO,
-                    getattr(usage, 'input_tokens', None),
-                    getattr(usage, 'output_tokens', None),
-                    response.stop_reason,
-                )
-
-                content = (response.content[0].text if response.content else "").strip()
-                if not content:
-                    if tentativa < 2:
-                        continue
-                    return {'erro': 'Resposta vazia após retentativas'}
-
-                if response.stop_reason == 'max_tokens':
-                    logger.warning("[Claude/chat] max_tokens atingido (tentativa %d)", tentativa + 1)
-                    if tentativa < 2:
-                        continue
-                    return {'erro': 'Resposta truncada (max_tokens) após retentativas'}
-
-                content = self._limpar_markdown(content)
-                return json.loads(content)
-
-            except json.JSONDecodeError as e:
-                logger.warning(
-                    "[Claude/chat] JSONDecodeError tentativa %d: %s | início: %r",
-                    tentativa + 1, e, content[:200] if content else "(vazio)",
-                )
+                # O limitador espera por orçamento (rpm/tpm) e recua junto com as outras threads em 429
+                response = llm_limiter.criar_mensagem(client, **requisicao)
+                ai_result = self._ler_resposta(response, tentativa, chave_cache)
+                if ai_result is not None:
+                    return ai_result
+            except anthropic.RateLimitError as e:
+                logger.warning("Rate limit (429) tentativa %d; limitador suspenso pelo retry-after.", tentativa + 1)
+                if tentativa == 2:
+                    return {'erro': f'Rate limit excedido após 3 tentativas: {e}'}
+            except (anthropic.APIConnectionError, anthropic.APIStatusError) as e:
+                logger.error("Erro na avaliação (tentativa %d): %s", tentativa + 1, e)
                 if tentativa < 2:
+                    _time.sleep(min(2 ** (tentativa + 1), 10))
                     continue
-                return {'erro': f'JSON inválido: {e}'}
+                return {'erro': str(e)}
+            except Exception as e:
+                logger.error("Erro na avaliação (tentativa %d): %s", tentativa + 1, e)
+                return {'erro': str(e)}
+
+        return {'erro': 'Falha após retentativas'}
+
+    async def _call_claude_async(self, aclient, chat_text: str, contexto_adicional: Optional[Dict] = None) -> Dict:
+        """_call_claude com anthropic.AsyncAnthropic (mesmo cache, limitador e retentativas).
+
+        O cache é SQLite síncrono: consulta e gravação rodam em thread, fora do event loop.
+        """
+        chave_cache, cacheado = await asyncio.to_thread(self._consultar_cache, chat_text, contexto_adicional)
+        if cacheado is not None:
+            return cacheado
+        requisicao = self._requisicao(chat_text, contexto_adicional)
+
+        for tentativa in range(3):
+            try:
+                response = await llm_limiter.criar_mensagem_async(aclient, **requisicao)
+                ai_result = await asyncio.to_thread(self._ler_resposta, response, tentativa, chave_cache)
+                if ai_result is not None:
+                    return ai_result
             except anthropic.RateLimitError as e:
-                wait = min(2 ** (tentativa + 2), 60)
-                logger.warning("Rate limit (429) tentativa %d. Aguardando %ds...", tentativa + 1, wait)
-                _time.sleep(wait)
+                logger.warning("Rate limit (429) tentativa %d; limitador suspenso pelo retry-after.", tentativa + 1)
                 if tentativa == 2:
                     return {'erro': f'Rate limit excedido após 3 tentativas: {e}'}
             except (anthropic.APIConnectionError, anthropic.APIStatusError) as e:
                 logger.error("Erro na avaliação (tentativa %d): %s", tentativa + 1, e)
                 if tentativa < 2:
-                    _time.sleep(min(2 ** (tentativa + 1), 10))
+                    await asyncio.sleep(min(2 ** (tentativa + 1), 10))
                     continue
                 return {'erro': str(e)}
             except Exception as e:
@@ -380,16 +450,9 @@ class ChatIAAnalyzer:
 
     # ── pipeline completo (1 chat) ───────────────────────────────────────────
 
-    def avaliar_chat(self, chat_text: str, contexto_adicional: Optional[Dict] = None,
-                     agent_name: str = '') -> Dict:
-        """
-        Pipeline completo:
-          1. Filtra bot (Python, 0 API calls)
-          2. Verifica avaliabilidade (Python, 0 API calls)
-          3. Classifica + avalia com Claude (1 API call)
-        """
+    def _triagem(self, chat_text: str, agent_name: str) -> Tuple[Dict, Optional[str]]:
+        """Camadas 1+2+2b (0 API calls). Retorna (resultado parcial, transcrição limpa ou None se não vai ao Claude)."""
         filtro = filtrar_mensagens_bot(chat_text)
-        transcricao_limpa = filtro['transcricao_limpa']
         stats = filtro['stats']
 
         resultado = {
@@ -410,16 +473,24 @@ class ChatIAAnalyzer:
         if not avaliavel:
             resultado['classificacao'] = 'inapto_regra'
             resultado['motivo'] = motivo
-            return resultado
+            return resultado, None
+
+        # Camada 2b: classificador local (não-venda com confiança alta, ver utils.triagem_local)
+        local = triagem_local.triar(_CANAL, filtro['transcricao_limpa'])
+        if local:
+            resultado['classificacao'] = local['tipo']
+            resultado['motivo'] = local['motivo']
+            return resultado, None
 
-        # Camada 3: Claude faz classificação + avaliação (1 call)
         if not self.client:
             resultado['classificacao'] = 'outros'
             resultado['motivo'] = 'Anthropic não inicializado'
-            return resultado
+            return resultado, None
 
-        ai_result = self._call_claude(transcricao_limpa, contexto_adicional)
+        return resultado, filtro['transcricao_limpa']
 
+    def _completar(self, resultado: Dict, ai_result: Dict) -> Dict:
+        """Camada 3: incorpora a classificação + avaliação do Claude ao resultado."""
         if 'erro' in ai_result and ai_result.get('erro'):
             resultado['erro'] = ai_result['erro']
             resultado['classificacao'] = 'falha_avaliacao'
@@ -440,61 +511,104 @@ class ChatIAAnalyzer:
 
         return resultado
 
+    def avaliar_chat(self, chat_text: str, contexto_adicional: Optional[Dict] = None,
+                     agent_name: str = '') -> Dict:
+        """
+        Pipeline completo:
+          1. Filtra bot (Python, 0 API calls)
+          2. Verifica avaliabilidade (Python, 0 API calls)
+          2b. Triagem local de não-venda (numpy, 0 API calls)
+          3. Classifica + avalia com Claude (1 API call)
+        """
+        resultado, transcricao_limpa = self._triagem(chat_text, agent_name)
+        if transcricao_limpa is None:
+            return resultado
+        return self._completar(resultado, self._call_claude(transcricao_limpa, contexto_adicional))
+
+    async def avaliar_chat_async(self, aclient, chat_text: str, contexto_adicional: Optional[Dict] = None,
+                                 agent_name: str = '') -> Dict:
+        """avaliar_chat com o cliente assíncrono (ver cliente_async)."""
+        resultado, transcricao_limpa = self._triagem(chat_text, agent_name)
+        if transcricao_limpa is None:
+            return resultado
+        ai_result = await self._call_claude_async(aclient, transcricao_limpa, contexto_adicional)
+        return self._completar(resultado, ai_result)
+
     # ══════════════════════════════════════════════════════════════════════════
-    # PROCESSAMENTO PARALELO (modo tempo-real, ThreadPoolExecutor)
+    # PROCESSAMENTO EM LOTE (modo tempo-real, utils.avaliacao_async)
     # ══════════════════════════════════════════════════════════════════════════
 
-    def avaliar_lote_paralelo(
+    def cliente_async(self):
+        """Cliente assíncrono novo — um por event loop (use com `async with`).
+
+        Sem ANTHROPIC_API_KEY devolve um contexto vazio: a triagem já encerra os chats sem chamar a API.
+        """
+        if not self.api_key:
+            return contextlib.nullcontext()
+        return anthropic.AsyncAnthropic(api_key=self.api_key)
+
+    def concorrencia(self, max_workers: Optional[int] = None) -> int:
+        """Avaliações simultâneas: explícito > CHAT_CLAUDE_MAX_WORKERS > derivado do limitador."""
+        return max_workers or self.max_workers or llm_limiter.limitador(self.model).concorrencia()
+
+    @staticmethod
+    def _resultado_falha(chat_data: Dict, erro: str) -> Dict:
+        return {
+            'chat_id': chat_data.get('chat_id', ''),
+            'classificacao': 'falha_avaliacao',
+            'motivo': erro,
+            'erro': erro,
+            'ai_evaluation': None, 'lead_score': None,
+            'vendor_score': None, 'main_product': None,
+            'deve_avaliar': False, 'filtro_stats': {}
+        }
+
+    async def avaliar_lote_async(
         self,
         chats: List[Dict],
         max_workers: Optional[int] = None,
-        callback=None
+        callback=None,
+        cancelamento: Optional[threading.Event] = None,
     ) -> List[Dict]:
-        """
-        Avalia múltiplos chats em paralelo.
-        chats: lista de dicts com chat_id, transcript, agent_name, contexto_adicional
-        """
-        workers = max_workers or self.max_workers
-        resultados: List[Optional[Dict]] = [None] * len(chats)
+        """Corrotina de avaliar_lote_paralelo (para quem já roda num event loop)."""
+        chats = [dict(c, chat_id=c.get('chat_id', f'chat_{i}')) for i, c in enumerate(chats)]
 
-        def _process(idx, chat_data):
-            chat_id = chat_data.get('chat_id', f'chat_{idx}')
-            try:
-                result = self.avaliar_chat(
+        def _progresso(concluidos, total, _indice, result):
+            if callback:
+                callback(concluidos, total, result.get('chat_id', ''), result)
+
+        async with self.cliente_async() as aclient:
+            async def _avaliar(chat_data):
+                result = await self.avaliar_chat_async(
+                    aclient,
                     chat_text=chat_data.get('transcript', ''),
                     contexto_adicional=chat_data.get('contexto_adicional'),
                     agent_name=chat_data.get('agent_name', '')
                 )
-                result['chat_id'] = chat_id
-                return idx, result
-            except Exception as e:
-                return idx, {
-                    'chat_id': chat_id,
-                    'classificacao': 'falha_avaliacao',
-                    'motivo': str(e),
-                    'erro': str(e),
-                    'ai_evaluation': None, 'lead_score': None,
-                    'vendor_score': None, 'main_product': None,
-                    'deve_avaliar': False, 'filtro_stats': {}
-                }
-
-        with ThreadPoolExecutor(max_workers=workers) as executor:
-            futures = {
-                executor.submit(_process, i, chat): i
-                for i, chat in enumerate(chats)
-            }
-            completed = 0
-            for future in as_completed(futures):
-                idx, result = future.result()
-                resultados[idx] = result
-                completed += 1
-                if callback:
-                    try:
-                        callback(completed, len(chats), result.get('chat_id', ''), result)
-                    except Exception:
-                        pass
+                result['chat_id'] = chat_data['chat_id']
+                return result
+
+            return await avaliacao_async.executar_lote(
+                chats, _avaliar,
+                concorrencia=self.concorrencia(max_workers),
+                progresso=_progresso,
+                cancelamento=cancelamento,
+                falha=self._resultado_falha,
+            )
 
-        return [r for r in resultados if r is not None]
+    def avaliar_lote_paralelo(
+        self,
+        chats: List[Dict],
+        max_workers: Optional[int] = None,
+        callback=None,
+        cancelamento: Optional[threading.Event] = None,
+    ) -> List[Dict]:
+        """
+        Avalia múltiplos chats concorrentemente (asyncio; ver utils.avaliacao_async).
+        chats: lista de dicts com chat_id, transcript, agent_name, contexto_adicional
+        Resultados na ordem de `chats`; cancelados voltam com erro 'cancelado'.
+        """
+        return avaliacao_async.rodar(self.avaliar_lote_async(chats, max_workers, callback, cancelamento))
 
     # ══════════════════════════════════════════════════════════════════════════
     # BATCH API (Anthropic Message Batches — 50% de desconto)
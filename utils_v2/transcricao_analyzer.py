@@ -19,22 +19,41 @@ ENV VARS:
   CLAUDE_MODEL             — default claude-sonnet-4-6
   CLAUDE_TEMPERATURE       — default 0.2
   CLAUDE_MAX_TOKENS        — default 6000 (subiu de 4096: schema maior)
-  CLAUDE_MAX_INPUT_CHARS   — default 25000
-  CLAUDE_MAX_WORKERS       — default 2
-  CLAUDE_THROTTLE_SECONDS  — default 4
+  CLAUDE_MAX_INPUT_TOKENS  — orçamento de tokens da transcrição no prompt (default 7000;
+                             utils.compactacao — substitui CLAUDE_MAX_INPUT_CHARS)
+  CLAUDE_MAX_WORKERS       — avaliações simultâneas no lote
+                             (default: llm_limiter.concorrencia(), pelo limite de rpm)
+  LLM_RPM / LLM_ITPM / LLM_OTPM — orçamento inicial do limitador compartilhado
+                             (utils.llm_limiter; ajustado pelos cabeçalhos da API)
+
+CACHE DE AVALIAÇÕES: _call_claude consulta utils.avaliacao_cache antes da
+API (mesma chave do canal WhatsApp, com canal='ligacao'). A reavaliação em
+lote só chama o Claude para transcrições cujo conteúdo, contexto, modelo,
+régua ou prompt mudaram.
+
+TRIAGEM LOCAL: depois das heurísticas, utils.triagem_local (TF-IDF +
+regressão logística treinados com as classificações já gravadas) descarta
+sem API as ligações que ele dá como não-venda com confiança >= TRIAGEM_LIMIAR.
+
+LOTE: analisar_lote_paralelo roda em asyncio (utils.avaliacao_async) com
+anthropic.AsyncAnthropic — dezenas de avaliações em voo numa única thread,
+semáforo dimensionado pelo limitador, callback de progresso e cancelamento
+por threading.Event. A versão corrotina (analisar_lote_async) serve quem
+já roda num event loop.
 """
 
+import asyncio
 import os
 import re
 import json
 import logging
-import time as _time
 import threading
-from typing import Dict, List, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextlib
+from typing import Dict, List, Optional, Tuple
 import anthropic
 from dotenv import load_dotenv
 
+from utils import avaliacao_async, avaliacao_cache, compactacao, llm_limiter, triagem_local
 from utils.venda_consultiva_core import (
     REGUA_VERSAO,
     build_user_prompt,
@@ -45,6 +64,8 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 _SYSTEM_PROMPT = system_prompt("ligacao")
+_CANAL = "ligacao"
+_PROMPT_BASE = build_user_prompt(_CANAL, "")
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -133,10 +154,15 @@ class TranscricaoAnalyzer:
         self.model = os.getenv("CLAUDE_MODEL", "claude-sonnet-4-6")
         self.temperature = float(os.getenv("CLAUDE_TEMPERATURE", "0.2"))
         self.max_tokens = int(os.getenv("CLAUDE_MAX_TOKENS", "6000"))
-        self.max_input_chars = int(os.getenv("CLAUDE_MAX_INPUT_CHARS", "25000"))
-        self.max_workers = int(os.getenv("CLAUDE_MAX_WORKERS", "2"))
-        self.throttle_seconds = float(os.getenv("CLAUDE_THROTTLE_SECONDS", "4"))
-        self._thread_local = threading.local()
+        self.max_input_tokens = int(os.getenv("CLAUDE_MAX_INPUT_TOKENS", "7000"))
+        self.max_workers = int(os.getenv("CLAUDE_MAX_WORKERS", "0")) or None
+
+    @property
+    def _prompt_versao(self) -> str:
+        """Versão do prompt no cache: textos fixos + regras e orçamento da compactação."""
+        return avaliacao_cache.versao_prompt(
+            _SYSTEM_PROMPT, _PROMPT_BASE, compactacao.versao(self.max_input_tokens)
+        )
 
     # ── helpers ───────────────────────────────────────────────────────────────
 
@@ -154,65 +180,106 @@ class TranscricaoAnalyzer:
             ctx_json = json.dumps(contexto_adicional, ensure_ascii=False)
         return build_user_prompt(
             canal="ligacao",
-            conteudo=transcricao[:self.max_input_chars],
+            conteudo=compactacao.compactar(_CANAL, transcricao, self.max_input_tokens, self.model),
             contexto_adicional_json=ctx_json,
         )
 
     # ── chamada unitária ao Claude ────────────────────────────────────────────
 
+    def _consultar_cache(self, transcricao: str, contexto_adicional: Optional[Dict]) -> Tuple[str, Optional[Dict]]:
+        chave_cache = avaliacao_cache.chave(
+            _CANAL, transcricao, contexto_adicional, self.model, self._prompt_versao
+        )
+        cacheado = avaliacao_cache.buscar(chave_cache, _CANAL)
+        if cacheado is not None:
+            logger.info("[Claude/ligacao] cache hit %s (regua=%s)", chave_cache[:12], REGUA_VERSAO)
+        return chave_cache, cacheado
+
+    def _requisicao(self, transcricao: str, contexto_adicional: Optional[Dict]) -> Dict:
+        return dict(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            system=[{
+                "type": "text",
+                "text": _SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"}
+            }],
+            messages=[{"role": "user", "content": self._build_prompt(transcricao, contexto_adicional)}],
+        )
+
+    def _ler_resposta(self, response, tentativa: int, chave_cache: str) -> Optional[Dict]:
+        """Interpreta a resposta do Claude. None = repetir a chamada."""
+        usage = getattr(response, 'usage', None)
+        logger.info(
+            "[Claude/ligacao] modelo=%s regua=%s | tokens in=%s out=%s | stop=%s",
+            self.model, REGUA_VERSAO,
+            getattr(usage, 'input_tokens', None),
+            getattr(usage, 'output_tokens', None),
+            response.stop_reason,
+        )
+
+        content = (response.content[0].text if response.content else "").strip()
+        if not content:
+            return None if tentativa < 2 else {'erro': 'Resposta vazia'}
+
+        if response.stop_reason == 'max_tokens' and tentativa < 2:
+            return None
+
+        content = self._limpar_markdown(content)
+        try:
+            ai_result = json.loads(content)
+        except json.JSONDecodeError as e:
+            return None if tentativa < 2 else {'erro': f'JSON inválido: {e}'}
+
+        avaliacao_cache.salvar(
+            chave_cache, _CANAL, ai_result,
+            tokens=(getattr(usage, 'input_tokens', 0) or 0) + (getattr(usage, 'output_tokens', 0) or 0),
+            modelo=self.model, prompt_versao=self._prompt_versao,
+        )
+        return ai_result
+
     def _call_claude(self, transcricao: str, contexto_adicional: Optional[Dict] = None) -> Dict:
-        prompt = self._build_prompt(transcricao, contexto_adicional)
-        content = ""
+        chave_cache, cacheado = self._consultar_cache(transcricao, contexto_adicional)
+        if cacheado is not None:
+            return cacheado
+        requisicao = self._requisicao(transcricao, contexto_adicional)
 
         for tentativa in range(3):
-            last = getattr(self._thread_local, 'last_request_time', 0.0)
-            elapsed = _time.time() - last
-            if elapsed < self.throttle_seconds:
-                _time.sleep(self.throttle_seconds - elapsed)
-            self._thread_local.last_request_time = _time.time()
-
             try:
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=self.max_tokens,
-                    temperature=self.temperature,
-                    system=[{
-                        "type": "text",
-                        "text": _SYSTEM_PROMPT,
-                        "cache_control": {"type": "ephemeral"}
-                    }],
-                    messages=[{"role": "user", "content": prompt}],
-                )
-
-                usage = getattr(response, 'usage', None)
-                logger.info(
-                    "[Claude/ligacao] modelo=%s regua=%s | tokens in=%s out=%s | stop=%s",
-                    self.model, REGUA_VERSAO,
-                    getattr(usage, 'input_tokens', None),
-                    getattr(usage, 'output_tokens', None),
-                    response.stop_reason,
-                )
+                # O limitador espera por orçamento (rpm/tpm) e recua junto com as outras threads em 429
+                response = llm_limiter.criar_mensagem(self.client, **requisicao)
+                ai_result = self._ler_resposta(response, tentativa, chave_cache)
+                if ai_result is not None:
+                    return ai_result
+            except anthropic.RateLimitError as e:
+                logger.warning("Rate limit 429 (tentativa %d); limitador suspenso pelo retry-after.", tentativa + 1)
+                if tentativa == 2:
+                    return {'erro': f'Rate limit excedido: {e}'}
+            except Exception as e:
+                logger.error("Erro (tentativa %d): %s", tentativa + 1, e)
+                return {'erro': str(e)}
 
-                content = (response.content[0].text if response.content else "").strip()
-                if not content:
-                    if tentativa < 2:
-                        continue
-                    return {'erro': 'Resposta vazia'}
+        return {'erro': 'Falha após retentativas'}
 
-                if response.stop_reason == 'max_tokens' and tentativa < 2:
-                    continue
+    async def _call_claude_async(self, aclient, transcricao: str, contexto_adicional: Optional[Dict] = None) -> Dict:
+        """_call_claude com anthropic.AsyncAnthropic (mesmo cache, limitador e retentativas).
 
-                content = self._limpar_markdown(content)
-                return json.loads(content)
+        O cache é SQLite síncrono: consulta e gravação rodam em thread, fora do event loop.
+        """
+        chave_cache, cacheado = await asyncio.to_thread(self._consultar_cache, transcricao, contexto_adicional)
+        if cacheado is not None:
+            return cacheado
+        requisicao = self._requisicao(transcricao, contexto_adicional)
 
-            except json.JSONDecodeError as e:
-                if tentativa < 2:
-                    continue
-                return {'erro': f'JSON inválido: {e}'}
+        for tentativa in range(3):
+            try:
+                response = await llm_limiter.criar_mensagem_async(aclient, **requisicao)
+                ai_result = await asyncio.to_thread(self._ler_resposta, response, tentativa, chave_cache)
+                if ai_result is not None:
+                    return ai_result
             except anthropic.RateLimitError as e:
-                wait = min(2 ** (tentativa + 2), 60)
-                logger.warning("Rate limit 429 (tentativa %d). Aguardando %ds...", tentativa + 1, wait)
-                _time.sleep(wait)
+                logger.warning("Rate limit 429 (tentativa %d); limitador suspenso pelo retry-after.", tentativa + 1)
                 if tentativa == 2:
                     return {'erro': f'Rate limit excedido: {e}'}
             except Exception as e:
@@ -223,16 +290,9 @@ class TranscricaoAnalyzer:
 
     # ── pipeline completo (1 ligação) ─────────────────────────────────────────
 
-    def analisar_transcricao(self, transcricao: str, contexto_adicional: Optional[Dict] = None) -> Dict:
-        """
-        Pipeline completo:
-          1. Heurística de triagem (0 API calls)
-          2. Detecção de inversão de interlocutores (0 API calls)
-          3. Classificação + avaliação com Claude (1 API call)
-        contexto_adicional: dict montado por venda_consultiva_core
-        .montar_contexto_qualificacao (tipo_ligacao, empresa, P1/P2, etapa).
-        """
-        resultado = {
+    @staticmethod
+    def _resultado_base() -> Dict:
+        return {
             'classificacao_ligacao': None, 'motivo': '', 'deve_avaliar': False,
             'avaliacao_completa': None, 'nota_vendedor': 0,
             'lead_score': None, 'lead_classificacao': None,
@@ -241,29 +301,41 @@ class TranscricaoAnalyzer:
             'confianca_avaliacao': None, 'erro': None,
         }
 
+    def _triagem(self, transcricao: str) -> Tuple[Dict, Optional[Dict]]:
+        """Camadas 1+1b+2 (0 API calls). Retorna (resultado parcial, info de interlocutores ou None se não vai ao Claude)."""
+        resultado = self._resultado_base()
+
         if not transcricao or len(transcricao.strip()) < 10:
             resultado['classificacao_ligacao'] = 'dados_insuficientes'
             resultado['motivo'] = 'Transcrição vazia ou muito curta'
-            return resultado
+            return resultado, None
 
         # Camada 1: heurística
         heuristica = _heuristica_triagem(transcricao)
         if heuristica and not heuristica.get('deve_avaliar', False):
             resultado['classificacao_ligacao'] = heuristica['tipo']
             resultado['motivo'] = heuristica['motivo']
-            return resultado
+            return resultado, None
+
+        # Camada 1b: classificador local (não-venda com confiança alta, ver utils.triagem_local)
+        local = triagem_local.triar(_CANAL, transcricao)
+        if local:
+            resultado['classificacao_ligacao'] = local['tipo']
+            resultado['motivo'] = local['motivo']
+            return resultado, None
 
         # Camada 2: detecção de inversão
         info_interloc = _detectar_troca_interlocutores(transcricao)
 
-        # Camada 3: Claude faz triagem + avaliação (1 call)
         if not self.client:
             resultado['classificacao_ligacao'] = 'erro'
             resultado['motivo'] = 'Anthropic não inicializado'
-            return resultado
+            return resultado, None
 
-        ai_result = self._call_claude(transcricao, contexto_adicional)
+        return resultado, info_interloc
 
+    def _completar(self, resultado: Dict, ai_result: Dict, info_interloc: Dict) -> Dict:
+        """Camada 3: incorpora a triagem + avaliação do Claude ao resultado."""
         if 'erro' in ai_result and ai_result.get('erro'):
             resultado['erro'] = ai_result['erro']
             resultado['classificacao_ligacao'] = 'erro'
@@ -300,56 +372,102 @@ class TranscricaoAnalyzer:
 
         return resultado
 
-    # ── processamento paralelo ────────────────────────────────────────────────
+    def analisar_transcricao(self, transcricao: str, contexto_adicional: Optional[Dict] = None) -> Dict:
+        """
+        Pipeline completo:
+          1. Heurística de triagem (0 API calls)
+          1b. Triagem local de não-venda (numpy, 0 API calls)
+          2. Detecção de inversão de interlocutores (0 API calls)
+          3. Classificação + avaliação com Claude (1 API call)
+        contexto_adicional: dict montado por venda_consultiva_core
+        .montar_contexto_qualificacao (tipo_ligacao, empresa, P1/P2, etapa).
+        """
+        resultado, info_interloc = self._triagem(transcricao)
+        if info_interloc is None:
+            return resultado
+        ai_result = self._call_claude(transcricao, contexto_adicional)
+        return self._completar(resultado, ai_result, info_interloc)
 
-    def analisar_lote_paralelo(
+    async def analisar_transcricao_async(self, aclient, transcricao: str,
+                                         contexto_adicional: Optional[Dict] = None) -> Dict:
+        """analisar_transcricao com o cliente assíncrono (ver cliente_async)."""
+        resultado, info_interloc = self._triagem(transcricao)
+        if info_interloc is None:
+            return resultado
+        ai_result = await self._call_claude_async(aclient, transcricao, contexto_adicional)
+        return self._completar(resultado, ai_result, info_interloc)
+
+    # ── processamento em lote (utils.avaliacao_async) ─────────────────────────
+
+    def cliente_async(self):
+        """Cliente assíncrono novo — um por event loop (use com `async with`).
+
+        Sem ANTHROPIC_API_KEY devolve um contexto vazio: a triagem já encerra as ligações sem chamar a API.
+        """
+        if not self.api_key:
+            return contextlib.nullcontext()
+        return anthropic.AsyncAnthropic(api_key=self.api_key)
+
+    def concorrencia(self, max_workers: Optional[int] = None) -> int:
+        """Avaliações simultâneas: explícito > CLAUDE_MAX_WORKERS > derivado do limitador."""
+        return max_workers or self.max_workers or llm_limiter.limitador(self.model).concorrencia()
+
+    @staticmethod
+    def _resultado_falha(item: Dict, erro: str) -> Dict:
+        return {
+            'transcricao_id': item.get('transcricao_id', ''),
+            'classificacao_ligacao': 'erro',
+            'motivo': erro, 'erro': erro,
+            'nota_vendedor': 0, 'lead_score': None,
+            'avaliacao_completa': None,
+        }
+
+    async def analisar_lote_async(
         self,
         transcricoes: List[Dict],
         max_workers: Optional[int] = None,
-        callback=None
+        callback=None,
+        cancelamento: Optional[threading.Event] = None,
     ) -> List[Dict]:
-        """
-        Avalia múltiplas transcrições em paralelo.
-        transcricoes: dicts com transcricao_id, transcricao, contexto_adicional.
-        """
-        workers = max_workers or self.max_workers
-        resultados = [None] * len(transcricoes)
-
-        def _process(idx, item):
-            tid = item.get('transcricao_id', f'trans_{idx}')
-            try:
-                result = self.analisar_transcricao(
+        """Corrotina de analisar_lote_paralelo (para quem já roda num event loop)."""
+        transcricoes = [dict(t, transcricao_id=t.get('transcricao_id', f'trans_{i}'))
+                        for i, t in enumerate(transcricoes)]
+
+        def _progresso(concluidos, total, _indice, result):
+            if callback:
+                callback(concluidos, total, result.get('transcricao_id', ''), result)
+
+        async with self.cliente_async() as aclient:
+            async def _avaliar(item):
+                result = await self.analisar_transcricao_async(
+                    aclient,
                     transcricao=item.get('transcricao', ''),
                     contexto_adicional=item.get('contexto_adicional')
                 )
-                result['transcricao_id'] = tid
-                return idx, result
-            except Exception as e:
-                return idx, {
-                    'transcricao_id': tid,
-                    'classificacao_ligacao': 'erro',
-                    'motivo': str(e), 'erro': str(e),
-                    'nota_vendedor': 0, 'lead_score': None,
-                    'avaliacao_completa': None,
-                }
-
-        with ThreadPoolExecutor(max_workers=workers) as executor:
-            futures = {
-                executor.submit(_process, i, t): i
-                for i, t in enumerate(transcricoes)
-            }
-            completed = 0
-            for future in as_completed(futures):
-                idx, result = future.result()
-                resultados[idx] = result
-                completed += 1
-                if callback:
-                    try:
-                        callback(completed, len(transcricoes), result.get('transcricao_id', ''), result)
-                    except Exception:
-                        pass
+                result['transcricao_id'] = item['transcricao_id']
+                return result
 
-        return resultados
+            return await avaliacao_async.executar_lote(
+                transcricoes, _avaliar,
+                concorrencia=self.concorrencia(max_workers),
+                progresso=_progresso,
+                cancelamento=cancelamento,
+                falha=self._resultado_falha,
+            )
+
+    def analisar_lote_paralelo(
+        self,
+        transcricoes: List[Dict],
+        max_workers: Optional[int] = None,
+        callback=None,
+        cancelamento: Optional[threading.Event] = None,
+    ) -> List[Dict]:
+        """
+        Avalia múltiplas transcrições concorrentemente (asyncio; ver utils.avaliacao_async).
+        transcricoes: dicts com transcricao_id, transcricao, contexto_adicional.
+        Resultados na ordem de entrada; cancelados voltam com erro 'cancelado'.
+        """
+        return avaliacao_async.rodar(self.analisar_lote_async(transcricoes, max_workers, callback, cancelamento))
 
     # ── batch API ─────────────────────────────────────────────────────────────
 
@@ -375,35 +493,41 @@ class TranscricaoAnalyzer:
         except Exception as e:
             return {'erro': str(e)}
 
-    def criar_batch(self, transcricoes: List[Dict]) -> Optional[str]:
-        """Envia transcrições para Batch API (50% desconto). Retorna batch_id."""
-        if not self.client:
-            return None
-
-        requests = []
+    def preparar_batch(self, transcricoes: List[Dict]) -> Dict:
+        """
+        Separa o que precisa do Claude do que já se resolve localmente.
+        transcricoes: dicts com transcricao_id, transcricao, contexto_adicional.
+        Retorna:
+          requests     — entradas para messages.batches.create
+          resolvidos   — resultados finais (heurística de triagem ou cache de
+                         avaliações), no formato de analisar_transcricao
+          chaves_cache — {transcricao_id: chave} para gravar no cache na coleta
+        """
+        requests, resolvidos, chaves_cache = [], [], {}
         for item in transcricoes:
             tid = str(item.get('transcricao_id', ''))
             transcricao = item.get('transcricao', '')
+            contexto = item.get('contexto_adicional')
 
-            heuristica = _heuristica_triagem(transcricao)
-            if heuristica and not heuristica.get('deve_avaliar', False):
+            resultado, info_interloc = self._triagem(transcricao)
+            if info_interloc is None:
+                resolvidos.append(dict(resultado, transcricao_id=tid))
                 continue
 
-            prompt = self._build_prompt(transcricao, item.get('contexto_adicional'))
-            requests.append({
-                "custom_id": tid,
-                "params": {
-                    "model": self.model,
-                    "max_tokens": self.max_tokens,
-                    "temperature": self.temperature,
-                    "system": [{"type": "text", "text": _SYSTEM_PROMPT}],
-                    "messages": [{"role": "user", "content": prompt}],
-                }
-            })
-
-        if not requests:
-            return None
+            chave_cache, cacheado = self._consultar_cache(transcricao, contexto)
+            if cacheado is not None:
+                resolvidos.append(dict(self._completar(resultado, cacheado, info_interloc), transcricao_id=tid))
+                continue
+
+            chaves_cache[tid] = chave_cache
+            requests.append({"custom_id": tid, "params": self._requisicao(transcricao, contexto)})
+
+        return {'requests': requests, 'resolvidos': resolvidos, 'chaves_cache': chaves_cache}
 
+    def enviar_batch(self, requests: List[Dict]) -> Optional[str]:
+        """Cria o batch na Anthropic (50% de desconto). Retorna batch_id ou None."""
+        if not self.client or not requests:
+            return None
         try:
             batch = self.client.messages.batches.create(requests=requests)
             logger.info("Batch criado: %s (%d requests)", batch.id, len(requests))
@@ -412,40 +536,45 @@ class TranscricaoAnalyzer:
             logger.error("Erro ao criar batch: %s", e)
             return None
 
-    def coletar_resultados_batch(self, batch_id: str) -> List[Dict]:
-        """Coleta resultados de batch finalizado."""
+    def criar_batch(self, transcricoes: List[Dict]) -> Optional[str]:
+        """Envia transcrições para Batch API (50% desconto). Retorna batch_id.
+
+        Só envia o que precisa do Claude; para também receber os resultados
+        resolvidos localmente (heurística/cache), use preparar_batch + enviar_batch.
+        """
+        if not self.client:
+            return None
+        return self.enviar_batch(self.preparar_batch(transcricoes)['requests'])
+
+    def coletar_resultados_batch(self, batch_id: str, chaves_cache: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """Coleta resultados de batch finalizado. Formato igual a analisar_transcricao().
+
+        chaves_cache (de preparar_batch): grava cada avaliação bem-sucedida no cache de avaliações.
+        """
         resultados = []
         try:
             for entry in self.client.messages.batches.results(batch_id):
-                resultado = {
-                    'transcricao_id': entry.custom_id,
-                    'classificacao_ligacao': None, 'motivo': '',
-                    'nota_vendedor': 0, 'avaliacao_completa': None,
-                    'lead_score': None, 'lead_classificacao': None,
-                    'vendedor_disclaimer': None, 'lead_disclaimer': None,
-                    'erro': None,
-                }
+                resultado = dict(self._resultado_base(), transcricao_id=entry.custom_id)
 
                 if entry.result.type == 'succeeded':
-                    content = (entry.result.message.content[0].text
-                               if entry.result.message.content else "").strip()
+                    message = entry.result.message
+                    content = (message.content[0].text if message.content else "").strip()
                     content = self._limpar_markdown(content)
                     try:
                         ai_result = json.loads(content)
-                        tipo = ai_result.get('tipo', 'outros')
-                        resultado['classificacao_ligacao'] = tipo
-                        resultado['motivo'] = ai_result.get('motivo', '')
-
-                        if tipo == 'venda':
-                            resultado['avaliacao_completa'] = json.dumps(ai_result, ensure_ascii=False)
-                            resultado['nota_vendedor'] = ai_result.get('avaliacao_vendedor', {}).get('nota_final_0_100', 0)
-                            resultado['lead_score'] = ai_result.get('avaliacao_lead', {}).get('lead_score_0_100')
-                            resultado['lead_classificacao'] = ai_result.get('avaliacao_lead', {}).get('classificacao')
-                            resultado['vendedor_disclaimer'] = ai_result.get('vendedor_disclaimer')
-                            resultado['lead_disclaimer'] = ai_result.get('lead_disclaimer')
                     except json.JSONDecodeError as e:
                         resultado['erro'] = f'JSON inválido: {e}'
                         resultado['classificacao_ligacao'] = 'erro'
+                    else:
+                        resultado = self._completar(resultado, ai_result, {})
+                        chave_cache = (chaves_cache or {}).get(entry.custom_id)
+                        if chave_cache:
+                            usage = getattr(message, 'usage', None)
+                            avaliacao_cache.salvar(
+                                chave_cache, _CANAL, ai_result,
+                                tokens=(getattr(usage, 'input_tokens', 0) or 0) + (getattr(usage, 'output_tokens', 0) or 0),
+                                modelo=self.model, prompt_versao=self._prompt_versao,
+                            )
                 else:
                     resultado['erro'] = f'Batch entry failed: {entry.result.type}'
                     resultado['classificacao_ligacao'] = 'erro'